@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, UserProfile
+from .models import LastKnownPosition, User, UserProfile
 
 class CustomUserAdmin(UserAdmin):
     list_display = ('email', 'first_name', 'last_name', 'is_staff', 'is_active')
@@ -23,5 +23,11 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_filter = ('authority_level', 'status', 'email_verified')
     search_fields = ('full_name', 'user__email', 'contact_number')
 
+class LastKnownPositionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'latitude', 'longitude', 'accuracy', 'geohash', 'recorded_at')
+    search_fields = ('user__email',)
+    readonly_fields = ('geohash',)
+
 admin.site.register(User, CustomUserAdmin)
-admin.site.register(UserProfile, UserProfileAdmin)
\ No newline at end of file
+admin.site.register(UserProfile, UserProfileAdmin)
+admin.site.register(LastKnownPosition, LastKnownPositionAdmin)
\ No newline at end of file
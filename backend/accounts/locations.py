@@ -0,0 +1,166 @@
+"""
+Coalesced ingestion of location pings.
+
+Devices may ping as often as they like: each process keeps only the newest ping per user
+in memory and writes them all to LastKnownPosition in one INSERT ... ON CONFLICT DO UPDATE
+statement, with the geohash computed before the write. A flush happens every
+LOCATION_FLUSH_SECONDS (from a background thread, or from the next ping), or as soon as
+LOCATION_BUFFER_MAX_USERS distinct users are waiting. Each process therefore writes at most
+one row per active user per interval, however often the devices ping. The upsert only
+replaces a row with a newer position, so flushes from different workers can land in any
+order.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, router
+from django.utils import timezone
+
+from core.services import geohash
+from .models import LastKnownPosition, User, UserProfile
+
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement, well under the bound-parameter limits of Postgres and SQLite
+UPSERT_BATCH_SIZE = 500
+
+POSITION_FIELDS = ('user', 'latitude', 'longitude', 'accuracy', 'geohash', 'recorded_at')
+
+
+def write_positions(positions):
+    """
+    Upsert {user_id: (latitude, longitude, accuracy, recorded_at)} into LastKnownPosition,
+    keeping the stored row when it is newer. Returns the number of rows written; users
+    deleted since their ping are dropped.
+    """
+    connection = connections[router.db_for_write(LastKnownPosition)]
+    quote = connection.ops.quote_name
+    opts = LastKnownPosition._meta
+    fields = [opts.get_field(name) for name in POSITION_FIELDS]
+    table = quote(opts.db_table)
+    updated = [field for field in fields if not field.primary_key]
+
+    # Users deleted since their ping would fail the foreign key when the batch commits
+    existing = set(User.objects.filter(id__in=list(positions)).values_list('id', flat=True))
+    items = [(user_id, position) for user_id, position in positions.items() if user_id in existing]
+    for start in range(0, len(items), UPSERT_BATCH_SIZE):
+        batch = items[start:start + UPSERT_BATCH_SIZE]
+        params = []
+        for user_id, (latitude, longitude, accuracy, recorded_at) in batch:
+            values = (
+                user_id, latitude, longitude, accuracy,
+                geohash.encode(latitude, longitude, opts.get_field('geohash').precision), recorded_at,
+            )
+            params.extend(field.get_db_prep_value(value, connection) for field, value in zip(fields, values))
+        row = '(' + ', '.join(['%s'] * len(fields)) + ')'
+        sql = (
+            f'INSERT INTO {table} ({", ".join(quote(field.column) for field in fields)}) '
+            f'VALUES {", ".join([row] * len(batch))} '
+            f'ON CONFLICT ({quote(opts.pk.column)}) DO UPDATE SET '
+            + ', '.join(f'{quote(field.column)} = EXCLUDED.{quote(field.column)}' for field in updated)
+            + f' WHERE {table}.{quote("recorded_at")} < EXCLUDED.{quote("recorded_at")}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+    return len(items)
+
+
+class LocationBuffer:
+    """Newest pending ping per user, flushed to the database in batches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._flushed_at = time.monotonic()
+        self._flusher = None
+        self._pid = os.getpid()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, user_id, latitude, longitude, accuracy=None, recorded_at=None):
+        """Record a ping; returns True when it triggered a flush"""
+        recorded_at = recorded_at or timezone.now()
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the pings and the flusher thread belong to the parent
+                self._pending, self._flusher, self._pid = {}, None, os.getpid()
+            current = self._pending.get(user_id)
+            if current is None or recorded_at >= current[3]:
+                self._pending[user_id] = (latitude, longitude, accuracy, recorded_at)
+            due = (
+                len(self._pending) >= settings.LOCATION_BUFFER_MAX_USERS
+                or time.monotonic() - self._flushed_at >= settings.LOCATION_FLUSH_SECONDS
+            )
+            if settings.LOCATION_FLUSH_THREAD and self._flusher is None:
+                self._flusher = threading.Thread(target=self._run_flusher, name='location-flusher', daemon=True)
+                self._flusher.start()
+        if due:
+            self.flush()
+        return due
+
+    def flush(self):
+        """Write the pending pings; returns how many were written"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._flushed_at = time.monotonic()
+            if not pending:
+                return 0
+            try:
+                return write_positions(pending)
+            except Exception:
+                logger.exception('Writing %d location pings failed; keeping them for the next flush', len(pending))
+                with self._lock:
+                    for user_id, position in pending.items():
+                        current = self._pending.get(user_id)
+                        if current is None or current[3] < position[3]:
+                            self._pending[user_id] = position
+                return 0
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(settings.LOCATION_FLUSH_SECONDS)
+            if self._pid != os.getpid():
+                return
+            if time.monotonic() - self._flushed_at >= settings.LOCATION_FLUSH_SECONDS:
+                self.flush()
+                close_old_connections()
+
+
+location_buffer = LocationBuffer()
+atexit.register(location_buffer.flush)
+
+
+def fresh_positions():
+    """Positions recorded within the last LOCATION_STALE_MINUTES"""
+    return LastKnownPosition.objects.filter(
+        recorded_at__gte=timezone.now() - timedelta(minutes=settings.LOCATION_STALE_MINUTES)
+    )
+
+
+def approved_users_near(latitude, longitude, delta_degrees, exclude_user=None):
+    """
+    Approved users within delta_degrees of a point: users with a fresh position are placed
+    where they last pinged from, the others at their profile location.
+    """
+    box = {
+        'latitude__range': (latitude - delta_degrees, latitude + delta_degrees),
+        'longitude__range': (longitude - delta_degrees, longitude + delta_degrees),
+    }
+    fresh = fresh_positions()
+    pinged = fresh.filter(user__profile__status='approved', **box).select_related('user')
+    registered = UserProfile.objects.filter(status='approved', **box).exclude(
+        user__in=fresh.values('user')
+    ).select_related('user')
+    if exclude_user is not None:
+        pinged = pinged.exclude(user=exclude_user)
+        registered = registered.exclude(user=exclude_user)
+    return [position.user for position in pinged] + [profile.user for profile in registered]
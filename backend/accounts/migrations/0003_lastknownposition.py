@@ -0,0 +1,25 @@
+import core.fields
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_emergencycontact'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LastKnownPosition',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='last_position', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('accuracy', models.FloatField(blank=True, help_text='Reported accuracy radius in meters.', null=True)),
+                ('geohash', core.fields.GeohashField(blank=True, db_index=True, editable=False, max_length=12)),
+                ('recorded_at', models.DateTimeField(db_index=True, help_text='When the device took the position.')),
+            ],
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 
+from core.fields import GeohashField
+
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -62,3 +64,17 @@ class UserProfile(models.Model):
         return f"{self.full_name} ({self.user.email})"
 
 
+class LastKnownPosition(models.Model):
+    """
+    Latest location ping of a user, one row per user. Written in batches by
+    accounts.locations.LocationBuffer, never through save().
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='last_position')
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    accuracy = models.FloatField(null=True, blank=True, help_text="Reported accuracy radius in meters.")
+    geohash = GeohashField()
+    recorded_at = models.DateTimeField(db_index=True, help_text="When the device took the position.")
+
+    def __str__(self):
+        return f"{self.user.email} @ {self.latitude}, {self.longitude}"
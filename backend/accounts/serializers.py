@@ -1,23 +1,30 @@
 
 from rest_framework import serializers
+from core.serializers import TimedSerializerMixin
 from .models import User
 
-class PasswordResetRequestSerializer(serializers.Serializer):
+class PasswordResetRequestSerializer(TimedSerializerMixin, serializers.Serializer):
     email = serializers.EmailField()
 
-class PasswordResetConfirmSerializer(serializers.Serializer):
+class PasswordResetConfirmSerializer(TimedSerializerMixin, serializers.Serializer):
     uid = serializers.CharField()
     token = serializers.CharField()
     password = serializers.CharField(write_only=True)
 
-class EmailVerificationRequestSerializer(serializers.Serializer):
+class EmailVerificationRequestSerializer(TimedSerializerMixin, serializers.Serializer):
     email = serializers.EmailField()
 
-class EmailVerificationConfirmSerializer(serializers.Serializer):
+class EmailVerificationConfirmSerializer(TimedSerializerMixin, serializers.Serializer):
     uid = serializers.CharField()
     token = serializers.CharField()
 
-class RegisterSerializer(serializers.Serializer):
+class LocationPingSerializer(TimedSerializerMixin, serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    accuracy = serializers.FloatField(min_value=0, required=False, allow_null=True)
+    recorded_at = serializers.DateTimeField(required=False)
+
+class RegisterSerializer(TimedSerializerMixin, serializers.Serializer):
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
     first_name = serializers.CharField(max_length=150)
@@ -30,7 +37,7 @@ class RegisterSerializer(serializers.Serializer):
     emergency_contact_name = serializers.CharField(max_length=100, required=False, allow_null=True)
     emergency_contact_number = serializers.CharField(max_length=15, required=False, allow_null=True)
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'email', 'first_name', 'last_name')
@@ -4,6 +4,14 @@ from rest_framework.test import APIClient, APIRequestFactory
 from django.core.cache import cache
 from rest_framework import status
 from accounts.views import UserLoginAPIView
+from accounts.locations import LocationBuffer, approved_users_near, location_buffer
+from core.services import geohash
+from core.services.throttling import get_throttle_store
+from datetime import timedelta
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 
 
@@ -104,6 +112,7 @@ class AccountsAPITest(TestCase):
 	def setUp(self):
 		self.client = APIClient()
 		cache.clear()
+		get_throttle_store().clear()
 
 	def test_register_and_jwt_and_me(self):
 		# Register
@@ -261,3 +270,95 @@ class AccountsAPITest(TestCase):
 		self.assertEqual(pending_profile.status, 'approved')
 
 
+@override_settings(LOCATION_FLUSH_THREAD=False, LOCATION_FLUSH_SECONDS=60, LOCATION_BUFFER_MAX_USERS=1000)
+class LocationIngestTests(TestCase):
+	def setUp(self):
+		from accounts.models import User
+		location_buffer.flush()
+		self.user = User.objects.create_user(email='pinger@example.com', password='pingpass123')
+		self.client = APIClient()
+		self.client.force_authenticate(self.user)
+
+	def make_profile(self, email, latitude, longitude):
+		from accounts.models import User, UserProfile
+		user = User.objects.create_user(email=email, password='pass12345')
+		UserProfile.objects.create(
+			user=user, full_name=email, authority_level='User', contact_number='1234567890',
+			date_of_birth='2000-01-01', address='Address', status='approved',
+			latitude=latitude, longitude=longitude
+		)
+		return user
+
+	def test_pings_are_coalesced_into_one_upsert(self):
+		from accounts.models import LastKnownPosition
+		url = reverse('location_ping')
+		for step in range(5):
+			resp = self.client.post(url, {'latitude': 14.5 + step * 0.001, 'longitude': 121.0}, format='json')
+			self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+		self.assertFalse(LastKnownPosition.objects.exists())
+
+		with CaptureQueriesContext(connection) as queries:
+			self.assertEqual(location_buffer.flush(), 1)
+		self.assertEqual(len([query for query in queries if query['sql'].startswith('INSERT')]), 1)
+		position = LastKnownPosition.objects.get(user=self.user)
+		self.assertAlmostEqual(position.latitude, 14.504)
+		self.assertEqual(position.geohash, geohash.encode(14.504, 121.0, 9))
+
+	def test_older_ping_does_not_replace_newer_position(self):
+		from accounts.models import LastKnownPosition
+		now = timezone.now()
+		buffer = LocationBuffer()
+		buffer.add(self.user.id, 14.6, 121.0, recorded_at=now)
+		buffer.flush()
+		buffer.add(self.user.id, 10.0, 120.0, recorded_at=now - timedelta(minutes=1))
+		buffer.flush()
+		self.assertEqual(LastKnownPosition.objects.get(user=self.user).latitude, 14.6)
+
+	def test_future_timestamp_is_clamped(self):
+		from accounts.models import LastKnownPosition
+		self.client.post(reverse('location_ping'), {
+			'latitude': 14.6, 'longitude': 121.0, 'recorded_at': (timezone.now() + timedelta(days=1)).isoformat()
+		}, format='json')
+		location_buffer.flush()
+		self.assertLessEqual(LastKnownPosition.objects.get(user=self.user).recorded_at, timezone.now())
+
+	def test_invalid_coordinates_are_rejected(self):
+		resp = self.client.post(reverse('location_ping'), {'latitude': 91, 'longitude': 121.0}, format='json')
+		self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+	@override_settings(LOCATION_BUFFER_MAX_USERS=2)
+	def test_buffer_flushes_when_full(self):
+		from accounts.models import LastKnownPosition, User
+		other = User.objects.create_user(email='other@example.com', password='pass12345')
+		buffer = LocationBuffer()
+		self.assertFalse(buffer.add(self.user.id, 14.6, 121.0))
+		self.assertTrue(buffer.add(other.id, 14.7, 121.0))
+		self.assertEqual(len(buffer), 0)
+		self.assertEqual(LastKnownPosition.objects.count(), 2)
+
+	def test_deleted_users_are_dropped(self):
+		from accounts.models import LastKnownPosition, User
+		other = User.objects.create_user(email='gone@example.com', password='pass12345')
+		buffer = LocationBuffer()
+		buffer.add(self.user.id, 14.6, 121.0)
+		buffer.add(other.id, 14.7, 121.0)
+		other.delete()
+		self.assertEqual(buffer.flush(), 1)
+		self.assertEqual(list(LastKnownPosition.objects.values_list('user_id', flat=True)), [self.user.id])
+
+	def test_nearby_users_prefer_fresh_positions(self):
+		from accounts.models import LastKnownPosition
+		stays = self.make_profile('stays@example.com', 14.60, 121.00)
+		moved_in = self.make_profile('moved-in@example.com', 10.00, 120.00)
+		moved_out = self.make_profile('moved-out@example.com', 14.60, 121.00)
+		went_stale = self.make_profile('stale@example.com', 10.00, 120.00)
+		buffer = LocationBuffer()
+		buffer.add(moved_in.id, 14.61, 121.01)
+		buffer.add(moved_out.id, 10.00, 120.00)
+		buffer.add(went_stale.id, 14.61, 121.01, recorded_at=timezone.now() - timedelta(hours=1))
+		buffer.flush()
+		self.assertEqual(LastKnownPosition.objects.count(), 3)
+
+		nearby = approved_users_near(14.60, 121.00, 0.1, exclude_user=self.user)
+		self.assertEqual({user.email for user in nearby}, {stays.email, moved_in.email})
+
@@ -7,6 +7,7 @@ urlpatterns = [
     path('user/login/', views.UserLoginAPIView.as_view(), name='user_login'),
     path('user/responder/login/', views.ResponderLoginAPIView.as_view(), name='responder_login'),
     path('logout/', views.LogoutAPIView.as_view(), name='logout'),
+    path('location/', views.LocationPingAPIView.as_view(), name='location_ping'),
 
     # Password reset endpoints
     path('password-reset/request/', views.PasswordResetRequestAPIView.as_view(), name='password_reset_request'),
@@ -10,7 +10,7 @@ from django.utils import timezone
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 
 # Rest framework imports
-from rest_framework import generics, serializers, status, permissions, throttling
+from rest_framework import generics, serializers, status, permissions
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -24,6 +24,8 @@ from knox.auth import TokenAuthentication
 from knox.models import AuthToken
 
 # Local imports
+from nstw_backend import throttling
+from .locations import location_buffer
 from .models import User, UserProfile
 from .permissions import IsLGUAdministrator
 from .serializers import (
@@ -32,7 +34,8 @@ from .serializers import (
     PasswordResetRequestSerializer, 
     PasswordResetConfirmSerializer,
     EmailVerificationRequestSerializer, 
-    EmailVerificationConfirmSerializer
+    EmailVerificationConfirmSerializer,
+    LocationPingSerializer
 )
 
 class RegisterAPIView(APIView):
@@ -552,3 +555,49 @@ class MeAPIView(APIView):
             }
         except AttributeError:
             return None
+
+
+class LocationPingAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [throttling.ScopedRateThrottle]
+    throttle_scope = 'location'
+
+    @swagger_auto_schema(
+        tags=['auth'],
+        operation_description=(
+            "Report the caller's current location. Pings are buffered and written in batches "
+            "(see LOCATION_FLUSH_SECONDS), so the position can take a few seconds to show up."
+        ),
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['latitude', 'longitude'],
+            properties={
+                'latitude': openapi.Schema(type=openapi.TYPE_NUMBER, description='Latitude, -90 to 90'),
+                'longitude': openapi.Schema(type=openapi.TYPE_NUMBER, description='Longitude, -180 to 180'),
+                'accuracy': openapi.Schema(type=openapi.TYPE_NUMBER, description='Accuracy radius in meters'),
+                'recorded_at': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME, description='When the device took the position (defaults to now)'),
+            }
+        ),
+        responses={
+            202: openapi.Response(
+                description="Ping accepted",
+                schema=openapi.Schema(
+                    type=openapi.TYPE_OBJECT,
+                    properties={
+                        'ok': openapi.Schema(type=openapi.TYPE_BOOLEAN)
+                    }
+                )
+            ),
+            400: "Invalid coordinates",
+            401: "Not authenticated"
+        }
+    )
+    def post(self, request):
+        serializer = LocationPingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        now = timezone.now()
+        # A device clock running ahead would otherwise pin the position until it catches up
+        recorded_at = min(data.get('recorded_at') or now, now)
+        location_buffer.add(request.user.id, data['latitude'], data['longitude'], data.get('accuracy'), recorded_at)
+        return Response({'ok': True}, status=status.HTTP_202_ACCEPTED)
@@ -1,9 +1,10 @@
 from rest_framework import serializers
+from core.serializers import TimedSerializerMixin
 from .models import Agency, AgencyEmergencyType
 from emergencies.serializers import EmergencyTypeSerializer
 from core.services.file_service import FileService
 
-class AgencySerializer(serializers.ModelSerializer):
+class AgencySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Agency
         fields = ['id', 'name', 'logo_url', 'hotline_number', 'latitude', 'longitude']
@@ -21,7 +22,7 @@ class AgencySerializer(serializers.ModelSerializer):
         
         return result
 
-class AgencyEmergencyTypeSerializer(serializers.ModelSerializer):
+class AgencyEmergencyTypeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     agency = AgencySerializer(read_only=True)
     emergency_type = EmergencyTypeSerializer(read_only=True)
 
@@ -29,7 +30,7 @@ class AgencyEmergencyTypeSerializer(serializers.ModelSerializer):
         model = AgencyEmergencyType
         fields = ['id', 'agency', 'emergency_type']
 
-class AgencyDetailSerializer(serializers.ModelSerializer):
+class AgencyDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     emergency_types = EmergencyTypeSerializer(many=True, read_only=True, source='agencyemergencytype_set.emergency_type')
 
     class Meta:
@@ -1,3 +1,28 @@
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from core.testing import QueryBudgetMixin
+from emergencies.models import EmergencyType
+from .models import Agency, AgencyEmergencyType
+
+
+class AgencyEmergencyTypeQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for index in range(5):
+            agency = Agency.objects.create(
+                name=f'Agency {index}',
+                hotline_number='911',
+                latitude=14.5995,
+                longitude=120.9842
+            )
+            emergency_type = EmergencyType.objects.create(name=f'Type {index}', icon_type='icon')
+            AgencyEmergencyType.objects.create(agency=agency, emergency_type=emergency_type)
+
+    def test_agency_emergency_type_list_query_budget(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get(reverse('agency-emergency-type-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 5)
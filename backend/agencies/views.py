@@ -101,7 +101,7 @@ class AgencyEmergencyTypeList(generics.ListCreateAPIView):
     create:
     Associate a new emergency type with an agency.
     """
-    queryset = AgencyEmergencyType.objects.all()
+    queryset = AgencyEmergencyType.objects.select_related('agency', 'emergency_type')
     serializer_class = AgencyEmergencyTypeSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
@@ -138,7 +138,7 @@ class AgencyEmergencyTypeDetail(generics.RetrieveUpdateDestroyAPIView):
     destroy:
     Remove an emergency type association from an agency.
     """
-    queryset = AgencyEmergencyType.objects.all()
+    queryset = AgencyEmergencyType.objects.select_related('agency', 'emergency_type')
     serializer_class = AgencyEmergencyTypeSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
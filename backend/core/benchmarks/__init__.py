@@ -0,0 +1,142 @@
+"""
+Microbenchmark suite for backend hot paths.
+
+Benchmarks are registered with the @benchmark decorator. A benchmark function performs
+its setup and returns a zero-argument callable; the runner times that callable.
+Database fixtures are created inside a transaction that is rolled back afterwards, so
+the suite can run against the local SQLite or Postgres database without leaving rows.
+
+Run with: python manage.py run_benchmarks
+"""
+import gc
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.db import transaction
+
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baselines.json'
+
+_registry = {}
+
+
+class _Rollback(Exception):
+    """Raised to roll back the fixtures of a benchmark"""
+
+
+def benchmark(name):
+    """Register a benchmark under the given name"""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def get_benchmarks():
+    # Import the cases lazily so registering them doesn't require app loading
+    from . import cases  # noqa: F401
+    return dict(sorted(_registry.items()))
+
+
+def time_callable(func, repeats=5, min_time=0.2):
+    """
+    Time func and return the median time per call in nanoseconds.
+    The number of calls per repeat grows until one repeat takes at least min_time seconds.
+    """
+    number = 1
+    while True:
+        elapsed = _time_loop(func, number)
+        if elapsed >= min_time or number >= 1_000_000:
+            break
+        number *= 2 if elapsed * 10 > min_time else 10
+
+    samples = [elapsed / number] + [_time_loop(func, number) / number for _ in range(repeats - 1)]
+    return statistics.median(samples) * 1e9
+
+
+def _time_loop(func, number):
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def run_benchmark(name, repeats=5, min_time=0.2):
+    """Run one benchmark with its fixtures rolled back afterwards; returns ns per call"""
+    setup = get_benchmarks()[name]
+    result = None
+    try:
+        with transaction.atomic():
+            result = time_callable(setup(), repeats=repeats, min_time=min_time)
+            raise _Rollback()
+    except _Rollback:
+        pass
+    return result
+
+
+def load_baselines(path=BASELINE_PATH):
+    path = Path(path)
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def save_baselines(results, path=BASELINE_PATH):
+    path = Path(path)
+    baselines = load_baselines(path)
+    baselines.update({name: round(value, 1) for name, value in results.items()})
+    path.write_text(json.dumps(dict(sorted(baselines.items())), indent=2) + '\n')
+
+
+def compare(results, baselines, threshold=0.2):
+    """
+    Compare results against baselines.
+    Returns rows of (name, baseline_ns, current_ns, ratio, verdict).
+    """
+    rows = []
+    for name, current in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            rows.append((name, None, current, None, 'new'))
+            continue
+        ratio = current / baseline if baseline else None
+        if ratio is None:
+            verdict = 'new'
+        elif ratio > 1 + threshold:
+            verdict = 'REGRESSION'
+        elif ratio < 1 - threshold:
+            verdict = 'improved'
+        else:
+            verdict = 'ok'
+        rows.append((name, baseline, current, ratio, verdict))
+    return rows
+
+
+def format_duration(nanoseconds):
+    if nanoseconds is None:
+        return '-'
+    for unit, scale in (('s', 1e9), ('ms', 1e6), ('µs', 1e3)):
+        if nanoseconds >= scale:
+            return f'{nanoseconds / scale:.2f} {unit}'
+    return f'{nanoseconds:.0f} ns'
+
+
+def format_report(rows, threshold=0.2):
+    """Render comparison rows as a Markdown table suitable for a review comment"""
+    lines = [
+        f'| Benchmark | Baseline | Current | Change | Verdict (±{threshold:.0%}) |',
+        '|---|---:|---:|---:|---|',
+    ]
+    for name, baseline, current, ratio, verdict in rows:
+        change = f'{(ratio - 1) * 100:+.1f}%' if ratio is not None else '-'
+        lines.append(
+            f'| {name} | {format_duration(baseline)} | {format_duration(current)} | {change} | {verdict} |'
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,288 @@
+"""
+Benchmark cases for backend hot paths. Each case sets up its fixtures and returns
+the callable to time.
+"""
+import base64
+import io
+
+from django.test.utils import override_settings
+
+from . import benchmark
+
+
+def _sample_image_base64(width=1024, height=768):
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (width, height), color=(200, 60, 30))
+    draw = ImageDraw.Draw(image)
+    for offset in range(0, width, 32):
+        draw.line((offset, 0, width - offset, height), fill=(20, 20, 20), width=3)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def _create_user(email='bench@example.com'):
+    from accounts.models import User, UserProfile
+
+    user = User.objects.create_user(email=email, password='benchmark-pass')
+    UserProfile.objects.create(
+        user=user,
+        full_name='Bench User',
+        authority_level='User',
+        contact_number='123',
+        date_of_birth='2000-01-01',
+        address='Manila',
+        status='approved',
+        latitude=14.5995,
+        longitude=120.9842
+    )
+    return user
+
+
+def _create_report(user, emergency_type=None):
+    from emergencies.models import EmergencyReport, EmergencyType
+
+    emergency_type = emergency_type or EmergencyType.objects.create(name='Fire', icon_type='fire-icon')
+    return EmergencyReport.objects.create(
+        emergency_type=emergency_type,
+        user=user,
+        longitude=120.9842,
+        latitude=14.5995,
+        details='Benchmark emergency report details'
+    )
+
+
+@benchmark('geo.haversine_distance')
+def haversine_distance():
+    from emergencies.views import TriggerCrowdsourcingBroadcast
+
+    view = TriggerCrowdsourcingBroadcast()
+
+    def run():
+        view.haversine_distance(14.5995, 120.9842, 14.6760, 121.0437)
+    return run
+
+
+@benchmark('db.request_connection_cycle')
+def request_connection_cycle():
+    from django.db import connections
+
+    # A separate wrapper, so closing it leaves the benchmark transaction alone. It shares
+    # the alias's pool, if one is configured.
+    connection = connections.create_connection('default')
+
+    def run():
+        # What one request costs in connection handling: connect (or check out of the pool),
+        # one query, then the end-of-request close (or return to the pool)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        connection.close_if_unusable_or_obsolete()
+    return run
+
+
+@benchmark('file_service.validate_image')
+def validate_image():
+    from core.services.file_service import FileService
+
+    image = _sample_image_base64()
+    return lambda: FileService.validate_image(image)
+
+
+@benchmark('file_service.process_image_field')
+def process_image_field():
+    from core.services.file_service import FileService
+
+    data_url = f'data:image/jpeg;base64,{_sample_image_base64()}'
+
+    def run():
+        with override_settings(IMAGE_STORAGE_BACKEND='stub'):
+            FileService.process_image_field(data_url, folder='benchmarks')
+    return run
+
+
+@benchmark('serializer.emergency_report.serialize')
+def emergency_report_serialize():
+    from emergencies.serializers import EmergencyReportSerializer
+
+    report = _create_report(_create_user())
+    return lambda: EmergencyReportSerializer(report).data
+
+
+@benchmark('serializer.emergency_report.serialize_many_50')
+def emergency_report_serialize_many():
+    from emergencies.models import EmergencyReport
+    from emergencies.serializers import EmergencyReportSerializer
+
+    user = _create_user()
+    report = _create_report(user)
+    for _ in range(49):
+        _create_report(user, report.emergency_type)
+    reports = list(EmergencyReport.objects.all()[:50])
+    return lambda: EmergencyReportSerializer(reports, many=True).data
+
+
+@benchmark('serializer.emergency_report.validate')
+def emergency_report_validate():
+    from emergencies.models import EmergencyType
+    from emergencies.serializers import EmergencyReportSerializer
+
+    emergency_type = EmergencyType.objects.create(name='Flood', icon_type='flood-icon')
+    payload = {
+        'emergency_type': str(emergency_type.id),
+        'longitude': 120.9842,
+        'latitude': 14.5995,
+        'details': 'Rising flood water near the barangay hall',
+    }
+
+    def run():
+        serializer = EmergencyReportSerializer(data=payload)
+        assert serializer.is_valid(), serializer.errors
+    return run
+
+
+@benchmark('duplicates.find_surge')
+def duplicate_find_surge():
+    import random
+    import uuid
+    from types import SimpleNamespace
+
+    from django.utils import timezone
+
+    from emergencies.duplicates import RecentReportIndex
+
+    # 20,000 open reports of 4 types around Metro Manila, as during a city-wide surge
+    index = RecentReportIndex()
+    rng = random.Random(41)
+    now = timezone.now()
+    types = [uuid.uuid4() for _ in range(4)]
+    for _ in range(20_000):
+        index.add(SimpleNamespace(
+            id=uuid.uuid4(), emergency_type_id=rng.choice(types), latitude=rng.uniform(14.4, 14.8),
+            longitude=rng.uniform(120.9, 121.1), date_created=now, canonical_report_id=None
+        ))
+    # Includes the database refresh, amortized over DUPLICATE_INDEX_REFRESH_SECONDS
+    return lambda: index.find(types[0], 14.5995, 120.9842, now=now)
+
+
+@benchmark('dispatch.recommend_5000')
+def dispatch_recommend():
+    import random
+    import uuid
+
+    from django.utils import timezone
+
+    from responders.dispatch import ResponderIndex
+
+    # 5,000 on-duty responders of agencies handling 2 of 8 types each, around Metro Manila
+    index = ResponderIndex()
+    rng = random.Random(45)
+    now = timezone.now()
+    types = [uuid.uuid4() for _ in range(8)]
+    # The first lookup loads the (empty) database; the synthetic responders go in after it
+    index.recommend(types[0], 14.5995, 120.9842, 5, now=now)
+    for user_id in range(5000):
+        index.set_capabilities(user_id, rng.sample(types, 2))
+        index.move(user_id, rng.uniform(14.4, 14.8), rng.uniform(120.9, 121.1), now)
+    # Includes the database refresh, amortized over DISPATCH_INDEX_REFRESH_SECONDS
+    return lambda: index.recommend(types[0], 14.5995, 120.9842, 5, now=now)
+
+
+@benchmark('routing.eta_15_of_900')
+def routing_eta():
+    import random
+
+    from core.services.routing import RoadGraph
+
+    # A 30 x 30 street grid of ~330 m blocks with a few one-way streets, and the 15
+    # candidates (5 requested, ROUTING_CANDIDATE_FACTOR 3) dispatch routes for a report
+    rng = random.Random(46)
+    size, step = 30, 0.003
+    latitudes = [14.5 + row * step for row in range(size) for _ in range(size)]
+    longitudes = [121.0 + column * step for _ in range(size) for column in range(size)]
+    tails, heads, weights = [], [], []
+    for node in range(size * size):
+        for neighbour in (node + 1 if node % size != size - 1 else None, node + size if node + size < size * size else None):
+            if neighbour is None:
+                continue
+            seconds = rng.uniform(15, 60)
+            tails.append(node), heads.append(neighbour), weights.append(seconds)
+            if rng.random() > 0.1:
+                tails.append(neighbour), heads.append(node), weights.append(seconds)
+    graph = RoadGraph(latitudes, longitudes, tails, heads, weights)
+    graph.contract()
+    origins = [(rng.uniform(14.5, 14.587), rng.uniform(121.0, 121.087)) for _ in range(15)]
+    return lambda: graph.eta_seconds(origins, (14.54, 121.04), 500, 15 / 3.6)
+
+
+def _throttled_requests(count=1000):
+    """GET requests from `count` different users, as the user throttle sees them"""
+    from types import SimpleNamespace
+
+    from django.test import RequestFactory
+
+    factory = RequestFactory()
+    requests = []
+    for user_id in range(count):
+        request = factory.get('/api/emergencies/reports/')
+        request.user = SimpleNamespace(pk=user_id, is_authenticated=True)
+        requests.append(request)
+    return requests
+
+
+def _throttle_run(throttle_class, requests):
+    position = iter(range(1 << 62))
+
+    def run():
+        # A new throttle per request, as DRF instantiates them, cycling through the users
+        throttle_class().allow_request(requests[next(position) % len(requests)], None)
+    return run
+
+
+@benchmark('throttle.user_drf_cache')
+def throttle_user_drf_cache():
+    from rest_framework.throttling import UserRateThrottle
+
+    # DRF's stock throttle: a timestamp list per user in the (per-process) default cache
+    return _throttle_run(UserRateThrottle, _throttled_requests())
+
+
+@benchmark('throttle.user_sliding_window')
+def throttle_user_sliding_window():
+    from nstw_backend.throttling import UserRateThrottle
+
+    # With the configured THROTTLE_BACKEND (file by default)
+    return _throttle_run(UserRateThrottle, _throttled_requests())
+
+
+@benchmark('throttle.database_store_hit')
+def throttle_database_store_hit():
+    from core.services.throttling import DatabaseStore
+
+    store = DatabaseStore()
+    keys = [f'throttle_user_{user_id}' for user_id in range(1000)]
+    position = iter(range(1 << 62))
+    return lambda: store.hit(keys[next(position) % len(keys)], 60, 100)
+
+
+@benchmark('models.update_verification_status')
+def update_verification_status():
+    from accounts.models import User
+    from emergencies.models import EmergencyVerification
+
+    report = _create_report(_create_user())
+    for index in range(10):
+        voter = User.objects.create_user(email=f'voter{index}@example.com', password='benchmark-pass')
+        EmergencyVerification.objects.create(report=report, user=voter, vote=index % 3 != 0)
+    return report.update_verification_status
+
+
+@benchmark('auth.knox_token_authentication')
+def knox_token_authentication():
+    from knox.auth import TokenAuthentication
+    from knox.models import AuthToken
+
+    _, token = AuthToken.objects.create(_create_user())
+    authentication = TokenAuthentication()
+    credentials = token.encode()
+    return lambda: authentication.authenticate_credentials(credentials)
@@ -0,0 +1,41 @@
+"""
+Model fields shared by the apps.
+"""
+from django.db import models
+
+from core.services import geohash
+
+
+class GeohashField(models.CharField):
+    """
+    Geohash of the model's latitude/longitude fields, recomputed whenever the row is saved
+    or bulk-created. Indexed, it serves as a spatial index: the rows inside a geohash cell
+    are the rows whose geohash starts with the cell's hash.
+    """
+
+    def __init__(self, *args, precision=9, latitude_field='latitude', longitude_field='longitude', **kwargs):
+        self.precision = precision
+        self.latitude_field = latitude_field
+        self.longitude_field = longitude_field
+        kwargs.setdefault('max_length', 12)
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('db_index', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.precision != 9:
+            kwargs['precision'] = self.precision
+        if self.latitude_field != 'latitude':
+            kwargs['latitude_field'] = self.latitude_field
+        if self.longitude_field != 'longitude':
+            kwargs['longitude_field'] = self.longitude_field
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        latitude = getattr(model_instance, self.latitude_field)
+        longitude = getattr(model_instance, self.longitude_field)
+        value = geohash.encode(latitude, longitude, self.precision) if latitude is not None and longitude is not None else ''
+        setattr(model_instance, self.attname, value)
+        return value
@@ -0,0 +1,35 @@
+"""
+Django management command to move old closed reports to compressed cold storage.
+Usage: python manage.py archive_reports [--older-than-days 180] [--batch-size 500] [--limit N] [--dry-run]
+
+Resolved and dismissed reports older than the threshold are written, with their
+verifications and evaluations, to append-only gzip files under ARCHIVE_ROOT and deleted
+from the hot tables. They stay reachable by ID at /api/emergencies/archived-reports/<id>/.
+Run it from a scheduler during quiet hours.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from emergencies.archive import archive_candidates, archive_closed_reports
+
+
+class Command(BaseCommand):
+    help = 'Archives closed reports older than a threshold to compressed append-only files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help='Archive resolved/dismissed reports created more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE,
+                            help='Reports written and deleted per transaction')
+        parser.add_argument('--limit', type=int, default=None, help='Stop after archiving this many reports')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the reports that would be archived')
+
+    def handle(self, *args, **options):
+        older_than_days = options['older_than_days']
+        if options['dry_run']:
+            count = archive_candidates(older_than_days).count()
+            self.stdout.write(f'{count} report(s) older than {older_than_days} days would be archived')
+            return
+
+        archived = archive_closed_reports(older_than_days, batch_size=options['batch_size'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'{archived} report(s) archived to {settings.ARCHIVE_ROOT}'))
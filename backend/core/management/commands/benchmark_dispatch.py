@@ -0,0 +1,188 @@
+"""
+Django management command to measure concurrent auto-dispatch of reports to responders.
+Usage: python manage.py benchmark_dispatch [--responders 32] [--reports 2000] [--hold-ms 0] [--compare]
+
+Creates a temporary agency with --responders responders and --reports queued reports,
+then starts every responder at once, each calling dispatch_next in a loop until the
+queue is empty; --hold-ms keeps each claim's transaction open longer, standing in for
+slower requests. The command reports claims per second, the latency of whole claims and
+of the locking SELECT alone, claims that came back empty while reports were still
+queued, and checks that no report was assigned twice. With SKIP LOCKED the locking
+SELECT never waits for another responder. --compare runs the same workload with a plain
+FOR UPDATE, where every responder queues up behind the lock on the same top report.
+
+Each responder is a separate process. Requires Postgres: SQLite has no row locks, so it
+serializes all writers.
+"""
+import multiprocessing
+import time
+import uuid
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from accounts.models import User
+from agencies.models import Agency, AgencyEmergencyType
+from core.management.commands.loadtest import percentile
+from emergencies.models import EmergencyReport, EmergencyType
+from emergencies.rollups import record_report_inserts
+from emergencies.triage import dispatch_next, score_new_report
+from responders.models import Responder
+
+
+def close_connections():
+    """Close every connection, and the connection pools, which cannot be shared across a fork"""
+    for conn in connections.all():
+        conn.close()
+        if hasattr(conn, 'close_pool'):
+            conn.close_pool()
+
+
+class PickTimer:
+    """execute_wrapper recording how long each SELECT ... FOR UPDATE took, lock waits included"""
+
+    def __init__(self):
+        self.durations = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if 'FOR UPDATE' not in sql:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.durations.append(time.perf_counter() - start)
+
+
+def dispatch_worker(user, emergency_type_ids, start_barrier, hold, skip_locked, results):
+    """Claim reports until none are queued; runs in its own process with its own connection"""
+    claimed, latencies, empty = [], [], 0
+    picks = PickTimer()
+    try:
+        start_barrier.wait()
+        with connection.execute_wrapper(picks):
+            while True:
+                start = time.perf_counter()
+                with transaction.atomic():
+                    report = dispatch_next(user, emergency_type_ids, skip_locked=skip_locked)
+                    if report is not None and hold:
+                        # The rest of the request, with the row still locked
+                        time.sleep(hold)
+                latencies.append(time.perf_counter() - start)
+                if report is not None:
+                    claimed.append(report.id)
+                elif EmergencyReport.objects.filter(
+                    emergency_type_id__in=emergency_type_ids, status='Pending', responder__isnull=True
+                ).exists():
+                    # Every queued report was locked by another responder at that moment
+                    empty += 1
+                else:
+                    break
+    finally:
+        close_connections()
+        results.put((claimed, latencies, picks.durations, empty))
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks concurrent responders claiming reports through SKIP LOCKED auto-dispatch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--responders', type=int, default=32, help='Concurrent responders')
+        parser.add_argument('--reports', type=int, default=2000, help='Queued reports to dispatch')
+        parser.add_argument('--hold-ms', type=float, default=0.0, help='Extra time each claim keeps its row locked')
+        parser.add_argument('--compare', action='store_true', help='Also run with a plain FOR UPDATE')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('benchmark_dispatch needs Postgres row locks; SQLite serializes all writers.')
+
+        modes = [('SKIP LOCKED', True)] + ([('FOR UPDATE', False)] if options['compare'] else [])
+        for label, skip_locked in modes:
+            fixtures = self.create_fixtures(options['responders'], options['reports'])
+            try:
+                self.run_mode(label, skip_locked, fixtures, options['hold_ms'] / 1000, options['reports'])
+            finally:
+                self.delete_fixtures(fixtures)
+
+    def create_fixtures(self, responder_count, report_count):
+        tag = uuid.uuid4().hex[:8]
+        password = make_password(None)
+        with transaction.atomic():
+            agency = Agency.objects.create(
+                name=f'Dispatch benchmark {tag}', hotline_number='000', latitude=14.5995, longitude=120.9842
+            )
+            emergency_type = EmergencyType.objects.create(name=f'Dispatch benchmark {tag}', icon_type='benchmark')
+            AgencyEmergencyType.objects.create(agency=agency, emergency_type=emergency_type)
+            users = User.objects.bulk_create([
+                User(email=f'dispatch-{tag}-{index}@example.invalid', password=password)
+                for index in range(responder_count + 1)
+            ])
+            reporter, responders = users[0], users[1:]
+            Responder.objects.bulk_create([Responder(user=user, agency=agency) for user in responders])
+            reports = []
+            for index in range(report_count):
+                report = EmergencyReport(
+                    emergency_type=emergency_type, user=reporter,
+                    latitude=14.5 + index % 100 * 0.001, longitude=120.9 + index // 100 * 0.001
+                )
+                score_new_report(report)
+                reports.append(report)
+            EmergencyReport.objects.bulk_create(reports, batch_size=1000)
+            record_report_inserts(reports)
+        return {'agency': agency, 'emergency_type': emergency_type, 'reporter': reporter, 'responders': responders}
+
+    def delete_fixtures(self, fixtures):
+        with transaction.atomic():
+            EmergencyReport.objects.filter(emergency_type=fixtures['emergency_type']).delete()
+            User.objects.filter(id__in=[fixtures['reporter'].id] + [user.id for user in fixtures['responders']]).delete()
+            fixtures['emergency_type'].delete()
+            fixtures['agency'].delete()
+
+    def run_mode(self, label, skip_locked, fixtures, hold, report_count):
+        # Processes rather than threads, so the GIL does not serialize the responders;
+        # each child opens its own database connection after the fork
+        context = multiprocessing.get_context('fork')
+        close_connections()
+        barrier = context.Barrier(len(fixtures['responders']) + 1)
+        results = context.Queue()
+        workers = [
+            context.Process(
+                target=dispatch_worker,
+                args=(user, [fixtures['emergency_type'].id], barrier, hold, skip_locked, results)
+            )
+            for user in fixtures['responders']
+        ]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        start = time.perf_counter()
+        outcomes = [results.get() for _ in workers]
+        elapsed = time.perf_counter() - start
+        for worker in workers:
+            worker.join()
+
+        claimed = [report_id for worker_claimed, _, _, _ in outcomes for report_id in worker_claimed]
+        latencies = sorted(latency for _, worker_latencies, _, _ in outcomes for latency in worker_latencies)
+        picks = sorted(duration for _, _, worker_picks, _ in outcomes for duration in worker_picks)
+        empty = sum(worker_empty for _, _, _, worker_empty in outcomes)
+        assigned = EmergencyReport.objects.filter(
+            emergency_type=fixtures['emergency_type'], responder__isnull=False
+        ).count()
+
+        self.stdout.write(
+            f'{label}: {len(claimed)} claims by {len(workers)} responders in {elapsed:.2f}s '
+            f'({len(claimed) / elapsed:.0f}/s)'
+        )
+        for name, values in (('claim', latencies), ('locking SELECT', picks)):
+            self.stdout.write(
+                f'  {name} latency p50 {percentile(values, 0.50) * 1000:.1f} ms, '
+                f'p95 {percentile(values, 0.95) * 1000:.1f} ms, p99 {percentile(values, 0.99) * 1000:.1f} ms, '
+                f'max {(values[-1] if values else 0) * 1000:.1f} ms'
+            )
+        self.stdout.write(f'  empty claims while reports were queued: {empty}')
+        if len(set(claimed)) != len(claimed) or len(claimed) != report_count or assigned != report_count:
+            raise CommandError(
+                f'{label}: {len(claimed)} claims, {len(set(claimed))} distinct, {assigned} of {report_count} assigned'
+            )
+        self.stdout.write(self.style.SUCCESS('  every report was assigned exactly once'))
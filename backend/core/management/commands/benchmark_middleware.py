@@ -0,0 +1,119 @@
+"""
+Django management command to measure per-request middleware overhead.
+Usage: python manage.py benchmark_middleware [--iterations 5000]
+
+Runs the same synthetic requests through every profile in settings.MIDDLEWARE_PROFILES
+with a no-op view, so the numbers only reflect the cost of the middleware stack itself.
+"""
+import gc
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+
+
+@csrf_exempt
+def noop_view(request):
+    """Stand-in for a DRF view (DRF views are csrf_exempt as well)"""
+    return HttpResponse('ok')
+
+
+def build_middleware_chain(middleware_paths, view=noop_view):
+    """
+    Build a request handler the same way Django's BaseHandler does:
+    __call__ chain from the outside in, process_view hooks run before the view.
+    """
+    view_hooks = []
+
+    def get_response(request):
+        for hook in view_hooks:
+            response = hook(request, view, (), {})
+            if response is not None:
+                return response
+        return view(request)
+
+    handler = get_response
+    for path in reversed(middleware_paths):
+        try:
+            middleware = import_string(path)(handler)
+        except MiddlewareNotUsed:
+            continue
+        if hasattr(middleware, 'process_view'):
+            view_hooks.insert(0, middleware.process_view)
+        handler = middleware
+    return handler
+
+
+def time_requests(handler, request_builder, iterations):
+    """Return the mean time per request in microseconds"""
+    requests = [request_builder() for _ in range(iterations)]
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for request in requests:
+            handler(request)
+        elapsed = time.perf_counter() - start
+    finally:
+        gc.enable()
+    return elapsed / iterations * 1_000_000
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks per-request overhead of each middleware profile for API and admin paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5000, help='Requests per scenario and round')
+        parser.add_argument('--rounds', type=int, default=5, help='Rounds per scenario; the fastest round is reported')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        rounds = options['rounds']
+        factory = RequestFactory()
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'localhost'
+
+        scenarios = {
+            'API GET (token)': lambda: factory.get(
+                '/api/emergencies/reports/', HTTP_HOST=host, HTTP_AUTHORIZATION='Token benchmark'
+            ),
+            'API POST (token)': lambda: factory.post(
+                '/api/emergencies/reports/', {'details': 'benchmark'}, content_type='application/json',
+                HTTP_HOST=host, HTTP_AUTHORIZATION='Token benchmark'
+            ),
+            'Admin GET': lambda: factory.get('/admin/', HTTP_HOST=host),
+        }
+
+        handlers = {
+            profile: build_middleware_chain(middleware_paths)
+            for profile, middleware_paths in settings.MIDDLEWARE_PROFILES.items()
+        }
+
+        # Interleave profiles across rounds so warm-up and GC noise hit every stack equally
+        results = {}
+        for _ in range(rounds):
+            for profile, handler in handlers.items():
+                for scenario, request_builder in scenarios.items():
+                    elapsed = time_requests(handler, request_builder, iterations)
+                    key = (profile, scenario)
+                    results[key] = min(results.get(key, elapsed), elapsed)
+
+        profiles = list(handlers)
+        self.stdout.write(f'Middleware overhead (best of {rounds} x {iterations} requests, µs/request)')
+        self.stdout.write(f"{'Scenario':<20}" + ''.join(f'{profile:>12}' for profile in profiles))
+        for scenario in scenarios:
+            row = ''.join(f'{results[(profile, scenario)]:>12.1f}' for profile in profiles)
+            self.stdout.write(f'{scenario:<20}{row}')
+
+        if {'standard', 'stateless'} <= set(profiles):
+            for scenario in scenarios:
+                standard = results[('standard', scenario)]
+                stateless = results[('stateless', scenario)]
+                change = (stateless - standard) / standard * 100 if standard else 0.0
+                self.stdout.write(self.style.SUCCESS(
+                    f'{scenario}: stateless vs standard {stateless - standard:+.1f} µs/request ({change:+.0f}%)'
+                ))
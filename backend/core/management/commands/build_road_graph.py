@@ -0,0 +1,43 @@
+"""
+Django management command to preprocess a road network for dispatch ETAs.
+Usage: python manage.py build_road_graph roads.geojson [--output /var/lib/alisto/roads.graph]
+
+The input is GeoJSON with one LineString feature per OpenStreetMap way and the way's tags as
+properties, e.g. from an extract: `osmium tags-filter city.osm.pbf w/highway -o roads.pbf`
+then `osmium export roads.pbf -o roads.geojson`. The graph is contracted once here, which
+takes a few minutes for a city, and written to --output (ROAD_GRAPH_PATH by default) for
+the web processes to load.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.routing import RoadGraph
+
+
+class Command(BaseCommand):
+    help = 'Builds the contracted road graph used for dispatch ETAs from a GeoJSON road extract'
+
+    def add_arguments(self, parser):
+        parser.add_argument('geojson', help='GeoJSON file of OpenStreetMap ways with their tags')
+        parser.add_argument('--output', default=None, help='Graph file to write (default ROAD_GRAPH_PATH)')
+
+    def handle(self, *args, **options):
+        output = options['output'] or settings.ROAD_GRAPH_PATH
+        if not output:
+            raise CommandError('Pass --output or set ROAD_GRAPH_PATH.')
+        started = time.monotonic()
+        try:
+            graph = RoadGraph.from_geojson(options['geojson'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Could not read {options["geojson"]}: {exc}')
+        if not graph.node_count:
+            raise CommandError(f'No roads found in {options["geojson"]}.')
+        road_edges = graph.road_edge_count
+        shortcuts = graph.contract()
+        graph.save(output)
+        self.stdout.write(self.style.SUCCESS(
+            f'Road graph written to {output}: {graph.node_count} nodes, {road_edges} road edges '
+            f'and {shortcuts} shortcuts in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,31 @@
+"""
+Django management command to create the upcoming monthly partitions of the partitioned tables.
+Usage: python manage.py create_partitions [--months-ahead 3]
+
+Run it on every deploy (start_production.sh does) and daily from a scheduler so the next
+months always exist. Rows for a month without a partition land in the default partition
+and are moved into the month's partition when it is created. Does nothing on SQLite.
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from core.services.partitions import add_months, ensure_partitions, month_start
+
+
+class Command(BaseCommand):
+    help = 'Creates the monthly date_created partitions for the current and upcoming months'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3, help='Months after the current one to create')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write('Table partitioning is only used on PostgreSQL; nothing to do.')
+            return
+
+        current = month_start(timezone.now())
+        created = ensure_partitions(connection, current, add_months(current, options['months_ahead']))
+        for name in created:
+            self.stdout.write(f'  Created partition {name}')
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} partition(s) created'))
@@ -0,0 +1,383 @@
+"""
+Django management command to generate a synthetic dataset for performance work.
+Usage: python manage.py generate_dataset --users 10000 --reports 1000000 --seed 42
+
+Everything is inserted with bulk_create in batches, and the output is fully determined
+by --seed (IDs, coordinates, dates, votes and tokens), so two runs with the same
+arguments produce the same data. Synthetic users are recognisable by their email
+domain, which --flush uses to remove a previous dataset (reports and tokens cascade).
+"""
+import math
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from knox import crypto
+from knox.models import AuthToken
+from knox.settings import CONSTANTS
+
+from accounts.models import User, UserProfile
+from agencies.models import Agency, AgencyEmergencyType
+from emergencies.models import (
+    EmergencyChange, EmergencyReport, EmergencyType, EmergencyVerification, UserEvaluation, pause_change_log,
+)
+from emergencies.rollups import pause_rollups, rebuild_rollups
+from emergencies.triage import base_priority
+from responders.models import Responder
+
+
+SYNTHETIC_EMAIL_DOMAIN = 'synthetic.alisto.test'
+
+# (name, latitude, longitude, relative population weight)
+PHILIPPINE_CITIES = [
+    ('Manila', 14.5995, 120.9842, 30),
+    ('Quezon City', 14.6760, 121.0437, 30),
+    ('Caloocan', 14.6507, 120.9676, 15),
+    ('Cebu City', 10.3157, 123.8854, 15),
+    ('Davao City', 7.1907, 125.4553, 15),
+    ('Zamboanga City', 6.9214, 122.0790, 8),
+    ('Cagayan de Oro', 8.4542, 124.6319, 7),
+    ('Iloilo City', 10.7202, 122.5621, 6),
+    ('Bacolod', 10.6765, 122.9509, 6),
+    ('General Santos', 6.1164, 125.1716, 5),
+    ('Baguio', 16.4023, 120.5960, 4),
+    ('Tacloban', 11.2433, 125.0048, 3),
+    ('Legazpi', 13.1391, 123.7438, 3),
+    ('Puerto Princesa', 9.7392, 118.7353, 2),
+    ('Tuguegarao', 17.6132, 121.7270, 2),
+]
+
+# (name, icon_type, relative frequency)
+EMERGENCY_TYPES = [
+    ('Fire', 'fire', 20),
+    ('Flood', 'flood', 25),
+    ('Medical', 'medical', 20),
+    ('Vehicular Accident', 'vehicle', 12),
+    ('Crime', 'crime', 10),
+    ('Landslide', 'landslide', 5),
+    ('Earthquake', 'earthquake', 4),
+    ('Typhoon Damage', 'typhoon', 4),
+]
+
+# Report details are one of the emergency type's descriptions, English or Filipino, and a place
+REPORT_DETAILS = {
+    'Fire': ['House fire spreading to the neighbors', 'Sunog sa palengke, makapal ang usok', 'Grass fire getting close to homes'],
+    'Flood': ['Flash flood, water rising quickly', 'Baha hanggang tuhod, stranded ang mga bata', 'Flooded street, cars cannot pass'],
+    'Medical': ['Elderly man unconscious, needs an ambulance', 'Buntis na kailangan ng tulong medikal', 'Child with high fever and seizures'],
+    'Vehicular Accident': ['Motorcycle collision with injured riders', 'Banggaan ng jeep at tricycle', 'Truck overturned blocking two lanes'],
+    'Crime': ['Robbery in progress, suspects armed', 'May nagnanakaw sa tindahan', 'Fight with injuries outside a bar'],
+    'Landslide': ['Landslide blocking the road', 'Gumuho ang lupa sa likod ng bahay', 'Rocks falling onto the highway'],
+    'Earthquake': ['Cracked walls after the earthquake', 'Bumagsak ang pader dahil sa lindol', 'People trapped in a collapsed building'],
+    'Typhoon Damage': ['Fallen tree blocking the road', 'Natanggal ang bubong dahil sa bagyo', 'Electric post toppled by strong winds'],
+}
+REPORT_PLACES = [
+    'near the bridge', 'beside the elementary school', 'along the national highway', 'sa tabi ng simbahan',
+    'behind the public market', 'at the barangay hall', 'near the river bank', 'sa kanto ng plaza',
+    'inside the subdivision', 'at the bus terminal',
+]
+
+# (status, relative frequency)
+REPORT_STATUSES = [
+    ('Pending', 25),
+    ('Responding', 10),
+    ('Responded', 10),
+    ('Resolved', 45),
+    ('Dismissed', 10),
+]
+
+# Serializer bounds for coordinates within the Philippines
+LATITUDE_RANGE = (4.23, 21.12)
+LONGITUDE_RANGE = (116.93, 126.34)
+
+
+@contextmanager
+def preserve_date_created(*models):
+    """Temporarily disable auto_now_add on date_created so generated dates are kept"""
+    fields = [model._meta.get_field('date_created') for model in models]
+    previous = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, previous):
+            field.auto_now_add = value
+
+
+class Command(BaseCommand):
+    help = 'Generates a deterministic synthetic dataset (users, agencies, reports, verifications, tokens) with bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Number of users (with profiles)')
+        parser.add_argument('--reports', type=int, default=10000, help='Number of emergency reports')
+        parser.add_argument('--agencies', type=int, default=50, help='Number of agencies')
+        parser.add_argument('--responder-ratio', type=float, default=0.05, help='Share of users that are responders')
+        parser.add_argument('--verifications-per-report', type=float, default=2.0, help='Average verifications per report')
+        parser.add_argument('--evaluation-ratio', type=float, default=0.3, help='Share of resolved reports with an evaluation')
+        parser.add_argument('--tokens', type=int, default=100, help='Number of knox tokens (one per user, first users first)')
+        parser.add_argument('--tokens-file', help='Write the generated plain-text tokens to this file (one per line)')
+        parser.add_argument('--days', type=int, default=365, help='Spread report dates over this many days')
+        parser.add_argument('--end-date', type=date.fromisoformat, help='Last day of the date range (YYYY-MM-DD, default today)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed produces the same dataset')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create batch')
+        parser.add_argument('--password', default='synthetic-pass', help='Password shared by all synthetic users')
+        parser.add_argument('--flush', action='store_true', help='Delete a previously generated dataset first')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # Dates are anchored to the end of a day so they don't depend on the time of the run
+        end_date = options['end_date'] or timezone.now().date()
+        self.now = datetime.combine(end_date, datetime.max.time(), tzinfo=dt_timezone.utc).replace(microsecond=0)
+        started = time.perf_counter()
+
+        # The rollups are rebuilt once at the end instead of row by row
+        with pause_rollups():
+            if options['flush']:
+                self.flush()
+            elif User.objects.filter(email__endswith=f'@{SYNTHETIC_EMAIL_DOMAIN}').exists():
+                raise CommandError('A synthetic dataset already exists. Re-run with --flush to replace it.')
+
+            emergency_types = self.create_emergency_types()
+            agencies = self.create_agencies(options['agencies'], emergency_types)
+            user_ids, responder_ids = self.create_users(options['users'], options['responder_ratio'], options['password'], agencies)
+            tokens = self.create_tokens(user_ids[:options['tokens']])
+            self.create_reports(
+                options['reports'], user_ids, responder_ids, emergency_types,
+                options['verifications_per_report'], options['evaluation_ratio'], options['days'],
+            )
+        rebuild_rollups()
+        self.log('Analytics rollups rebuilt')
+
+        if options['tokens_file']:
+            Path(options['tokens_file']).write_text('\n'.join(tokens) + '\n')
+            self.stdout.write(f'Tokens written to {options["tokens_file"]}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Synthetic dataset generated in {time.perf_counter() - started:.1f}s'
+        ))
+
+    # Helpers
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def weighted_choice(self, items, weights):
+        return self.rng.choices(items, weights=weights, k=1)[0]
+
+    def coordinates(self, spread=0.08):
+        """Pick a point around a city, weighted by population, within the Philippine bounds"""
+        _, latitude, longitude, _ = self.weighted_choice(PHILIPPINE_CITIES, [city[3] for city in PHILIPPINE_CITIES])
+        latitude = min(max(self.rng.gauss(latitude, spread), LATITUDE_RANGE[0]), LATITUDE_RANGE[1])
+        longitude = min(max(self.rng.gauss(longitude, spread), LONGITUDE_RANGE[0]), LONGITUDE_RANGE[1])
+        return round(latitude, 6), round(longitude, 6)
+
+    def bulk_create(self, model, rows):
+        model.objects.bulk_create(rows, batch_size=self.batch_size)
+
+    def log(self, message):
+        self.stdout.write(f'  {message}')
+
+    # Generation steps
+
+    def flush(self):
+        users = User.objects.filter(email__endswith=f'@{SYNTHETIC_EMAIL_DOMAIN}')
+        verifications = EmergencyVerification.objects.filter(report__user__in=users)
+        reports = EmergencyReport.objects.filter(user__in=users)
+        EmergencyChange.record(EmergencyChange.VERIFICATION, verifications.values_list('id', flat=True), deleted=True)
+        EmergencyChange.record(EmergencyChange.REPORT, reports.values_list('id', flat=True), deleted=True)
+        # Delete the heavy tables with single queries instead of relying on the ORM cascade
+        with pause_change_log():
+            verifications.delete()
+            UserEvaluation.objects.filter(report__user__in=users).delete()
+            reports.delete()
+            users.delete()
+        Agency.objects.filter(name__startswith='Synthetic ').delete()
+        self.log('Previous synthetic dataset removed')
+
+    def create_emergency_types(self):
+        types = []
+        for name, icon_type, weight in EMERGENCY_TYPES:
+            emergency_type, _ = EmergencyType.objects.get_or_create(name=name, defaults={'icon_type': icon_type})
+            types.append((emergency_type, weight))
+        self.log(f'{len(types)} emergency types')
+        return types
+
+    def create_agencies(self, count, emergency_types):
+        agencies = []
+        for index in range(count):
+            city = PHILIPPINE_CITIES[index % len(PHILIPPINE_CITIES)]
+            latitude, longitude = self.coordinates(spread=0.02) if index >= len(PHILIPPINE_CITIES) else city[1:3]
+            agencies.append(Agency(
+                id=self.uuid(),
+                name=f'Synthetic {city[0]} Agency {index + 1}',
+                hotline_number=f'0{self.rng.randint(200000000, 999999999)}',
+                latitude=latitude,
+                longitude=longitude,
+            ))
+        self.bulk_create(Agency, agencies)
+
+        mappings = []
+        for agency in agencies:
+            handled = self.rng.sample(emergency_types, k=self.rng.randint(1, 3))
+            mappings.extend(
+                AgencyEmergencyType(id=self.uuid(), agency=agency, emergency_type=emergency_type)
+                for emergency_type, _ in handled
+            )
+        self.bulk_create(AgencyEmergencyType, mappings)
+        self.log(f'{len(agencies)} agencies, {len(mappings)} agency emergency types')
+        return agencies
+
+    def create_users(self, count, responder_ratio, password, agencies):
+        # Hash once: per-user hashing would dominate the run time
+        password_hash = make_password(password)
+        user_ids, responder_ids = [], []
+
+        for start in range(0, count, self.batch_size):
+            end = min(start + self.batch_size, count)
+            users = [
+                User(
+                    email=f'user{index}@{SYNTHETIC_EMAIL_DOMAIN}',
+                    password=password_hash,
+                    first_name='Synthetic',
+                    last_name=f'User {index}',
+                )
+                for index in range(start, end)
+            ]
+            with transaction.atomic():
+                self.bulk_create(User, users)
+                ids = dict(User.objects.filter(
+                    email__in=[user.email for user in users]
+                ).values_list('email', 'id'))
+
+                profiles, responders = [], []
+                for index, user in enumerate(users, start=start):
+                    user_id = ids[user.email]
+                    is_responder = self.rng.random() < responder_ratio
+                    latitude, longitude = self.coordinates()
+                    profiles.append(UserProfile(
+                        user_id=user_id,
+                        full_name=f'Synthetic User {index}',
+                        authority_level='Responder' if is_responder else 'User',
+                        contact_number=f'09{self.rng.randint(100000000, 999999999)}',
+                        date_of_birth=f'{self.rng.randint(1950, 2005)}-{self.rng.randint(1, 12):02d}-{self.rng.randint(1, 28):02d}',
+                        address='Synthetic address',
+                        status='approved',
+                        email_verified=True,
+                        latitude=latitude,
+                        longitude=longitude,
+                    ))
+                    user_ids.append(user_id)
+                    if is_responder and agencies:
+                        responder_ids.append(user_id)
+                        responders.append(Responder(user_id=user_id, agency=self.rng.choice(agencies)))
+                self.bulk_create(UserProfile, profiles)
+                self.bulk_create(Responder, responders)
+        self.log(f'{len(user_ids)} users with profiles ({len(responder_ids)} responders)')
+        return user_ids, responder_ids
+
+    def create_tokens(self, user_ids):
+        tokens, rows = [], []
+        for user_id in user_ids:
+            token = f'{self.rng.getrandbits(256):064x}'
+            tokens.append(token)
+            rows.append(AuthToken(
+                digest=crypto.hash_token(token),
+                token_key=token[:CONSTANTS.TOKEN_KEY_LENGTH],
+                user_id=user_id,
+                expiry=None,
+            ))
+        self.bulk_create(AuthToken, rows)
+        self.log(f'{len(rows)} knox tokens')
+        return tokens
+
+    def create_reports(self, count, user_ids, responder_ids, emergency_types, verifications_per_report, evaluation_ratio, days):
+        if not user_ids:
+            raise CommandError('At least one user is required to generate reports.')
+
+        type_choices = [emergency_type for emergency_type, _ in emergency_types]
+        type_weights = [weight for _, weight in emergency_types]
+        statuses = [status for status, _ in REPORT_STATUSES]
+        status_weights = [weight for _, weight in REPORT_STATUSES]
+        max_verifications = max(0, math.ceil(verifications_per_report * 2))
+        span_seconds = days * 24 * 3600
+        totals = {'reports': 0, 'verifications': 0, 'evaluations': 0}
+
+        with preserve_date_created(EmergencyReport, EmergencyVerification, UserEvaluation):
+            for start in range(0, count, self.batch_size):
+                reports, verifications, evaluations = [], [], []
+                for _ in range(min(self.batch_size, count - start)):
+                    date_created = self.now - timedelta(seconds=self.rng.randint(0, span_seconds))
+                    status = self.weighted_choice(statuses, status_weights)
+                    latitude, longitude = self.coordinates()
+                    emergency_type = self.weighted_choice(type_choices, type_weights)
+                    details = self.rng.choice(REPORT_DETAILS.get(emergency_type.name, ['Emergency reported']))
+                    report = EmergencyReport(
+                        id=self.uuid(),
+                        emergency_type=emergency_type,
+                        user_id=self.rng.choice(user_ids),
+                        latitude=latitude,
+                        longitude=longitude,
+                        details=f'{details} {self.rng.choice(REPORT_PLACES)}',
+                        status=status,
+                        date_created=date_created,
+                        responder_id=(
+                            self.rng.choice(responder_ids)
+                            if responder_ids and status in ('Responding', 'Responded', 'Resolved') else None
+                        ),
+                    )
+
+                    yes_votes = no_votes = 0
+                    for _ in range(self.rng.randint(0, max_verifications)):
+                        vote = self.rng.random() < 0.75
+                        yes_votes += vote
+                        no_votes += not vote
+                        verifications.append(EmergencyVerification(
+                            id=self.uuid(),
+                            report=report,
+                            user_id=self.rng.choice(user_ids),
+                            vote=vote,
+                            details=None if vote else 'Could not confirm this emergency on site',
+                            date_created=date_created + timedelta(minutes=self.rng.randint(1, 120)),
+                        ))
+                    # Mirror EmergencyReport.update_verification_status and the triage receivers,
+                    # which bulk_create bypasses
+                    report.verification_status = 'Verified' if yes_votes else ('Low confidence' if no_votes else 'Unverified')
+                    report.vote_score = yes_votes - no_votes
+                    report.priority = base_priority(emergency_type.severity, date_created, report.vote_score)
+
+                    if status == 'Resolved' and self.rng.random() < evaluation_ratio:
+                        stars = self.rng.randint(1, 5)
+                        evaluations.append(UserEvaluation(
+                            id=self.uuid(),
+                            report=report,
+                            user_id=report.user_id,
+                            stars=stars,
+                            did_app_guide_clearly=self.rng.choice(['Yes', 'Somewhat', 'No']),
+                            completion_speed=self.rng.choice(['Very fast', 'Acceptable', 'Too slow']),
+                            confidence_level=self.rng.choice(['Not confident', 'Neutral', 'Very confident']),
+                            improvement_suggestion='Faster responder dispatch would help' if stars <= 2 else None,
+                            date_created=date_created + timedelta(hours=self.rng.randint(1, 48)),
+                        ))
+                    reports.append(report)
+
+                with transaction.atomic():
+                    self.bulk_create(EmergencyReport, reports)
+                    self.bulk_create(EmergencyVerification, verifications)
+                    self.bulk_create(UserEvaluation, evaluations)
+                    EmergencyChange.record(EmergencyChange.REPORT, [report.id for report in reports])
+                    EmergencyChange.record(EmergencyChange.VERIFICATION, [verification.id for verification in verifications])
+
+                totals['reports'] += len(reports)
+                totals['verifications'] += len(verifications)
+                totals['evaluations'] += len(evaluations)
+                self.log(f'{totals["reports"]}/{count} reports')
+
+        self.log(f'{totals["reports"]} reports, {totals["verifications"]} verifications, {totals["evaluations"]} evaluations')
@@ -0,0 +1,30 @@
+"""
+Django management command to generate the OpenAPI schema served at /swagger.json.
+Usage: python manage.py generate_schema [--output DIR]
+
+Introspecting every view takes a good part of a second, so the API serves the schema from
+the files written here (OPENAPI_SCHEMA_DIR by default) instead of generating it per request.
+Run it at each deploy, after the code changes; start_production.sh does.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from nstw_backend.schema import generate_schema, write_schema
+
+
+class Command(BaseCommand):
+    help = 'Generates the OpenAPI schema files served by the API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None, help='Directory to write to (default OPENAPI_SCHEMA_DIR)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        schemas = generate_schema()
+        paths = write_schema(options['output'] or settings.OPENAPI_SCHEMA_DIR, schemas)
+        sizes = ', '.join(f'{path} ({len(content):,} bytes)' for path, content in zip(paths, schemas.values()))
+        self.stdout.write(self.style.SUCCESS(
+            f'OpenAPI schema generated in {time.monotonic() - started:.2f}s: {sizes}'
+        ))
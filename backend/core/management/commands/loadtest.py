@@ -0,0 +1,289 @@
+"""
+Django management command to run a disaster-surge load test against a running server.
+Usage: python manage.py loadtest --url http://localhost:8000 --tokens-file tokens.txt --stages 8,16,32
+
+Each stage runs --duration seconds with the given number of concurrent clients. Clients
+mix report creation (some with images), verification votes, responder claims and list
+polling according to --mix, and the command reports throughput, p50/p95/p99 latency,
+error rate and the share of requests slower than the mobile app's 5 second timeout.
+
+Prepare the server with synthetic data and the stub image storage, for example:
+    python manage.py generate_dataset --users 2000 --reports 50000 --tokens 1000 --tokens-file tokens.txt
+    IMAGE_STORAGE_BACKEND=stub THROTTLE_USER_RATE=100000/minute ./start_production.sh
+"""
+import base64
+import http.client
+import io
+import json
+import math
+import random
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+MOBILE_TIMEOUT_SECONDS = 5.0
+
+# Relative weights of each action during a surge
+DEFAULT_MIX = 'create_report=20,verify=25,claim=5,list_reports=50'
+
+# Status codes that are an expected outcome rather than an error
+EXPECTED_STATUSES = {
+    'create_report': {201},
+    'create_report_image': {201},
+    'verify': {201},
+    'claim': {200, 400},  # 400: another responder claimed the report first
+    'list_reports': {200},
+}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def sample_image_data_url(width=640, height=480):
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (width, height), color=(90, 120, 160))
+    draw = ImageDraw.Draw(image)
+    for offset in range(0, width, 20):
+        draw.line((offset, 0, width - offset, height), fill=(230, 230, 230), width=2)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=80)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+class EndpointResults:
+    """Thread-safe latency and outcome collector for one stage"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.slow = {}
+
+    def record(self, action, latency, ok):
+        with self.lock:
+            self.latencies.setdefault(action, []).append(latency)
+            self.errors[action] = self.errors.get(action, 0) + (not ok)
+            self.slow[action] = self.slow.get(action, 0) + (latency > MOBILE_TIMEOUT_SECONDS)
+
+    def summary(self, elapsed):
+        rows = {}
+        for action, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            count = len(latencies)
+            rows[action] = {
+                'requests': count,
+                'throughput_rps': round(count / elapsed, 2),
+                'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+                'error_rate': round(self.errors[action] / count, 4),
+                'over_timeout_rate': round(self.slow[action] / count, 4),
+            }
+        return rows
+
+
+class SurgeClient(threading.Thread):
+    """One simulated device: a persistent connection issuing a random mix of actions"""
+
+    def __init__(self, harness, token, seed):
+        super().__init__(daemon=True)
+        self.harness = harness
+        self.token = token
+        self.rng = random.Random(seed)
+        self.connection = None
+
+    def connect(self):
+        connection_class = http.client.HTTPSConnection if self.harness.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(self.harness.host, self.harness.port, timeout=self.harness.request_timeout)
+
+    def request(self, method, path, payload=None):
+        body = json.dumps(payload) if payload is not None else None
+        headers = {'Authorization': f'Token {self.token}', 'Accept': 'application/json'}
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        if self.connection is None:
+            self.connect()
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            # Reconnect on the next request; the failure counts as an error
+            self.connection.close()
+            self.connection = None
+            return None, b''
+
+    def run(self):
+        harness = self.harness
+        while not harness.stop_event.is_set():
+            action = self.rng.choices(harness.actions, weights=harness.weights, k=1)[0]
+            start = time.perf_counter()
+            action_name, status, body = getattr(self, f'do_{action}')()
+            latency = time.perf_counter() - start
+            if action_name is None:
+                continue
+            ok = status in EXPECTED_STATUSES[action_name]
+            harness.results.record(action_name, latency, ok)
+            if ok and action_name.startswith('create_report'):
+                try:
+                    harness.remember_report(json.loads(body)['data']['id'])
+                except (ValueError, KeyError, TypeError):
+                    pass
+
+    # Actions return (recorded action name, status, body); None skips recording
+
+    def do_create_report(self):
+        with_image = self.rng.random() < self.harness.image_ratio
+        latitude = round(self.rng.uniform(14.45, 14.75), 6)
+        longitude = round(self.rng.uniform(120.95, 121.10), 6)
+        payload = {
+            'emergency_type': self.rng.choice(self.harness.emergency_type_ids),
+            'latitude': latitude,
+            'longitude': longitude,
+            'details': 'Load test: flooding reported along the main road',
+        }
+        if with_image:
+            payload['image_base64'] = self.harness.image
+        status, body = self.request('POST', self.harness.report_path, payload)
+        return ('create_report_image' if with_image else 'create_report'), status, body
+
+    def do_verify(self):
+        report_id = self.harness.random_report(self.rng)
+        if report_id is None:
+            return None, None, None
+        vote = self.rng.random() < 0.8
+        payload = {'report': report_id, 'vote': vote}
+        if not vote:
+            payload['details'] = 'Could not see any emergency here'
+        status, body = self.request('POST', self.harness.verification_path, payload)
+        return 'verify', status, body
+
+    def do_claim(self):
+        report_id = self.harness.random_report(self.rng)
+        if report_id is None:
+            return None, None, None
+        status, body = self.request('POST', f'/api/emergencies/{report_id}/responder-actions/')
+        return 'claim', status, body
+
+    def do_list_reports(self):
+        status, body = self.request('GET', '/api/emergencies/reports/')
+        return 'list_reports', status, body
+
+
+class Command(BaseCommand):
+    help = 'Runs a disaster-surge load test (report creation, votes, claims, polling) against a running server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='Base URL of the server under test')
+        parser.add_argument('--tokens-file', required=True, help='Knox tokens, one per line (see generate_dataset --tokens-file)')
+        parser.add_argument('--stages', default='8,16,32', help='Comma-separated concurrent client counts, one stage each')
+        parser.add_argument('--duration', type=float, default=30.0, help='Seconds per stage')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help='Action weights, e.g. create_report=20,verify=25,claim=5,list_reports=50')
+        parser.add_argument('--image-ratio', type=float, default=0.5, help='Share of created reports that carry an image')
+        parser.add_argument('--request-timeout', type=float, default=30.0, help='Client socket timeout in seconds')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the client action sequence')
+        parser.add_argument('--async-creation', action='store_true', help='Create reports and verifications through the async endpoints')
+        parser.add_argument('--json', help='Also write the per-stage results to this JSON file')
+
+    def handle(self, *args, **options):
+        parts = urlsplit(options['url'])
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname
+        self.port = parts.port
+        self.request_timeout = options['request_timeout']
+        self.image_ratio = options['image_ratio']
+        prefix = '/api/emergencies/async/' if options['async_creation'] else '/api/emergencies/'
+        self.report_path = f'{prefix}reports/'
+        self.verification_path = f'{prefix}verifications/'
+
+        tokens = [line.strip() for line in Path(options['tokens_file']).read_text().splitlines() if line.strip()]
+        if not tokens:
+            raise CommandError('The tokens file is empty.')
+
+        try:
+            mix = dict(item.split('=') for item in options['mix'].split(','))
+            self.actions = list(mix)
+            self.weights = [float(weight) for weight in mix.values()]
+        except ValueError:
+            raise CommandError('Invalid --mix. Use the form create_report=20,verify=25,claim=5,list_reports=50')
+        unknown = [action for action in self.actions if not hasattr(SurgeClient, f'do_{action}')]
+        if unknown:
+            raise CommandError(f'Unknown actions in --mix: {", ".join(unknown)}')
+
+        self.image = sample_image_data_url()
+        self.reports = deque(maxlen=5000)
+        self.reports_lock = threading.Lock()
+        self.emergency_type_ids = self.fetch_emergency_types(tokens[0])
+
+        all_results = []
+        for stage, concurrency in enumerate(int(value) for value in options['stages'].split(',')):
+            self.stop_event = threading.Event()
+            self.results = EndpointResults()
+            clients = [
+                SurgeClient(self, tokens[index % len(tokens)], seed=options['seed'] * 100003 + stage * 1009 + index)
+                for index in range(concurrency)
+            ]
+            start = time.perf_counter()
+            for client in clients:
+                client.start()
+            time.sleep(options['duration'])
+            self.stop_event.set()
+            for client in clients:
+                client.join(timeout=self.request_timeout)
+            elapsed = time.perf_counter() - start
+
+            summary = self.results.summary(elapsed)
+            all_results.append({'concurrency': concurrency, 'seconds': round(elapsed, 1), 'endpoints': summary})
+            self.print_stage(concurrency, elapsed, summary)
+
+        if options['json']:
+            Path(options['json']).write_text(json.dumps(all_results, indent=2) + '\n')
+            self.stdout.write(f'Results written to {options["json"]}')
+
+    def fetch_emergency_types(self, token):
+        client = SurgeClient(self, token, seed=0)
+        status, body = client.request('GET', '/api/emergencies/types/')
+        if status != 200:
+            raise CommandError(f'Could not list emergency types from {self.host} (status {status}). Is the server up?')
+        type_ids = [item['id'] for item in json.loads(body)]
+        if not type_ids:
+            raise CommandError('The server has no emergency types. Run generate_dataset first.')
+        return type_ids
+
+    def remember_report(self, report_id):
+        with self.reports_lock:
+            self.reports.append(report_id)
+
+    def random_report(self, rng):
+        with self.reports_lock:
+            if not self.reports:
+                return None
+            return self.reports[rng.randrange(len(self.reports))]
+
+    def print_stage(self, concurrency, elapsed, summary):
+        total = sum(row['requests'] for row in summary.values())
+        self.stdout.write('')
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{concurrency} clients, {elapsed:.1f}s, {total / elapsed:.1f} req/s overall'
+        ))
+        self.stdout.write(
+            f"{'Endpoint':<22}{'req':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>9}{'>5s':>8}"
+        )
+        for action, row in summary.items():
+            self.stdout.write(
+                f"{action:<22}{row['requests']:>8}{row['throughput_rps']:>9.1f}{row['p50_ms']:>9.0f}"
+                f"{row['p95_ms']:>9.0f}{row['p99_ms']:>9.0f}{row['error_rate']:>9.1%}{row['over_timeout_rate']:>8.1%}"
+            )
+        creations = sum(row['throughput_rps'] for action, row in summary.items() if action.startswith('create_report'))
+        self.stdout.write(f'Report submissions absorbed: {creations:.1f}/s')
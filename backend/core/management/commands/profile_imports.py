@@ -0,0 +1,96 @@
+"""
+Django management command to profile what a worker imports at boot.
+Usage: python manage.py profile_imports [--limit 20] [--warm]
+
+Starts a fresh interpreter with `python -X importtime`, sets Django up and loads the URLconf
+with every view, as a worker does before serving its first request. It reports the boot time
+and peak memory, the packages that took longest to import (their own import time, summed
+over their modules) and whether the modules imported on first use (DEFERRED_IMPORTS in
+nstw_backend/preload.py) stayed out of the boot. --warm also runs the warm-up done in
+gunicorn's master with GUNICORN_PRELOAD=True.
+"""
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from nstw_backend.preload import DEFERRED_IMPORTS
+
+
+BOOT_SCRIPT = """
+import json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+if {warm}:
+    from nstw_backend.preload import warm
+    warm()
+print(json.dumps({{
+    'seconds': time.perf_counter() - started,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'deferred_loaded': [name for name in {deferred!r} if name in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(output):
+    """(module, self microseconds, cumulative microseconds) per line of -X importtime output"""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, module = line[len('import time:'):].split('|')
+        imports.append((module.strip(), int(own), int(cumulative)))
+    return imports
+
+
+class Command(BaseCommand):
+    help = 'Profiles the imports and memory of a worker booting the application'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help='Packages to list (default 20)')
+        parser.add_argument('--warm', action='store_true', help="Also run the preload warm-up of gunicorn's master")
+
+    def handle(self, *args, **options):
+        script = BOOT_SCRIPT.format(warm=options['warm'], deferred=DEFERRED_IMPORTS)
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'The application failed to boot:\n{result.stderr[-2000:]}')
+        boot = json.loads(result.stdout.strip().splitlines()[-1])
+        imports = parse_importtime(result.stderr)
+
+        by_package = defaultdict(lambda: [0, 0])
+        for module, own, _ in imports:
+            package = by_package[module.split('.')[0]]
+            package[0] += own
+            package[1] += 1
+        total = sum(own for _, own, _ in imports)
+
+        self.stdout.write(
+            f"Boot: {boot['seconds'] * 1000:.0f} ms, {len(imports)} modules imported in {total / 1000:.0f} ms, "
+            f"peak RSS {boot['max_rss_kb'] / 1024:.1f} MB"
+        )
+        self.stdout.write(f"{'package':<32} {'ms':>8} {'share':>6} {'modules':>8}")
+        ranked = sorted(by_package.items(), key=lambda item: item[1][0], reverse=True)
+        for package, (own, modules) in ranked[:options['limit']]:
+            self.stdout.write(f'{package:<32} {own / 1000:>8.1f} {own / total:>6.0%} {modules:>8}')
+
+        loaded = boot['deferred_loaded']
+        if options['warm']:
+            self.stdout.write(f"Warmed: {', '.join(loaded)}")
+        elif loaded:
+            self.stdout.write(self.style.WARNING(
+                f"Imported at boot although deferred to first use: {', '.join(loaded)}"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Deferred to first use: {', '.join(DEFERRED_IMPORTS)}"))
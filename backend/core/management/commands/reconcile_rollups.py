@@ -0,0 +1,32 @@
+"""
+Django management command to rebuild the analytics rollups and heatmap cells from the reports.
+Usage: python manage.py reconcile_rollups [--days 7 | --all]
+
+The rollups are maintained incrementally on every report save; this recomputes a range of
+days from the reports (archived ones included) to repair drift from writes that bypass
+the ORM signals, or after changing which agencies handle an emergency type. Schedule it
+daily for the last few days.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from emergencies.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the report and agency daily rollups from the reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7, help='Rebuild today and this many previous days')
+        parser.add_argument('--all', action='store_true', help='Rebuild every day')
+
+    def handle(self, *args, **options):
+        start = None if options['all'] else timezone.localdate() - timedelta(days=options['days'])
+        report_rows, agency_rows, cell_rows = rebuild_rollups(start=start)
+        scope = 'all days' if start is None else f'days since {start}'
+        self.stdout.write(self.style.SUCCESS(
+            f'Rollups rebuilt for {scope}: {report_rows} report, {agency_rows} agency '
+            f'and {cell_rows} heatmap cell row(s)'
+        ))
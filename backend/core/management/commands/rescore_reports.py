@@ -0,0 +1,26 @@
+"""
+Django management command to recompute the triage priority of reports.
+Usage: python manage.py rescore_reports [--open]
+
+Priorities are maintained incrementally as votes, duplicates and severities change; this
+recomputes them from their components after changing a TRIAGE_* weight.
+"""
+from django.core.management.base import BaseCommand
+
+from emergencies.models import EmergencyReport
+from emergencies.triage import OPEN_STATUSES, rescore_reports
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the triage priority of the queued reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--open', action='store_true',
+            help='Rescore every open report (Pending, Responding, Responded), not only the queued ones'
+        )
+
+    def handle(self, *args, **options):
+        queryset = EmergencyReport.objects.filter(status__in=OPEN_STATUSES) if options['open'] else None
+        count = rescore_reports(queryset)
+        self.stdout.write(self.style.SUCCESS(f'Rescored {count} report(s)'))
@@ -0,0 +1,70 @@
+"""
+Django management command to run the backend microbenchmark suite.
+Usage: python manage.py run_benchmarks [names ...] [--save-baseline] [--report report.md]
+
+Results are compared with the stored baselines in core/benchmarks/baselines.json.
+Refresh the baselines on the reference machine with --save-baseline when a change is
+expected to move the numbers, and commit the updated file with the change.
+"""
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import (
+    BASELINE_PATH, compare, format_duration, format_report,
+    get_benchmarks, load_baselines, run_benchmark, save_baselines,
+)
+
+
+class Command(BaseCommand):
+    help = 'Runs the backend microbenchmarks and compares them with the stored baselines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Benchmarks to run (prefix match); all by default')
+        parser.add_argument('--list', action='store_true', help='List the available benchmarks')
+        parser.add_argument('--repeats', type=int, default=5, help='Timed repeats per benchmark (median is kept)')
+        parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds per timed repeat')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Relative change reported as a regression')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH), help='Baseline file to compare with')
+        parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+        parser.add_argument('--report', help='Also write the Markdown regression report to this file')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error on regressions')
+
+    def handle(self, *args, **options):
+        benchmarks = get_benchmarks()
+        if options['list']:
+            for name in benchmarks:
+                self.stdout.write(name)
+            return
+
+        selected = [
+            name for name in benchmarks
+            if not options['names'] or any(name.startswith(prefix) for prefix in options['names'])
+        ]
+        if not selected:
+            raise CommandError('No benchmark matches the given names. Use --list to see them.')
+
+        results = {}
+        for name in selected:
+            results[name] = run_benchmark(name, repeats=options['repeats'], min_time=options['min_time'])
+            self.stdout.write(f'{name:<50} {format_duration(results[name]):>12}')
+
+        threshold = options['threshold']
+        rows = compare(results, load_baselines(options['baseline']), threshold=threshold)
+        report = format_report(rows, threshold=threshold)
+        self.stdout.write('')
+        self.stdout.write(report)
+
+        if options['report']:
+            Path(options['report']).write_text(report + '\n')
+
+        if options['save_baseline']:
+            save_baselines(results, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f'Baselines saved to {options["baseline"]}'))
+
+        regressions = [row[0] for row in rows if row[4] == 'REGRESSION']
+        if regressions:
+            message = f'{len(regressions)} benchmark(s) regressed: {", ".join(regressions)}'
+            if options['fail_on_regression']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
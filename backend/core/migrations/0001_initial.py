@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ThrottleCounter',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('window_index', models.BigIntegerField(help_text='Current window: seconds since the epoch divided by the throttle duration.')),
+                ('previous_count', models.PositiveIntegerField(default=0)),
+                ('current_count', models.PositiveIntegerField(default=0)),
+                ('allowed', models.BooleanField(default=True, help_text='Whether the latest request was allowed.')),
+                ('expires_at', models.FloatField(db_index=True, help_text='Seconds since the epoch after which the counts no longer matter.')),
+            ],
+        ),
+    ]
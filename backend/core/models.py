@@ -0,0 +1,17 @@
+from django.db import models
+
+
+class ThrottleCounter(models.Model):
+    """
+    Sliding-window request counts of one throttle key, for THROTTLE_BACKEND=database
+    (see core.services.throttling). Rows past expires_at are pruned periodically.
+    """
+    key = models.CharField(max_length=255, primary_key=True)
+    window_index = models.BigIntegerField(help_text="Current window: seconds since the epoch divided by the throttle duration.")
+    previous_count = models.PositiveIntegerField(default=0)
+    current_count = models.PositiveIntegerField(default=0)
+    allowed = models.BooleanField(default=True, help_text="Whether the latest request was allowed.")
+    expires_at = models.FloatField(db_index=True, help_text="Seconds since the epoch after which the counts no longer matter.")
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,36 @@
+"""
+Serializer base classes shared by the apps.
+"""
+from rest_framework import serializers
+
+from core.services.metrics import timed
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    """List serializer recording the time to build its data, queryset evaluation included"""
+
+    @property
+    def data(self):
+        with timed('serialization'):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """
+    Records the time spent building `serializer.data` (to_representation, related lookups
+    and lazy querysets) as the request's 'serialization' section, along with the renderer's
+    json encoding. Nested serializers are built inside their parent's data and not counted twice.
+    """
+
+    @property
+    def data(self):
+        with timed('serialization'):
+            return super().data
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_serializer = super().many_init(*args, **kwargs)
+        # Only the default list serializer: one set through Meta.list_serializer_class is kept
+        if type(list_serializer) is serializers.ListSerializer:
+            list_serializer.__class__ = TimedListSerializer
+        return list_serializer
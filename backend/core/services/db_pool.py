@@ -0,0 +1,48 @@
+"""
+Database connection pool statistics for the psycopg3 pools configured in DATABASES.
+"""
+from django.db import connections
+
+
+def summarize_pool_stats(stats):
+    """
+    Turn psycopg_pool's get_stats() counters into the figures worth watching: checkouts,
+    wait time, saturation and connection setup cost. Counters that never moved are absent
+    from get_stats(), hence the defaults.
+    """
+    checkouts = stats.get('requests_num', 0)
+    wait_ms = stats.get('requests_wait_ms', 0)
+    connections_opened = stats.get('connections_num', 0)
+    in_use = stats.get('pool_size', 0) - stats.get('pool_available', 0)
+    pool_max = stats.get('pool_max', 0)
+    return {
+        'size': stats.get('pool_size', 0),
+        'min_size': stats.get('pool_min', 0),
+        'max_size': pool_max,
+        'in_use': in_use,
+        'available': stats.get('pool_available', 0),
+        'saturation': round(in_use / pool_max, 3) if pool_max else 0.0,
+        'waiting': stats.get('requests_waiting', 0),
+        'checkouts': checkouts,
+        'queued_checkouts': stats.get('requests_queued', 0),
+        'checkout_timeouts': stats.get('requests_errors', 0),
+        'wait_ms_total': wait_ms,
+        'wait_ms_avg': round(wait_ms / checkouts, 3) if checkouts else 0.0,
+        'connections_opened': connections_opened,
+        'connect_ms_avg': round(stats.get('connections_ms', 0) / connections_opened, 3) if connections_opened else 0.0,
+        'connections_lost': stats.get('connections_lost', 0),
+        'bad_returns': stats.get('returns_bad', 0),
+    }
+
+
+def pool_stats():
+    """
+    Statistics of every pooled database alias in this worker process, keyed by alias.
+    Aliases without a pool (SQLite, or DB_POOL_ENABLED=False) are left out.
+    """
+    stats = {}
+    for connection in connections.all():
+        pool = getattr(connection, 'pool', None)
+        if pool is not None:
+            stats[connection.alias] = summarize_pool_stats(pool.get_stats())
+    return stats
@@ -1,18 +1,27 @@
 """
 File Service for handling image uploads to Cloudinary
+
+PIL, the Cloudinary SDK and httpx take a large share of a worker's boot time and memory, and
+most workers never touch an image, so they are imported on first use.
 """
+import asyncio
 import base64
 import io
 import logging
+import time
 import uuid
-from PIL import Image
-import cloudinary
-import cloudinary.uploader
+import weakref
+from asgiref.sync import sync_to_async
 from django.conf import settings
 
+from core.services.metrics import timed
+
 
 logger = logging.getLogger(__name__)
 
+# One pooled async HTTP client per event loop (a client cannot be shared across loops)
+_async_clients = weakref.WeakKeyDictionary()
+
 
 class FileService:
     """Service for handling file operations including base64 to file conversion and Cloudinary uploads"""
@@ -28,6 +37,7 @@ class FileService:
         if not all(config.get(key) for key in required_keys):
             return False
 
+        import cloudinary
         cloudinary.config(
             cloud_name=config.get('CLOUD_NAME'),
             api_key=config.get('API_KEY'),
@@ -96,6 +106,7 @@ class FileService:
                 return False, "Image size exceeds 10MB limit"
             
             # Try to open as image
+            from PIL import Image
             image = Image.open(io.BytesIO(image_data))
             
             # Validate image format
@@ -122,8 +133,9 @@ class FileService:
         Returns: (success, url_or_error_message)
         """
         try:
-            # Initialize Cloudinary
-            if not FileService.initialize_cloudinary():
+            # Initialize Cloudinary (the stub backend never talks to the network)
+            stub_storage = getattr(settings, 'IMAGE_STORAGE_BACKEND', 'cloudinary') == 'stub'
+            if not stub_storage and not FileService.initialize_cloudinary():
                 return False, "Cloudinary not configured properly"
             
             # Extract base64 data and determine image format
@@ -142,20 +154,29 @@ class FileService:
             # Generate unique filename
             filename = f"{uuid.uuid4()}.{image_format}"
 
+            if stub_storage:
+                latency = getattr(settings, 'IMAGE_STORAGE_STUB_LATENCY_MS', 0)
+                if latency:
+                    with timed('upload'):
+                        time.sleep(latency / 1000)
+                return True, f"https://stub-storage.invalid/{folder}/{filename}"
+
             # Prepare the data URL for Cloudinary
             payload = base64_string
             if not base64_string.startswith('data:'):
                 payload = f"data:image/{image_format};base64,{base64_data}"
             
             # Upload to Cloudinary
-            result = cloudinary.uploader.upload(
-                payload,
-                folder=folder,
-                public_id=filename.split('.')[0],
-                resource_type='image',
-                overwrite=True,
-                invalidate=True
-            )
+            import cloudinary.uploader
+            with timed('upload'):
+                result = cloudinary.uploader.upload(
+                    payload,
+                    folder=folder,
+                    public_id=filename.split('.')[0],
+                    resource_type='image',
+                    overwrite=True,
+                    invalidate=True
+                )
             
             # Return the secure URL
             return True, result.get('secure_url')
@@ -163,6 +184,107 @@ class FileService:
         except Exception as e:
             return False, f"Failed to upload image: {str(e)}"
     
+    @staticmethod
+    def async_http_client():
+        """Return the pooled httpx.AsyncClient for the running event loop"""
+        loop = asyncio.get_running_loop()
+        client = _async_clients.get(loop)
+        if client is None:
+            import httpx
+            timeout = getattr(settings, 'IMAGE_UPLOAD_TIMEOUT_SECONDS', 30)
+            client = _async_clients[loop] = httpx.AsyncClient(timeout=timeout)
+        return client
+
+    @staticmethod
+    async def upload_to_cloudinary_async(base64_string, folder='alisto', image_format='png'):
+        """
+        Async counterpart of upload_to_cloudinary for the ASGI views. The upload is a signed
+        POST to the Cloudinary upload API, so a slow upload only suspends its own request.
+        Expects already validated image data.
+        Returns: (success, url_or_error_message)
+        """
+        try:
+            stub_storage = getattr(settings, 'IMAGE_STORAGE_BACKEND', 'cloudinary') == 'stub'
+            if not stub_storage and not FileService.initialize_cloudinary():
+                return False, "Cloudinary not configured properly"
+
+            if base64_string.startswith('data:'):
+                base64_data, detected_format = FileService.extract_base64_data(base64_string)
+                image_format = detected_format or image_format
+            else:
+                base64_data = base64_string
+
+            filename = f"{uuid.uuid4()}.{image_format}"
+
+            if stub_storage:
+                latency = getattr(settings, 'IMAGE_STORAGE_STUB_LATENCY_MS', 0)
+                if latency:
+                    with timed('upload'):
+                        await asyncio.sleep(latency / 1000)
+                return True, f"https://stub-storage.invalid/{folder}/{filename}"
+
+            # Same parameters as the cloudinary.uploader.upload call in upload_to_cloudinary
+            import cloudinary.utils
+            params = cloudinary.utils.sign_request({
+                'folder': folder,
+                'public_id': filename.split('.')[0],
+                'overwrite': True,
+                'invalidate': True,
+                'timestamp': cloudinary.utils.now(),
+            }, {})
+            params['file'] = f"data:image/{image_format};base64,{base64_data}"
+            url = cloudinary.utils.cloudinary_api_url('upload', resource_type='image')
+
+            with timed('upload'):
+                response = await FileService.async_http_client().post(url, data=params)
+            result = response.json()
+            if 'error' in result:
+                return False, f"Failed to upload image: {result['error'].get('message')}"
+
+            return True, result.get('secure_url')
+
+        except Exception as e:
+            return False, f"Failed to upload image: {str(e)}"
+
+    @staticmethod
+    async def process_image_field_async(image_data, folder='alisto'):
+        """
+        Async counterpart of process_image_field. Image validation (CPU-bound) runs in a
+        worker thread and the upload goes through upload_to_cloudinary_async.
+        Returns: (success, url_or_error_message)
+        """
+        if not image_data:
+            return True, None
+
+        if FileService.is_url(image_data):
+            return True, image_data
+
+        if FileService.is_base64(image_data):
+            base64_data, image_format = FileService.extract_base64_data(image_data)
+
+            is_valid, error_msg = await sync_to_async(FileService.validate_image, thread_sensitive=False)(base64_data)
+            if not is_valid:
+                return False, error_msg
+
+            success, result = await FileService.upload_to_cloudinary_async(
+                base64_data,
+                folder=folder,
+                image_format=image_format
+            )
+
+            if success:
+                return True, result
+
+            fallback_enabled = getattr(settings, 'ALLOW_INLINE_IMAGE_FALLBACK', True)
+            if fallback_enabled:
+                logger.warning("Cloudinary upload failed (%s). Using inline image fallback.", result)
+                data_url = image_data if image_data.startswith('data:') else f"data:image/{image_format};base64,{base64_data}"
+                return True, data_url
+
+            return False, result
+
+        return False, "Image must be either a valid URL or base64 encoded string"
+
     @staticmethod
     def process_image_field(image_data, folder='alisto'):
         """
@@ -0,0 +1,86 @@
+"""
+Geohash encoding and viewport cover, used to aggregate reports into map tiles.
+
+A geohash of precision p names a rectangular cell; every extra character splits a cell
+into 32, so the cells of one precision form a fixed grid and a cell's hash is a prefix of
+the hashes of all the cells inside it.
+"""
+import math
+
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: index for index, char in enumerate(BASE32)}
+
+
+def cell_size(precision):
+    """(latitude, longitude) extent in degrees of the cells of a precision"""
+    bits = precision * 5
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def encode(latitude, longitude, precision):
+    """Geohash of the cell containing a point"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, value, bit, even = [], 0, 0, True
+    while len(chars) < precision:
+        bounds, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(BASE32[value])
+            value, bit = 0, 0
+    return ''.join(chars)
+
+
+def bounds(geohash):
+    """(min_lat, min_lon, max_lat, max_lon) of a geohash cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            target = lon_range if even else lat_range
+            middle = (target[0] + target[1]) / 2
+            if value >> shift & 1:
+                target[0] = middle
+            else:
+                target[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def center(geohash):
+    min_lat, min_lon, max_lat, max_lon = bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+def cover_count(min_lat, min_lon, max_lat, max_lon, precision):
+    """Number of cells of a precision intersecting a bounding box"""
+    lat_step, lon_step = cell_size(precision)
+    rows = math.floor((max_lat + 90) / lat_step) - math.floor((min_lat + 90) / lat_step) + 1
+    columns = math.floor((max_lon + 180) / lon_step) - math.floor((min_lon + 180) / lon_step) + 1
+    return rows * columns
+
+
+def cover(min_lat, min_lon, max_lat, max_lon, precision):
+    """Geohashes of the cells of a precision intersecting a bounding box"""
+    lat_step, lon_step = cell_size(precision)
+    first_row, last_row = math.floor((min_lat + 90) / lat_step), math.floor((max_lat + 90) / lat_step)
+    first_column, last_column = math.floor((min_lon + 180) / lon_step), math.floor((max_lon + 180) / lon_step)
+    last_row = min(last_row, round(180 / lat_step) - 1)
+    last_column = min(last_column, round(360 / lon_step) - 1)
+    return [
+        # Encode the center of each grid cell to get its hash
+        encode(-90 + (row + 0.5) * lat_step, -180 + (column + 0.5) * lon_step, precision)
+        for row in range(first_row, last_row + 1)
+        for column in range(first_column, last_column + 1)
+    ]
@@ -0,0 +1,174 @@
+"""
+Per-request performance metrics: query count, DB time and named timed sections
+(serialization, image uploads) for the request currently being served.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+_current_metrics = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Metrics collected while serving a single request"""
+
+    def __init__(self, endpoint=''):
+        self.endpoint = endpoint
+        self.query_count = 0
+        self.db_time = 0.0
+        self.sections = {}
+        self.total_time = 0.0
+
+    def add_section(self, name, seconds):
+        self.sections[name] = self.sections.get(name, 0.0) + seconds
+
+    @contextmanager
+    def activate(self):
+        """
+        Make these metrics current and count queries on every configured database. The
+        metrics follow the request's context, so queries an async request runs in
+        sync_to_async threads count too.
+        """
+        for connection in connections.all(initialized_only=True):
+            instrument(connection)
+        token = _current_metrics.set(self)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.total_time = time.perf_counter() - start
+            _current_metrics.reset(token)
+
+    def as_dict(self):
+        return {
+            'endpoint': self.endpoint,
+            'queries': self.query_count,
+            'db_ms': round(self.db_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+            **{f'{name}_ms': round(seconds * 1000, 2) for name, seconds in self.sections.items()},
+        }
+
+    def server_timing(self):
+        """Format the metrics as a Server-Timing header value"""
+        parts = [
+            f'total;dur={self.total_time * 1000:.1f}',
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.query_count} queries"',
+        ]
+        parts.extend(f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.sections.items())
+        return ', '.join(parts)
+
+
+class EndpointStats:
+    """Process-wide running totals of request metrics, keyed by endpoint"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, metrics):
+        with self._lock:
+            stats = self._stats.setdefault(metrics.endpoint, {
+                'requests': 0, 'queries': 0, 'max_queries': 0,
+                'db_ms': 0.0, 'total_ms': 0.0, 'max_total_ms': 0.0, 'sections_ms': {},
+            })
+            total_ms = metrics.total_time * 1000
+            stats['requests'] += 1
+            stats['queries'] += metrics.query_count
+            stats['max_queries'] = max(stats['max_queries'], metrics.query_count)
+            stats['db_ms'] += metrics.db_time * 1000
+            stats['total_ms'] += total_ms
+            stats['max_total_ms'] = max(stats['max_total_ms'], total_ms)
+            for name, seconds in metrics.sections.items():
+                stats['sections_ms'][name] = stats['sections_ms'].get(name, 0.0) + seconds * 1000
+
+    def snapshot(self):
+        """Return per-endpoint totals and averages"""
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._stats.items():
+                requests = stats['requests']
+                result[endpoint] = {
+                    'requests': requests,
+                    'avg_queries': round(stats['queries'] / requests, 2),
+                    'max_queries': stats['max_queries'],
+                    'avg_db_ms': round(stats['db_ms'] / requests, 2),
+                    'avg_total_ms': round(stats['total_ms'] / requests, 2),
+                    'max_total_ms': round(stats['max_total_ms'], 2),
+                    'avg_sections_ms': {
+                        name: round(value / requests, 2) for name, value in stats['sections_ms'].items()
+                    },
+                }
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+endpoint_stats = EndpointStats()
+
+
+def _count_query(execute, sql, params, many, context):
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += time.perf_counter() - start
+        metrics.query_count += 1
+
+
+def instrument(connection):
+    """Count the queries of a connection towards the current request's metrics, if any"""
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    # Connections are per thread: the ones sync_to_async threads open are instrumented here
+    instrument(connection)
+
+
+def current_metrics():
+    """Return the RequestMetrics of the request being served, or None"""
+    return _current_metrics.get()
+
+
+@contextmanager
+def timed(section):
+    """Add the time spent in the block to a named section of the current request's metrics"""
+    metrics = _current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_section(section, time.perf_counter() - start)
+
+
+def exceeded_budgets(metrics, budgets):
+    """Return a list of human readable budget violations for the given metrics"""
+    measured = {
+        'queries': metrics.query_count,
+        'db_ms': metrics.db_time * 1000,
+        'total_ms': metrics.total_time * 1000,
+    }
+    measured.update({f'{name}_ms': seconds * 1000 for name, seconds in metrics.sections.items()})
+
+    violations = []
+    for name, limit in budgets.items():
+        value = measured.get(name)
+        if limit is not None and value is not None and value > limit:
+            violations.append(f'{name}={value:.0f} > {limit}' if name != 'queries' else f'{name}={value} > {limit}')
+    return violations
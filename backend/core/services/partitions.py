@@ -0,0 +1,87 @@
+"""
+Monthly range partitions for the Postgres tables partitioned by date_created.
+
+Each partitioned table has one partition per UTC calendar month, named <table>_pYYYYMM,
+and a <table>_default partition that catches rows outside the created months. Creating a
+month whose rows already landed in the default partition moves them into the new one.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+
+
+# Tables partitioned by the emergencies migrations
+PARTITIONED_TABLES = (
+    'emergencies_emergencyreport',
+    'emergencies_emergencyverification',
+)
+
+
+def month_start(moment):
+    """First instant (UTC) of the month containing moment"""
+    moment = moment.astimezone(dt_timezone.utc) if moment.tzinfo else moment.replace(tzinfo=dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y%m}'
+
+
+def existing_partitions(cursor, table):
+    cursor.execute(
+        """
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+        """,
+        [table],
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def create_default_partition(cursor, table):
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+
+def create_month_partition(cursor, table, month):
+    """
+    Create the partition of one month. The table is built standalone, filled with the
+    month's rows from the default partition, then attached, so it also works for months
+    whose rows were caught by the default partition.
+    """
+    name = partition_name(table, month)
+    bounds = [month, add_months(month, 1)]
+    cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM "{table}_default" WHERE date_created >= %s AND date_created < %s RETURNING *) '
+        f'INSERT INTO "{name}" SELECT * FROM moved',
+        bounds,
+    )
+    cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', bounds)
+    return name
+
+
+def ensure_partitions(connection, start, end, tables=PARTITIONED_TABLES):
+    """
+    Create the missing monthly partitions for every month from start to end (inclusive) and
+    return their names. Does nothing on databases other than Postgres.
+    """
+    if connection.vendor != 'postgresql':
+        return []
+
+    created = []
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for table in tables:
+            existing = existing_partitions(cursor, table)
+            month = month_start(start)
+            while month <= month_start(end):
+                if partition_name(table, month) not in existing:
+                    created.append(create_month_partition(cursor, table, month))
+                month = add_months(month, 1)
+    return created
@@ -0,0 +1,533 @@
+"""
+Offline road routing for dispatch ETAs.
+
+RoadGraph.from_geojson reads a road-network extract: LineString / MultiLineString features
+with OSM tags (`highway`, `maxspeed`, `oneway`, `junction`), as written by e.g.
+`osmium export region.osm.pbf -o roads.geojson`. It builds a compact graph: way ends,
+intersections and a vertex at least every MAX_EDGE_METERS become nodes, and the vertices in
+between only add to the edge length. Edge weights are travel times in seconds at the
+maxspeed, or at DEFAULT_SPEEDS_KMH for the road class.
+
+contract() then builds a contraction hierarchy. Nodes are contracted least important first;
+contracting v adds a shortcut u -> w for each path u -> v -> w that no witness path beats.
+A query runs two Dijkstra searches that only climb the hierarchy, one from each end, and
+they meet at the most important node of the shortest path. They settle a few hundred nodes
+where a plain Dijkstra across a city settles tens of thousands.
+
+Blocked areas (flooding) leave the hierarchy as it is. Blocking only makes routes longer,
+so a hierarchy route that avoids every blocked road is still the shortest one. Routes that
+cross a blocked road are recomputed with Dijkstra on the road graph without the blocked
+roads, one search per target for all sources.
+
+Everything runs in-process from a local file; nothing is fetched over the network.
+"""
+import heapq
+import json
+import math
+import pickle
+import re
+from array import array
+from collections import defaultdict
+
+
+FORMAT_VERSION = 1
+EARTH_RADIUS_METERS = 6_371_000
+# Ways get a node at least every MAX_EDGE_METERS or so (no road edge reaches twice that), so
+# every point of a road is within MAX_EDGE_METERS of a node for blocking and snapping
+MAX_EDGE_METERS = 300
+# Nodes settled by a witness search before giving up (and adding the shortcut)
+WITNESS_SETTLE_LIMIT = 200
+# Smaller limit while estimating a node's importance
+PRIORITY_SETTLE_LIMIT = 40
+GRID_DEGREES = 0.01
+
+DEFAULT_SPEEDS_KMH = {
+    'motorway': 80, 'motorway_link': 50,
+    'trunk': 60, 'trunk_link': 40,
+    'primary': 50, 'primary_link': 35,
+    'secondary': 40, 'secondary_link': 30,
+    'tertiary': 35, 'tertiary_link': 25,
+    'unclassified': 25, 'residential': 20, 'road': 20,
+    'service': 15, 'living_street': 10,
+}
+
+_SPEED = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*(mph|km/h|kmh|kph)?\s*$')
+
+
+def distance_meters(lat1, lon1, lat2, lon2):
+    """Equirectangular distance, accurate to well under 1% along a road segment"""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.hypot(x, y) * EARTH_RADIUS_METERS
+
+
+def _speed_kmh(tags):
+    """Travel speed of a way, or None when it is not a road for vehicles"""
+    default = DEFAULT_SPEEDS_KMH.get(tags.get('highway'))
+    if default is None:
+        return None
+    match = _SPEED.match(str(tags.get('maxspeed') or ''))
+    if match is None:
+        return default
+    speed = float(match.group(1))
+    return speed * 1.609344 if match.group(2) == 'mph' else speed
+
+
+def _direction(tags):
+    """1 for one-way along the geometry, -1 against it, 0 for both ways"""
+    oneway = str(tags.get('oneway') or '').lower()
+    if oneway in ('yes', 'true', '1'):
+        return 1
+    if oneway == '-1':
+        return -1
+    if oneway in ('no', 'false', '0'):
+        return 0
+    return 1 if tags.get('junction') in ('roundabout', 'circular') or tags.get('highway') == 'motorway' else 0
+
+
+def _densify(points):
+    """(lon, lat) points rounded to 7 decimals, with vertices added so no segment is longer than MAX_EDGE_METERS"""
+    dense = []
+    for index, (lon, lat) in enumerate(points):
+        if index:
+            previous_lon, previous_lat = points[index - 1]
+            pieces = math.ceil(distance_meters(previous_lat, previous_lon, lat, lon) / MAX_EDGE_METERS)
+            for piece in range(1, pieces):
+                fraction = piece / pieces
+                dense.append((
+                    round(previous_lon + (lon - previous_lon) * fraction, 7),
+                    round(previous_lat + (lat - previous_lat) * fraction, 7),
+                ))
+        dense.append((round(lon, 7), round(lat, 7)))
+    return dense
+
+
+def _csr(node_count, keys, values):
+    """Offsets and values of an adjacency list grouped by key, in compressed sparse row form"""
+    offsets = array('l', [0]) * (node_count + 1)
+    for key in keys:
+        offsets[key + 1] += 1
+    for node in range(node_count):
+        offsets[node + 1] += offsets[node]
+    grouped = array('l', [0]) * len(values)
+    position = array('l', offsets)
+    for key, value in zip(keys, values):
+        grouped[position[key]] = value
+        position[key] += 1
+    return offsets, grouped
+
+
+class RoadGraph:
+    """
+    Road graph with its contraction hierarchy. Edges 0 .. road_edge_count - 1 are roads;
+    the later ones are shortcuts, each made of two earlier edges (children_a, children_b).
+    """
+
+    def __init__(self, latitudes, longitudes, tails, heads, weights):
+        self.latitudes = array('d', latitudes)
+        self.longitudes = array('d', longitudes)
+        self.tails = array('l', tails)
+        self.heads = array('l', heads)
+        self.weights = array('d', weights)
+        self.road_edge_count = len(self.tails)
+        self.children_a = array('l', [-1]) * self.road_edge_count
+        self.children_b = array('l', [-1]) * self.road_edge_count
+        self.ranks = None
+        self._index()
+
+    @property
+    def node_count(self):
+        return len(self.latitudes)
+
+    @property
+    def shortcut_count(self):
+        return len(self.tails) - self.road_edge_count
+
+    # Building
+
+    @classmethod
+    def from_geojson(cls, path):
+        with open(path) as file:
+            features = json.load(file).get('features', ())
+        lines = []
+        for feature in features:
+            tags = feature.get('properties') or {}
+            speed = _speed_kmh(tags)
+            geometry = feature.get('geometry') or {}
+            if speed is None or geometry.get('type') not in ('LineString', 'MultiLineString'):
+                continue
+            parts = [geometry['coordinates']] if geometry['type'] == 'LineString' else geometry['coordinates']
+            for part in parts:
+                points = _densify([(lon, lat) for lon, lat, *_ in part])
+                if len(points) >= 2:
+                    lines.append((points, speed / 3.6, _direction(tags)))
+
+        # Way ends and vertices shared by several ways are nodes
+        uses = defaultdict(int)
+        for points, _, _ in lines:
+            uses[points[0]] += 2
+            uses[points[-1]] += 2
+            for point in points[1:-1]:
+                uses[point] += 1
+        node_ids, latitudes, longitudes = {}, [], []
+
+        def node(point):
+            if point not in node_ids:
+                node_ids[point] = len(latitudes)
+                longitudes.append(point[0])
+                latitudes.append(point[1])
+            return node_ids[point]
+
+        tails, heads, weights = [], [], []
+        for points, meters_per_second, direction in lines:
+            start, length = node(points[0]), 0.0
+            last = len(points) - 1
+            for index in range(1, len(points)):
+                previous, point = points[index - 1], points[index]
+                length += distance_meters(previous[1], previous[0], point[1], point[0])
+                if uses[point] < 2 and length < MAX_EDGE_METERS and index != last:
+                    continue
+                end = node(point)
+                if end != start:
+                    seconds = length / meters_per_second
+                    if direction >= 0:
+                        tails.append(start), heads.append(end), weights.append(seconds)
+                    if direction <= 0:
+                        tails.append(end), heads.append(start), weights.append(seconds)
+                start, length = end, 0.0
+        return cls(latitudes, longitudes, tails, heads, weights)
+
+    def contract(self):
+        """Build the contraction hierarchy; returns the number of shortcuts added"""
+        node_count = self.node_count
+        weights = self.weights
+        # Cheapest edge per node pair in the part of the graph not contracted yet
+        out_edges = [{} for _ in range(node_count)]
+        in_edges = [{} for _ in range(node_count)]
+        for edge in range(self.road_edge_count):
+            tail, head = self.tails[edge], self.heads[edge]
+            current = out_edges[tail].get(head)
+            if current is None or weights[edge] < weights[current]:
+                out_edges[tail][head] = edge
+                in_edges[head][tail] = edge
+
+        contracted_neighbours = [0] * node_count
+
+        def priority(node):
+            shortcuts = self._shortcuts(node, out_edges, in_edges, PRIORITY_SETTLE_LIMIT)
+            # Edge difference plus contracted neighbours, which spreads contraction evenly
+            return (
+                len(shortcuts) - len(out_edges[node]) - len(in_edges[node])
+                + contracted_neighbours[node]
+            )
+
+        heap = [(priority(node), node) for node in range(node_count)]
+        heapq.heapify(heap)
+        ranks = array('l', [0]) * node_count
+        up_tails, up_edges, down_heads, down_edges = [], [], [], []
+        rank = 0
+        while heap:
+            _, node = heapq.heappop(heap)
+            # Lazy update: the priority may have grown since it was queued
+            current = priority(node)
+            if heap and current > heap[0][0]:
+                heapq.heappush(heap, (current, node))
+                continue
+
+            for tail, head, weight, first, second in self._shortcuts(node, out_edges, in_edges, WITNESS_SETTLE_LIMIT):
+                edge = len(self.tails)
+                self.tails.append(tail)
+                self.heads.append(head)
+                weights.append(weight)
+                self.children_a.append(first)
+                self.children_b.append(second)
+                existing = out_edges[tail].get(head)
+                if existing is None or weight < weights[existing]:
+                    out_edges[tail][head] = edge
+                    in_edges[head][tail] = edge
+
+            ranks[node] = rank
+            rank += 1
+            # The edges left at a node all lead to nodes contracted later, i.e. up the hierarchy
+            for head, edge in out_edges[node].items():
+                up_tails.append(node), up_edges.append(edge)
+                del in_edges[head][node]
+                contracted_neighbours[head] += 1
+            for tail, edge in in_edges[node].items():
+                down_heads.append(node), down_edges.append(edge)
+                del out_edges[tail][node]
+                contracted_neighbours[tail] += 1
+            out_edges[node] = in_edges[node] = None
+
+        self.ranks = ranks
+        self.up_offsets, self.up_edges = _csr(node_count, up_tails, up_edges)
+        self.down_offsets, self.down_edges = _csr(node_count, down_heads, down_edges)
+        self.clear_blocks()
+        return self.shortcut_count
+
+    def _shortcuts(self, node, out_edges, in_edges, settle_limit):
+        """Shortcuts (tail, head, weight, first edge, second edge) needed to contract node"""
+        weights = self.weights
+        outgoing = list(out_edges[node].items())
+        shortcuts = []
+        if not outgoing:
+            return shortcuts
+        for tail, first in in_edges[node].items():
+            targets = {head: weights[first] + weights[second] for head, second in outgoing if head != tail}
+            if not targets:
+                continue
+            witnesses = self._witness_search(tail, node, out_edges, max(targets.values()), set(targets), settle_limit)
+            for head, second in outgoing:
+                if head != tail and witnesses.get(head, math.inf) > targets[head]:
+                    shortcuts.append((tail, head, targets[head], first, second))
+        return shortcuts
+
+    def _witness_search(self, source, avoid, out_edges, max_cost, targets, settle_limit):
+        weights = self.weights
+        distances = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        remaining = len(targets)
+        while heap and settled < settle_limit and remaining:
+            distance, node = heapq.heappop(heap)
+            if distance > distances[node]:
+                continue
+            if distance > max_cost:
+                break
+            settled += 1
+            if node in targets:
+                remaining -= 1
+            for head, edge in out_edges[node].items():
+                if head == avoid:
+                    continue
+                candidate = distance + weights[edge]
+                if candidate < distances.get(head, math.inf):
+                    distances[head] = candidate
+                    heapq.heappush(heap, (candidate, head))
+        return distances
+
+    def _index(self):
+        """Road adjacency (for blocked routes and blocking) and the node grid (for snapping)"""
+        node_count = self.node_count
+        roads = range(self.road_edge_count)
+        self.road_out_offsets, self.road_out_edges = _csr(node_count, [self.tails[edge] for edge in roads], roads)
+        self.road_in_offsets, self.road_in_edges = _csr(node_count, [self.heads[edge] for edge in roads], roads)
+        self._grid = defaultdict(list)
+        for node in range(node_count):
+            self._grid[self._cell(self.latitudes[node], self.longitudes[node])].append(node)
+        self.clear_blocks()
+
+    # Storage
+
+    def save(self, path):
+        state = {
+            name: getattr(self, name) for name in (
+                'latitudes', 'longitudes', 'tails', 'heads', 'weights', 'children_a', 'children_b',
+                'road_edge_count', 'ranks', 'up_offsets', 'up_edges', 'down_offsets', 'down_edges',
+            )
+        }
+        with open(path, 'wb') as file:
+            pickle.dump((FORMAT_VERSION, state), file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path):
+        """Load a graph written by save() (a trusted local file)"""
+        with open(path, 'rb') as file:
+            version, state = pickle.load(file)
+        if version != FORMAT_VERSION:
+            raise ValueError(f'{path} has road graph format {version}, expected {FORMAT_VERSION}; rebuild it')
+        graph = cls.__new__(cls)
+        graph.__dict__.update(state)
+        graph._index()
+        return graph
+
+    # Snapping and blocking
+
+    @staticmethod
+    def _cell(latitude, longitude):
+        return math.floor(latitude / GRID_DEGREES), math.floor(longitude / GRID_DEGREES)
+
+    def _nodes_near(self, latitude, longitude, radius_meters):
+        cells = math.ceil(radius_meters / (GRID_DEGREES * 111_000 * max(math.cos(math.radians(latitude)), 0.01)))
+        row, column = self._cell(latitude, longitude)
+        for cell_row in range(row - cells, row + cells + 1):
+            for cell_column in range(column - cells, column + cells + 1):
+                for node in self._grid.get((cell_row, cell_column), ()):
+                    distance = distance_meters(latitude, longitude, self.latitudes[node], self.longitudes[node])
+                    if distance <= radius_meters:
+                        yield node, distance
+
+    def snap(self, latitude, longitude, max_meters):
+        """(nearest node, distance in meters) within max_meters, or None"""
+        return min(self._nodes_near(latitude, longitude, max_meters), key=lambda item: item[1], default=None)
+
+    def clear_blocks(self):
+        self.blocked = set()
+        self._tainted = None
+
+    def block_areas(self, areas):
+        """
+        Block the roads passing within radius meters of each (latitude, longitude, radius)
+        in areas, replacing the previous blocks. Returns the number of blocked road edges.
+        """
+        blocked = set()
+        for latitude, longitude, radius in areas:
+            nodes = {node for node, _ in self._nodes_near(latitude, longitude, radius + MAX_EDGE_METERS)}
+            for node in nodes:
+                for offsets, edges in ((self.road_out_offsets, self.road_out_edges), (self.road_in_offsets, self.road_in_edges)):
+                    for index in range(offsets[node], offsets[node + 1]):
+                        edge = edges[index]
+                        if edge not in blocked and self._segment_distance(edge, latitude, longitude) <= radius:
+                            blocked.add(edge)
+        self.blocked = blocked
+        if not blocked:
+            self._tainted = None
+            return 0
+        # A shortcut is tainted when it stands for a blocked road; children come first
+        tainted = bytearray(len(self.tails))
+        for edge in blocked:
+            tainted[edge] = 1
+        children_a, children_b = self.children_a, self.children_b
+        for edge in range(self.road_edge_count, len(self.tails)):
+            if tainted[children_a[edge]] or tainted[children_b[edge]]:
+                tainted[edge] = 1
+        self._tainted = tainted
+        return len(blocked)
+
+    def _segment_distance(self, edge, latitude, longitude):
+        """Distance in meters from a point to the straight segment of a road edge"""
+        scale = math.cos(math.radians(latitude))
+        points = []
+        for node in (self.tails[edge], self.heads[edge]):
+            points.append((
+                math.radians(self.longitudes[node] - longitude) * scale * EARTH_RADIUS_METERS,
+                math.radians(self.latitudes[node] - latitude) * EARTH_RADIUS_METERS,
+            ))
+        (x1, y1), (x2, y2) = points
+        length_squared = (x2 - x1) ** 2 + (y2 - y1) ** 2
+        t = 0.0 if not length_squared else max(0.0, min(1.0, -(x1 * (x2 - x1) + y1 * (y2 - y1)) / length_squared))
+        return math.hypot(x1 + t * (x2 - x1), y1 + t * (y2 - y1))
+
+    # Queries
+
+    def _upward(self, source, forward, other_side=None):
+        """
+        Dijkstra from source over the edges leading up the hierarchy, forward from a source
+        or backward from a target. Returns (distances, parent edges, best meeting node and
+        total) against the distances of other_side, the finished search from the other end,
+        once no shorter meeting is possible.
+
+        Stall on demand: a node reached more cheaply down from a higher node is not on a
+        shortest path going up, so its edges are not relaxed.
+        """
+        if forward:
+            offsets, edges, ends = self.up_offsets, self.up_edges, self.heads
+            stall_offsets, stall_edges, stall_ends = self.down_offsets, self.down_edges, self.tails
+        else:
+            offsets, edges, ends = self.down_offsets, self.down_edges, self.tails
+            stall_offsets, stall_edges, stall_ends = self.up_offsets, self.up_edges, self.heads
+        weights = self.weights
+        distances, parents = {source: 0.0}, {source: -1}
+        get = distances.get
+        push, pop = heapq.heappush, heapq.heappop
+        best, meeting = math.inf, None
+        heap = [(0.0, source)]
+        while heap:
+            distance, node = pop(heap)
+            if distance > distances[node]:
+                continue
+            if other_side is not None:
+                if distance >= best:
+                    break
+                total = distance + other_side.get(node, math.inf)
+                if total < best:
+                    best, meeting = total, node
+            for index in range(stall_offsets[node], stall_offsets[node + 1]):
+                edge = stall_edges[index]
+                if get(stall_ends[edge], math.inf) + weights[edge] < distance:
+                    break
+            else:
+                for index in range(offsets[node], offsets[node + 1]):
+                    edge = edges[index]
+                    other = ends[edge]
+                    candidate = distance + weights[edge]
+                    if candidate < get(other, math.inf):
+                        distances[other] = candidate
+                        parents[other] = edge
+                        push(heap, (candidate, other))
+        return distances, parents, meeting, best
+
+    def _path_is_blocked(self, meeting, forward_parents, backward_parents):
+        tainted = self._tainted
+        for parents, forward in ((forward_parents, True), (backward_parents, False)):
+            node = meeting
+            while parents[node] != -1:
+                edge = parents[node]
+                if tainted[edge]:
+                    return True
+                node = self.tails[edge] if forward else self.heads[edge]
+        return False
+
+    def _blocked_travel_times(self, sources, target):
+        """Dijkstra back from target over the unblocked roads until every source is settled"""
+        pending = set(sources)
+        distances = {target: 0.0}
+        heap = [(0.0, target)]
+        settled = set()
+        while heap and pending:
+            distance, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled.add(node)
+            pending.discard(node)
+            for index in range(self.road_in_offsets[node], self.road_in_offsets[node + 1]):
+                edge = self.road_in_edges[index]
+                if edge in self.blocked:
+                    continue
+                tail = self.tails[edge]
+                candidate = distance + self.weights[edge]
+                if candidate < distances.get(tail, math.inf):
+                    distances[tail] = candidate
+                    heapq.heappush(heap, (candidate, tail))
+        return {source: distances[source] for source in sources if source in settled}
+
+    def travel_times(self, sources, target):
+        """
+        Seconds from each source node to the target node over the roads, as a dict;
+        sources that cannot reach the target are left out.
+        """
+        backward, backward_parents, _, _ = self._upward(target, forward=False)
+        times, rerouted = {}, []
+        for source in set(sources):
+            _, forward_parents, meeting, best = self._upward(source, forward=True, other_side=backward)
+            if meeting is None:
+                continue
+            if self._tainted is not None and self._path_is_blocked(meeting, forward_parents, backward_parents):
+                rerouted.append(source)
+            else:
+                times[source] = best
+        if rerouted:
+            times.update(self._blocked_travel_times(rerouted, target))
+        return times
+
+    def travel_time(self, source, target):
+        """Seconds from source to target node, or None when it cannot be reached"""
+        return self.travel_times([source], target).get(source)
+
+    def eta_seconds(self, origins, destination, max_snap_meters, offroad_meters_per_second):
+        """
+        Estimated seconds from each (latitude, longitude) origin to the destination point:
+        straight to the nearest road node at offroad speed, then along the roads. A list in
+        the order of origins, with None for points off the road network or cut off from it.
+        """
+        target = self.snap(*destination, max_snap_meters)
+        if target is None:
+            return [None] * len(origins)
+        snapped = [self.snap(latitude, longitude, max_snap_meters) for latitude, longitude in origins]
+        times = self.travel_times([item[0] for item in snapped if item is not None], target[0])
+        offroad = target[1] / offroad_meters_per_second
+        return [
+            None if item is None or item[0] not in times
+            else times[item[0]] + offroad + item[1] / offroad_meters_per_second
+            for item in snapped
+        ]
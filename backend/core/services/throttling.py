@@ -0,0 +1,231 @@
+"""
+Sliding-window request counters shared by the API throttles of every worker.
+
+DRF's stock throttles keep a list of request timestamps per client in the default cache,
+which here is per-process local memory: each worker enforces the limits on its own, and the
+lists grow with the number of clients and their rates. These stores keep three numbers per
+key instead: the current window (time divided by the throttle duration), and the requests
+counted in it and in the window before. The requests in the last `duration` seconds are
+estimated as
+
+    previous * (1 - elapsed fraction of the current window) + current
+
+and, as with DRF, a request is counted and allowed only while the estimate is below the
+limit. THROTTLE_BACKEND picks the store:
+
+- file: a fixed table of THROTTLE_FILE_SLOTS slots in a memory-mapped file, shared by the
+  workers of one server. An update locks only its own slot. A key whose slot is taken over
+  by another key starts again from zero.
+- database: one ThrottleCounter row per key, updated by a single upsert. It is shared by
+  every server, at one query per throttle check. Expired rows are pruned every
+  THROTTLE_PRUNE_SECONDS.
+- redis: a hash per key, updated by a Lua script, on any server speaking the Redis protocol
+  at THROTTLE_REDIS_URL. Needs the `redis` package. While the server is unreachable,
+  requests are allowed.
+"""
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router
+
+from core.models import ThrottleCounter
+
+
+logger = logging.getLogger(__name__)
+
+# allowed, the counts after the request, and the seconds elapsed in the current window
+ThrottleHit = namedtuple('ThrottleHit', 'allowed previous current elapsed')
+
+
+def _count(state_window, previous, current, window, weight, limit):
+    """Roll (state_window, previous, current) forward to window and count a request in it"""
+    if state_window != window:
+        previous = current if state_window == window - 1 else 0
+        current = 0
+    allowed = previous * weight + current < limit
+    return allowed, previous, current + 1 if allowed else current
+
+
+class ThrottleStore:
+    def hit(self, key, duration, limit, now=None):
+        """Count a request for key against `limit` requests per `duration` seconds"""
+        now = time.time() if now is None else now
+        window, elapsed = divmod(now, duration)
+        window = int(window)
+        allowed, previous, current = self._hit(key, window, 1 - elapsed / duration, limit, (window + 2) * duration)
+        return ThrottleHit(bool(allowed), previous, current, elapsed)
+
+    def _hit(self, key, window, weight, limit, expires_at):
+        raise NotImplementedError
+
+    def clear(self):
+        """Forget every count"""
+        raise NotImplementedError
+
+
+class FileStore(ThrottleStore):
+    # Key fingerprint, window, previous and current count
+    SLOT = struct.Struct('<QQII')
+
+    def __init__(self, path, slots):
+        self.path, self.slots = path, slots
+        size = slots * self.SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size < size:
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        # fcntl locks exclude other processes only; this excludes the other threads
+        self._lock = threading.Lock()
+
+    def _hit(self, key, window, weight, limit, expires_at):
+        fingerprint = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
+        offset = fingerprint % self.slots * self.SLOT.size
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self.SLOT.size, offset)
+            try:
+                stored, state_window, previous, current = self.SLOT.unpack_from(self._map, offset)
+                if stored != fingerprint:
+                    state_window, previous, current = -1, 0, 0
+                allowed, previous, current = _count(state_window, previous, current, window, weight, limit)
+                self.SLOT.pack_into(self._map, offset, fingerprint, window, previous, current)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self.SLOT.size, offset)
+        return allowed, previous, current
+
+    def clear(self):
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                self._map[:] = bytes(len(self._map))
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+
+class DatabaseStore(ThrottleStore):
+    def __init__(self):
+        self._statements = {}
+        self._pruned_at = time.monotonic()
+
+    def _statement(self, connection):
+        """The upsert counting a request; Postgres and SQLite both support it"""
+        if connection.alias not in self._statements:
+            quote = connection.ops.quote_name
+            table = quote(ThrottleCounter._meta.db_table)
+            key, window, previous, current, allowed, expires_at = (
+                quote(name) for name in ('key', 'window_index', 'previous_count', 'current_count', 'allowed', 'expires_at')
+            )
+            rolled_previous = (
+                f'CASE WHEN {table}.{window} = EXCLUDED.{window} THEN {table}.{previous} '
+                f'WHEN {table}.{window} = EXCLUDED.{window} - 1 THEN {table}.{current} ELSE 0 END'
+            )
+            rolled_current = f'CASE WHEN {table}.{window} = EXCLUDED.{window} THEN {table}.{current} ELSE 0 END'
+            under_limit = f'({rolled_previous}) * %s + ({rolled_current}) < %s'
+            self._statements[connection.alias] = (
+                f'INSERT INTO {table} ({key}, {window}, {previous}, {current}, {allowed}, {expires_at}) '
+                f'VALUES (%s, %s, 0, %s, %s, %s) '
+                f'ON CONFLICT ({key}) DO UPDATE SET {previous} = {rolled_previous}, '
+                f'{current} = {rolled_current} + CASE WHEN {under_limit} THEN 1 ELSE 0 END, '
+                f'{allowed} = {under_limit}, {window} = EXCLUDED.{window}, {expires_at} = EXCLUDED.{expires_at} '
+                f'RETURNING {allowed}, {previous}, {current}'
+            )
+        return self._statements[connection.alias]
+
+    def _hit(self, key, window, weight, limit, expires_at):
+        connection = connections[router.db_for_write(ThrottleCounter)]
+        first_allowed = limit > 0
+        with connection.cursor() as cursor:
+            cursor.execute(self._statement(connection), [
+                key, window, int(first_allowed), first_allowed, expires_at, weight, limit, weight, limit,
+            ])
+            allowed, previous, current = cursor.fetchone()
+        if time.monotonic() - self._pruned_at >= settings.THROTTLE_PRUNE_SECONDS:
+            self._pruned_at = time.monotonic()
+            ThrottleCounter.objects.filter(expires_at__lt=time.time()).delete()
+        return allowed, previous, current
+
+    def clear(self):
+        ThrottleCounter.objects.all().delete()
+
+
+class RedisStore(ThrottleStore):
+    SCRIPT = """
+    local state = redis.call('HMGET', KEYS[1], 'w', 'p', 'c')
+    local window = tonumber(ARGV[1])
+    local stored = tonumber(state[1])
+    local previous, current = 0, 0
+    if stored == window then
+        previous, current = tonumber(state[2]), tonumber(state[3])
+    elseif stored == window - 1 then
+        previous = tonumber(state[3])
+    end
+    local allowed = 0
+    if previous * tonumber(ARGV[2]) + current < tonumber(ARGV[3]) then
+        allowed, current = 1, current + 1
+    end
+    redis.call('HSET', KEYS[1], 'w', window, 'p', previous, 'c', current)
+    redis.call('PEXPIREAT', KEYS[1], ARGV[4])
+    return {allowed, previous, current}
+    """
+    PREFIX = 'throttle:'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('THROTTLE_BACKEND=redis needs the redis package: pip install redis')
+        self._errors = redis.RedisError
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def _hit(self, key, window, weight, limit, expires_at):
+        try:
+            return self._script(keys=[self.PREFIX + key], args=[window, repr(weight), limit, int(expires_at * 1000)])
+        except self._errors:
+            logger.exception('Throttle store unreachable; allowing the request')
+            return True, 0, 0
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.PREFIX + '*'):
+            self._client.delete(key)
+
+
+_lock = threading.Lock()
+_store = {'config': None, 'store': None}
+
+
+def default_file_path():
+    """A file per process group: gunicorn's or uvicorn's workers share their master's"""
+    return os.path.join(tempfile.gettempdir(), f'alisto-throttle-{os.getpgrp()}.bin')
+
+
+def get_throttle_store():
+    """The store configured by THROTTLE_BACKEND, created once per process"""
+    config = (
+        settings.THROTTLE_BACKEND, settings.THROTTLE_FILE_PATH, settings.THROTTLE_FILE_SLOTS,
+        settings.THROTTLE_REDIS_URL, os.getpid(),
+    )
+    if _store['config'] == config:
+        return _store['store']
+    with _lock:
+        if _store['config'] != config:
+            backend = config[0]
+            if backend == 'file':
+                store = FileStore(settings.THROTTLE_FILE_PATH or default_file_path(), settings.THROTTLE_FILE_SLOTS)
+            elif backend == 'database':
+                store = DatabaseStore()
+            elif backend == 'redis':
+                store = RedisStore(settings.THROTTLE_REDIS_URL)
+            else:
+                raise ImproperlyConfigured(f"THROTTLE_BACKEND must be 'file', 'database' or 'redis', not {backend!r}")
+            _store.update(config=config, store=store)
+        return _store['store']
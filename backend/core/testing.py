@@ -0,0 +1,41 @@
+"""
+Test helpers shared across apps.
+"""
+import json
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin providing assertMaxQueries, an upper-bound version of assertNumQueries.
+    Use it to pin a view's query budget so N+1 regressions fail the test suite.
+    """
+
+    @contextmanager
+    def assertMaxQueries(self, max_queries, using='default'):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > max_queries:
+            queries = '\n'.join(
+                f'{index}. {query["sql"]}' for index, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(f'{executed} queries executed, budget is {max_queries}\nCaptured queries were:\n{queries}')
+
+
+def road_feature(points, **tags):
+    """GeoJSON feature for an OpenStreetMap way through (latitude, longitude) points"""
+    return {
+        'type': 'Feature',
+        'properties': {'highway': 'residential', **tags},
+        'geometry': {'type': 'LineString', 'coordinates': [[longitude, latitude] for latitude, longitude in points]},
+    }
+
+
+def write_geojson(path, features):
+    with open(path, 'w') as file:
+        json.dump({'type': 'FeatureCollection', 'features': features}, file)
+    return path
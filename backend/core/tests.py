@@ -0,0 +1,655 @@
+import heapq
+import math
+import os
+import re
+import tempfile
+import time
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+from urllib.parse import parse_qs
+
+import httpx
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import LiveServerTestCase, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User, UserProfile
+from emergencies.models import EmergencyReport, EmergencyType, EmergencyVerification
+from emergencies.serializers import EmergencyTypeSerializer
+from knox.auth import TokenAuthentication
+from knox.models import AuthToken
+from core.benchmarks import compare, get_benchmarks, run_benchmark
+from core.management.commands.benchmark_middleware import build_middleware_chain
+from core.management.commands.loadtest import EndpointResults, percentile
+from nstw_backend.db_routers import ReplicaRouter
+from nstw_backend import schema
+from nstw_backend.middleware import AsyncWhiteNoiseMiddleware, ReplicaRoutingMiddleware, RequestMetricsMiddleware
+from nstw_backend.throttling import UserRateThrottle
+from core.services.db_pool import pool_stats, summarize_pool_stats
+from core.services.file_service import FileService
+from core.services.partitions import add_months, ensure_partitions, existing_partitions, month_start, partition_name
+from core.services.metrics import RequestMetrics, endpoint_stats, timed
+from core.services import geohash
+from core.services.routing import RoadGraph
+from core.services.throttling import DatabaseStore, FileStore, get_throttle_store
+from core.models import ThrottleCounter
+from core.testing import road_feature, write_geojson
+
+
+class StatelessMiddlewareProfileTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.handler = build_middleware_chain(settings.STATELESS_MIDDLEWARE, view=self.capture_view)
+        self.seen = None
+
+    def capture_view(self, request):
+        self.seen = request
+        return HttpResponse('ok')
+
+    def test_api_request_skips_session_and_messages(self):
+        self.handler(self.factory.get('/api/emergencies/reports/', HTTP_AUTHORIZATION='Token abc'))
+        self.assertFalse(hasattr(self.seen, 'session'))
+        self.assertFalse(hasattr(self.seen, '_messages'))
+        self.assertIsInstance(self.seen.user, AnonymousUser)
+
+    def test_api_post_is_not_csrf_checked(self):
+        response = self.handler(self.factory.post('/api/emergencies/reports/', {}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_admin_request_keeps_session_and_messages(self):
+        self.handler(self.factory.get('/admin/'))
+        self.assertTrue(hasattr(self.seen, 'session'))
+        self.assertTrue(hasattr(self.seen, '_messages'))
+
+    def test_admin_post_is_csrf_checked(self):
+        response = self.handler(self.factory.post('/admin/login/', {}))
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(MIDDLEWARE=settings.STATELESS_MIDDLEWARE)
+    def test_admin_login_works_under_stateless_profile(self):
+        User.objects.create_superuser(email='admin@example.com', password='adminpass')
+        self.client.get('/admin/login/')
+        response = self.client.post('/admin/login/', {'username': 'admin@example.com', 'password': 'adminpass'})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('sessionid', response.cookies)
+        self.assertEqual(self.client.get('/admin/').status_code, 200)
+
+    def test_benchmark_middleware_command_reports_both_profiles(self):
+        out = StringIO()
+        call_command('benchmark_middleware', iterations=20, rounds=1, stdout=out)
+        self.assertIn('standard', out.getvalue())
+        self.assertIn('stateless', out.getvalue())
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        endpoint_stats.reset()
+
+    def test_metrics_count_queries_and_sections(self):
+        metrics = RequestMetrics()
+        with metrics.activate():
+            User.objects.count()
+            with timed('upload'):
+                pass
+        self.assertEqual(metrics.query_count, 1)
+        self.assertIn('upload', metrics.sections)
+
+    def test_timed_is_noop_outside_a_request(self):
+        with timed('upload'):
+            pass
+
+    def test_response_carries_server_timing_and_endpoint_stats(self):
+        response = self.client.get('/api/agencies/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('serialization;dur=', response['Server-Timing'])
+        self.assertIn('GET /api/agencies/', endpoint_stats.snapshot())
+
+    def test_serialization_includes_building_serializer_data(self):
+        EmergencyType.objects.create(name='Fire', icon_type='fire-icon')
+        to_representation = EmergencyTypeSerializer.to_representation
+
+        def slow_representation(serializer, instance):
+            time.sleep(0.05)
+            return to_representation(serializer, instance)
+
+        with patch.object(EmergencyTypeSerializer, 'to_representation', slow_representation):
+            for many in (False, True):
+                metrics = RequestMetrics()
+                with metrics.activate():
+                    instance = EmergencyType.objects.all() if many else EmergencyType.objects.get()
+                    EmergencyTypeSerializer(instance, many=many).data
+                self.assertGreaterEqual(metrics.sections['serialization'], 0.05)
+
+            _, token = AuthToken.objects.create(User.objects.create_user(email='metrics@example.com', password='pass'))
+            response = self.client.get('/api/emergencies/types/', HTTP_AUTHORIZATION=f'Token {token}')
+        serialization = re.search(r'serialization;dur=([\d.]+)', response['Server-Timing'])
+        self.assertGreaterEqual(float(serialization.group(1)), 50)
+
+    @override_settings(REQUEST_BUDGETS={'queries': 0})
+    def test_over_budget_request_is_logged(self):
+        with self.assertLogs('nstw_backend.metrics', level='WARNING') as logs:
+            self.client.get('/api/agencies/')
+        self.assertIn('queries=1 > 0', logs.output[0])
+
+    async def test_async_requests_are_measured_without_a_thread(self):
+        async def view(request):
+            await sync_to_async(User.objects.count)()
+            return HttpResponse()
+
+        handler = RequestMetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(handler))
+        response = await handler(RequestFactory().get('/api/agencies/'))
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    def test_metrics_endpoint_requires_staff(self):
+        user = User.objects.create_user(email='staff@example.com', password='pass')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/health/metrics/').status_code, 401)
+
+
+class DatabasePoolStatsTests(TestCase):
+    def test_summary_derives_wait_and_saturation(self):
+        summary = summarize_pool_stats({
+            'pool_min': 2, 'pool_max': 10, 'pool_size': 6, 'pool_available': 1,
+            'requests_num': 40, 'requests_wait_ms': 120, 'connections_num': 6, 'connections_ms': 90,
+        })
+        self.assertEqual(summary['in_use'], 5)
+        self.assertEqual(summary['saturation'], 0.5)
+        self.assertEqual(summary['checkouts'], 40)
+        self.assertEqual(summary['wait_ms_avg'], 3.0)
+        self.assertEqual(summary['connect_ms_avg'], 15.0)
+        self.assertEqual(summary['checkout_timeouts'], 0)
+
+    def test_only_pooled_databases_are_reported(self):
+        pooled = {alias for alias, config in settings.DATABASES.items() if config.get('OPTIONS', {}).get('pool')}
+        self.assertEqual(set(pool_stats()), pooled)
+
+    def test_metrics_endpoint_includes_pools(self):
+        staff = User.objects.create_user(email='staff@example.com', password='pass', is_staff=True)
+        _, token = AuthToken.objects.create(staff)
+        response = self.client.get('/health/metrics/', HTTP_AUTHORIZATION=f'Token {token}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['db_pools']), set(pool_stats()))
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica_1'],
+    REPLICA_READ_PATH_PREFIXES=('/api/emergencies/reports/',),
+    REPLICA_PIN_SECONDS=10,
+)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        self.handler = ReplicaRoutingMiddleware(self.view)
+        caches[settings.REPLICA_PIN_CACHE].clear()
+
+    def view(self, request):
+        # Report where the request's reads would go
+        return HttpResponse(f'{self.router.db_for_read(EmergencyReport)},{self.router.db_for_read(AuthToken)}')
+
+    def get(self, path='/api/emergencies/reports/', token='abc'):
+        return self.handler(self.factory.get(path, HTTP_AUTHORIZATION=f'Token {token}')).content.decode()
+
+    def test_reads_outside_a_request_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(EmergencyReport), 'default')
+        self.assertEqual(self.router.db_for_write(EmergencyReport), 'default')
+
+    def test_safe_requests_on_listed_paths_read_from_replicas(self):
+        self.assertEqual(self.get(), 'replica_1,default')
+        self.assertEqual(self.get('/api/responders/'), 'default,default')
+        self.assertEqual(self.handler(self.factory.post('/api/emergencies/reports/')).content.decode(), 'default,default')
+
+    def test_writers_are_pinned_to_the_primary(self):
+        self.handler(self.factory.post('/api/emergencies/reports/', HTTP_AUTHORIZATION='Token abc'))
+        self.assertEqual(self.get(token='abc'), 'default,default')
+        self.assertEqual(self.get(token='other'), 'replica_1,default')
+
+    def test_pins_hold_across_workers(self):
+        # Each worker process has its own cache objects; the pin must reach the other's
+        worker_a, worker_b = ReplicaRoutingMiddleware(self.view), ReplicaRoutingMiddleware(self.view)
+        cache_a = caches.create_connection(settings.REPLICA_PIN_CACHE)
+        cache_b = caches.create_connection(settings.REPLICA_PIN_CACHE)
+        self.assertIsNot(cache_a, cache_b)
+        with patch.object(worker_a, 'get_pin_cache', return_value=cache_a), \
+                patch.object(worker_b, 'get_pin_cache', return_value=cache_b):
+            worker_a(self.factory.post('/api/emergencies/reports/', HTTP_AUTHORIZATION='Token abc'))
+            request = self.factory.get('/api/emergencies/reports/', HTTP_AUTHORIZATION='Token abc')
+            self.assertEqual(worker_b(request).content.decode(), 'default,default')
+
+    def test_pin_cache_is_shared_between_processes(self):
+        backend = settings.CACHES[settings.REPLICA_PIN_CACHE]['BACKEND']
+        self.assertNotIn('locmem', backend)
+        self.assertIn('django_cache', settings.REPLICA_EXCLUDED_APPS)
+
+    async def test_async_requests_are_routed_without_a_thread(self):
+        async def view(request):
+            return await sync_to_async(self.view)(request)
+
+        handler = ReplicaRoutingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(handler))
+        request = self.factory.get('/api/emergencies/reports/', HTTP_AUTHORIZATION='Token abc')
+        self.assertEqual((await handler(request)).content.decode(), 'replica_1,default')
+        await handler(self.factory.post('/api/emergencies/reports/', HTTP_AUTHORIZATION='Token abc'))
+        self.assertEqual((await handler(request)).content.decode(), 'default,default')
+
+    async def test_static_files_middleware_passes_async_requests_through(self):
+        async def view(request):
+            return HttpResponse('view')
+
+        handler = AsyncWhiteNoiseMiddleware(view)
+        self.assertTrue(iscoroutinefunction(handler))
+        self.assertEqual((await handler(self.factory.get('/api/responders/'))).content, b'view')
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica_1', 'emergencies'))
+        self.assertTrue(self.router.allow_migrate('default', 'emergencies'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_middleware_is_skipped_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ReplicaRoutingMiddleware(self.view)
+
+
+class PartitionTests(TestCase):
+    def test_month_arithmetic(self):
+        month = month_start(datetime(2025, 11, 17, 23, 30, tzinfo=dt_timezone.utc))
+        self.assertEqual(month, datetime(2025, 11, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(add_months(month, 3), datetime(2026, 2, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(partition_name('reports', add_months(month, -11)), 'reports_p202412')
+
+    def test_create_partitions_command(self):
+        out = StringIO()
+        call_command('create_partitions', months_ahead=2, stdout=out)
+        if connection.vendor != 'postgresql':
+            self.assertIn('nothing to do', out.getvalue())
+
+    @skipUnless(connection.vendor == 'postgresql', 'Partitioning is PostgreSQL only')
+    def test_rows_in_the_default_partition_move_to_a_new_month(self):
+        user = User.objects.create_user(email='partition@example.com', password='pass')
+        month = datetime(2035, 6, 1, tzinfo=dt_timezone.utc)
+        report = EmergencyReport.objects.create(
+            emergency_type=EmergencyType.objects.create(name='Fire', icon_type='fire-icon'),
+            user=user, longitude=120.9842, latitude=14.5995
+        )
+        EmergencyReport.objects.filter(id=report.id).update(date_created=month.replace(day=15))
+
+        table = EmergencyReport._meta.db_table
+        self.assertEqual(ensure_partitions(connection, month, month, tables=[table]), [partition_name(table, month)])
+        with connection.cursor() as cursor:
+            self.assertIn(partition_name(table, month), existing_partitions(cursor, table))
+            cursor.execute(f'SELECT COUNT(*) FROM "{partition_name(table, month)}"')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_every_benchmark_runs_and_rolls_back_its_fixtures(self):
+        for name in get_benchmarks():
+            self.assertGreater(run_benchmark(name, repeats=1, min_time=0), 0, name)
+        self.assertFalse(User.objects.exists())
+
+    def test_compare_flags_regressions_and_improvements(self):
+        rows = compare({'slow': 150.0, 'fast': 50.0, 'same': 100.0, 'added': 1.0},
+                       {'slow': 100.0, 'fast': 100.0, 'same': 105.0}, threshold=0.2)
+        verdicts = {row[0]: row[4] for row in rows}
+        self.assertEqual(verdicts, {'slow': 'REGRESSION', 'fast': 'improved', 'same': 'ok', 'added': 'new'})
+
+    def test_run_benchmarks_command_writes_report(self):
+        out = StringIO()
+        call_command('run_benchmarks', 'geo.', repeats=1, min_time=0, stdout=out)
+        self.assertIn('| geo.haversine_distance |', out.getvalue())
+
+
+class GenerateDatasetCommandTests(TestCase):
+    def generate(self, **options):
+        options = {'users': 20, 'reports': 50, 'agencies': 4, 'tokens': 5, 'batch_size': 16,
+                   'seed': 7, 'end_date': None, 'stdout': StringIO(), **options}
+        call_command('generate_dataset', **options)
+        return list(EmergencyReport.objects.order_by('id').values_list('id', 'latitude', 'longitude', 'verification_status'))
+
+    def test_generates_requested_volumes(self):
+        self.generate()
+        self.assertEqual(UserProfile.objects.count(), 20)
+        self.assertEqual(EmergencyReport.objects.count(), 50)
+        for report in EmergencyReport.objects.all()[:10]:
+            self.assertTrue(4.23 <= report.latitude <= 21.12)
+            self.assertTrue(116.93 <= report.longitude <= 126.34)
+
+    def test_same_seed_is_deterministic(self):
+        from datetime import date
+        first = self.generate(end_date=date(2025, 1, 31))
+        second = self.generate(end_date=date(2025, 1, 31), flush=True)
+        self.assertEqual(first, second)
+
+    def test_verification_status_matches_votes(self):
+        self.generate()
+        for report in EmergencyReport.objects.all():
+            votes = set(EmergencyVerification.objects.filter(report=report).values_list('vote', flat=True))
+            expected = 'Verified' if True in votes else ('Low confidence' if False in votes else 'Unverified')
+            self.assertEqual(report.verification_status, expected)
+
+    def test_reports_are_scored_for_triage(self):
+        from emergencies.triage import base_priority
+        self.generate()
+        for report in EmergencyReport.objects.select_related('emergency_type'):
+            votes = list(EmergencyVerification.objects.filter(report=report).values_list('vote', flat=True))
+            self.assertEqual(report.vote_score, votes.count(True) - votes.count(False))
+            self.assertAlmostEqual(
+                report.priority, base_priority(report.emergency_type.severity, report.date_created, report.vote_score)
+            )
+
+    def test_generated_tokens_authenticate(self):
+        import tempfile
+        with tempfile.NamedTemporaryFile('r') as tokens_file:
+            self.generate(tokens_file=tokens_file.name)
+            token = tokens_file.read().split()[0]
+        user, _ = TokenAuthentication().authenticate_credentials(token.encode())
+        self.assertTrue(user.email.endswith('synthetic.alisto.test'))
+
+
+class LoadTestTests(LiveServerTestCase):
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([], 0.95), 0.0)
+
+    def test_results_summary_counts_errors_and_timeouts(self):
+        results = EndpointResults()
+        results.record('verify', 0.1, True)
+        results.record('verify', 6.0, False)
+        summary = results.summary(elapsed=2.0)['verify']
+        self.assertEqual(summary['requests'], 2)
+        self.assertEqual(summary['error_rate'], 0.5)
+        self.assertEqual(summary['over_timeout_rate'], 0.5)
+
+    @override_settings(IMAGE_STORAGE_BACKEND='stub')
+    def test_loadtest_runs_against_live_server(self):
+        import tempfile
+        with tempfile.NamedTemporaryFile('r') as tokens_file:
+            call_command('generate_dataset', users=5, reports=5, agencies=2, tokens=5,
+                         tokens_file=tokens_file.name, stdout=StringIO())
+            out = StringIO()
+            call_command('loadtest', url=self.live_server_url, tokens_file=tokens_file.name,
+                         stages='2', duration=1.0, stdout=out)
+        self.assertIn('Report submissions absorbed', out.getvalue())
+        self.assertIn('create_report', out.getvalue())
+
+
+@override_settings(CLOUDINARY_CONFIG={'CLOUD_NAME': 'demo', 'API_KEY': 'key', 'API_SECRET': 'secret'})
+class AsyncUploadTests(TestCase):
+    image = 'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+
+    async def upload(self, handler):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with patch.object(FileService, 'async_http_client', return_value=client):
+            return await FileService.upload_to_cloudinary_async(self.image, folder='tests')
+
+    async def test_signed_upload(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json={'secure_url': 'https://res.cloudinary.com/demo/tests/x.png'})
+
+        self.assertEqual(await self.upload(handler), (True, 'https://res.cloudinary.com/demo/tests/x.png'))
+        self.assertEqual(str(requests[0].url), 'https://api.cloudinary.com/v1_1/demo/image/upload')
+        fields = parse_qs(requests[0].content.decode())
+        self.assertEqual(fields['folder'], ['tests'])
+        self.assertEqual(fields['api_key'], ['key'])
+        self.assertIn('signature', fields)
+        self.assertTrue(fields['file'][0].startswith('data:image/png;base64,'))
+
+    async def test_upload_error(self):
+        def handler(request):
+            return httpx.Response(401, json={'error': {'message': 'Invalid Signature'}})
+
+        self.assertEqual(await self.upload(handler), (False, 'Failed to upload image: Invalid Signature'))
+
+
+class GeohashTests(TestCase):
+    def test_encode_and_bounds(self):
+        self.assertEqual(geohash.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        min_lat, min_lon, max_lat, max_lon = geohash.bounds('u4pru')
+        self.assertTrue(min_lat <= 57.64911 <= max_lat and min_lon <= 10.40744 <= max_lon)
+
+    def test_cover_lists_every_intersecting_cell(self):
+        viewport = (14.5, 120.9, 14.7, 121.1)
+        cells = geohash.cover(*viewport, 5)
+        self.assertEqual(len(cells), geohash.cover_count(*viewport, 5))
+        self.assertEqual(len(set(cells)), len(cells))
+        self.assertIn(geohash.encode(14.5995, 120.9842, 5), cells)
+        self.assertIn(geohash.encode(14.5, 120.9, 5), cells)
+        self.assertIn(geohash.encode(14.7, 121.1, 5), cells)
+
+
+class RoadGraphTests(TestCase):
+    """Building, contracting and querying the road graph used for dispatch ETAs."""
+
+    step = 0.003  # About 330 m between grid intersections
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def build(self, features, contract=True):
+        graph = RoadGraph.from_geojson(write_geojson(os.path.join(self.directory, 'roads.geojson'), features))
+        if contract:
+            graph.contract()
+        return graph
+
+    def grid(self, size=6):
+        """Grid of streets, every third row one-way eastbound and the middle column a primary road"""
+        features = []
+        for row in range(size):
+            for column in range(size):
+                point = (14.5 + row * self.step, 121.0 + column * self.step)
+                if column + 1 < size:
+                    east = (point[0], point[1] + self.step)
+                    features.append(road_feature([point, east], oneway='yes' if row % 3 == 0 else 'no'))
+                if row + 1 < size:
+                    north = (point[0] + self.step, point[1])
+                    features.append(road_feature([point, north], highway='primary' if column == size // 2 else 'residential'))
+        return features
+
+    def node(self, graph, latitude, longitude):
+        return graph.snap(latitude, longitude, 10)[0]
+
+    def dijkstra(self, graph, source, target):
+        distances, heap = {source: 0.0}, [(0.0, source)]
+        while heap:
+            distance, node = heapq.heappop(heap)
+            if node == target:
+                return distance
+            if distance > distances[node]:
+                continue
+            for index in range(graph.road_out_offsets[node], graph.road_out_offsets[node + 1]):
+                edge = graph.road_out_edges[index]
+                if edge in graph.blocked:
+                    continue
+                candidate = distance + graph.weights[edge]
+                if candidate < distances.get(graph.heads[edge], math.inf):
+                    distances[graph.heads[edge]] = candidate
+                    heapq.heappush(heap, (candidate, graph.heads[edge]))
+        return None
+
+    def assertMatchesDijkstra(self, graph):
+        for target in range(graph.node_count):
+            times = graph.travel_times(range(graph.node_count), target)
+            for source in range(graph.node_count):
+                expected = self.dijkstra(graph, source, target)
+                if expected is None:
+                    self.assertNotIn(source, times)
+                else:
+                    self.assertAlmostEqual(times[source], expected, places=6)
+
+    def test_ways_become_directed_edges_at_their_speed(self):
+        graph = self.build([
+            road_feature([(14.5, 121.0), (14.5, 121.002)], oneway='yes', maxspeed='36'),
+            road_feature([(14.5, 121.002), (14.502, 121.002)], oneway='-1'),
+            road_feature([(14.502, 121.002), (14.504, 121.002)], highway='footway'),
+        ], contract=False)
+        self.assertEqual((graph.node_count, graph.road_edge_count), (3, 2))
+        west, east, north = (self.node(graph, *point) for point in ((14.5, 121.0), (14.5, 121.002), (14.502, 121.002)))
+        # About 215 m at 36 km/h; the second way runs against its geometry only
+        self.assertEqual([(graph.tails[edge], graph.heads[edge]) for edge in range(2)], [(west, east), (north, east)])
+        self.assertAlmostEqual(graph.weights[0], 21.5, delta=0.1)
+
+    def test_long_segments_get_intermediate_nodes(self):
+        graph = self.build([road_feature([(14.5, 121.0), (14.5, 121.01)])], contract=False)
+        # 1,077 m, split in two edges each way
+        self.assertEqual((graph.node_count, graph.road_edge_count), (3, 4))
+        self.assertIsNotNone(graph.snap(14.5, 121.005, 200))
+
+    def test_hierarchy_matches_dijkstra(self):
+        graph = self.build(self.grid())
+        self.assertGreater(graph.shortcut_count, 0)
+        self.assertMatchesDijkstra(graph)
+
+    def test_blocked_areas_are_routed_around(self):
+        graph = self.build(self.grid())
+        west, east = self.node(graph, 14.5 + 2 * self.step, 121.0), self.node(graph, 14.5 + 2 * self.step, 121.0 + 5 * self.step)
+        clear = graph.travel_time(west, east)
+
+        self.assertGreater(graph.block_areas([(14.5 + 2 * self.step, 121.0 + 2.5 * self.step, 100)]), 0)
+        self.assertGreater(graph.travel_time(west, east), clear)
+        self.assertMatchesDijkstra(graph)
+
+        # A block around a corner cuts it off
+        graph.block_areas([(14.5, 121.0, 100)])
+        self.assertIsNone(graph.travel_time(self.node(graph, 14.5, 121.0), east))
+        graph.clear_blocks()
+        self.assertAlmostEqual(graph.travel_time(west, east), clear)
+
+    def test_save_and_load(self):
+        graph = self.build(self.grid(4))
+        path = os.path.join(self.directory, 'roads.graph')
+        graph.save(path)
+        loaded = RoadGraph.load(path)
+        self.assertEqual((loaded.node_count, loaded.shortcut_count), (graph.node_count, graph.shortcut_count))
+        self.assertEqual(loaded.travel_times(range(graph.node_count), 0), graph.travel_times(range(graph.node_count), 0))
+
+    def test_eta_snaps_points_to_the_nearest_road(self):
+        graph = self.build([road_feature([(14.5, 121.0), (14.5, 121.01)], maxspeed='36')])
+        # 111 m off the road at one end at 10 m/s, then along the road
+        etas = graph.eta_seconds([(14.501, 121.0), (14.6, 121.0)], (14.5, 121.01), 500, 10)
+        self.assertAlmostEqual(etas[0], 107.7 + 11.1, delta=0.5)
+        self.assertIsNone(etas[1])
+
+
+class ThrottleStoreTests(TestCase):
+    """Sliding-window counts shared by the throttles of every worker."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'throttle.bin')
+
+    def assertSlidingWindow(self, store):
+        # 4 requests per minute
+        self.assertEqual([store.hit('client', 60, 4, now=600 + second).allowed for second in range(5)], [True] * 4 + [False])
+        # A quarter into the next window the last one still weighs 4 * 0.75 requests
+        hit = store.hit('client', 60, 4, now=675)
+        self.assertEqual((hit.allowed, hit.previous, hit.current), (True, 4, 1))
+        self.assertFalse(store.hit('client', 60, 4, now=675).allowed)
+        self.assertEqual([store.hit('client', 60, 4, now=705).allowed for _ in range(3)], [True, True, False])
+        # Other keys and idle clients start from zero
+        self.assertTrue(store.hit('other', 60, 4, now=705).allowed)
+        self.assertEqual(store.hit('client', 60, 4, now=900)[:3], (True, 0, 1))
+        store.clear()
+        self.assertEqual(store.hit('other', 60, 4, now=705)[:3], (True, 0, 1))
+
+    def test_file_store(self):
+        self.assertSlidingWindow(FileStore(self.path, 1024))
+
+    def test_file_store_is_shared_through_the_file(self):
+        worker, other_worker = FileStore(self.path, 1024), FileStore(self.path, 1024)
+        worker.hit('client', 60, 2, now=600)
+        other_worker.hit('client', 60, 2, now=601)
+        self.assertFalse(worker.hit('client', 60, 2, now=602).allowed)
+
+    def test_database_store(self):
+        store = DatabaseStore()
+        self.assertSlidingWindow(store)
+        with override_settings(THROTTLE_PRUNE_SECONDS=0):
+            store.hit('recent', 60, 4)
+            self.assertEqual(list(ThrottleCounter.objects.values_list('key', flat=True)), ['recent'])
+
+    def test_throttle_reports_when_to_retry(self):
+        request = RequestFactory().get('/api/emergencies/reports/')
+        request.user = AnonymousUser()
+        with override_settings(THROTTLE_BACKEND='file', THROTTLE_FILE_PATH=self.path):
+            throttle = UserRateThrottle()
+            throttle.rate, (throttle.num_requests, throttle.duration) = '2/min', (2, 60)
+            throttle.timer = lambda: 630
+            self.assertEqual([throttle.allow_request(request, None) for _ in range(3)], [True, True, False])
+            # The 2 requests weigh less than 2 as soon as the next window starts
+            self.assertEqual(throttle.wait(), 30)
+            # 10 s into it they weigh 1.67, so one more goes through; at 30 s they weigh 1
+            throttle.timer = lambda: 670
+            self.assertEqual([throttle.allow_request(request, None) for _ in range(2)], [True, False])
+            self.assertEqual(throttle.wait(), 20)
+            self.assertIsInstance(get_throttle_store(), FileStore)
+
+
+class OpenAPISchemaTests(TestCase):
+    """The schema is generated once and served from memory with an ETag."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(OPENAPI_SCHEMA_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.json_url = reverse('schema-json', kwargs={'format': '.json'})
+
+    def test_generated_files_are_served_with_an_etag(self):
+        call_command('generate_schema', stdout=StringIO())
+        with patch.object(schema, 'generate_schema', side_effect=AssertionError('schema generated per request')):
+            response = self.client.get(self.json_url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('/api/responders/road-blocks/', response.json()['paths'])
+            etag = response['ETag']
+            self.assertEqual(self.client.get(self.json_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            # The UI's own spec URL is served from the same files
+            self.assertEqual(self.client.get(reverse('schema-swagger-ui'), {'format': 'openapi'})['ETag'], etag)
+            response = self.client.get(reverse('schema-json', kwargs={'format': '.yaml'}))
+            self.assertTrue(response.content.startswith(b"swagger: '2.0'"))
+
+    def test_without_files_the_schema_is_generated_once(self):
+        with patch.object(schema, 'generate_schema', wraps=schema.generate_schema) as generate:
+            first = self.client.get(self.json_url)
+            self.client.get(reverse('schema-json', kwargs={'format': '.yaml'}))
+            self.assertEqual(self.client.get(self.json_url).content, first.content)
+        self.assertEqual(generate.call_count, 1)
+
+    def test_ui_pages_load_the_cached_spec(self):
+        for name in ('schema-swagger-ui', 'schema-redoc'):
+            self.assertContains(self.client.get(reverse(name)), f'"url": "{self.json_url}"')
+
+
+class WorkerBootTests(TestCase):
+    """Heavy dependencies are imported on first use, or by the preload warm-up"""
+
+    def test_deferred_modules_stay_out_of_the_boot(self):
+        out = StringIO()
+        call_command('profile_imports', '--limit', '5', stdout=out)
+        output = out.getvalue()
+        self.assertIn('Deferred to first use: PIL.Image', output)
+        self.assertIn('django', output)
+
+    def test_warm_up_loads_the_deferred_modules(self):
+        out = StringIO()
+        call_command('profile_imports', '--warm', stdout=out)
+        self.assertIn('Warmed: PIL.Image, cloudinary.uploader, cloudinary.utils, httpx, bleach', out.getvalue())
@@ -0,0 +1,45 @@
+"""
+Shared view base classes.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers are coroutines, for endpoints that wait on network I/O
+    (e.g. image uploads) and should not hold a worker while they do.
+
+    DRF's authentication, permission and throttle checks are synchronous and may hit the
+    database or cache, so they run in a thread via sync_to_async; the handler itself runs
+    on the event loop and must wrap its own ORM access the same way or use the a* methods.
+    Under WSGI Django runs the view in a one-off event loop, so it still works there.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            # options() and http_method_not_allowed() are inherited synchronous methods
+            if asyncio.iscoroutine(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
@@ -1,8 +1,11 @@
+import uuid
+
 from django.contrib import admin
-from .models import EmergencyType, EmergencyReport, EmergencyVerification, UserEvaluation
+from .models import EmergencyType, EmergencyReport, EmergencyVerification, UserEvaluation, ArchivedReport
+from .search import filter_reports
 
 class EmergencyTypeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'icon_type')
+    list_display = ('name', 'icon_type', 'severity')
     search_fields = ('name',)
 
 class EmergencyReportAdmin(admin.ModelAdmin):
@@ -11,6 +14,22 @@ class EmergencyReportAdmin(admin.ModelAdmin):
     search_fields = ('id', 'user__email', 'details')
     date_hierarchy = 'date_created'
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        A report id or reporter email finds that report or that user's reports; anything else
+        goes through the indexed details search rather than an ILIKE scan of every report.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        try:
+            return queryset.filter(id=uuid.UUID(search_term)), False
+        except ValueError:
+            pass
+        if '@' in search_term:
+            return queryset.filter(user__email__iexact=search_term), False
+        return filter_reports(queryset, search_term), False
+
 class EmergencyVerificationAdmin(admin.ModelAdmin):
     list_display = ('id', 'report', 'user', 'vote', 'date_created')
     list_filter = ('vote',)
@@ -23,7 +42,14 @@ class UserEvaluationAdmin(admin.ModelAdmin):
     search_fields = ('report__id', 'user__email', 'improvement_suggestion')
     date_hierarchy = 'date_created'
 
+class ArchivedReportAdmin(admin.ModelAdmin):
+    list_display = ('id', 'status', 'date_created', 'date_archived', 'archive_file')
+    list_filter = ('status',)
+    search_fields = ('id',)
+    date_hierarchy = 'date_created'
+
 admin.site.register(EmergencyType, EmergencyTypeAdmin)
 admin.site.register(EmergencyReport, EmergencyReportAdmin)
 admin.site.register(EmergencyVerification, EmergencyVerificationAdmin)
 admin.site.register(UserEvaluation, UserEvaluationAdmin)
+admin.site.register(ArchivedReport, ArchivedReportAdmin)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class EmergenciesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'emergencies'
+
+    def ready(self):
+        # Registers the analytics rollup, duplicate detection and triage signal receivers
+        from . import duplicates, rollups, triage  # noqa: F401
@@ -0,0 +1,171 @@
+"""
+Archival of closed reports to compressed, append-only cold storage.
+
+Each archived report is written, with its verifications and evaluations, as one JSON
+document in its own gzip member, appended to ARCHIVE_ROOT/reports-YYYYMM.jsonl.gz (the
+month of the report's date_created). A multi-member gzip file is still a valid gzip file,
+so a whole month can be read back with any gzip tool, while ArchivedReport keeps the
+offset and length of each member to fetch a single report without reading the rest.
+"""
+import fcntl
+import gzip
+import json
+import os
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    ArchivedReport, EmergencyChange, EmergencyReport, EmergencyVerification, UserEvaluation, pause_change_log
+)
+from .rollups import pause_rollups
+
+
+CLOSED_STATUSES = ('Resolved', 'Dismissed')
+
+
+def archive_root():
+    return Path(settings.ARCHIVE_ROOT)
+
+
+def _row(instance):
+    return {field.attname: getattr(instance, field.attname) for field in instance._meta.concrete_fields}
+
+
+def archive_candidates(older_than_days):
+    """Closed reports created more than older_than_days ago"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return EmergencyReport.objects.filter(status__in=CLOSED_STATUSES, date_created__lt=cutoff)
+
+
+def append_members(path, documents):
+    """
+    Append each document as its own gzip member and return their (offset, length).
+    The file is locked while appending so concurrent runs cannot interleave members.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    positions = []
+    with open(path, 'ab') as archive_file:
+        fcntl.flock(archive_file, fcntl.LOCK_EX)
+        try:
+            offset = archive_file.seek(0, os.SEEK_END)
+            for document in documents:
+                member = gzip.compress((json.dumps(document, cls=DjangoJSONEncoder) + '\n').encode('utf-8'), mtime=0)
+                archive_file.write(member)
+                positions.append((offset, len(member)))
+                offset += len(member)
+            archive_file.flush()
+            os.fsync(archive_file.fileno())
+        finally:
+            fcntl.flock(archive_file, fcntl.LOCK_UN)
+    return positions
+
+
+def _read_children(report_ids):
+    """Rows of the verifications and of the evaluations of the reports, by report id"""
+    verifications, evaluations = {}, {}
+    for verification in EmergencyVerification.objects.filter(report_id__in=report_ids).order_by('id'):
+        verifications.setdefault(verification.report_id, []).append(_row(verification))
+    for evaluation in UserEvaluation.objects.filter(report_id__in=report_ids).order_by('id'):
+        evaluations.setdefault(evaluation.report_id, []).append(_row(evaluation))
+    return verifications, evaluations
+
+
+def archive_batch(report_ids):
+    """
+    Move one batch of reports to the archive: write the archive members first, then index
+    them and delete the hot rows in one transaction. If the transaction fails, the members
+    are left unreferenced and the reports stay in place for the next run. So are the members
+    of reports changed while the members were written: the transaction locks the rows, reads
+    them and their verifications and evaluations again, and only indexes and deletes the
+    reports still closed and archived as they are.
+    """
+    reports = list(EmergencyReport.objects.filter(id__in=report_ids, status__in=CLOSED_STATUSES))
+    verifications, evaluations = _read_children(report_ids)
+
+    by_file = {}
+    for report in reports:
+        by_file.setdefault(f'reports-{report.date_created:%Y%m}.jsonl.gz', []).append(report)
+
+    entries = []
+    for filename, file_reports in by_file.items():
+        documents = [
+            {
+                'report': _row(report),
+                'verifications': verifications.get(report.id, []),
+                'evaluations': evaluations.get(report.id, []),
+            }
+            for report in file_reports
+        ]
+        positions = append_members(archive_root() / filename, documents)
+        for report, (offset, length) in zip(file_reports, positions):
+            entries.append(ArchivedReport(
+                id=report.id,
+                status=report.status,
+                emergency_type_id=report.emergency_type_id,
+                verification_status=report.verification_status,
+                latitude=report.latitude,
+                longitude=report.longitude,
+                date_created=report.date_created,
+                archive_file=filename,
+                offset=offset,
+                length=length,
+            ))
+
+    written = {report.id: _row(report) for report in reports}
+    with transaction.atomic():
+        current = {
+            report.id: _row(report) for report in EmergencyReport.objects.select_for_update().filter(
+                id__in=list(written), status__in=CLOSED_STATUSES
+            )
+        }
+        current_verifications, current_evaluations = _read_children(list(current))
+        # A report reopened, edited, voted on or evaluated since it was read stays for the next run
+        entries = [
+            entry for entry in entries
+            if current.get(entry.id) == written[entry.id]
+            and current_verifications.get(entry.id, []) == verifications.get(entry.id, [])
+            and current_evaluations.get(entry.id, []) == evaluations.get(entry.id, [])
+        ]
+        archived_ids = [entry.id for entry in entries]
+        verification_ids = [row['id'] for report_id in archived_ids for row in verifications.get(report_id, [])]
+        ArchivedReport.objects.bulk_create(
+            entries, update_conflicts=True, unique_fields=['id'],
+            update_fields=[
+                'status', 'emergency_type_id', 'verification_status', 'latitude', 'longitude',
+                'archive_file', 'offset', 'length', 'date_archived'
+            ]
+        )
+        # Archived reports stay in the analytics rollups
+        with pause_change_log(), pause_rollups():
+            EmergencyReport.objects.filter(id__in=archived_ids).delete()
+        EmergencyChange.record(EmergencyChange.VERIFICATION, verification_ids, deleted=True)
+        EmergencyChange.record(EmergencyChange.REPORT, archived_ids, deleted=True)
+    return len(entries)
+
+
+def archive_closed_reports(older_than_days, batch_size=500, limit=None):
+    """
+    Archive closed reports older than the threshold in batches of batch_size, streaming
+    ids so memory stays flat however much history there is. Returns the number archived.
+    """
+    archived = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        report_ids = list(archive_candidates(older_than_days).order_by('date_created').values_list('id', flat=True)[:size])
+        if not report_ids:
+            break
+        archived += archive_batch(report_ids)
+    return archived
+
+
+def read_archived_report(entry):
+    """Read back the archived document of one ArchivedReport"""
+    with open(archive_root() / entry.archive_file, 'rb') as archive_file:
+        archive_file.seek(entry.offset)
+        member = archive_file.read(entry.length)
+    return json.loads(gzip.decompress(member))
@@ -0,0 +1,94 @@
+"""
+Server-side clustering of reports for the map viewport.
+
+Reports are grouped by the prefix of their indexed geohash at a precision chosen from the
+zoom, so a viewport returns at most MAP_CLUSTER_MAX_CELLS clusters however many reports
+it holds. From MAP_CLUSTER_MAX_ZOOM on, the individual reports come back instead.
+"""
+from collections import Counter, defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import Avg, Count, Q
+from django.db.models.functions import Substr
+
+from core.services import geohash
+from .models import EmergencyReport
+
+
+# Coarsest geohash cover used to narrow the query with indexed prefix lookups
+MAX_PREFIX_CELLS = 32
+
+REPORT_FIELDS = ('id', 'latitude', 'longitude', 'emergency_type_id', 'status', 'verification_status', 'date_created')
+
+
+def cluster_precision(viewport, zoom):
+    """Cluster cell precision for a zoom, coarsened until the viewport spans at most MAP_CLUSTER_MAX_CELLS cells"""
+    precision = min(max(zoom // 2 + 1, 1), 8)
+    while precision > 1 and geohash.cover_count(*viewport, precision) > settings.MAP_CLUSTER_MAX_CELLS:
+        precision -= 1
+    return precision
+
+
+def reports_in_viewport(viewport, precision, queryset=None):
+    """
+    Reports inside the viewport. The geohash prefixes of a coarse cover hit the geohash
+    index first, then the exact bounds trim the edges.
+    """
+    min_lat, min_lon, max_lat, max_lon = viewport
+    queryset = (queryset if queryset is not None else EmergencyReport.objects.all()).filter(
+        latitude__gte=min_lat, latitude__lte=max_lat, longitude__gte=min_lon, longitude__lte=max_lon
+    )
+    for prefix_precision in range(precision, 0, -1):
+        if geohash.cover_count(*viewport, prefix_precision) <= MAX_PREFIX_CELLS:
+            cells = geohash.cover(*viewport, prefix_precision)
+            return queryset.filter(reduce(or_, (Q(geohash__startswith=cell) for cell in cells)))
+    return queryset
+
+
+def viewport_clusters(viewport, zoom, queryset=None):
+    """
+    Clusters (or, when zoomed in far enough, reports) in the viewport.
+    Returns a dict with the mode ('clusters' or 'reports'), precision and items.
+    """
+    if zoom >= settings.MAP_CLUSTER_MAX_ZOOM:
+        reports = list(
+            reports_in_viewport(viewport, 8, queryset)
+            .order_by('-date_created')
+            .values(*REPORT_FIELDS)[:settings.MAP_MAX_REPORTS + 1]
+        )
+        return {
+            'mode': 'reports',
+            'precision': None,
+            'truncated': len(reports) > settings.MAP_MAX_REPORTS,
+            'reports': reports[:settings.MAP_MAX_REPORTS],
+        }
+
+    precision = cluster_precision(viewport, zoom)
+    reports = reports_in_viewport(viewport, precision, queryset).annotate(cell=Substr('geohash', 1, precision)).order_by()
+    clusters = {
+        row['cell']: {
+            'geohash': row['cell'],
+            'count': row['count'],
+            'latitude': row['latitude'],
+            'longitude': row['longitude'],
+        }
+        for row in reports.values('cell').annotate(
+            count=Count('id'), latitude=Avg('latitude'), longitude=Avg('longitude')
+        )
+    }
+    # Most frequent emergency type and status of each cluster
+    for field, key in (('emergency_type_id', 'dominant_emergency_type'), ('status', 'dominant_status')):
+        counts = defaultdict(Counter)
+        for row in reports.values('cell', field).annotate(count=Count('id')):
+            counts[row['cell']][row[field]] = row['count']
+        for cell, cluster in clusters.items():
+            cluster[key] = counts[cell].most_common(1)[0][0] if counts[cell] else None
+
+    return {
+        'mode': 'clusters',
+        'precision': precision,
+        'truncated': False,
+        'clusters': sorted(clusters.values(), key=lambda cluster: -cluster['count']),
+    }
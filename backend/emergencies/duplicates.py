@@ -0,0 +1,321 @@
+"""
+Ingest-time detection of duplicate reports of one incident.
+
+Each process keeps an in-memory spatio-temporal index of the recent open reports: a grid
+of cells about DUPLICATE_RADIUS_METERS wide, per emergency type, holding the reports of
+the last DUPLICATE_WINDOW_MINUTES. A new report is looked up against the 3x3 cells around
+it, so the check costs a few dictionary lookups however many reports exist. Reports
+created by other processes are pulled from the database at most every
+DUPLICATE_INDEX_REFRESH_SECONDS with one indexed date_created query, and reports closed
+since then are dropped, found through the EmergencyChange log. Reports closed in this
+process are dropped as soon as the change commits.
+
+A report matching an earlier one (same type, within the radius and the window) gets the
+earlier report's canonical report, or the earlier report itself, as canonical_report.
+"""
+import math
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import EmergencyChange, EmergencyReport
+
+
+METERS_PER_DEGREE = 111_320
+CLOSED_STATUSES = ('Resolved', 'Dismissed')
+REFRESH_OVERLAP = timedelta(seconds=10)
+
+
+def distance_meters(lat1, lon1, lat2, lon2):
+    """Equirectangular distance, accurate to well under 1% at duplicate-detection ranges"""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.hypot(x, y) * 6_371_000
+
+
+class RecentReportIndex:
+    """
+    Grid index of recent open reports. Rows are latitude bands one radius high; each row
+    uses a longitude step one radius wide at the row's edge nearest the pole, so the 3x3
+    cells around a point always contain everything within the radius.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Bumped whenever the index is emptied, so a refresh read before that is dropped
+        self._generation = 0
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._cells = defaultdict(deque)
+            self._entries = deque()  # (date_created, key, entry) in insertion order, for expiry
+            self._ids = {}  # report id: (key, entry)
+            self._linked = Counter()  # canonical report id: indexed duplicates linked to it
+            self._closed = set()  # closed reports that indexed duplicates are still linked to
+            self._loaded_until = None
+            self._change_cursor = None
+            self._refreshed_at = 0.0
+            self._refreshing = False
+            self._generation += 1
+            self._radius = None
+
+    def _configure(self):
+        radius = settings.DUPLICATE_RADIUS_METERS
+        if radius != self._radius:
+            # Cell sizes depend on the radius; rebuild from the database when it changes
+            self._cells.clear()
+            self._entries.clear()
+            self._ids.clear()
+            self._linked.clear()
+            self._closed.clear()
+            self._loaded_until = None
+            self._change_cursor = None
+            self._generation += 1
+            self._radius = radius
+            self._lat_step = radius / METERS_PER_DEGREE
+
+    def _row(self, latitude):
+        return math.floor((latitude + 90) / self._lat_step)
+
+    def _lon_step(self, row):
+        edge = max(abs(row * self._lat_step - 90), abs((row + 1) * self._lat_step - 90))
+        return self._lat_step / max(math.cos(math.radians(min(edge, 89.9))), 1e-3)
+
+    def _key(self, emergency_type_id, latitude, longitude):
+        row = self._row(latitude)
+        return emergency_type_id, row, math.floor((longitude + 180) / self._lon_step(row))
+
+    def _add(self, report_id, emergency_type_id, latitude, longitude, date_created, canonical_id):
+        if report_id in self._ids:
+            return
+        key = self._key(emergency_type_id, latitude, longitude)
+        entry = (date_created, report_id, latitude, longitude, canonical_id)
+        self._cells[key].append(entry)
+        self._entries.append((date_created, key, entry))
+        self._ids[report_id] = key, entry
+        if canonical_id is not None:
+            self._linked[canonical_id] += 1
+
+    def _remove(self, report_id):
+        key, entry = self._ids.pop(report_id)
+        cell = self._cells[key]
+        cell.remove(entry)
+        if not cell:
+            del self._cells[key]
+        canonical_id = entry[4]
+        if canonical_id is not None:
+            self._linked[canonical_id] -= 1
+            if not self._linked[canonical_id]:
+                del self._linked[canonical_id]
+                self._closed.discard(canonical_id)
+
+    def _discard(self, report_id):
+        """Drop a closed report; the duplicates linked to it stop naming it as canonical"""
+        if report_id in self._ids:
+            self._remove(report_id)
+        if report_id in self._linked:
+            self._closed.add(report_id)
+
+    def _expire(self, cutoff):
+        # Entries arrive roughly in date_created order; stop at the first recent one
+        while self._entries and self._entries[0][0] < cutoff:
+            _, _, entry = self._entries.popleft()
+            # Skip entries already discarded, or replaced when their report was reopened
+            if self._ids.get(entry[1], (None, None))[1] is entry:
+                self._remove(entry[1])
+
+    def _start_refresh(self, now):
+        """
+        (since, change cursor, generation) of a refresh this thread should read, or None
+        when the index is fresh or another thread is already reading. Until the first load
+        is in place, each thread reads one rather than look up an empty index. Called with
+        the lock held.
+        """
+        if self._refreshing and self._loaded_until is not None:
+            return None
+        if time.monotonic() - self._refreshed_at < settings.DUPLICATE_INDEX_REFRESH_SECONDS:
+            return None
+        window_start = now - timedelta(minutes=settings.DUPLICATE_WINDOW_MINUTES)
+        # Re-read a few seconds back: a report committed late may carry an earlier date_created
+        since = max(self._loaded_until - REFRESH_OVERLAP, window_start) if self._loaded_until else window_start
+        self._refreshing = True
+        return since, self._change_cursor, self._generation
+
+    @staticmethod
+    def _read_changes(cursor, window_start):
+        """
+        (next cursor, ids of the reports closed or deleted after cursor, rows of the other
+        changed reports of the window, to add back those reopened) from the change log. On
+        the first load, only the cursor to start from.
+        """
+        if cursor is None:
+            # Read before the reports: changes logged while loading are replayed, not lost
+            cursor = EmergencyChange.objects.filter(
+                date_created__lte=EmergencyChange.settled_before()
+            ).aggregate(cursor=Max('id'))['cursor'] or 0
+            return cursor, set(), []
+        entries = list(
+            EmergencyChange.objects.filter(id__gt=cursor, kind=EmergencyChange.REPORT)
+            .order_by('id').values_list('id', 'object_id', 'date_created')
+        )
+        if not entries:
+            return cursor, set(), []
+        # Recent entries are applied now and again on the next refresh
+        cursor = EmergencyChange.settled_cursor(
+            [(entry_id, date_created) for entry_id, _, date_created in entries], cursor
+        )
+        report_ids = {object_id for _, object_id, _ in entries}
+        open_rows = list(
+            EmergencyReport.objects.filter(id__in=report_ids).exclude(status__in=CLOSED_STATUSES)
+            .values_list('id', 'emergency_type_id', 'latitude', 'longitude', 'date_created', 'canonical_report_id')
+        )
+        # Deleted reports are missing and count as closed
+        closed_ids = report_ids - {row[0] for row in open_rows}
+        return cursor, closed_ids, [row for row in open_rows if row[4] >= window_start]
+
+    def _refresh(self, now):
+        """
+        Pull the reports other processes created since the last refresh, and drop those
+        closed since. The queries run without the lock, so ingests in this process go on
+        with the index as it was.
+        """
+        if (
+            self._loaded_until is not None
+            and time.monotonic() - self._refreshed_at < settings.DUPLICATE_INDEX_REFRESH_SECONDS
+        ):
+            # Not due: skip the lock, find() takes it next anyway
+            return
+        with self._lock:
+            self._configure()
+            refresh = self._start_refresh(now)
+        if refresh is None:
+            return
+        since, cursor, generation = refresh
+        try:
+            changes = self._read_changes(cursor, now - timedelta(minutes=settings.DUPLICATE_WINDOW_MINUTES))
+            rows = list(
+                EmergencyReport.objects.filter(date_created__gte=since)
+                .exclude(status__in=CLOSED_STATUSES)
+                .order_by('date_created')
+                .values_list('id', 'emergency_type_id', 'latitude', 'longitude', 'date_created', 'canonical_report_id')
+            )
+        except Exception:
+            with self._lock:
+                self._refreshing = False
+            raise
+        with self._lock:
+            self._refreshing = False
+            if generation != self._generation:
+                return
+            for row in rows:
+                self._add(*row)
+                self._loaded_until = max(self._loaded_until or row[4], row[4])
+            self._loaded_until = self._loaded_until or since
+            self._change_cursor, closed_ids, open_rows = changes
+            for report_id in closed_ids:
+                self._discard(report_id)
+            for row in open_rows:
+                self._closed.discard(row[0])
+                self._add(*row)
+            self._refreshed_at = time.monotonic()
+
+    def find(self, emergency_type_id, latitude, longitude, now=None):
+        """
+        Canonical report id for a new report, or None when it matches no recent report.
+        The closest match within the radius wins.
+        """
+        now = now or timezone.now()
+        self._refresh(now)
+        with self._lock:
+            self._configure()
+            self._expire(now - timedelta(minutes=settings.DUPLICATE_WINDOW_MINUTES))
+
+            _, row, column = self._key(emergency_type_id, latitude, longitude)
+            best, best_distance = None, self._radius
+            for neighbour_row in (row - 1, row, row + 1):
+                if neighbour_row == row:
+                    columns = (column - 1, column, column + 1)
+                else:
+                    # Neighbouring rows use their own longitude step
+                    neighbour_column = math.floor((longitude + 180) / self._lon_step(neighbour_row))
+                    columns = (neighbour_column - 1, neighbour_column, neighbour_column + 1)
+                for neighbour_column in columns:
+                    for _, report_id, other_lat, other_lon, canonical_id in self._cells.get(
+                        (emergency_type_id, neighbour_row, neighbour_column), ()
+                    ):
+                        distance = distance_meters(latitude, longitude, other_lat, other_lon)
+                        if distance <= best_distance:
+                            if canonical_id in self._closed:
+                                # Its canonical report was closed: it stands for the incident
+                                canonical_id = None
+                            best, best_distance = canonical_id or report_id, distance
+            return best
+
+    def add(self, report):
+        with self._lock:
+            self._configure()
+            self._add(
+                report.id, report.emergency_type_id, report.latitude, report.longitude,
+                report.date_created, report.canonical_report_id
+            )
+
+    def discard(self, report_id):
+        """Drop a report that was closed"""
+        with self._lock:
+            self._discard(report_id)
+
+
+recent_reports = RecentReportIndex()
+
+
+def index_reports(reports):
+    """Add newly created reports to this process's index once their transaction commits"""
+    if not settings.DUPLICATE_DETECTION_ENABLED:
+        return
+    reports = list(reports)
+
+    def add_all():
+        for report in reports:
+            recent_reports.add(report)
+
+    transaction.on_commit(add_all)
+
+
+def assign_canonical(report):
+    """Link a new report to the canonical report of the incident it duplicates, if any"""
+    if not settings.DUPLICATE_DETECTION_ENABLED or report.canonical_report_id is not None:
+        return
+    report.canonical_report_id = recent_reports.find(report.emergency_type_id, report.latitude, report.longitude)
+
+
+@receiver(pre_save, sender=EmergencyReport)
+def detect_duplicate(sender, instance, raw=False, **kwargs):
+    if raw or not instance._state.adding:
+        return
+    assign_canonical(instance)
+
+
+@receiver(post_save, sender=EmergencyReport)
+def index_new_report(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    index_reports([instance])
+
+
+@receiver(post_save, sender=EmergencyReport)
+def drop_closed_report(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or created or not settings.DUPLICATE_DETECTION_ENABLED or instance.status not in CLOSED_STATUSES:
+        return
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    report_id = instance.id
+    transaction.on_commit(lambda: recent_reports.discard(report_id))
@@ -0,0 +1,68 @@
+"""
+Report heatmap served from the precomputed ReportGeohashCell counts.
+
+The zoom level picks the geohash precision (two zoom levels per character), stepping
+down to coarser precisions until the viewport spans at most HEATMAP_MAX_CELLS cells, so
+the response size depends on the viewport, never on the number of reports.
+"""
+from django.conf import settings
+from django.db.models import Sum
+
+from core.services import geohash
+from .models import ReportGeohashCell
+
+
+def parse_viewport(query_params):
+    """
+    Read min_lat, min_lon, max_lat, max_lon and zoom from the query string.
+    Raises ValueError with a message for the client on invalid input.
+    """
+    try:
+        viewport = tuple(float(query_params[name]) for name in ('min_lat', 'min_lon', 'max_lat', 'max_lon'))
+        zoom = int(query_params['zoom'])
+    except (KeyError, ValueError):
+        raise ValueError('min_lat, min_lon, max_lat, max_lon and zoom are required numbers.')
+    min_lat, min_lon, max_lat, max_lon = viewport
+    if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+        raise ValueError('The viewport must satisfy -90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180.')
+    if not 0 <= zoom <= 22:
+        raise ValueError('zoom must be between 0 and 22.')
+    return viewport, zoom
+
+
+def precision_for(viewport, zoom):
+    """Finest maintained precision suited to the zoom whose cover fits HEATMAP_MAX_CELLS"""
+    precisions = sorted(settings.HEATMAP_PRECISIONS)
+    candidates = [precision for precision in precisions if precision <= max(zoom // 2, precisions[0])]
+    for precision in reversed(candidates):
+        if geohash.cover_count(*viewport, precision) <= settings.HEATMAP_MAX_CELLS:
+            return precision
+    return precisions[0]
+
+
+def heatmap_cells(viewport, zoom, start, end):
+    """
+    Report counts of the cells intersecting the viewport between the start and end days.
+    Returns (precision, cells) with cells as dicts of geohash, cell center and reports.
+    """
+    precision = precision_for(viewport, zoom)
+    rows = ReportGeohashCell.objects.filter(precision=precision, day__gte=start, day__lte=end)
+    if geohash.cover_count(*viewport, precision) <= settings.HEATMAP_MAX_CELLS:
+        rows = rows.filter(geohash__in=geohash.cover(*viewport, precision))
+        limit = None
+    else:
+        # Even the coarsest cells are too many to list: only the busiest cells in view are returned
+        limit = settings.HEATMAP_MAX_CELLS
+    rows = rows.values('geohash').annotate(total=Sum('reports')).filter(total__gt=0).order_by('-total')
+
+    min_lat, min_lon, max_lat, max_lon = viewport
+    cells = []
+    for row in rows.iterator():
+        cell_min_lat, cell_min_lon, cell_max_lat, cell_max_lon = geohash.bounds(row['geohash'])
+        if cell_max_lat < min_lat or cell_min_lat > max_lat or cell_max_lon < min_lon or cell_min_lon > max_lon:
+            continue
+        latitude, longitude = geohash.center(row['geohash'])
+        cells.append({'geohash': row['geohash'], 'latitude': latitude, 'longitude': longitude, 'reports': row['total']})
+        if limit is not None and len(cells) >= limit:
+            break
+    return precision, cells
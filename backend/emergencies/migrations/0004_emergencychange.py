@@ -0,0 +1,39 @@
+# Change log behind delta sync, seeded with the existing reports and verifications
+from django.db import migrations, models
+
+
+def seed_change_log(apps, schema_editor):
+    EmergencyChange = apps.get_model('emergencies', 'EmergencyChange')
+    EmergencyReport = apps.get_model('emergencies', 'EmergencyReport')
+    EmergencyVerification = apps.get_model('emergencies', 'EmergencyVerification')
+
+    for kind, model in (('report', EmergencyReport), ('verification', EmergencyVerification)):
+        object_ids = model.objects.order_by('date_created').values_list('id', flat=True).iterator()
+        EmergencyChange.objects.bulk_create(
+            (EmergencyChange(kind=kind, object_id=object_id) for object_id in object_ids),
+            batch_size=5000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emergencies', '0003_alter_image_url_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmergencyChange',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('report', 'Report'), ('verification', 'Verification')], max_length=20)),
+                ('object_id', models.UUIDField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id'], name='emergencies_kind_7bc3d0_idx')],
+            },
+        ),
+        migrations.RunPython(seed_change_log, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,90 @@
+# Range-partition reports and verifications by date_created month (Postgres only)
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+from core.services.partitions import add_months, create_default_partition, ensure_partitions, month_start
+
+
+PARTITIONED_MODELS = ('EmergencyReport', 'EmergencyVerification')
+
+# Months of partitions created ahead of time; `manage.py create_partitions` keeps extending them
+MONTHS_AHEAD = 3
+
+FK_SUFFIX = '_fk_%(to_table)s_%(to_column)s'
+
+
+def _rebuild(apps, schema_editor, partitioned):
+    """
+    Rebuild each table as a partitioned (or, when reversing, plain) table: create the new
+    table next to the old one, copy the rows, drop the old table, then recreate the
+    indexes and outgoing foreign keys. Postgres requires the partition key in the primary
+    key, so the partitioned tables use (id, date_created).
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+
+    with connection.cursor() as cursor:
+        for model_name in PARTITIONED_MODELS:
+            model = apps.get_model('emergencies', model_name)
+            table = model._meta.db_table
+            old = f'{table}_old'
+
+            cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+            cursor.execute(f'ALTER TABLE "{old}" RENAME CONSTRAINT "{table}_pkey" TO "{old}_pkey"')
+            if partitioned:
+                cursor.execute(
+                    f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+                    f'PARTITION BY RANGE (date_created)'
+                )
+                cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY (id, date_created)')
+                cursor.execute(f'SELECT MIN(date_created), MAX(date_created) FROM "{old}"')
+                oldest, newest = cursor.fetchone()
+                last = add_months(month_start(timezone.now()), MONTHS_AHEAD)
+                create_default_partition(cursor, table)
+                ensure_partitions(connection, oldest or timezone.now(), max(last, newest or last), tables=[table])
+            else:
+                cursor.execute(f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+                cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{table}_pkey" PRIMARY KEY (id)')
+
+            cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+            # Also drops the partitions of the old table when reversing
+            cursor.execute(f'DROP TABLE "{old}" CASCADE')
+
+            for statement in schema_editor._model_indexes_sql(model):
+                schema_editor.execute(statement)
+            for field in model._meta.local_fields:
+                if field.remote_field and field.db_constraint:
+                    schema_editor.execute(schema_editor._create_fk_sql(model, field, FK_SUFFIX))
+
+
+def partition_tables(apps, schema_editor):
+    _rebuild(apps, schema_editor, partitioned=True)
+
+
+def unpartition_tables(apps, schema_editor):
+    _rebuild(apps, schema_editor, partitioned=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emergencies', '0004_emergencychange'),
+    ]
+
+    operations = [
+        # A partitioned table's unique keys must include the partition key, so (id) alone
+        # cannot be referenced by a foreign key constraint any more. The ORM still cascades.
+        migrations.AlterField(
+            model_name='emergencyverification',
+            name='report',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='emergencies.emergencyreport'),
+        ),
+        migrations.AlterField(
+            model_name='userevaluation',
+            name='report',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='emergencies.emergencyreport'),
+        ),
+        migrations.RunPython(partition_tables, unpartition_tables),
+    ]
@@ -0,0 +1,113 @@
+# Analytics rollups per (day, emergency type, status) and (day, agency), seeded from the existing reports
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+OPEN_STATUSES = ('Pending', 'Responding', 'Responded')
+
+
+def seed_rollups(apps, schema_editor):
+    EmergencyReport = apps.get_model('emergencies', 'EmergencyReport')
+    ArchivedReport = apps.get_model('emergencies', 'ArchivedReport')
+    ReportDailyRollup = apps.get_model('emergencies', 'ReportDailyRollup')
+    AgencyDailyRollup = apps.get_model('emergencies', 'AgencyDailyRollup')
+    AgencyEmergencyType = apps.get_model('agencies', 'AgencyEmergencyType')
+
+    groups = Counter()
+    for model in (EmergencyReport, ArchivedReport):
+        rows = (
+            model.objects.annotate(day=TruncDate('date_created'))
+            .values_list('day', 'emergency_type_id', 'status', 'verification_status')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        for day, emergency_type_id, status, verification_status, count in rows:
+            if emergency_type_id is not None:
+                groups[(day, emergency_type_id, status, verification_status)] += count
+
+    agencies_by_type = defaultdict(list)
+    for agency_id, emergency_type_id in AgencyEmergencyType.objects.values_list('agency_id', 'emergency_type_id'):
+        agencies_by_type[emergency_type_id].append(agency_id)
+
+    type_rows, agency_rows = defaultdict(Counter), defaultdict(Counter)
+    for (day, emergency_type_id, status, verification_status), count in groups.items():
+        verified = count if verification_status == 'Verified' else 0
+        type_rows[(day, emergency_type_id, status)].update({
+            'reports': count,
+            'verified': verified,
+            'low_confidence': count if verification_status == 'Low confidence' else 0,
+        })
+        for agency_id in agencies_by_type[emergency_type_id]:
+            agency_rows[(day, agency_id)].update({
+                'reports': count,
+                'open': count if status in OPEN_STATUSES else 0,
+                'resolved': count if status == 'Resolved' else 0,
+                'dismissed': count if status == 'Dismissed' else 0,
+                'verified': verified,
+            })
+
+    ReportDailyRollup.objects.bulk_create([
+        ReportDailyRollup(day=day, emergency_type_id=emergency_type_id, status=status, **counts)
+        for (day, emergency_type_id, status), counts in type_rows.items()
+    ], batch_size=1000)
+    AgencyDailyRollup.objects.bulk_create([
+        AgencyDailyRollup(day=day, agency_id=agency_id, **counts)
+        for (day, agency_id), counts in agency_rows.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agencies', '0002_alter_agency_logo_url'),
+        ('emergencies', '0006_archivedreport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedreport',
+            name='emergency_type_id',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedreport',
+            name='verification_status',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ReportDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('reports', models.IntegerField(default=0)),
+                ('verified', models.IntegerField(default=0)),
+                ('low_confidence', models.IntegerField(default=0)),
+                ('emergency_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='emergencies.emergencytype')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'emergency_type', 'status'), name='unique_report_daily_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AgencyDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('reports', models.IntegerField(default=0)),
+                ('open', models.IntegerField(default=0)),
+                ('resolved', models.IntegerField(default=0)),
+                ('dismissed', models.IntegerField(default=0)),
+                ('verified', models.IntegerField(default=0)),
+                ('agency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='agencies.agency')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'agency'), name='unique_agency_daily_rollup')],
+            },
+        ),
+        migrations.RunPython(seed_rollups, migrations.RunPython.noop),
+    ]
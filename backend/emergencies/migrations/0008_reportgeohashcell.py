@@ -0,0 +1,60 @@
+# Heatmap report counts per day and geohash cell, seeded from the existing reports
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+from core.services import geohash
+
+
+def seed_cells(apps, schema_editor):
+    EmergencyReport = apps.get_model('emergencies', 'EmergencyReport')
+    ReportGeohashCell = apps.get_model('emergencies', 'ReportGeohashCell')
+    precisions = settings.HEATMAP_PRECISIONS
+
+    cells = Counter()
+    points = EmergencyReport.objects.values_list('date_created', 'latitude', 'longitude').order_by()
+    for date_created, latitude, longitude in points.iterator(chunk_size=5000):
+        finest = geohash.encode(latitude, longitude, max(precisions))
+        for precision in precisions:
+            cells[(timezone.localdate(date_created), precision, finest[:precision])] += 1
+
+    ReportGeohashCell.objects.bulk_create([
+        ReportGeohashCell(day=day, precision=precision, geohash=cell, reports=count)
+        for (day, precision, cell), count in cells.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emergencies', '0007_report_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedreport',
+            name='latitude',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedreport',
+            name='longitude',
+            field=models.FloatField(null=True),
+        ),
+        migrations.CreateModel(
+            name='ReportGeohashCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('precision', models.PositiveSmallIntegerField()),
+                ('geohash', models.CharField(max_length=12)),
+                ('reports', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('precision', 'geohash', 'day'), name='unique_report_geohash_cell')],
+            },
+        ),
+        migrations.RunPython(seed_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Geohash column on reports, the spatial index behind the map clustering endpoint
+from django.db import migrations
+
+import core.fields
+from core.services import geohash
+
+
+def backfill_geohash(apps, schema_editor):
+    EmergencyReport = apps.get_model('emergencies', 'EmergencyReport')
+    batch = []
+    for report in EmergencyReport.objects.only('id', 'latitude', 'longitude').iterator(chunk_size=5000):
+        report.geohash = geohash.encode(report.latitude, report.longitude, 9)
+        batch.append(report)
+        if len(batch) == 5000:
+            EmergencyReport.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    EmergencyReport.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emergencies', '0008_reportgeohashcell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emergencyreport',
+            name='geohash',
+            field=core.fields.GeohashField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
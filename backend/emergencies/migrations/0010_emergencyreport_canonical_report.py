@@ -0,0 +1,18 @@
+# Link from a duplicate report to the first report of its incident
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emergencies', '0009_emergencyreport_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emergencyreport',
+            name='canonical_report',
+            field=models.ForeignKey(blank=True, db_constraint=False, help_text='The first report of the incident this report duplicates.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='duplicates', to='emergencies.emergencyreport'),
+        ),
+    ]
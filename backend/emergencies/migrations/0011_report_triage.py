@@ -0,0 +1,80 @@
+# Triage queue: emergency type severity, report vote/duplicate counts and stored priority, seeded from the existing rows
+from datetime import datetime, timezone
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+
+PRIORITY_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def seed_triage(apps, schema_editor):
+    EmergencyType = apps.get_model('emergencies', 'EmergencyType')
+    EmergencyReport = apps.get_model('emergencies', 'EmergencyReport')
+    EmergencyVerification = apps.get_model('emergencies', 'EmergencyVerification')
+
+    severities = dict(EmergencyType.objects.values_list('id', 'severity'))
+    votes = {
+        row['report_id']: row['yes_votes'] - row['no_votes']
+        for row in EmergencyVerification.objects.values('report_id').annotate(
+            yes_votes=Count('id', filter=Q(vote=True)), no_votes=Count('id', filter=Q(vote=False))
+        ).order_by()
+    }
+    duplicates = dict(
+        EmergencyReport.objects.filter(canonical_report__isnull=False)
+        .values_list('canonical_report_id').annotate(count=Count('id')).order_by()
+    )
+
+    batch = []
+    for report in EmergencyReport.objects.only('id', 'emergency_type_id', 'date_created').iterator(chunk_size=5000):
+        report.vote_score = votes.get(report.id, 0)
+        report.duplicate_count = duplicates.get(report.id, 0)
+        hours = (report.date_created - PRIORITY_EPOCH).total_seconds() / 3600
+        report.priority = (
+            settings.TRIAGE_SEVERITY_WEIGHT * severities[report.emergency_type_id]
+            + settings.TRIAGE_VOTE_WEIGHT * report.vote_score
+            + settings.TRIAGE_DUPLICATE_WEIGHT * report.duplicate_count
+            - settings.TRIAGE_AGE_WEIGHT * hours
+        )
+        batch.append(report)
+        if len(batch) == 5000:
+            EmergencyReport.objects.bulk_update(batch, ['vote_score', 'duplicate_count', 'priority'])
+            batch = []
+    EmergencyReport.objects.bulk_update(batch, ['vote_score', 'duplicate_count', 'priority'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emergencies', '0010_emergencyreport_canonical_report'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emergencytype',
+            name='severity',
+            field=models.PositiveSmallIntegerField(default=3, help_text='Triage weight of the type, from 1 (minor) to 5 (life-threatening).', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.AddField(
+            model_name='emergencyreport',
+            name='vote_score',
+            field=models.IntegerField(default=0, help_text='Confirming minus disputing verification votes.'),
+        ),
+        migrations.AddField(
+            model_name='emergencyreport',
+            name='duplicate_count',
+            field=models.PositiveIntegerField(default=0, help_text='Reports linked to this one as duplicates.'),
+        ),
+        migrations.AddField(
+            model_name='emergencyreport',
+            name='priority',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(seed_triage, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='emergencyreport',
+            index=models.Index(F('priority').desc(), condition=models.Q(('responder__isnull', True), ('status', 'Pending')), name='report_triage_queue_idx'),
+        ),
+    ]
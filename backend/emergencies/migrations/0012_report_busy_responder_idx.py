@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emergencies', '0011_report_triage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emergencyreport',
+            index=models.Index(condition=models.Q(('status', 'Responding')), fields=['responder'], name='report_busy_responder_idx'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Full-text and trigram search over report details (Postgres only, see emergencies/search.py)
+from django.db import DatabaseError, migrations, transaction
+
+
+TABLE = 'emergencies_emergencyreport'
+# As in emergencies/search.py
+VECTOR_COLUMN = 'details_search'
+SEARCH_CONFIG = 'simple'
+
+ADD_SEARCH = [
+    f'ALTER TABLE "{TABLE}" ADD COLUMN "{VECTOR_COLUMN}" tsvector',
+    f"""
+    CREATE FUNCTION report_details_search_update() RETURNS trigger AS $$
+    BEGIN
+        NEW."{VECTOR_COLUMN}" := to_tsvector('{SEARCH_CONFIG}', COALESCE(NEW.details, ''));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    # Row triggers on a partitioned table are cloned to every partition, including those
+    # attached later by `manage.py create_partitions`
+    f"""
+    CREATE TRIGGER report_details_search BEFORE INSERT OR UPDATE OF details ON "{TABLE}"
+    FOR EACH ROW EXECUTE FUNCTION report_details_search_update()
+    """,
+    f"""UPDATE "{TABLE}" SET "{VECTOR_COLUMN}" = to_tsvector('{SEARCH_CONFIG}', COALESCE(details, ''))""",
+    f'CREATE INDEX report_details_search_idx ON "{TABLE}" USING GIN ("{VECTOR_COLUMN}")',
+]
+
+# Matches the UPPER(details) LIKE UPPER(...) of the ORM's icontains lookup
+ADD_TRIGRAM_INDEX = f'CREATE INDEX report_details_trgm_idx ON "{TABLE}" USING GIN (UPPER(details) gin_trgm_ops)'
+
+REMOVE_SEARCH = [
+    'DROP INDEX IF EXISTS report_details_trgm_idx',
+    'DROP INDEX report_details_search_idx',
+    f'DROP TRIGGER report_details_search ON "{TABLE}"',
+    'DROP FUNCTION report_details_search_update()',
+    f'ALTER TABLE "{TABLE}" DROP COLUMN "{VECTOR_COLUMN}"',
+]
+
+
+def _execute(schema_editor, statements):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def add_search(apps, schema_editor):
+    _execute(schema_editor, ADD_SEARCH)
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # pg_trgm ships with the official Postgres images and is trusted, so the database owner
+    # may create it, but a server built without contrib, or a role without CREATE on the
+    # database, cannot. Search then matches whole words only (see emergencies/search.py).
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except DatabaseError:
+        return
+    schema_editor.execute(ADD_TRIGRAM_INDEX)
+
+
+def remove_search(apps, schema_editor):
+    _execute(schema_editor, REMOVE_SEARCH)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emergencies', '0012_report_busy_responder_idx'),
+    ]
+
+    operations = [
+        # pg_trgm is left installed when reversing; other objects may use it by then
+        migrations.RunPython(add_search, remove_search),
+    ]
@@ -1,15 +1,26 @@
 from django.db import models
 import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
 from django.conf import settings
-from django.db.models import Count, Q
-from django.db.models.signals import post_save
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.core.mail import send_mail
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.utils import timezone
+from core.fields import GeohashField
 
 class EmergencyType(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
     icon_type = models.CharField(max_length=100)
+    severity = models.PositiveSmallIntegerField(
+        default=3,
+        validators=[MinValueValidator(1), MaxValueValidator(5)],
+        help_text="Triage weight of the type, from 1 (minor) to 5 (life-threatening)."
+    )
 
     def __str__(self):
         return self.name
@@ -34,6 +45,8 @@ class EmergencyReport(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     longitude = models.FloatField()
     latitude = models.FloatField()
+    # Spatial index for the map endpoints, derived from latitude/longitude on save
+    geohash = GeohashField()
     details = models.TextField(null=True, blank=True)
     verification_status = models.CharField(
         max_length=20,
@@ -55,10 +68,50 @@ class EmergencyReport(models.Model):
         related_name='assigned_reports',
         help_text="The responder assigned to this emergency report."
     )
+    # Earlier report of the same incident, linked at ingest by emergencies.duplicates.
+    # No database constraint: the table is range-partitioned on Postgres (see migration 0005)
+    canonical_report = models.ForeignKey(
+        'self',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicates',
+        db_constraint=False,
+        help_text="The first report of the incident this report duplicates."
+    )
+    # Triage queue state, maintained by emergencies.triage
+    vote_score = models.IntegerField(default=0, help_text="Confirming minus disputing verification votes.")
+    duplicate_count = models.PositiveIntegerField(default=0, help_text="Reports linked to this one as duplicates.")
+    priority = models.FloatField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # The triage queue: pending unassigned reports, highest priority first
+            models.Index(
+                F('priority').desc(),
+                name='report_triage_queue_idx',
+                condition=Q(status='Pending', responder__isnull=True),
+            ),
+            # Responders' current assignments, loaded by responders.dispatch
+            models.Index(
+                fields=['responder'],
+                name='report_busy_responder_idx',
+                condition=Q(status='Responding'),
+            ),
+        ]
 
     def __str__(self):
         return f"Emergency Report {self.id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Values as loaded, so the rollup receivers can tell what a save changed
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if value is not models.DEFERRED
+        }
+        return instance
+
     def update_verification_status(self):
         """
         Updates the verification status of the report based on the votes in EmergencyVerification.
@@ -73,11 +126,58 @@ class EmergencyReport(models.Model):
         else:
             self.verification_status = 'Unverified'
 
-        self.save()
+        from .triage import vote_priority
+        # Incremented in the database, and only the fields changed here are saved, so
+        # concurrent changes to the priority and duplicate_count are kept
+        self.priority = vote_priority(yes_votes - no_votes)
+        self.vote_score = yes_votes - no_votes
+        self.save(update_fields=['verification_status', 'vote_score', 'priority'])
+        # Deferred again, so it is reloaded if read
+        del self.priority
+
+    @classmethod
+    def bulk_update_verification_status(cls, report_ids):
+        """
+        Recompute verification_status for many reports with one aggregate query.
+        Used after bulk inserts, which bypass EmergencyVerification.save().
+        """
+        votes = (
+            EmergencyVerification.objects.filter(report_id__in=report_ids)
+            .values('report_id')
+            .annotate(yes_votes=Count('id', filter=Q(vote=True)), no_votes=Count('id', filter=Q(vote=False)))
+        )
+        votes_by_report = {row['report_id']: row for row in votes}
+
+        # The rollup key fields are loaded too so the rollups can be adjusted without another query
+        reports = list(
+            cls.objects.filter(id__in=report_ids)
+            .only(
+                'id', 'verification_status', 'vote_score', 'status', 'emergency_type_id', 'date_created',
+                'latitude', 'longitude'
+            )
+        )
+        from .triage import vote_priority
+        for report in reports:
+            row = votes_by_report.get(report.id, {})
+            if row.get('yes_votes'):
+                report.verification_status = 'Verified'
+            elif row.get('no_votes'):
+                report.verification_status = 'Low confidence'
+            else:
+                report.verification_status = 'Unverified'
+            vote_score = row.get('yes_votes', 0) - row.get('no_votes', 0)
+            report.priority = vote_priority(vote_score)
+            report.vote_score = vote_score
+        cls.objects.bulk_update(reports, ['verification_status', 'vote_score', 'priority'])
+        EmergencyChange.record(EmergencyChange.REPORT, [report.id for report in reports])
+
+        from .rollups import record_report_updates
+        record_report_updates(reports)
 
 class EmergencyVerification(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    report = models.ForeignKey(EmergencyReport, on_delete=models.CASCADE)
+    # No database constraint: EmergencyReport is range-partitioned on Postgres (see migration 0005)
+    report = models.ForeignKey(EmergencyReport, on_delete=models.CASCADE, db_constraint=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     vote = models.BooleanField(null=True)
     details = models.TextField(null=True, blank=True)
@@ -113,7 +213,8 @@ class UserEvaluation(models.Model):
     ]
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    report = models.ForeignKey(EmergencyReport, on_delete=models.CASCADE)
+    # No database constraint: EmergencyReport is range-partitioned on Postgres (see migration 0005)
+    report = models.ForeignKey(EmergencyReport, on_delete=models.CASCADE, db_constraint=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     stars = models.IntegerField(choices=STARS_CHOICES)
     did_app_guide_clearly = models.CharField(max_length=20, choices=APP_GUIDE_CHOICES)
@@ -124,3 +225,179 @@ class UserEvaluation(models.Model):
 
     def __str__(self):
         return f"Evaluation for {self.report.id}"
+
+
+class EmergencyChange(models.Model):
+    """
+    Append-only log of report and verification changes used by delta sync.
+    The auto-incrementing id is the cursor clients pass back as ?since=.
+    """
+    REPORT = 'report'
+    VERIFICATION = 'verification'
+    KIND_CHOICES = [
+        (REPORT, 'Report'),
+        (VERIFICATION, 'Verification'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.UUIDField()
+    deleted = models.BooleanField(default=False)
+    date_created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['kind', 'object_id'])]
+
+    def __str__(self):
+        return f"Change {self.id}: {self.kind} {self.object_id}{' (deleted)' if self.deleted else ''}"
+
+    @classmethod
+    def record(cls, kind, object_ids, deleted=False):
+        """
+        Log changes for rows written without save()/delete(), e.g. bulk_create or bulk_update.
+        """
+        cls.objects.bulk_create([cls(kind=kind, object_id=object_id, deleted=deleted) for object_id in object_ids])
+
+    @classmethod
+    def settled_before(cls):
+        """
+        Entries logged before this time are settled: every entry with a lower id is visible.
+
+        An id is taken when its entry is inserted but only becomes visible when the
+        transaction commits, so a transaction still open may hold an id below entries that
+        are already readable. SYNC_VISIBILITY_LAG_SECONDS must exceed the longest
+        transaction that logs changes.
+        """
+        return timezone.now() - timedelta(seconds=settings.SYNC_VISIBILITY_LAG_SECONDS)
+
+    @classmethod
+    def settled_cursor(cls, entries, cursor):
+        """
+        The cursor to resume from after reading `entries`, (id, date_created) pairs in id
+        order that follow `cursor`. It stops before the first entry that is not settled, and
+        the entries after it are read again next time.
+        """
+        cutoff = cls.settled_before()
+        for entry_id, date_created in entries:
+            if date_created > cutoff:
+                break
+            cursor = entry_id
+        return cursor
+
+
+class ArchivedReport(models.Model):
+    """
+    Thin index of a closed report moved to cold storage by `manage.py archive_reports`.
+    The full report, with its verifications and evaluations, is the gzip member at
+    offset/length in archive_file (relative to settings.ARCHIVE_ROOT).
+    """
+    id = models.UUIDField(primary_key=True, editable=False)  # id of the archived report
+    status = models.CharField(max_length=20)
+    # Kept so the analytics rollups can still be rebuilt for archived days
+    emergency_type_id = models.UUIDField(null=True)
+    verification_status = models.CharField(max_length=20, blank=True)
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    date_created = models.DateTimeField()
+    date_archived = models.DateTimeField(auto_now_add=True)
+    archive_file = models.CharField(max_length=255)
+    offset = models.BigIntegerField()
+    length = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"Archived report {self.id} ({self.archive_file})"
+
+
+class ReportDailyRollup(models.Model):
+    """
+    Report counts per day (in settings.TIME_ZONE), emergency type and status, maintained
+    incrementally by emergencies.rollups. `manage.py reconcile_rollups` rebuilds them.
+    """
+    day = models.DateField()
+    emergency_type = models.ForeignKey(EmergencyType, on_delete=models.CASCADE)
+    status = models.CharField(max_length=20)
+    reports = models.IntegerField(default=0)
+    verified = models.IntegerField(default=0)
+    low_confidence = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'emergency_type', 'status'], name='unique_report_daily_rollup')
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.emergency_type_id} {self.status}: {self.reports}"
+
+
+class AgencyDailyRollup(models.Model):
+    """
+    Report counts per day and agency, where an agency counts the reports of the emergency
+    types it handles (AgencyEmergencyType). Maintained like ReportDailyRollup.
+    """
+    day = models.DateField()
+    agency = models.ForeignKey('agencies.Agency', on_delete=models.CASCADE)
+    reports = models.IntegerField(default=0)
+    open = models.IntegerField(default=0)
+    resolved = models.IntegerField(default=0)
+    dismissed = models.IntegerField(default=0)
+    verified = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'agency'], name='unique_agency_daily_rollup')
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.agency_id}: {self.reports}"
+
+
+class ReportGeohashCell(models.Model):
+    """
+    Report counts per day and geohash cell, at each precision in settings.HEATMAP_PRECISIONS,
+    behind the heatmap endpoint. Maintained like ReportDailyRollup.
+    """
+    day = models.DateField()
+    precision = models.PositiveSmallIntegerField()
+    geohash = models.CharField(max_length=12)
+    reports = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['precision', 'geohash', 'day'], name='unique_report_geohash_cell')
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.geohash}: {self.reports}"
+
+
+_change_log_paused = ContextVar('change_log_paused', default=False)
+
+
+@contextmanager
+def pause_change_log():
+    """
+    Skip the per-row change log signals, for bulk jobs that call EmergencyChange.record themselves.
+    """
+    token = _change_log_paused.set(True)
+    try:
+        yield
+    finally:
+        _change_log_paused.reset(token)
+
+
+@receiver(post_save, sender=EmergencyReport)
+@receiver(post_save, sender=EmergencyVerification)
+def log_emergency_change(sender, instance, **kwargs):
+    if _change_log_paused.get():
+        return
+    kind = EmergencyChange.REPORT if sender is EmergencyReport else EmergencyChange.VERIFICATION
+    EmergencyChange.objects.create(kind=kind, object_id=instance.id)
+
+
+@receiver(post_delete, sender=EmergencyReport)
+@receiver(post_delete, sender=EmergencyVerification)
+def log_emergency_deletion(sender, instance, **kwargs):
+    if _change_log_paused.get():
+        return
+    kind = EmergencyChange.REPORT if sender is EmergencyReport else EmergencyChange.VERIFICATION
+    EmergencyChange.objects.create(kind=kind, object_id=instance.id, deleted=True)
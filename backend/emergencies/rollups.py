@@ -0,0 +1,282 @@
+"""
+Analytics rollups of reports, kept up to date incrementally.
+
+Every report contributes one count to ReportDailyRollup (day, emergency_type, status), to
+AgencyDailyRollup (day, agency) for each agency handling its emergency type, and to
+ReportGeohashCell (day, precision, geohash) for its cell at each HEATMAP_PRECISIONS. A save
+moves the report's contribution from its old key to its new one with F() increments, so
+the dashboards never scan EmergencyReport. Writes that bypass save() call
+record_report_inserts / record_report_updates, and rebuild_rollups recomputes any range
+from the reports themselves (see `manage.py reconcile_rollups`).
+"""
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connections, models, router, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from agencies.models import AgencyEmergencyType
+from core.services import geohash
+from .models import AgencyDailyRollup, ArchivedReport, EmergencyReport, ReportDailyRollup, ReportGeohashCell
+
+
+OPEN_STATUSES = ('Pending', 'Responding', 'Responded')
+
+STATE_FIELDS = ('date_created', 'emergency_type_id', 'status', 'verification_status', 'latitude', 'longitude')
+
+_rollups_paused = ContextVar('rollups_paused', default=False)
+
+
+@contextmanager
+def pause_rollups():
+    """
+    Skip the rollup signals, for jobs that keep the counts on purpose (archival) or
+    rebuild them afterwards (dataset generation).
+    """
+    token = _rollups_paused.set(True)
+    try:
+        yield
+    finally:
+        _rollups_paused.reset(token)
+
+
+def report_state(values):
+    """Rollup key fields of a report, or None when some were not loaded"""
+    if any(values.get(name) is None for name in STATE_FIELDS):
+        return None
+    return tuple(values[name] for name in STATE_FIELDS)
+
+
+def _current_values(report):
+    return {name: getattr(report, name) for name in STATE_FIELDS}
+
+
+def _day(moment):
+    return timezone.localdate(moment) if timezone.is_aware(moment) else moment.date()
+
+
+def _type_counts(status, verification_status, count=1):
+    return {
+        'reports': count,
+        'verified': count if verification_status == 'Verified' else 0,
+        'low_confidence': count if verification_status == 'Low confidence' else 0,
+    }
+
+
+def _agency_counts(status, verification_status, count=1):
+    return {
+        'reports': count,
+        'open': count if status in OPEN_STATUSES else 0,
+        'resolved': count if status == 'Resolved' else 0,
+        'dismissed': count if status == 'Dismissed' else 0,
+        'verified': count if verification_status == 'Verified' else 0,
+    }
+
+
+def _cells(latitude, longitude):
+    """(precision, geohash) of the heatmap cells containing a point"""
+    finest = geohash.encode(latitude, longitude, max(settings.HEATMAP_PRECISIONS))
+    return [(precision, finest[:precision]) for precision in settings.HEATMAP_PRECISIONS]
+
+
+def _increment(model, key_fields, deltas):
+    """
+    Add the deltas ({key tuple: Counter}) to the rollup rows of model, creating missing rows,
+    in one INSERT ... ON CONFLICT DO UPDATE statement (supported by Postgres and SQLite).
+    """
+    deltas = {key: counts for key, counts in deltas.items() if any(counts.values())}
+    if not deltas:
+        return
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    opts = model._meta
+    keys = [opts.get_field(name) for name in key_fields]
+    counters = [
+        field for field in opts.concrete_fields
+        if isinstance(field, models.IntegerField) and not field.primary_key and field not in keys
+    ]
+
+    rows, params = [], []
+    for key, counts in deltas.items():
+        rows.append('(' + ', '.join(['%s'] * (len(keys) + len(counters))) + ')')
+        params.extend(field.get_db_prep_value(value, connection) for field, value in zip(keys, key))
+        params.extend(counts.get(field.name, 0) for field in counters)
+    table = quote(opts.db_table)
+    sql = (
+        f'INSERT INTO {table} ({", ".join(quote(field.column) for field in keys + counters)}) '
+        f'VALUES {", ".join(rows)} '
+        f'ON CONFLICT ({", ".join(quote(field.column) for field in keys)}) DO UPDATE SET '
+        + ', '.join(f'{quote(field.column)} = {table}.{quote(field.column)} + EXCLUDED.{quote(field.column)}' for field in counters)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def apply_changes(changes):
+    """
+    Apply report state changes to the rollups. Each change is an (old, new) pair of
+    report_state() tuples, with None for an insert's old or a deletion's new state.
+    """
+    # Deltas per (day, emergency_type, status), per (day, emergency_type) for the agencies
+    # and per (day, precision, geohash)
+    type_deltas, agency_type_deltas, cell_deltas = defaultdict(Counter), defaultdict(Counter), defaultdict(Counter)
+    for old, new in changes:
+        if old == new:
+            continue
+        for state, sign in ((old, -1), (new, 1)):
+            if state is not None:
+                date_created, emergency_type_id, status, verification_status, latitude, longitude = state
+                day = _day(date_created)
+                type_deltas[(day, emergency_type_id, status)].update(_type_counts(status, verification_status, sign))
+                agency_type_deltas[(day, emergency_type_id)].update(_agency_counts(status, verification_status, sign))
+                for precision, cell in _cells(latitude, longitude):
+                    cell_deltas[(day, precision, cell)]['reports'] += sign
+    _increment(ReportGeohashCell, ('day', 'precision', 'geohash'), cell_deltas)
+    _increment(ReportDailyRollup, ('day', 'emergency_type', 'status'), type_deltas)
+
+    agency_type_deltas = {key: counts for key, counts in agency_type_deltas.items() if any(counts.values())}
+    if not agency_type_deltas:
+        return
+    agencies_by_type = defaultdict(list)
+    for agency_id, emergency_type_id in AgencyEmergencyType.objects.filter(
+        emergency_type_id__in={emergency_type_id for _, emergency_type_id in agency_type_deltas}
+    ).values_list('agency_id', 'emergency_type_id'):
+        agencies_by_type[emergency_type_id].append(agency_id)
+
+    agency_deltas = defaultdict(Counter)
+    for (day, emergency_type_id), counts in agency_type_deltas.items():
+        for agency_id in agencies_by_type[emergency_type_id]:
+            agency_deltas[(day, agency_id)].update(counts)
+
+    _increment(AgencyDailyRollup, ('day', 'agency'), agency_deltas)
+
+
+def record_report_inserts(reports):
+    """Count reports inserted without save(), e.g. with bulk_create"""
+    if _rollups_paused.get():
+        return
+    apply_changes([(None, report_state(_current_values(report))) for report in reports])
+    for report in reports:
+        report._loaded_values = _current_values(report)
+
+
+def record_report_updates(reports):
+    """Move the counts of reports updated without save(), e.g. with bulk_update"""
+    if _rollups_paused.get():
+        return
+    changes = []
+    for report in reports:
+        old = report_state(getattr(report, '_loaded_values', {}))
+        if old is not None:
+            changes.append((old, report_state(_current_values(report))))
+        report._loaded_values = _current_values(report)
+    apply_changes(changes)
+
+
+@receiver(pre_save, sender=EmergencyReport)
+def capture_report_state(sender, instance, raw=False, **kwargs):
+    """Read the stored state of reports whose rollup fields were not all loaded"""
+    if raw or _rollups_paused.get() or instance._state.adding:
+        return
+    if report_state(getattr(instance, '_loaded_values', {})) is None:
+        instance._loaded_values = (
+            EmergencyReport.objects.filter(id=instance.id).values(*STATE_FIELDS).first() or {}
+        )
+
+
+@receiver(post_save, sender=EmergencyReport)
+def update_report_rollups(sender, instance, created, raw=False, **kwargs):
+    if raw or _rollups_paused.get():
+        return
+    old = None if created else report_state(getattr(instance, '_loaded_values', {}))
+    new = _current_values(instance)
+    apply_changes([(old, report_state(new))])
+    instance._loaded_values = new
+
+
+@receiver(post_delete, sender=EmergencyReport)
+def remove_report_from_rollups(sender, instance, **kwargs):
+    if _rollups_paused.get():
+        return
+    apply_changes([(report_state(_current_values(instance)), None)])
+
+
+def rebuild_rollups(start=None, end=None):
+    """
+    Recompute the rollups of the days from start to end (inclusive, None for unbounded)
+    from the reports, including archived ones, replacing the stored rows. Returns the
+    number of ReportDailyRollup, AgencyDailyRollup and ReportGeohashCell rows written. Counts changed by
+    saves while it runs can be lost, so run it when traffic is low.
+    """
+    def day_range(queryset):
+        if start is not None:
+            queryset = queryset.filter(day__gte=start)
+        if end is not None:
+            queryset = queryset.filter(day__lte=end)
+        return queryset
+
+    def date_created_range(queryset):
+        # Filter on the column itself so the date_created index (and partition pruning) applies
+        if start is not None:
+            queryset = queryset.filter(date_created__gte=timezone.make_aware(datetime.combine(start, time.min)))
+        if end is not None:
+            queryset = queryset.filter(date_created__lt=timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)))
+        return queryset
+
+    groups, cells = Counter(), Counter()
+    for model in (EmergencyReport, ArchivedReport):
+        points = (
+            date_created_range(model.objects.filter(latitude__isnull=False, longitude__isnull=False))
+            .values_list('date_created', 'latitude', 'longitude')
+            .order_by()
+        )
+        for date_created, latitude, longitude in points.iterator(chunk_size=5000):
+            day = _day(date_created)
+            for precision, cell in _cells(latitude, longitude):
+                cells[(day, precision, cell)] += 1
+
+        rows = (
+            date_created_range(model.objects.all())
+            .annotate(day=TruncDate('date_created'))
+            .values_list('day', 'emergency_type_id', 'status', 'verification_status')
+            .annotate(count=Count('id'))
+            .order_by()
+        )
+        for day, emergency_type_id, status, verification_status, count in rows:
+            if emergency_type_id is not None:
+                groups[(day, emergency_type_id, status, verification_status)] += count
+
+    agencies_by_type = defaultdict(list)
+    for agency_id, emergency_type_id in AgencyEmergencyType.objects.values_list('agency_id', 'emergency_type_id'):
+        agencies_by_type[emergency_type_id].append(agency_id)
+
+    type_rows, agency_rows = defaultdict(Counter), defaultdict(Counter)
+    for (day, emergency_type_id, status, verification_status), count in groups.items():
+        type_rows[(day, emergency_type_id, status)].update(_type_counts(status, verification_status, count))
+        for agency_id in agencies_by_type[emergency_type_id]:
+            agency_rows[(day, agency_id)].update(_agency_counts(status, verification_status, count))
+
+    with transaction.atomic():
+        day_range(ReportDailyRollup.objects.all()).delete()
+        day_range(AgencyDailyRollup.objects.all()).delete()
+        day_range(ReportGeohashCell.objects.all()).delete()
+        ReportDailyRollup.objects.bulk_create([
+            ReportDailyRollup(day=day, emergency_type_id=emergency_type_id, status=status, **counts)
+            for (day, emergency_type_id, status), counts in type_rows.items()
+        ], batch_size=1000)
+        AgencyDailyRollup.objects.bulk_create([
+            AgencyDailyRollup(day=day, agency_id=agency_id, **counts)
+            for (day, agency_id), counts in agency_rows.items()
+        ], batch_size=1000)
+        ReportGeohashCell.objects.bulk_create([
+            ReportGeohashCell(day=day, precision=precision, geohash=cell, reports=count)
+            for (day, precision, cell), count in cells.items()
+        ], batch_size=1000)
+    return len(type_rows), len(agency_rows), len(cells)
@@ -0,0 +1,99 @@
+"""
+Search over report details.
+
+On Postgres, migration 0013 gives the report table a `details_search` tsvector column that a
+trigger keeps equal to to_tsvector('simple', details), with a GIN index on it, and a pg_trgm
+GIN index on UPPER(details). The column is not a model field, so the ORM never loads or
+writes it. The 'simple' configuration lowercases words but does not stem them: reports mix
+English and Filipino, and English stemming would mangle the Filipino words.
+
+A report matches a search when either of these holds:
+
+- its details match the search as a websearch query: words, "quoted phrases", OR, -word;
+- every word of at least MIN_SUBSTRING_LENGTH characters appears somewhere in its details,
+  which finds partial words ("flood" in "flooding"). The trigram index answers these
+  substring matches, and the ORM's icontains is already written as UPPER(details) LIKE,
+  which is the form that index covers. Migration 0013 skips that index where pg_trgm cannot
+  be created, and search then only does the full-text match: without the index, the
+  substring match would read every report in the window.
+
+Matches are ranked by ts_rank_cd, so substring-only matches rank 0, and ties go to the newest
+report. Both indexes are bitmap-scanned and combined before the status and type filters
+apply, so the cost of a search grows with its matches, not with the table.
+
+Other databases (SQLite in development) only do the substring match, unranked and newest
+first.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+VECTOR_COLUMN = 'details_search'
+TRIGRAM_INDEX = 'report_details_trgm_idx'
+SEARCH_CONFIG = 'simple'
+# Shorter strings have no trigrams, and the index cannot narrow a LIKE on them
+MIN_SUBSTRING_LENGTH = 3
+
+
+def _terms(text):
+    """(words, negated words) of a websearch query, without its operators"""
+    words, negated = [], []
+    for word in text.replace('"', ' ').split():
+        if word.startswith('-'):
+            if len(word) > 1:
+                negated.append(word[1:])
+        elif word.upper() != 'OR':
+            words.append(word)
+    return words, negated
+
+
+def _contains(words, negated):
+    return Q(*[Q(details__icontains=word) for word in words], *[~Q(details__icontains=word) for word in negated])
+
+
+_trigram_index = {}  # database alias -> whether migration 0013 created the trigram index
+
+
+def has_trigram_index(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    if connection.alias not in _trigram_index:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [TRIGRAM_INDEX])
+            _trigram_index[connection.alias] = cursor.fetchone()[0]
+    return _trigram_index[connection.alias]
+
+
+def _query(text):
+    return SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+
+
+def filter_reports(reports, text):
+    """reports matching text, in no particular order"""
+    words, negated = _terms(text)
+    connection = connections[reports.db]
+    if connection.vendor != 'postgresql':
+        match = _contains(words, negated)
+    else:
+        quote = connection.ops.quote_name
+        reports = reports.alias(search=RawSQL(
+            f'{quote(reports.model._meta.db_table)}.{quote(VECTOR_COLUMN)}', [], output_field=SearchVectorField()
+        ))
+        match = Q(search=_query(text))
+        substrings = [word for word in words if len(word) >= MIN_SUBSTRING_LENGTH]
+        if substrings and has_trigram_index(connection):
+            match |= _contains(substrings, negated)
+    # Only negated words would match nearly every report, without an index
+    return reports.filter(match) if words else reports.none()
+
+
+def search_reports(reports, text):
+    """reports matching text, annotated with their rank and best matches first"""
+    reports = filter_reports(reports, text)
+    if connections[reports.db].vendor != 'postgresql':
+        return reports.annotate(rank=Value(0.0, output_field=FloatField())).order_by('-date_created')
+    return reports.annotate(
+        rank=SearchRank(F('search'), _query(text), cover_density=True)
+    ).order_by('-rank', '-date_created')
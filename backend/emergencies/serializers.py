@@ -1,13 +1,14 @@
 from rest_framework import serializers
+from core.serializers import TimedSerializerMixin
 from .models import EmergencyType, EmergencyReport, EmergencyVerification, UserEvaluation
 from core.services.file_service import FileService
 
-class EmergencyTypeSerializer(serializers.ModelSerializer):
+class EmergencyTypeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = EmergencyType
-        fields = ['id', 'name', 'icon_type']
+        fields = ['id', 'name', 'icon_type', 'severity']
 
-class EmergencyReportSerializer(serializers.ModelSerializer):
+class EmergencyReportSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     image_base64 = serializers.CharField(
         write_only=True,
         required=False,
@@ -21,9 +22,12 @@ class EmergencyReportSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'emergency_type', 'user', 'longitude', 'latitude',
             'details', 'verification_status', 'status', 'image_url',
-            'image_base64', 'date_created'
+            'image_base64', 'date_created', 'canonical_report', 'vote_score', 'duplicate_count'
+        ]
+        read_only_fields = [
+            'id', 'user', 'verification_status', 'date_created', 'image_url', 'canonical_report',
+            'vote_score', 'duplicate_count'
         ]
-        read_only_fields = ['id', 'user', 'verification_status', 'date_created', 'image_url']
     
     def validate_longitude(self, value):
         # Philippines longitude range approximately: 116.93° to 126.34° E
@@ -60,10 +64,16 @@ class EmergencyReportSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
     
     def update(self, instance, validated_data):
-        """Override update to handle image upload"""
-        return super().update(instance, validated_data)
+        """Save only the fields sent, so concurrent increments of the triage counters are kept"""
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        update_fields = list(validated_data)
+        if {'latitude', 'longitude'} & validated_data.keys():
+            update_fields.append('geohash')
+        instance.save(update_fields=update_fields)
+        return instance
 
-class EmergencyVerificationSerializer(serializers.ModelSerializer):
+class EmergencyVerificationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     image_base64 = serializers.CharField(
         write_only=True,
         required=False,
@@ -106,7 +116,7 @@ class EmergencyVerificationSerializer(serializers.ModelSerializer):
             })
         return data
 
-class UserEvaluationSerializer(serializers.ModelSerializer):
+class UserEvaluationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = UserEvaluation
         fields = [
@@ -133,3 +143,45 @@ class UserEvaluationSerializer(serializers.ModelSerializer):
                 "improvement_suggestion": "Please provide improvement suggestions for low ratings"
             })
         return data
+
+
+class EmergencyReportSyncSerializer(EmergencyReportSerializer):
+    """
+    A queued report in a batch sync. The client-generated id makes retries idempotent,
+    and emergency types are resolved from context['emergency_types'] instead of one query per item.
+    """
+    id = serializers.UUIDField()
+    emergency_type = serializers.UUIDField()
+
+    class Meta(EmergencyReportSerializer.Meta):
+        read_only_fields = [
+            'user', 'verification_status', 'date_created', 'image_url', 'canonical_report',
+            'vote_score', 'duplicate_count'
+        ]
+
+    def validate_emergency_type(self, value):
+        emergency_type = self.context['emergency_types'].get(value)
+        if emergency_type is None:
+            raise serializers.ValidationError("Invalid emergency type.")
+        return emergency_type
+
+class EmergencyVerificationSyncSerializer(EmergencyVerificationSerializer):
+    """
+    A queued verification in a batch sync. The report may be an existing report or
+    one created earlier in the same batch, so it is accepted as a plain UUID here.
+    """
+    id = serializers.UUIDField()
+    report = serializers.UUIDField()
+
+    class Meta(EmergencyVerificationSerializer.Meta):
+        read_only_fields = ['user', 'date_created', 'image_url']
+
+class SyncBatchSerializer(TimedSerializerMixin, serializers.Serializer):
+    reports = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    verifications = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+
+    def validate(self, data):
+        max_items = self.context['max_items']
+        if len(data['reports']) + len(data['verifications']) > max_items:
+            raise serializers.ValidationError(f"A sync batch may contain at most {max_items} items.")
+        return data
@@ -0,0 +1,193 @@
+"""
+Offline sync: batch ingestion of reports and verifications queued on a device while it
+was offline, and delta reads of what changed since a client's last sync.
+"""
+from django.db import connection, transaction
+
+from .models import EmergencyType, EmergencyReport, EmergencyVerification, EmergencyChange
+from .rollups import record_report_inserts
+from .duplicates import assign_canonical, index_reports
+from .triage import record_duplicates, score_new_report
+from .serializers import (
+    EmergencyReportSerializer,
+    EmergencyVerificationSerializer,
+    EmergencyReportSyncSerializer,
+    EmergencyVerificationSyncSerializer
+)
+
+
+def _error_result(item, errors):
+    return {'id': str(item.get('id')) if item.get('id') else None, 'status': 'error', 'errors': errors}
+
+
+def _sanitize(item):
+    """Apply the same details sanitization as EmergencyReportList"""
+    item = dict(item)
+    if item.get('details'):
+        import bleach  # imported by the first report rather than at worker boot
+        item['details'] = bleach.clean(item['details'], tags=['b', 'i', 'u'], strip=True)
+    return item
+
+
+def _lock_ids(ids):
+    """
+    Hold a transaction-level advisory lock per client id, in a fixed order so batches
+    sharing ids cannot deadlock. The partitioned tables' primary key is (id, date_created),
+    so Postgres no longer rejects a second row with the same id; a concurrent retry of the
+    same batch waits here instead, then finds the ids the first one committed.
+    """
+    if connection.vendor != 'postgresql' or not ids:
+        return
+    keys = sorted({int.from_bytes(object_id.bytes[:8], 'big', signed=True) for object_id in ids})
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(key) FROM unnest(%s::bigint[]) AS key', [keys])
+
+
+def _new_items(user, valid_reports, valid_verifications):
+    """
+    Unsaved reports and verifications of a batch, keyed by id, marking the results of the
+    ids that were synced before, or repeated within the batch, as 'duplicate'
+    """
+    existing_reports = set(EmergencyReport.objects.filter(
+        id__in=[data['id'] for data, _ in valid_reports]
+    ).values_list('id', flat=True))
+    existing_verifications = set(EmergencyVerification.objects.filter(
+        id__in=[data['id'] for data, _ in valid_verifications]
+    ).values_list('id', flat=True))
+
+    new_reports = {}
+    for data, result in valid_reports:
+        if data['id'] in existing_reports or data['id'] in new_reports:
+            result['status'] = 'duplicate'
+        else:
+            new_reports[data['id']] = EmergencyReport(user=user, **data)
+
+    referenced = {data['report'] for data, _ in valid_verifications} - set(new_reports)
+    known_reports = set(EmergencyReport.objects.filter(id__in=referenced).values_list('id', flat=True))
+
+    new_verifications = {}
+    for data, result in valid_verifications:
+        if data['id'] in existing_verifications or data['id'] in new_verifications:
+            result['status'] = 'duplicate'
+        elif data['report'] not in known_reports and data['report'] not in new_reports:
+            result.update(status='error', errors={'report': ['Emergency report does not exist or failed validation.']})
+        else:
+            fields = {key: value for key, value in data.items() if key != 'report'}
+            new_verifications[data['id']] = EmergencyVerification(user=user, report_id=data['report'], **fields)
+    return new_reports, new_verifications
+
+
+def ingest_batch(user, reports, verifications):
+    """
+    Validate a batch of queued reports and verifications together and insert the valid
+    ones with bulk_create in a single transaction.
+
+    Items carry client-generated UUIDs: an id that already exists is reported as
+    'duplicate' so a device can safely retry a batch whose response it never received.
+    Verifications may reference reports created earlier in the same batch.
+
+    Returns per-item results in request order: {'reports': [...], 'verifications': [...]}.
+    """
+    report_results, verification_results = [], []
+    emergency_types = {emergency_type.id: emergency_type for emergency_type in EmergencyType.objects.all()}
+    context = {'emergency_types': emergency_types}
+
+    # Validate reports
+    valid_reports = []
+    for item in reports:
+        serializer = EmergencyReportSyncSerializer(data=_sanitize(item), context=context)
+        if serializer.is_valid():
+            result = {'id': str(serializer.validated_data['id']), 'status': 'created'}
+            valid_reports.append((serializer.validated_data, result))
+            report_results.append(result)
+        else:
+            report_results.append(_error_result(item, serializer.errors))
+
+    # Validate verifications
+    valid_verifications = []
+    for item in verifications:
+        serializer = EmergencyVerificationSyncSerializer(data=item, context=context)
+        if serializer.is_valid():
+            result = {'id': str(serializer.validated_data['id']), 'status': 'created'}
+            valid_verifications.append((serializer.validated_data, result))
+            verification_results.append(result)
+        else:
+            verification_results.append(_error_result(item, serializer.errors))
+
+    with transaction.atomic():
+        _lock_ids([data['id'] for data, _ in valid_reports] + [data['id'] for data, _ in valid_verifications])
+        new_reports, new_verifications = _new_items(user, valid_reports, valid_verifications)
+
+        # bulk_create skips the pre_save/post_save duplicate detection and triage receivers
+        for report in new_reports.values():
+            assign_canonical(report)
+            score_new_report(report)
+
+        EmergencyReport.objects.bulk_create(new_reports.values())
+        EmergencyVerification.objects.bulk_create(new_verifications.values())
+        EmergencyChange.record(EmergencyChange.REPORT, new_reports)
+        record_report_inserts(list(new_reports.values()))
+        record_duplicates(new_reports.values())
+        EmergencyChange.record(EmergencyChange.VERIFICATION, new_verifications)
+        affected = {verification.report_id for verification in new_verifications.values()}
+        if affected:
+            # bulk_create bypasses EmergencyVerification.save(), which normally does this
+            EmergencyReport.bulk_update_verification_status(affected)
+    index_reports(new_reports.values())
+
+    return {'reports': report_results, 'verifications': verification_results}
+
+
+def changes_since(since, limit):
+    """
+    Return the reports and verifications changed after the change-log cursor `since`.
+
+    At most `limit` log entries are read; a row changed several times in that window is
+    returned once, in its current state, and deleted rows come back as tombstone ids.
+    Clients pass the returned cursor as the next `since` and repeat while has_more is set.
+
+    Entries logged in the last SYNC_VISIBILITY_LAG_SECONDS are returned, but the cursor
+    stays before them (see EmergencyChange.settled_cursor), so the next read returns them
+    again along with any entry an older transaction committed in the meantime.
+    """
+    entries = list(
+        EmergencyChange.objects.filter(id__gt=since)
+        .order_by('id')
+        .values_list('id', 'kind', 'object_id', 'deleted', 'date_created')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    cursor = EmergencyChange.settled_cursor([(entry[0], entry[4]) for entry in entries], since)
+    # Unsettled entries are read again on the next sync, not straight away
+    has_more = has_more and cursor == entries[-1][0]
+
+    # The latest entry per row wins
+    latest = {}
+    for _, kind, object_id, deleted, _ in entries:
+        latest[(kind, object_id)] = deleted
+    changed = {EmergencyChange.REPORT: [], EmergencyChange.VERIFICATION: []}
+    deleted = {EmergencyChange.REPORT: set(), EmergencyChange.VERIFICATION: set()}
+    for (kind, object_id), is_deleted in latest.items():
+        if is_deleted:
+            deleted[kind].add(object_id)
+        else:
+            changed[kind].append(object_id)
+
+    reports = list(EmergencyReport.objects.filter(id__in=changed[EmergencyChange.REPORT]))
+    verifications = list(EmergencyVerification.objects.filter(id__in=changed[EmergencyChange.VERIFICATION]))
+    # Rows deleted after the last entry read are tombstones already
+    deleted[EmergencyChange.REPORT].update(set(changed[EmergencyChange.REPORT]) - {report.id for report in reports})
+    deleted[EmergencyChange.VERIFICATION].update(
+        set(changed[EmergencyChange.VERIFICATION]) - {verification.id for verification in verifications}
+    )
+
+    return {
+        'cursor': cursor,
+        'has_more': has_more,
+        'reports': EmergencyReportSerializer(reports, many=True).data,
+        'verifications': EmergencyVerificationSerializer(verifications, many=True).data,
+        'deleted': {
+            'reports': sorted(str(object_id) for object_id in deleted[EmergencyChange.REPORT]),
+            'verifications': sorted(str(object_id) for object_id in deleted[EmergencyChange.VERIFICATION]),
+        },
+    }
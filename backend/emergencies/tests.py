@@ -1,13 +1,37 @@
-from django.test import TestCase
+from django.test import AsyncClient, TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from accounts.models import User, UserProfile
-from .models import EmergencyReport, EmergencyVerification, EmergencyType
-from agencies.models import Agency  # Import Agency model
+from .models import (
+    EmergencyReport, EmergencyVerification, EmergencyType, UserEvaluation, ArchivedReport, EmergencyChange,
+    ReportDailyRollup, AgencyDailyRollup, ReportGeohashCell
+)
+from .rollups import rebuild_rollups
+from .serializers import EmergencyReportSerializer
+from .duplicates import distance_meters, recent_reports
+from .triage import rescore_reports
+from . import archive
+from .search import has_trigram_index
+from .sync import ingest_batch
+from agencies.models import Agency, AgencyEmergencyType  # Import Agency model
+from responders.models import Responder
 import uuid
+import gzip
+import json
+import tempfile
+from datetime import timedelta
+from django.core.management import call_command
+from django.utils import timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.db.models import F
 from rest_framework.exceptions import ErrorDetail, ValidationError
+from unittest import skipUnless
 from unittest.mock import patch
+from core.testing import QueryBudgetMixin
+from knox.models import AuthToken
+from asgiref.sync import sync_to_async
 
 class VerificationSystemTests(TestCase):
     def setUp(self):
@@ -316,3 +340,1057 @@ class EnhancedVerificationSystemTests(VerificationSystemTests):
         url = reverse('trigger-crowdsourcing-broadcast')
         response = self.client.post(url, {'report_id': str(self.report.id), 'range': 1.0}, format='json')
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+# Reports left by earlier tests could make the report below a duplicate, costing the
+# broadcast a query for the canonical report
+@override_settings(DUPLICATE_DETECTION_ENABLED=False)
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Query budgets stay constant no matter how many rows the views return."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='budget@example.com', password='pass')
+        self.emergency_type = EmergencyType.objects.create(name='Fire', icon_type='fire-icon')
+        for index in range(10):
+            neighbour = User.objects.create_user(email=f'neighbour{index}@example.com', password='pass')
+            UserProfile.objects.create(
+                user=neighbour,
+                full_name=f'Neighbour {index}',
+                authority_level='User',
+                contact_number='123',
+                date_of_birth='2000-01-01',
+                address='Test',
+                status='approved',
+                latitude=14.5995 + index * 0.001,
+                longitude=120.9842
+            )
+            EmergencyReport.objects.create(
+                emergency_type=self.emergency_type,
+                user=neighbour,
+                longitude=120.9842,
+                latitude=14.5995,
+                details='Budget test report'
+            )
+        self.report = EmergencyReport.objects.first()
+        self.client.force_authenticate(user=self.user)
+
+    def test_emergency_report_list_query_budget(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get(reverse('emergency-report-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 10)
+
+    def test_trigger_crowdsourcing_broadcast_query_budget(self):
+        url = reverse('trigger-crowdsourcing-broadcast')
+        with self.assertMaxQueries(3):
+            response = self.client.post(url, {'report_id': str(self.report.id), 'range': 5.0}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['users']), 10)
+
+class BatchSyncTests(QueryBudgetMixin, TestCase):
+    """Offline queues flushed through the batch sync endpoint."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='offline@example.com', password='pass')
+        self.emergency_type = EmergencyType.objects.create(name='Flood', icon_type='flood-icon')
+        self.url = reverse('emergency-report-sync')
+        self.client.force_authenticate(user=self.user)
+
+    def queued_report(self, **fields):
+        report = {
+            'id': str(uuid.uuid4()),
+            'emergency_type': str(self.emergency_type.id),
+            'longitude': 120.9842,
+            'latitude': 14.5995,
+            'details': 'Flood water rising near the <script>x</script>bridge'
+        }
+        report.update(fields)
+        return report
+
+    def test_batch_creates_reports_and_verifications(self):
+        reports = [self.queued_report() for _ in range(3)]
+        verification = {'id': str(uuid.uuid4()), 'report': reports[0]['id'], 'vote': True}
+        response = self.client.post(self.url, {'reports': reports, 'verifications': [verification]}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['status'] for item in response.data['data']['reports']], ['created'] * 3)
+        self.assertEqual(response.data['data']['verifications'][0]['status'], 'created')
+        self.assertEqual(EmergencyReport.objects.filter(user=self.user).count(), 3)
+        created = EmergencyReport.objects.get(id=reports[0]['id'])
+        self.assertEqual(created.verification_status, 'Verified')
+        self.assertNotIn('<script>', created.details)
+
+    def test_retrying_a_batch_reports_duplicates(self):
+        payload = {'reports': [self.queued_report()]}
+        self.client.post(self.url, payload, format='json')
+        response = self.client.post(self.url, payload, format='json')
+
+        self.assertEqual(response.data['data']['reports'][0]['status'], 'duplicate')
+        self.assertEqual(EmergencyReport.objects.count(), 1)
+
+    def test_concurrent_retry_reports_duplicates(self):
+        payload = {'reports': [self.queued_report()]}
+        raced = []
+
+        def first_batch_commits(ids):
+            # What a retry finds once the batch it raced with releases the id locks
+            if not raced:
+                raced.append(True)
+                ingest_batch(self.user, payload['reports'], [])
+
+        with patch('emergencies.sync._lock_ids', side_effect=first_batch_commits):
+            response = self.client.post(self.url, payload, format='json')
+
+        self.assertEqual(response.data['data']['reports'][0]['status'], 'duplicate')
+        self.assertEqual(EmergencyReport.objects.count(), 1)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Advisory locks are Postgres only')
+    def test_batch_locks_its_ids(self):
+        report = self.queued_report()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'reports': [report]}, format='json')
+        self.assertTrue(any('pg_advisory_xact_lock' in query['sql'] for query in queries))
+
+    def test_invalid_items_do_not_block_the_rest(self):
+        reports = [self.queued_report(), self.queued_report(emergency_type=str(uuid.uuid4()))]
+        verification = {'id': str(uuid.uuid4()), 'report': reports[1]['id'], 'vote': True}
+        response = self.client.post(self.url, {'reports': reports, 'verifications': [verification]}, format='json')
+
+        results = response.data['data']
+        self.assertEqual([item['status'] for item in results['reports']], ['created', 'error'])
+        self.assertIn('emergency_type', results['reports'][1]['errors'])
+        self.assertEqual(results['verifications'][0]['status'], 'error')
+        self.assertEqual(EmergencyReport.objects.count(), 1)
+
+    def test_oversized_batch_is_rejected(self):
+        with self.settings(SYNC_MAX_BATCH_SIZE=2):
+            response = self.client.post(self.url, {'reports': [self.queued_report() for _ in range(3)]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(EmergencyReport.objects.count(), 0)
+
+    def test_batch_query_budget(self):
+        reports = [self.queued_report() for _ in range(20)]
+        verifications = [{'id': str(uuid.uuid4()), 'report': report['id'], 'vote': True} for report in reports]
+        # Includes the analytics rollup and heatmap upserts for the inserts and the verification
+        # status updates, and the duplicate index load (its change-log cursor and the recent
+        # reports, two queries however many reports)
+        recent_reports.clear()
+        with self.assertMaxQueries(20):
+            response = self.client.post(self.url, {'reports': reports, 'verifications': verifications}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(EmergencyVerification.objects.count(), 20)
+
+@override_settings(SYNC_VISIBILITY_LAG_SECONDS=0)
+class DeltaSyncTests(QueryBudgetMixin, TestCase):
+    """Incremental reads through the change-log cursor."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='dashboard@example.com', password='pass')
+        self.emergency_type = EmergencyType.objects.create(name='Fire', icon_type='fire-icon')
+        self.url = reverse('emergency-change-list')
+        self.client.force_authenticate(user=self.user)
+
+    def create_report(self):
+        return EmergencyReport.objects.create(
+            emergency_type=self.emergency_type,
+            user=self.user,
+            longitude=120.9842,
+            latitude=14.5995,
+            details='Delta sync report'
+        )
+
+    def test_only_rows_changed_after_the_cursor_are_returned(self):
+        first = self.create_report()
+        cursor = self.client.get(self.url).data['cursor']
+
+        second = self.create_report()
+        EmergencyVerification.objects.create(report=first, user=self.user, vote=True)
+        response = self.client.get(self.url, {'since': cursor})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({item['id'] for item in response.data['reports']}, {str(first.id), str(second.id)})
+        self.assertEqual(len(response.data['verifications']), 1)
+        self.assertFalse(response.data['has_more'])
+        self.assertEqual(self.client.get(self.url, {'since': response.data['cursor']}).data['reports'], [])
+
+    def test_deleted_rows_come_back_as_tombstones(self):
+        report = self.create_report()
+        verification = EmergencyVerification.objects.create(report=report, user=self.user, vote=True)
+        cursor = self.client.get(self.url).data['cursor']
+
+        report_id, verification_id = str(report.id), str(verification.id)
+        report.delete()
+        response = self.client.get(self.url, {'since': cursor})
+
+        self.assertEqual(response.data['reports'], [])
+        self.assertEqual(response.data['deleted']['reports'], [report_id])
+        self.assertEqual(response.data['deleted']['verifications'], [verification_id])
+
+    def test_pages_follow_the_cursor(self):
+        reports = [self.create_report() for _ in range(5)]
+        seen, cursor, has_more = set(), 0, True
+        while has_more:
+            response = self.client.get(self.url, {'since': cursor, 'limit': 2})
+            seen.update(item['id'] for item in response.data['reports'])
+            cursor, has_more = response.data['cursor'], response.data['has_more']
+        self.assertEqual(seen, {str(report.id) for report in reports})
+
+    @override_settings(DUPLICATE_DETECTION_ENABLED=True, DUPLICATE_RADIUS_METERS=150, DUPLICATE_WINDOW_MINUTES=30)
+    def test_filing_a_duplicate_returns_its_canonical_report(self):
+        recent_reports.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            canonical = self.create_report()
+        cursor = self.client.get(self.url).data['cursor']
+
+        duplicate = self.create_report()
+        self.assertEqual(duplicate.canonical_report_id, canonical.id)
+        response = self.client.get(self.url, {'since': cursor})
+
+        reports = {item['id']: item for item in response.data['reports']}
+        self.assertEqual(set(reports), {str(canonical.id), str(duplicate.id)})
+        self.assertEqual(reports[str(canonical.id)]['duplicate_count'], 1)
+
+    def test_recent_changes_are_returned_again(self):
+        settled = self.create_report()
+        EmergencyChange.objects.update(date_created=timezone.now() - timedelta(minutes=1))
+        recent = self.create_report()
+
+        with override_settings(SYNC_VISIBILITY_LAG_SECONDS=30):
+            response = self.client.get(self.url, {'limit': 1})
+            self.assertTrue(response.data['has_more'])
+            response = self.client.get(self.url, {'since': response.data['cursor']})
+            again = self.client.get(self.url, {'since': response.data['cursor']})
+
+        self.assertIn(str(recent.id), {item['id'] for item in response.data['reports']})
+        self.assertFalse(response.data['has_more'])
+        # The cursor stays before the recent entries, which an older transaction may still
+        # commit an entry below
+        self.assertEqual(
+            {item['id'] for item in again.data['reports']}, {item['id'] for item in response.data['reports']}
+        )
+        self.assertNotIn(str(settled.id), {item['id'] for item in again.data['reports']})
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'since': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_delta_sync_query_budget(self):
+        for _ in range(20):
+            self.create_report()
+        with self.assertMaxQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['reports']), 20)
+
+
+@override_settings(IMAGE_STORAGE_BACKEND='stub')
+class AsyncCreationTests(TestCase):
+    """Async report and verification creation views."""
+
+    image = (
+        'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQ'
+        'DwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+    )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='async@example.com', password='pass')
+        self.emergency_type = EmergencyType.objects.create(name='Fire', icon_type='fire-icon')
+        self.client.force_authenticate(user=self.user)
+
+    def report_payload(self, **fields):
+        payload = {
+            'emergency_type': str(self.emergency_type.id),
+            'longitude': 120.9842,
+            'latitude': 14.5995,
+            'details': 'Smoke coming from the <b>market</b> building',
+            'image_base64': self.image
+        }
+        payload.update(fields)
+        return payload
+
+    def test_create_report_uploads_image(self):
+        response = self.client.post(reverse('emergency-report-create-async'), self.report_payload(), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'success')
+        self.assertTrue(response.data['data']['image_url'].startswith('https://stub-storage.invalid/emergency_reports/'))
+        report = EmergencyReport.objects.get(id=response.data['data']['id'])
+        self.assertEqual(report.user, self.user)
+
+    def test_invalid_report_is_rejected_before_upload(self):
+        with patch('emergencies.views.FileService.process_image_field_async') as mock_process:
+            response = self.client.post(
+                reverse('emergency-report-create-async'), self.report_payload(longitude=100.0), format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('longitude', response.data['errors'])
+        mock_process.assert_not_called()
+
+    def test_invalid_image_is_rejected(self):
+        response = self.client.post(
+            reverse('emergency-report-create-async'), self.report_payload(image_base64='data:image/png;base64,' + 'A' * 80), format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image_base64', response.data['errors'])
+        self.assertEqual(EmergencyReport.objects.count(), 0)
+
+    def test_create_verification_updates_report_status(self):
+        report = EmergencyReport.objects.create(
+            emergency_type=self.emergency_type, user=self.user, longitude=120.9842, latitude=14.5995
+        )
+        response = self.client.post(
+            reverse('emergency-verification-create-async'), {'report': str(report.id), 'vote': True}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        report.refresh_from_db()
+        self.assertEqual(report.verification_status, 'Verified')
+
+    def test_requires_authentication(self):
+        response = APIClient().post(reverse('emergency-report-create-async'), self.report_payload(), format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_create_report_through_asgi_with_token(self):
+        _, token = await sync_to_async(AuthToken.objects.create)(self.user)
+        response = await AsyncClient().post(
+            reverse('emergency-report-create-async'),
+            self.report_payload(),
+            content_type='application/json',
+            headers={'Authorization': f'Token {token}'}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(await EmergencyReport.objects.filter(user=self.user).acount(), 1)
+
+
+class ArchiveTests(TestCase):
+    """Moving closed reports to compressed cold storage."""
+
+    def setUp(self):
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+        settings_override = override_settings(ARCHIVE_ROOT=self.archive_dir.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='archive@example.com', password='pass')
+        self.emergency_type = EmergencyType.objects.create(name='Fire', icon_type='fire-icon')
+        self.client.force_authenticate(user=self.user)
+
+    def create_report(self, status_value, age_days):
+        report = EmergencyReport.objects.create(
+            emergency_type=self.emergency_type, user=self.user, longitude=120.9842, latitude=14.5995,
+            details='Archived report', status=status_value
+        )
+        self.backdate(report, age_days)
+        return report
+
+    def backdate(self, report, age_days):
+        EmergencyReport.objects.filter(id=report.id).update(date_created=timezone.now() - timedelta(days=age_days))
+
+    def test_old_closed_reports_are_archived_with_children(self):
+        old = self.create_report('Resolved', 400)
+        verification = EmergencyVerification.objects.create(report=old, user=self.user, vote=True)
+        UserEvaluation.objects.create(
+            report=old, user=self.user, stars=5, did_app_guide_clearly='Yes',
+            completion_speed='Very fast', confidence_level='Very confident'
+        )
+        # Saving the verification re-saved the report with its original date_created
+        self.backdate(old, 400)
+        open_report = self.create_report('Pending', 400)
+        recent = self.create_report('Resolved', 10)
+
+        call_command('archive_reports', older_than_days=180, batch_size=1, stdout=open('/dev/null', 'w'))
+
+        self.assertEqual(set(EmergencyReport.objects.values_list('id', flat=True)), {open_report.id, recent.id})
+        self.assertFalse(EmergencyVerification.objects.filter(id=verification.id).exists())
+        self.assertFalse(UserEvaluation.objects.exists())
+        entry = ArchivedReport.objects.get(id=old.id)
+        self.assertEqual(entry.status, 'Resolved')
+        self.assertTrue(EmergencyChange.objects.filter(object_id=old.id, deleted=True).exists())
+        self.assertTrue(EmergencyChange.objects.filter(object_id=verification.id, deleted=True).exists())
+        # Archived reports are still counted when the rollups are rebuilt
+        rebuild_rollups()
+        resolved = ReportDailyRollup.objects.filter(status='Resolved').values_list('day', 'reports')
+        self.assertEqual(dict(resolved)[timezone.localdate(old.date_created - timedelta(days=400))], 1)
+
+        response = self.client.get(reverse('archived-report-detail', args=[old.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['report']['id'], str(old.id))
+        self.assertEqual(response.data['data']['verifications'][0]['id'], str(verification.id))
+        self.assertEqual(response.data['data']['evaluations'][0]['stars'], 5)
+
+    def test_archive_file_is_plain_gzip_of_json_lines(self):
+        reports = [self.create_report('Dismissed', 300) for _ in range(3)]
+        call_command('archive_reports', older_than_days=180, batch_size=2, stdout=open('/dev/null', 'w'))
+
+        entry = ArchivedReport.objects.get(id=reports[0].id)
+        with gzip.open(f'{self.archive_dir.name}/{entry.archive_file}', 'rt') as archive_file:
+            archived_ids = {json.loads(line)['report']['id'] for line in archive_file.read().splitlines()}
+        self.assertEqual(archived_ids, {str(report.id) for report in reports})
+
+    def test_report_reopened_while_archiving_stays(self):
+        report = self.create_report('Resolved', 400)
+        append_members = archive.append_members
+
+        def reopen_while_writing(path, documents):
+            EmergencyReport.objects.filter(id=report.id).update(status='Pending')
+            return append_members(path, documents)
+
+        with patch('emergencies.archive.append_members', side_effect=reopen_while_writing):
+            self.assertEqual(archive.archive_batch([report.id]), 0)
+
+        self.assertEqual(EmergencyReport.objects.get(id=report.id).status, 'Pending')
+        self.assertFalse(ArchivedReport.objects.exists())
+        self.assertFalse(EmergencyChange.objects.filter(object_id=report.id, deleted=True).exists())
+
+    def test_report_voted_on_while_archiving_stays(self):
+        report = self.create_report('Resolved', 400)
+        append_members = archive.append_members
+        created = []
+
+        def vote_while_writing(path, documents):
+            created.append(EmergencyVerification.objects.create(report=report, user=self.user, vote=True))
+            return append_members(path, documents)
+
+        with patch('emergencies.archive.append_members', side_effect=vote_while_writing):
+            self.assertEqual(archive.archive_batch([report.id]), 0)
+
+        self.assertTrue(EmergencyVerification.objects.filter(id=created[0].id).exists())
+        self.assertFalse(ArchivedReport.objects.exists())
+        self.assertFalse(EmergencyChange.objects.filter(deleted=True).exists())
+        # The next run archives it with the new verification
+        self.assertEqual(archive.archive_batch([report.id]), 1)
+        archived = archive.read_archived_report(ArchivedReport.objects.get(id=report.id))
+        self.assertEqual(archived['verifications'][0]['id'], str(created[0].id))
+        self.assertEqual(archived['report']['verification_status'], 'Verified')
+
+    def test_dry_run_keeps_reports(self):
+        self.create_report('Resolved', 400)
+        call_command('archive_reports', older_than_days=180, dry_run=True, stdout=open('/dev/null', 'w'))
+        self.assertEqual(EmergencyReport.objects.count(), 1)
+        self.assertFalse(ArchivedReport.objects.exists())
+
+    def test_unknown_archived_report(self):
+        response = self.client.get(reverse('archived-report-detail', args=[uuid.uuid4()]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class AnalyticsRollupTests(QueryBudgetMixin, TestCase):
+    """Incremental report and agency rollups behind the dashboard analytics."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='analytics@example.com', password='pass')
+        self.fire = EmergencyType.objects.create(name='Fire', icon_type='fire-icon')
+        self.flood = EmergencyType.objects.create(name='Flood', icon_type='flood-icon')
+        self.agency = Agency.objects.create(name='BFP', hotline_number='911', latitude=14.5995, longitude=120.9842)
+        AgencyEmergencyType.objects.create(agency=self.agency, emergency_type=self.fire)
+        self.client.force_authenticate(user=self.user)
+
+    def create_report(self, emergency_type=None):
+        return EmergencyReport.objects.create(
+            emergency_type=emergency_type or self.fire, user=self.user, longitude=120.9842, latitude=14.5995
+        )
+
+    def rollup_counts(self):
+        return (
+            {
+                (row.emergency_type_id, row.status): (row.reports, row.verified, row.low_confidence)
+                for row in ReportDailyRollup.objects.exclude(reports=0)
+            },
+            {
+                row.agency_id: (row.reports, row.open, row.resolved, row.dismissed, row.verified)
+                for row in AgencyDailyRollup.objects.exclude(reports=0)
+            },
+        )
+
+    def test_rollups_follow_inserts_status_changes_and_deletes(self):
+        report = self.create_report()
+        self.create_report(self.flood)
+        self.assertEqual(self.rollup_counts(), (
+            {(self.fire.id, 'Pending'): (1, 0, 0), (self.flood.id, 'Pending'): (1, 0, 0)},
+            {self.agency.id: (1, 1, 0, 0, 0)},
+        ))
+
+        EmergencyVerification.objects.create(report=report, user=self.user, vote=True)
+        report = EmergencyReport.objects.get(id=report.id)
+        report.status = 'Resolved'
+        report.save()
+        self.assertEqual(self.rollup_counts()[0][(self.fire.id, 'Resolved')], (1, 1, 0))
+        self.assertNotIn((self.fire.id, 'Pending'), self.rollup_counts()[0])
+        self.assertEqual(self.rollup_counts()[1], {self.agency.id: (1, 0, 1, 0, 1)})
+
+        report.delete()
+        self.assertEqual(self.rollup_counts()[1], {})
+
+    def test_reconcile_matches_incremental_counts(self):
+        reports = [self.create_report(emergency_type) for emergency_type in (self.fire, self.fire, self.flood)]
+        EmergencyVerification.objects.create(report=reports[0], user=self.user, vote=False)
+        EmergencyReport.objects.filter(id=reports[1].id).first().save()
+        incremental = self.rollup_counts()
+
+        ReportDailyRollup.objects.update(reports=99)
+        call_command('reconcile_rollups', stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.rollup_counts(), incremental)
+
+    def test_sync_batch_updates_rollups(self):
+        report_id = str(uuid.uuid4())
+        self.client.post(reverse('emergency-report-sync'), {
+            'reports': [{'id': report_id, 'emergency_type': str(self.fire.id), 'longitude': 120.9842, 'latitude': 14.5995}],
+            'verifications': [{'id': str(uuid.uuid4()), 'report': report_id, 'vote': True}]
+        }, format='json')
+        self.assertEqual(self.rollup_counts()[0], {(self.fire.id, 'Pending'): (1, 1, 0)})
+
+    def test_analytics_endpoints(self):
+        for _ in range(3):
+            self.create_report()
+        self.create_report(self.flood)
+
+        with self.assertMaxQueries(1):
+            response = self.client.get(reverse('report-analytics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        totals = response.data['data']['totals']
+        self.assertEqual(totals['reports'], 4)
+        self.assertEqual(totals['by_status'], {'Pending': 4})
+        self.assertEqual(totals['by_emergency_type'][str(self.fire.id)], 3)
+
+        response = self.client.get(reverse('agency-analytics'), {'agency': str(self.agency.id)})
+        self.assertEqual(response.data['data']['agencies'][0]['reports'], 3)
+
+        response = self.client.get(reverse('report-analytics'), {'start': '2020-01-01', 'end': '2020-01-31'})
+        self.assertEqual(response.data['data']['totals']['reports'], 0)
+
+    def test_invalid_analytics_range(self):
+        for params in ({'start': 'last week'}, {'start': '2024-02-01', 'end': '2024-01-01'}, {'start': '2000-01-01'}, {'emergency_type': 'fire'}):
+            response = self.client.get(reverse('report-analytics'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class HeatmapTests(QueryBudgetMixin, TestCase):
+    """Geohash heatmap cells maintained on insert and served per viewport."""
+
+    manila = {'min_lat': 14.3, 'min_lon': 120.8, 'max_lat': 14.9, 'max_lon': 121.2}
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='heatmap@example.com', password='pass')
+        self.emergency_type = EmergencyType.objects.create(name='Fire', icon_type='fire-icon')
+        self.client.force_authenticate(user=self.user)
+
+    def create_report(self, latitude, longitude):
+        return EmergencyReport.objects.create(
+            emergency_type=self.emergency_type, user=self.user, latitude=latitude, longitude=longitude
+        )
+
+    def test_cells_are_counted_at_every_precision(self):
+        self.create_report(14.5995, 120.9842)
+        self.create_report(14.5996, 120.9843)
+        self.assertEqual(
+            sorted(ReportGeohashCell.objects.values_list('precision', 'geohash', 'reports')),
+            [(3, 'wdw', 2), (4, 'wdw5', 2), (5, 'wdw51', 2), (6, 'wdw511', 2)]
+        )
+
+    def test_moving_a_report_moves_its_cells(self):
+        report = self.create_report(14.5995, 120.9842)
+        report.latitude, report.longitude = 10.3157, 123.8854
+        report.save()
+        cells = dict(ReportGeohashCell.objects.filter(precision=3).values_list('geohash', 'reports'))
+        self.assertEqual(cells, {'wdw': 0, 'wcb': 1})
+
+    def test_heatmap_returns_cells_in_the_viewport(self):
+        for _ in range(3):
+            self.create_report(14.5995, 120.9842)
+        self.create_report(10.3157, 123.8854)
+
+        with self.assertMaxQueries(1):
+            response = self.client.get(reverse('report-heatmap'), {**self.manila, 'zoom': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['precision'], 5)
+        self.assertEqual([(cell['geohash'], cell['reports']) for cell in response.data['data']['cells']], [('wdw51', 3)])
+
+    def test_large_viewport_falls_back_to_coarser_cells(self):
+        self.create_report(14.5995, 120.9842)
+        self.create_report(10.3157, 123.8854)
+        with self.settings(HEATMAP_MAX_CELLS=50):
+            response = self.client.get(reverse('report-heatmap'), {
+                'min_lat': 4.5, 'min_lon': 116.0, 'max_lat': 21.5, 'max_lon': 127.0, 'zoom': 12
+            })
+        self.assertEqual(response.data['data']['precision'], 3)
+        self.assertEqual(len(response.data['data']['cells']), 2)
+
+    def test_invalid_viewport(self):
+        for params in ({'zoom': 10}, {**self.manila, 'zoom': 40}, {**self.manila, 'min_lat': 15.0, 'zoom': 10}):
+            response = self.client.get(reverse('report-heatmap'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class MapClusterTests(QueryBudgetMixin, TestCase):
+    """Server-side clustering of the reports in a map viewport."""
+
+    manila = {'min_lat': 14.3, 'min_lon': 120.8, 'max_lat': 14.9, 'max_lon': 121.2}
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='map@example.com', password='pass')
+        self.fire = EmergencyType.objects.create(name='Fire', icon_type='fire-icon')
+        self.flood = EmergencyType.objects.create(name='Flood', icon_type='flood-icon')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('emergency-report-map')
+
+    def create_report(self, latitude, longitude, emergency_type=None, **fields):
+        return EmergencyReport.objects.create(
+            emergency_type=emergency_type or self.fire, user=self.user, latitude=latitude, longitude=longitude, **fields
+        )
+
+    def test_geohash_is_set_on_save_and_bulk_create(self):
+        report = self.create_report(14.5995, 120.9842)
+        self.assertTrue(report.geohash.startswith('wdw511'))
+        self.assertEqual(len(report.geohash), 9)
+        bulk = EmergencyReport(emergency_type=self.fire, user=self.user, latitude=10.3157, longitude=123.8854)
+        EmergencyReport.objects.bulk_create([bulk])
+        self.assertTrue(EmergencyReport.objects.get(id=bulk.id).geohash.startswith('wcb'))
+
+    def test_reports_are_clustered_with_dominant_type_and_status(self):
+        self.create_report(14.5995, 120.9842)
+        self.create_report(14.5996, 120.9843)
+        self.create_report(14.5997, 120.9841, self.flood, status='Resolved')
+        self.create_report(14.80, 121.10, self.flood)
+        self.create_report(10.3157, 123.8854)
+
+        with self.assertMaxQueries(3):
+            response = self.client.get(self.url, {**self.manila, 'zoom': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data['data']
+        self.assertEqual(data['mode'], 'clusters')
+        self.assertEqual([cluster['count'] for cluster in data['clusters']], [3, 1])
+        busiest = data['clusters'][0]
+        self.assertEqual(busiest['dominant_emergency_type'], self.fire.id)
+        self.assertEqual(busiest['dominant_status'], 'Pending')
+        self.assertAlmostEqual(busiest['latitude'], 14.5996, places=4)
+
+    def test_cluster_count_is_bounded(self):
+        for index in range(40):
+            self.create_report(14.31 + index * 0.0145, 120.81 + index * 0.0095)
+        with self.settings(MAP_CLUSTER_MAX_CELLS=4):
+            response = self.client.get(self.url, {**self.manila, 'zoom': 14})
+        clusters = response.data['data']['clusters']
+        self.assertLessEqual(len(clusters), 4)
+        self.assertEqual(sum(cluster['count'] for cluster in clusters), 40)
+
+    def test_individual_reports_when_zoomed_in(self):
+        report = self.create_report(14.5995, 120.9842)
+        self.create_report(14.70, 121.00)
+        response = self.client.get(self.url, {
+            'min_lat': 14.599, 'min_lon': 120.984, 'max_lat': 14.600, 'max_lon': 120.985, 'zoom': 17
+        })
+        data = response.data['data']
+        self.assertEqual(data['mode'], 'reports')
+        self.assertEqual([item['id'] for item in data['reports']], [report.id])
+
+    def test_filters(self):
+        self.create_report(14.5995, 120.9842)
+        self.create_report(14.5995, 120.9842, status='Resolved')
+        response = self.client.get(self.url, {**self.manila, 'zoom': 10, 'status': 'Pending,Responding'})
+        self.assertEqual(response.data['data']['clusters'][0]['count'], 1)
+        response = self.client.get(self.url, {**self.manila, 'zoom': 10, 'emergency_type': 'fire'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(DUPLICATE_DETECTION_ENABLED=True, DUPLICATE_RADIUS_METERS=150, DUPLICATE_WINDOW_MINUTES=30)
+class DuplicateDetectionTests(TestCase):
+    """Ingest-time linking of duplicate reports to a canonical report."""
+
+    def setUp(self):
+        recent_reports.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='duplicates@example.com', password='pass')
+        self.fire = EmergencyType.objects.create(name='Fire', icon_type='fire-icon')
+        self.flood = EmergencyType.objects.create(name='Flood', icon_type='flood-icon')
+        self.client.force_authenticate(user=self.user)
+
+    def create_report(self, latitude=14.5995, longitude=120.9842, emergency_type=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return EmergencyReport.objects.create(
+                emergency_type=emergency_type or self.fire, user=self.user, latitude=latitude, longitude=longitude
+            )
+
+    def test_nearby_report_of_the_same_type_is_linked(self):
+        first = self.create_report()
+        # About 100 m north, then a third report near the second one
+        second = self.create_report(14.6004, 120.9842)
+        third = self.create_report(14.6010, 120.9845)
+
+        self.assertIsNone(first.canonical_report_id)
+        self.assertEqual(second.canonical_report_id, first.id)
+        self.assertEqual(third.canonical_report_id, first.id)
+        self.assertEqual(set(first.duplicates.all()), {second, third})
+
+    def test_other_types_and_distant_reports_are_not_linked(self):
+        self.create_report()
+        self.assertGreater(distance_meters(14.5995, 120.9842, 14.5995, 120.9862), 150)
+        self.assertIsNone(self.create_report(14.5995, 120.9862).canonical_report_id)
+        self.assertIsNone(self.create_report(emergency_type=self.flood).canonical_report_id)
+
+    def test_old_and_closed_reports_are_not_matched(self):
+        old = self.create_report()
+        EmergencyReport.objects.filter(id=old.id).update(date_created=timezone.now() - timedelta(hours=1))
+        closed = self.create_report(emergency_type=self.flood)
+        EmergencyReport.objects.filter(id=closed.id).update(status='Resolved')
+        recent_reports.clear()
+
+        self.assertIsNone(self.create_report().canonical_report_id)
+        self.assertIsNone(self.create_report(emergency_type=self.flood).canonical_report_id)
+
+    def test_reports_from_other_processes_are_picked_up_on_refresh(self):
+        first = self.create_report()
+        recent_reports.clear()
+        self.assertEqual(self.create_report(14.5996, 120.9843).canonical_report_id, first.id)
+
+    def test_refresh_queries_without_holding_the_index_lock(self):
+        first = self.create_report()
+        recent_reports.clear()
+        filter_reports, held = EmergencyReport.objects.filter, []
+
+        def filter_and_check(*args, **kwargs):
+            held.append(recent_reports._lock.locked())
+            return filter_reports(*args, **kwargs)
+
+        with patch.object(EmergencyReport.objects, 'filter', side_effect=filter_and_check):
+            self.assertEqual(recent_reports.find(self.fire.id, 14.5995, 120.9842), first.id)
+        self.assertEqual(held, [False])
+
+    def test_closed_canonical_reports_stop_absorbing_reports(self):
+        first = self.create_report()
+        duplicate = self.create_report(14.6004, 120.9842)
+        self.assertEqual(duplicate.canonical_report_id, first.id)
+        first.status = 'Dismissed'
+        with self.captureOnCommitCallbacks(execute=True):
+            first.save(update_fields=['status'])
+
+        # The open duplicate now stands for the incident, and is broadcast as itself
+        self.assertEqual(self.create_report(14.5996, 120.9843).canonical_report_id, duplicate.id)
+        response = self.client.post(
+            reverse('trigger-crowdsourcing-broadcast'), {'report_id': str(duplicate.id), 'range': 5}, format='json'
+        )
+        self.assertEqual(response.data['report_id'], str(duplicate.id))
+
+    @override_settings(DUPLICATE_INDEX_REFRESH_SECONDS=0, SYNC_VISIBILITY_LAG_SECONDS=0)
+    def test_reports_closed_by_other_processes_are_dropped_on_refresh(self):
+        first = self.create_report()
+        # Closed by another process: only the change log tells this one
+        EmergencyReport.objects.filter(id=first.id).update(status='Resolved')
+        EmergencyChange.record(EmergencyChange.REPORT, [first.id])
+        self.assertIsNone(self.create_report(14.5996, 120.9843).canonical_report_id)
+
+        # Reopened reports are indexed again
+        EmergencyReport.objects.filter(id=first.id).update(status='Pending')
+        EmergencyChange.record(EmergencyChange.REPORT, [first.id])
+        self.assertEqual(recent_reports.find(self.fire.id, 14.5995, 120.9842), first.id)
+
+    def test_batch_sync_links_duplicates(self):
+        first = self.create_report()
+        reports = [
+            {'id': str(uuid.uuid4()), 'emergency_type': str(self.fire.id), 'latitude': 14.5996, 'longitude': 120.9843},
+            {'id': str(uuid.uuid4()), 'emergency_type': str(self.fire.id), 'latitude': 10.3157, 'longitude': 123.8854},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('emergency-report-sync'), {'reports': reports}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(EmergencyReport.objects.get(id=reports[0]['id']).canonical_report_id, first.id)
+        self.assertIsNone(EmergencyReport.objects.get(id=reports[1]['id']).canonical_report_id)
+        # The synced reports are indexed too
+        self.assertEqual(self.create_report(10.3158, 123.8855).canonical_report_id, uuid.UUID(reports[1]['id']))
+
+    def test_broadcast_of_a_duplicate_uses_the_canonical_report(self):
+        first = self.create_report()
+        duplicate = self.create_report(14.5996, 120.9843)
+        response = self.client.post(
+            reverse('trigger-crowdsourcing-broadcast'), {'report_id': str(duplicate.id), 'range': 5}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['report_id'], str(first.id))
+
+    @override_settings(DUPLICATE_DETECTION_ENABLED=False)
+    def test_detection_can_be_disabled(self):
+        self.create_report()
+        self.assertIsNone(self.create_report().canonical_report_id)
+
+
+@override_settings(
+    DUPLICATE_DETECTION_ENABLED=True, TRIAGE_SEVERITY_WEIGHT=10, TRIAGE_VOTE_WEIGHT=2,
+    TRIAGE_DUPLICATE_WEIGHT=3, TRIAGE_AGE_WEIGHT=1
+)
+class TriageQueueTests(QueryBudgetMixin, TestCase):
+    """Pending reports ordered by their incrementally maintained triage priority."""
+
+    def setUp(self):
+        recent_reports.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='triage@example.com', password='pass')
+        self.fire = EmergencyType.objects.create(name='Fire', icon_type='fire-icon', severity=5)
+        self.flood = EmergencyType.objects.create(name='Flood', icon_type='flood-icon', severity=3)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('triage-next')
+
+    def create_report(self, emergency_type, latitude=14.5995, longitude=120.9842):
+        with self.captureOnCommitCallbacks(execute=True):
+            return EmergencyReport.objects.create(
+                emergency_type=emergency_type, user=self.user, latitude=latitude, longitude=longitude
+            )
+
+    def queue(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['data']]
+
+    def vote(self, report, vote):
+        voter = User.objects.create_user(email=f'voter{uuid.uuid4().hex[:8]}@example.com', password='pass')
+        return EmergencyVerification.objects.create(report=report, user=voter, vote=vote)
+
+    def test_severity_orders_the_queue(self):
+        flood = self.create_report(self.flood)
+        fire = self.create_report(self.fire, 10.3157, 123.8854)
+        self.assertEqual(self.queue(), [str(fire.id), str(flood.id)])
+
+    def test_votes_duplicates_and_age_raise_priority(self):
+        fire = self.create_report(self.fire)
+        flood = self.create_report(self.flood, 10.3157, 123.8854)
+        # 20 points behind: eleven confirming votes overtake the fire report
+        for _ in range(11):
+            self.vote(flood, True)
+        flood.refresh_from_db()
+        self.assertEqual(flood.vote_score, 11)
+        self.assertEqual(self.queue(), [str(flood.id), str(fire.id)])
+
+        # Duplicates of the fire report (3 points each) take it back to the top
+        for offset in range(1, 3):
+            self.create_report(self.fire, 14.5995 + offset * 0.0001)
+        fire.refresh_from_db()
+        self.assertEqual(fire.duplicate_count, 2)
+        self.assertEqual(self.queue(limit=1), [str(fire.id)])
+
+        # Reports waiting longer rise by TRIAGE_AGE_WEIGHT per hour
+        old_flood = self.create_report(self.flood, 7.0731, 125.6128)
+        EmergencyReport.objects.filter(id=old_flood.id).update(
+            priority=F('priority') - 30  # as if created 30 hours earlier
+        )
+        self.assertEqual(self.queue()[-1], str(old_flood.id))
+        EmergencyReport.objects.filter(id=old_flood.id).update(priority=F('priority') + 60)
+        self.assertEqual(self.queue()[0], str(old_flood.id))
+
+    def test_assigned_and_closed_reports_leave_the_queue(self):
+        first = self.create_report(self.fire)
+        second = self.create_report(self.flood, 10.3157, 123.8854)
+        third = self.create_report(self.flood, 7.0731, 125.6128)
+        first.responder = self.user
+        first.save()
+        second.status = 'Dismissed'
+        second.save()
+        self.assertEqual(self.queue(), [str(third.id)])
+
+    def test_severity_change_and_rescore_match(self):
+        flood = self.create_report(self.flood)
+        fire = self.create_report(self.fire, 10.3157, 123.8854)
+        self.vote(flood, True)
+        self.vote(flood, False)
+        self.vote(fire, False)
+        self.flood.severity = 5
+        self.flood.save()
+        self.assertEqual(self.queue(), [str(flood.id), str(fire.id)])
+
+        stored = dict(EmergencyReport.objects.values_list('id', 'priority'))
+        self.assertEqual(rescore_reports(), 2)
+        for report_id, priority in EmergencyReport.objects.values_list('id', 'priority'):
+            self.assertAlmostEqual(priority, stored[report_id], places=4)
+
+    def test_sync_scores_reports_and_counts_duplicates(self):
+        fire = self.create_report(self.fire)
+        reports = [
+            {'id': str(uuid.uuid4()), 'emergency_type': str(self.flood.id), 'latitude': 10.3157, 'longitude': 123.8854},
+            {'id': str(uuid.uuid4()), 'emergency_type': str(self.fire.id), 'latitude': 14.5996, 'longitude': 120.9843},
+        ]
+        verifications = [{'id': str(uuid.uuid4()), 'report': reports[0]['id'], 'vote': True}]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('emergency-report-sync'), {'reports': reports, 'verifications': verifications}, format='json'
+            )
+        fire.refresh_from_db()
+        self.assertEqual(fire.duplicate_count, 1)
+        synced = EmergencyReport.objects.get(id=reports[0]['id'])
+        self.assertEqual(synced.vote_score, 1)
+        # The duplicate scores like its own fire report, without the fire report's duplicate bonus
+        self.assertEqual(self.queue(), [str(fire.id), reports[1]['id'], str(synced.id)])
+
+    def test_saves_keep_concurrent_duplicate_counts(self):
+        fire = self.create_report(self.fire)
+        stale = EmergencyReport.objects.get(id=fire.id)
+        # A duplicate linked after `stale` was loaded
+        self.create_report(self.fire, 14.5996)
+        self.vote(fire, True)
+        stale.update_verification_status()
+        stale.status = 'Responding'
+        stale.save(update_fields=['status'])
+        serializer = EmergencyReportSerializer(stale, data={'details': 'Smoke on the third floor'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        fire.refresh_from_db()
+        self.assertEqual(fire.duplicate_count, 1)
+        self.assertEqual(fire.vote_score, 1)
+        self.assertEqual(fire.details, 'Smoke on the third floor')
+        stored = fire.priority
+        rescore_reports(EmergencyReport.objects.filter(id=fire.id))
+        fire.refresh_from_db()
+        self.assertAlmostEqual(fire.priority, stored, places=4)
+
+    def test_queue_query_budget_and_filters(self):
+        for index in range(15):
+            self.create_report(self.fire if index % 2 else self.flood, 10 + index, 121 + index * 0.1)
+        with self.assertMaxQueries(1):
+            response = self.client.get(self.url, {'limit': 5, 'emergency_type': str(self.flood.id)})
+        data = response.data['data']
+        self.assertEqual(len(data), 5)
+        self.assertTrue(all(item['emergency_type'] == self.flood.id for item in data))
+        scores = [item['priority_score'] for item in data]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertAlmostEqual(scores[0], 30, delta=1)
+
+        self.assertEqual(self.client.get(self.url, {'limit': 0}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {'emergency_type': 'fire'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DispatchTests(QueryBudgetMixin, TestCase):
+    """Responders taking the next report their agencies handle."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.reporter = User.objects.create_user(email='reporter@example.com', password='pass')
+        self.user = User.objects.create_user(email='dispatch@example.com', password='pass')
+        self.fire = EmergencyType.objects.create(name='Fire', icon_type='fire-icon', severity=5)
+        self.flood = EmergencyType.objects.create(name='Flood', icon_type='flood-icon', severity=3)
+        self.crime = EmergencyType.objects.create(name='Crime', icon_type='crime-icon', severity=4)
+        agency = Agency.objects.create(name='BFP', hotline_number='911', latitude=14.6, longitude=121.0)
+        AgencyEmergencyType.objects.create(agency=agency, emergency_type=self.fire)
+        AgencyEmergencyType.objects.create(agency=agency, emergency_type=self.flood)
+        Responder.objects.create(user=self.user, agency=agency)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('dispatch-next')
+
+    def create_report(self, emergency_type, latitude):
+        return EmergencyReport.objects.create(
+            emergency_type=emergency_type, user=self.reporter, latitude=latitude, longitude=121.0
+        )
+
+    def test_reports_are_dispatched_by_priority_within_the_agency_types(self):
+        flood = self.create_report(self.flood, 10.0)
+        self.create_report(self.crime, 11.0)
+        fire = self.create_report(self.fire, 12.0)
+
+        with self.assertMaxQueries(12):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['id'], str(fire.id))
+        fire.refresh_from_db()
+        self.assertEqual((fire.responder, fire.status), (self.user, 'Responding'))
+
+        self.assertEqual(self.client.post(self.url).data['data']['id'], str(flood.id))
+        # Only the crime report is left, which the agency does not handle
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data['data'])
+
+    def test_users_without_an_agency_are_refused(self):
+        self.create_report(self.fire, 10.0)
+        self.client.force_authenticate(user=self.reporter)
+        self.assertEqual(self.client.post(self.url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_claimed_reports_are_not_dispatched(self):
+        fire = self.create_report(self.fire, 10.0)
+        other = User.objects.create_user(email='other@example.com', password='pass')
+        self.client.force_authenticate(user=other)
+        self.client.post(f'/api/emergencies/{fire.id}/responder-actions/')
+        self.client.force_authenticate(user=self.user)
+        self.assertIsNone(self.client.post(self.url).data['data'])
+
+
+class ReportSearchTests(QueryBudgetMixin, TestCase):
+    """Search over report details, with the status and type filters."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='search@example.com', password='pass')
+        self.fire = EmergencyType.objects.create(name='Fire', icon_type='fire-icon')
+        self.flood = EmergencyType.objects.create(name='Flood', icon_type='flood-icon')
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse('emergency-report-search')
+        self.house_fire = self.create_report(self.fire, 'House fire near the bridge')
+        self.flooding = self.create_report(self.flood, 'Flooding along the national highway')
+        self.truck = self.create_report(self.fire, 'Fire truck blocked at the market, smoke near the school', status='Resolved')
+        self.baha = self.create_report(self.flood, 'Baha sa tabi ng simbahan')
+
+    def create_report(self, emergency_type, details, **fields):
+        return EmergencyReport.objects.create(
+            emergency_type=emergency_type, user=self.user, latitude=14.5995, longitude=120.9842, details=details, **fields
+        )
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['data']]
+
+    def test_words_and_partial_words_match(self):
+        # Partial words need the trigram index on Postgres; whether it exists is read once
+        partial_words = connection.vendor != 'postgresql' or has_trigram_index(connection)
+        with self.assertMaxQueries(1):
+            self.assertEqual(self.search(q='simbahan'), [str(self.baha.id)])
+        self.assertEqual(self.search(q='flood'), [str(self.flooding.id)] if partial_words else [])
+        self.assertEqual(set(self.search(q='fire near')), {str(self.house_fire.id), str(self.truck.id)})
+        self.assertEqual(self.search(q='fire -smoke'), [str(self.house_fire.id)])
+        self.assertEqual(self.search(q='-smoke'), [])
+
+    def test_filters_and_limit_compose_with_the_search(self):
+        self.assertEqual(self.search(q='near', status='Pending,Responding'), [str(self.house_fire.id)])
+        self.assertEqual(self.search(q='fire', emergency_type=str(self.flood.id)), [])
+        self.assertEqual(len(self.search(q='the', limit=1)), 1)
+
+    def test_only_recent_reports_are_searched_by_default(self):
+        EmergencyReport.objects.filter(id=self.baha.id).update(date_created=timezone.now() - timedelta(days=45))
+        self.assertEqual(self.search(q='simbahan'), [])
+        self.assertEqual(self.search(q='simbahan', days=60), [str(self.baha.id)])
+
+    def test_invalid_requests(self):
+        invalid = (
+            {}, {'q': ' '}, {'q': 'fire', 'limit': 0}, {'q': 'fire', 'days': 1000}, {'q': 'fire', 'emergency_type': 'fire'}
+        )
+        for params in invalid:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+            self.assertEqual(response.data['status'], 'error')
+
+    def test_admin_search(self):
+        admin_user = User.objects.create_superuser(email='admin@example.com', password='pass')
+        self.client.force_login(admin_user)
+        url = reverse('admin:emergencies_emergencyreport_changelist')
+        for term, expected in (('highway', [self.flooding]), (str(self.baha.id), [self.baha]), ('SEARCH@example.com', None)):
+            response = self.client.get(url, {'q': term})
+            expected = expected or EmergencyReport.objects.all()
+            self.assertEqual({report.id for report in response.context['cl'].result_list}, {report.id for report in expected})
+
+    @skipUnless(connection.vendor == 'postgresql', 'Full-text search is PostgreSQL only')
+    def test_matches_are_ranked_and_the_vector_follows_the_details(self):
+        response = self.client.get(self.url, {'q': 'fire near'})
+        first, second = response.data['data']
+        self.assertEqual(first['id'], str(self.house_fire.id))
+        self.assertGreater(first['rank'], second['rank'])
+
+        self.house_fire.details = 'Put out by the neighbors'
+        self.house_fire.save()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT details_search::text FROM emergencies_emergencyreport WHERE id = %s', [str(self.house_fire.id)]
+            )
+            self.assertIn("'neighbors'", cursor.fetchone()[0])
@@ -0,0 +1,182 @@
+"""
+Priority triage queue of pending, unassigned reports.
+
+A report's triage score is
+
+    TRIAGE_SEVERITY_WEIGHT * emergency type severity
+    + TRIAGE_VOTE_WEIGHT * (confirming votes - disputing votes)
+    + TRIAGE_DUPLICATE_WEIGHT * duplicates linked to it
+    + TRIAGE_AGE_WEIGHT * hours waited
+
+The age term grows at the same rate for every report, so the stored `priority` leaves
+it out and subtracts TRIAGE_AGE_WEIGHT * hours(date_created - PRIORITY_EPOCH) instead:
+ordering by the stored value orders by the score at any moment, and nothing is rescored
+as time passes. Votes and duplicate links move `priority` by F() increments as they
+arrive, and a partial index on the pending unassigned reports by priority turns "next N"
+into an index scan of N rows.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from agencies.models import AgencyEmergencyType
+from .models import EmergencyChange, EmergencyReport, EmergencyType
+
+
+PRIORITY_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+QUEUE_STATUS = 'Pending'
+# Reports that can still return to the queue, kept in step when a severity changes
+OPEN_STATUSES = ('Pending', 'Responding', 'Responded')
+
+
+def _hours_since_epoch(moment):
+    return (moment - PRIORITY_EPOCH).total_seconds() / 3600
+
+
+def base_priority(severity, date_created, vote_score=0, duplicate_count=0):
+    """Stored priority of a report (see the module docstring)"""
+    return (
+        settings.TRIAGE_SEVERITY_WEIGHT * severity
+        + settings.TRIAGE_VOTE_WEIGHT * vote_score
+        + settings.TRIAGE_DUPLICATE_WEIGHT * duplicate_count
+        - settings.TRIAGE_AGE_WEIGHT * _hours_since_epoch(date_created)
+    )
+
+
+def priority_score(priority, now=None):
+    """Triage score, age term included, of a stored priority at `now`"""
+    return priority + settings.TRIAGE_AGE_WEIGHT * _hours_since_epoch(now or timezone.now())
+
+
+def score_new_report(report):
+    """Set the priority of a report about to be inserted"""
+    # date_created is filled in at insert time; the difference is milliseconds
+    report.priority = base_priority(
+        report.emergency_type.severity, report.date_created or timezone.now(),
+        report.vote_score, report.duplicate_count
+    )
+
+
+def vote_priority(vote_score):
+    """
+    Priority of a report whose vote_score becomes vote_score, moved by the change from
+    the stored vote_score rather than the one loaded, which a concurrent vote may have
+    made stale. The UPDATE reads F('vote_score') before it is set.
+    """
+    return F('priority') + settings.TRIAGE_VOTE_WEIGHT * (vote_score - F('vote_score'))
+
+
+def record_duplicates(reports):
+    """Raise the canonical reports of newly inserted duplicates"""
+    added = Counter(report.canonical_report_id for report in reports if report.canonical_report_id is not None)
+    # One UPDATE per distinct increment, usually a single one
+    by_count = defaultdict(list)
+    for canonical_id, count in added.items():
+        by_count[count].append(canonical_id)
+    for count, canonical_ids in by_count.items():
+        EmergencyReport.objects.filter(id__in=canonical_ids).update(
+            duplicate_count=F('duplicate_count') + count,
+            priority=F('priority') + settings.TRIAGE_DUPLICATE_WEIGHT * count,
+        )
+    # update() bypasses the signals that log changes for delta sync
+    EmergencyChange.record(EmergencyChange.REPORT, added)
+
+
+def triage_queue(emergency_type_ids=None):
+    """Pending unassigned reports, highest priority first"""
+    reports = EmergencyReport.objects.filter(status=QUEUE_STATUS, responder__isnull=True)
+    if emergency_type_ids is not None:
+        reports = reports.filter(emergency_type_id__in=emergency_type_ids)
+    return reports.order_by('-priority')
+
+
+def next_reports(limit, emergency_type_ids=None):
+    """The `limit` highest-priority pending unassigned reports"""
+    return triage_queue(emergency_type_ids)[:limit]
+
+
+def responder_emergency_types(user):
+    """Ids of the emergency types handled by the agencies the user responds for"""
+    return list(
+        AgencyEmergencyType.objects.filter(agency__responder__user=user)
+        .values_list('emergency_type_id', flat=True).distinct()
+    )
+
+
+def dispatch_next(user, emergency_type_ids, skip_locked=True):
+    """
+    Assign the highest-priority queued report of the given types to user and return it,
+    or None when the queue is empty. The report is picked with SELECT ... FOR UPDATE SKIP
+    LOCKED: a report another dispatch has locked is skipped rather than waited for, so
+    concurrent responders each get a different report without blocking each other.
+    skip_locked=False is only there to benchmark the plain FOR UPDATE behaviour.
+    """
+    with transaction.atomic():
+        report = triage_queue(emergency_type_ids).select_for_update(skip_locked=skip_locked).first()
+        if report is None:
+            return None
+        report.responder = user
+        report.status = 'Responding'
+        report.save(update_fields=['responder', 'status'])
+    return report
+
+
+def rescore_reports(queryset=None, batch_size=1000):
+    """
+    Recompute the stored priority of reports (by default the queued ones) from their
+    components, e.g. after changing the TRIAGE_* weights. Returns the number rescored.
+    """
+    if queryset is None:
+        queryset = EmergencyReport.objects.filter(status=QUEUE_STATUS, responder__isnull=True)
+    severities = dict(EmergencyType.objects.values_list('id', 'severity'))
+    reports = list(queryset.only('id', 'emergency_type_id', 'date_created', 'vote_score', 'duplicate_count'))
+    for report in reports:
+        report.priority = base_priority(
+            severities[report.emergency_type_id], report.date_created, report.vote_score, report.duplicate_count
+        )
+    EmergencyReport.objects.bulk_update(reports, ['priority'], batch_size=batch_size)
+    return len(reports)
+
+
+@receiver(pre_save, sender=EmergencyReport)
+def score_report(sender, instance, raw=False, **kwargs):
+    if raw or not instance._state.adding:
+        return
+    score_new_report(instance)
+
+
+@receiver(post_save, sender=EmergencyReport)
+def raise_canonical_report(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    record_duplicates([instance])
+
+
+@receiver(pre_save, sender=EmergencyType)
+def capture_severity(sender, instance, raw=False, **kwargs):
+    instance._stored_severity = (
+        None if raw or instance._state.adding
+        else EmergencyType.objects.filter(id=instance.id).values_list('severity', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=EmergencyType)
+def apply_severity_change(sender, instance, created, raw=False, **kwargs):
+    """Move the open reports of a type whose severity changed"""
+    old = getattr(instance, '_stored_severity', None)
+    if raw or created or old is None or old == instance.severity:
+        return
+    report_ids = list(
+        EmergencyReport.objects.filter(emergency_type_id=instance.id, status__in=OPEN_STATUSES)
+        .values_list('id', flat=True)
+    )
+    EmergencyReport.objects.filter(id__in=report_ids).update(
+        priority=F('priority') + settings.TRIAGE_SEVERITY_WEIGHT * (instance.severity - old)
+    )
+    EmergencyChange.record(EmergencyChange.REPORT, report_ids)
@@ -4,14 +4,30 @@ from .views import (
     EmergencyReportList, EmergencyReportDetail,
     EmergencyVerificationList, EmergencyVerificationDetail,
     UserEvaluationList, UserEvaluationDetail,
-    TriggerCrowdsourcingBroadcast, MarkReportAsVerified
+    TriggerCrowdsourcingBroadcast, MarkReportAsVerified,
+    EmergencyReportBatchSync, EmergencyChangeList,
+    EmergencyReportCreateAsync, EmergencyVerificationCreateAsync,
+    ArchivedReportDetail, ReportAnalytics, AgencyAnalytics, ReportHeatmap,
+    EmergencyReportMap, EmergencyReportSearch, TriageQueue, DispatchNextReport
 )
 
 urlpatterns = [
     path('types/', EmergencyTypeList.as_view(), name='emergency-type-list'),
     path('types/<uuid:pk>/', EmergencyTypeDetail.as_view(), name='emergency-type-detail'),
     path('reports/', EmergencyReportList.as_view(), name='emergency-report-list'),
+    path('reports/map/', EmergencyReportMap.as_view(), name='emergency-report-map'),
+    path('reports/search/', EmergencyReportSearch.as_view(), name='emergency-report-search'),
+    path('triage/next/', TriageQueue.as_view(), name='triage-next'),
+    path('dispatch/next/', DispatchNextReport.as_view(), name='dispatch-next'),
     path('reports/<uuid:pk>/', EmergencyReportDetail.as_view(), name='emergency-report-detail'),
+    path('analytics/reports/', ReportAnalytics.as_view(), name='report-analytics'),
+    path('analytics/agencies/', AgencyAnalytics.as_view(), name='agency-analytics'),
+    path('analytics/heatmap/', ReportHeatmap.as_view(), name='report-heatmap'),
+    path('archived-reports/<uuid:pk>/', ArchivedReportDetail.as_view(), name='archived-report-detail'),
+    path('async/reports/', EmergencyReportCreateAsync.as_view(), name='emergency-report-create-async'),
+    path('async/verifications/', EmergencyVerificationCreateAsync.as_view(), name='emergency-verification-create-async'),
+    path('changes/', EmergencyChangeList.as_view(), name='emergency-change-list'),
+    path('sync/', EmergencyReportBatchSync.as_view(), name='emergency-report-sync'),
     path('verifications/', EmergencyVerificationList.as_view(), name='emergency-verification-list'),
     path('verifications/<uuid:pk>/', EmergencyVerificationDetail.as_view(), name='emergency-verification-detail'),
     path('evaluations/', UserEvaluationList.as_view(), name='user-evaluation-list'),
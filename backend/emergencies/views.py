@@ -4,20 +4,41 @@ from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from rest_framework.views import APIView
 from rest_framework import status
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from datetime import timedelta
 from django.utils.html import escape
 from rest_framework.exceptions import ValidationError
-import bleach
+import uuid
 import math
+from accounts.locations import approved_users_near
 from accounts.models import User, UserProfile
-from .models import EmergencyType, EmergencyReport, EmergencyVerification, UserEvaluation
+from .models import (
+    EmergencyType, EmergencyReport, EmergencyVerification, UserEvaluation, ArchivedReport,
+    ReportDailyRollup, AgencyDailyRollup
+)
 from .serializers import (
     EmergencyTypeSerializer,
     EmergencyReportSerializer,
     EmergencyVerificationSerializer,
-    UserEvaluationSerializer
+    UserEvaluationSerializer,
+    SyncBatchSerializer
 )
+from .sync import ingest_batch, changes_since
+from .archive import read_archived_report
+from .heatmap import heatmap_cells, parse_viewport
+from .clustering import viewport_clusters
+from .duplicates import CLOSED_STATUSES
+from .search import search_reports
+from .triage import dispatch_next, next_reports, priority_score, responder_emergency_types
 from agencies.models import Agency, AgencyEmergencyType
+from core.services.file_service import FileService
+from core.views import AsyncAPIView
 from django.core.mail import send_mail
 
 class EmergencyTypeList(generics.ListCreateAPIView):
@@ -117,7 +138,8 @@ class EmergencyReportList(generics.ListCreateAPIView):
     def sanitize_input(self, data):
         """Sanitize input data to prevent XSS and other injection attacks"""
         if 'details' in data:
-            # Escape HTML and allow only basic formatting
+            # Escape HTML and allow only basic formatting; bleach is imported by the first report
+            import bleach
             data['details'] = bleach.clean(
                 data['details'],
                 tags=['b', 'i', 'u'],  # Allow only basic formatting
@@ -452,6 +474,649 @@ class UserEvaluationDetail(generics.RetrieveUpdateDestroyAPIView):
     def delete(self, request, *args, **kwargs):
         return super().delete(request, *args, **kwargs)
 
+class EmergencyReportBatchSync(APIView):
+    """
+    Endpoint for the mobile app to flush reports and verifications queued while offline.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Submit queued emergency reports and verifications in one request. Items carry "
+            "client-generated UUIDs; items already synced are returned as 'duplicate', so a "
+            "batch can be retried safely. Verifications may reference reports in the same batch."
+        ),
+        tags=['Emergency Reports'],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'reports': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                    description='Emergency reports, each with a client-generated id plus the fields accepted by the report create endpoint'
+                ),
+                'verifications': openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                    description='Verifications, each with a client-generated id plus the fields accepted by the verification create endpoint'
+                )
+            }
+        ),
+        responses={
+            200: "Per-item results with status created, duplicate or error",
+            400: "Malformed or oversized batch",
+            401: "Authentication required"
+        }
+    )
+    def post(self, request):
+        serializer = SyncBatchSerializer(data=request.data, context={'max_items': settings.SYNC_MAX_BATCH_SIZE})
+        try:
+            serializer.is_valid(raise_exception=True)
+        except ValidationError as e:
+            return Response({
+                'status': 'error',
+                'message': 'Validation failed',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        results = ingest_batch(
+            request.user,
+            serializer.validated_data['reports'],
+            serializer.validated_data['verifications']
+        )
+        return Response({
+            'status': 'success',
+            'message': 'Sync batch processed',
+            'data': results
+        }, status=status.HTTP_200_OK)
+
+class EmergencyChangeList(APIView):
+    """
+    Endpoint for dashboards and devices to fetch only the reports and verifications changed since their last sync.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "List reports and verifications changed after the `since` cursor, with tombstones for "
+            "deleted rows. Start with since=0, then pass the returned cursor; repeat while has_more is true."
+        ),
+        tags=['Emergency Reports'],
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Cursor returned by the previous call (0 for a full sync)'),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Maximum change-log entries to read (capped by SYNC_CHANGES_PAGE_SIZE)')
+        ],
+        responses={
+            200: "Changed reports and verifications, deleted ids, next cursor and has_more",
+            400: "Invalid cursor",
+            401: "Authentication required"
+        }
+    )
+    def get(self, request):
+        page_size = settings.SYNC_CHANGES_PAGE_SIZE
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', page_size))
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'since and limit must be integers.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or limit < 1:
+            return Response({
+                'status': 'error',
+                'message': 'since must be 0 or more and limit must be positive.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(changes_since(since, min(limit, page_size)), status=status.HTTP_200_OK)
+
+class ArchivedReportDetail(APIView):
+    """
+    Endpoint to fetch a report that was moved to cold storage, with its verifications and evaluations.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Get an archived emergency report by ID. Closed reports are moved out of the report "
+            "endpoints by `manage.py archive_reports`; this returns the archived report with its "
+            "verifications and evaluations."
+        ),
+        tags=['Emergency Reports'],
+        responses={
+            200: "Archived report, verifications and evaluations",
+            401: "Authentication required",
+            404: "Archived report not found"
+        }
+    )
+    def get(self, request, pk):
+        entry = get_object_or_404(ArchivedReport, id=pk)
+        return Response({
+            'status': 'success',
+            'message': 'Archived report retrieved.',
+            'data': {
+                'date_archived': entry.date_archived,
+                **read_archived_report(entry)
+            }
+        }, status=status.HTTP_200_OK)
+
+def parse_analytics_filters(query_params, id_param=None):
+    """
+    Read the start/end days (YYYY-MM-DD, inclusive) of an analytics request, defaulting to
+    the last ANALYTICS_DEFAULT_DAYS days, and the optional UUID filter id_param.
+    Raises ValueError with a message for the client on invalid input.
+    """
+    try:
+        end = parse_date(query_params['end']) if query_params.get('end') else timezone.localdate()
+        start = parse_date(query_params['start']) if query_params.get('start') else end - timedelta(days=settings.ANALYTICS_DEFAULT_DAYS - 1)
+    except ValueError:
+        start = end = None
+    if start is None or end is None:
+        raise ValueError('start and end must be dates in YYYY-MM-DD format.')
+    if start > end:
+        raise ValueError('start must not be after end.')
+    if (end - start).days >= settings.ANALYTICS_MAX_DAYS:
+        raise ValueError(f'The range can span at most {settings.ANALYTICS_MAX_DAYS} days.')
+    try:
+        object_id = uuid.UUID(query_params[id_param]) if id_param and query_params.get(id_param) else None
+    except ValueError:
+        raise ValueError(f'{id_param} must be a UUID.')
+    return start, end, object_id
+
+ANALYTICS_RANGE_PARAMETERS = [
+    openapi.Parameter('start', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, description='First day (defaults to ANALYTICS_DEFAULT_DAYS days ago)'),
+    openapi.Parameter('end', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATE, description='Last day, inclusive (defaults to today)')
+]
+
+class ReportAnalytics(APIView):
+    """
+    Endpoint for responder dashboards: report counts per day, emergency type and status, read from the rollups.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Report counts per day, emergency type and status (with verified and low-confidence counts), "
+            "plus totals for the range. Served from incrementally maintained rollups, not the reports table."
+        ),
+        tags=['Analytics'],
+        manual_parameters=ANALYTICS_RANGE_PARAMETERS + [
+            openapi.Parameter('emergency_type', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_UUID, description='Only this emergency type')
+        ],
+        responses={
+            200: "Daily rows and totals by status and emergency type",
+            400: "Invalid date range or filter",
+            401: "Authentication required"
+        }
+    )
+    def get(self, request):
+        try:
+            start, end, emergency_type_id = parse_analytics_filters(request.query_params, 'emergency_type')
+        except ValueError as e:
+            return Response({
+                'status': 'error',
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        rollups = ReportDailyRollup.objects.filter(day__gte=start, day__lte=end).exclude(reports=0)
+        if emergency_type_id:
+            rollups = rollups.filter(emergency_type_id=emergency_type_id)
+
+        days = list(rollups.order_by('day', 'emergency_type_id', 'status').values(
+            'day', 'emergency_type_id', 'status', 'reports', 'verified', 'low_confidence'
+        ))
+        by_status, by_emergency_type = {}, {}
+        for row in days:
+            by_status[row['status']] = by_status.get(row['status'], 0) + row['reports']
+            emergency_type = str(row['emergency_type_id'])
+            by_emergency_type[emergency_type] = by_emergency_type.get(emergency_type, 0) + row['reports']
+
+        return Response({
+            'status': 'success',
+            'message': 'Report analytics retrieved.',
+            'data': {
+                'start': start,
+                'end': end,
+                'days': days,
+                'totals': {
+                    'reports': sum(row['reports'] for row in days),
+                    'verified': sum(row['verified'] for row in days),
+                    'low_confidence': sum(row['low_confidence'] for row in days),
+                    'by_status': by_status,
+                    'by_emergency_type': by_emergency_type
+                }
+            }
+        }, status=status.HTTP_200_OK)
+
+class AgencyAnalytics(APIView):
+    """
+    Endpoint for responder dashboards: report counts per day and agency, read from the rollups.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Counts per day and agency of the reports of the emergency types each agency handles: "
+            "all, open, resolved, dismissed and verified, plus totals per agency for the range."
+        ),
+        tags=['Analytics'],
+        manual_parameters=ANALYTICS_RANGE_PARAMETERS + [
+            openapi.Parameter('agency', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_UUID, description='Only this agency')
+        ],
+        responses={
+            200: "Daily rows and totals per agency",
+            400: "Invalid date range or filter",
+            401: "Authentication required"
+        }
+    )
+    def get(self, request):
+        try:
+            start, end, agency_id = parse_analytics_filters(request.query_params, 'agency')
+        except ValueError as e:
+            return Response({
+                'status': 'error',
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        rollups = AgencyDailyRollup.objects.filter(day__gte=start, day__lte=end).exclude(reports=0)
+        if agency_id:
+            rollups = rollups.filter(agency_id=agency_id)
+
+        counts = ('reports', 'open', 'resolved', 'dismissed', 'verified')
+        days = list(rollups.order_by('day', 'agency_id').values('day', 'agency_id', *counts))
+        totals = list(
+            rollups.values('agency_id')
+            .annotate(**{name: Sum(name) for name in counts})
+            .order_by('-reports')
+        )
+
+        return Response({
+            'status': 'success',
+            'message': 'Agency analytics retrieved.',
+            'data': {
+                'start': start,
+                'end': end,
+                'days': days,
+                'agencies': totals
+            }
+        }, status=status.HTTP_200_OK)
+
+VIEWPORT_PARAMETERS = [
+    openapi.Parameter('min_lat', openapi.IN_QUERY, type=openapi.TYPE_NUMBER, required=True, description='South edge of the viewport'),
+    openapi.Parameter('min_lon', openapi.IN_QUERY, type=openapi.TYPE_NUMBER, required=True, description='West edge of the viewport'),
+    openapi.Parameter('max_lat', openapi.IN_QUERY, type=openapi.TYPE_NUMBER, required=True, description='North edge of the viewport'),
+    openapi.Parameter('max_lon', openapi.IN_QUERY, type=openapi.TYPE_NUMBER, required=True, description='East edge of the viewport'),
+    openapi.Parameter('zoom', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=True, description='Map zoom level (0-22)')
+]
+
+class ReportHeatmap(APIView):
+    """
+    Endpoint for the LGU administrator heatmap: report counts per geohash cell in a viewport.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Report counts per geohash cell intersecting the viewport, for the days from start to end. "
+            "The zoom picks the cell size; the response has at most HEATMAP_MAX_CELLS cells however many "
+            "reports there are. Served from precomputed counts."
+        ),
+        tags=['Analytics'],
+        manual_parameters=VIEWPORT_PARAMETERS + ANALYTICS_RANGE_PARAMETERS,
+        responses={
+            200: "Geohash precision and cells with center coordinates and report counts",
+            400: "Invalid viewport, zoom or date range",
+            401: "Authentication required"
+        }
+    )
+    def get(self, request):
+        try:
+            viewport, zoom = parse_viewport(request.query_params)
+            start, end, _ = parse_analytics_filters(request.query_params)
+        except ValueError as e:
+            return Response({
+                'status': 'error',
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        precision, cells = heatmap_cells(viewport, zoom, start, end)
+        return Response({
+            'status': 'success',
+            'message': 'Heatmap retrieved.',
+            'data': {
+                'start': start,
+                'end': end,
+                'precision': precision,
+                'cells': cells
+            }
+        }, status=status.HTTP_200_OK)
+
+class EmergencyReportMap(APIView):
+    """
+    Endpoint for the administrator map: server-side clusters of the reports in a viewport.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Clusters of the reports inside the viewport, each with its count, centroid, dominant emergency "
+            "type and dominant status. From zoom MAP_CLUSTER_MAX_ZOOM on, individual reports are returned "
+            "instead (at most MAP_MAX_REPORTS, newest first). Clusters are capped at MAP_CLUSTER_MAX_CELLS."
+        ),
+        tags=['Emergency Reports'],
+        manual_parameters=VIEWPORT_PARAMETERS + [
+            openapi.Parameter('status', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Comma-separated statuses to include'),
+            openapi.Parameter('emergency_type', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_UUID, description='Only this emergency type')
+        ],
+        responses={
+            200: "mode ('clusters' or 'reports'), geohash precision, truncated flag and the clusters or reports",
+            400: "Invalid viewport, zoom or filter",
+            401: "Authentication required"
+        }
+    )
+    def get(self, request):
+        try:
+            viewport, zoom = parse_viewport(request.query_params)
+        except ValueError as e:
+            return Response({
+                'status': 'error',
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        reports = EmergencyReport.objects.all()
+        if request.query_params.get('status'):
+            reports = reports.filter(status__in=request.query_params['status'].split(','))
+        if request.query_params.get('emergency_type'):
+            try:
+                reports = reports.filter(emergency_type_id=uuid.UUID(request.query_params['emergency_type']))
+            except ValueError:
+                return Response({
+                    'status': 'error',
+                    'message': 'emergency_type must be a UUID.'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'status': 'success',
+            'message': 'Map clusters retrieved.',
+            'data': viewport_clusters(viewport, zoom, reports)
+        }, status=status.HTTP_200_OK)
+
+class EmergencyReportSearch(APIView):
+    """
+    Endpoint for responders and administrators: reports whose details match a search.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Reports whose details match `q`, best match first. `q` takes words, \"quoted phrases\", OR and "
+            "-word; words of 3 or more letters also match inside longer words. Only reports of the last `days` "
+            "days are searched. On PostgreSQL the matches are ranked by relevance, then newest first; elsewhere "
+            "they are only listed newest first."
+        ),
+        tags=['Emergency Reports'],
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True, description='Search text'),
+            openapi.Parameter('status', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Comma-separated statuses to include'),
+            openapi.Parameter('emergency_type', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Comma-separated emergency type ids to include'),
+            openapi.Parameter('days', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Days to search back (default SEARCH_DEFAULT_DAYS, at most SEARCH_MAX_DAYS)'),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Number of reports (default 20, at most SEARCH_MAX_LIMIT)')
+        ],
+        responses={
+            200: "Matching reports, each with its search rank",
+            400: "Missing search text, invalid days, limit or emergency type",
+            401: "Authentication required"
+        }
+    )
+    def get(self, request):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response({
+                'status': 'error',
+                'message': 'q is required.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            days = int(request.query_params.get('days', settings.SEARCH_DEFAULT_DAYS))
+            if not 1 <= days <= settings.SEARCH_MAX_DAYS:
+                raise ValueError
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': f'days must be an integer between 1 and {settings.SEARCH_MAX_DAYS}.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', 20))
+            if not 1 <= limit <= settings.SEARCH_MAX_LIMIT:
+                raise ValueError
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': f'limit must be an integer between 1 and {settings.SEARCH_MAX_LIMIT}.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # On Postgres the window also prunes the search to the recent monthly partitions
+        reports = EmergencyReport.objects.filter(date_created__gte=timezone.now() - timedelta(days=days))
+        if request.query_params.get('status'):
+            reports = reports.filter(status__in=request.query_params['status'].split(','))
+        if request.query_params.get('emergency_type'):
+            try:
+                reports = reports.filter(emergency_type_id__in=[
+                    uuid.UUID(value) for value in request.query_params['emergency_type'].split(',')
+                ])
+            except ValueError:
+                return Response({
+                    'status': 'error',
+                    'message': 'emergency_type must be a comma-separated list of UUIDs.'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        reports = list(search_reports(reports, text)[:limit])
+        data = EmergencyReportSerializer(reports, many=True).data
+        for item, report in zip(data, reports):
+            item['rank'] = round(report.rank, 4)
+        return Response({
+            'status': 'success',
+            'message': 'Search results retrieved.',
+            'data': data
+        }, status=status.HTTP_200_OK)
+
+class TriageQueue(APIView):
+    """
+    Endpoint for responders: the highest-priority pending reports nobody is assigned to yet.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "The next `limit` pending unassigned reports, highest triage score first. The score adds up the "
+            "emergency type severity, net verification votes, linked duplicates and hours waited, each "
+            "weighted by its TRIAGE_* setting. Reports are only listed; claim one to take it off the queue."
+        ),
+        tags=['Emergency Reports'],
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Number of reports (default 10, at most TRIAGE_MAX_LIMIT)'),
+            openapi.Parameter('emergency_type', openapi.IN_QUERY, type=openapi.TYPE_STRING, description='Comma-separated emergency type ids to include')
+        ],
+        responses={
+            200: "Reports in priority order, each with its priority_score",
+            400: "Invalid limit or emergency type",
+            401: "Authentication required"
+        }
+    )
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 10))
+            if not 1 <= limit <= settings.TRIAGE_MAX_LIMIT:
+                raise ValueError
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': f'limit must be an integer between 1 and {settings.TRIAGE_MAX_LIMIT}.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        emergency_type_ids = None
+        if request.query_params.get('emergency_type'):
+            try:
+                emergency_type_ids = [uuid.UUID(value) for value in request.query_params['emergency_type'].split(',')]
+            except ValueError:
+                return Response({
+                    'status': 'error',
+                    'message': 'emergency_type must be a comma-separated list of UUIDs.'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        reports = list(next_reports(limit, emergency_type_ids))
+        now = timezone.now()
+        data = EmergencyReportSerializer(reports, many=True).data
+        for item, report in zip(data, reports):
+            item['priority_score'] = round(priority_score(report.priority, now), 2)
+        return Response({
+            'status': 'success',
+            'message': 'Triage queue retrieved.',
+            'data': data
+        }, status=status.HTTP_200_OK)
+
+class DispatchNextReport(APIView):
+    """
+    Endpoint for responders: take the highest-priority unassigned report their agencies handle.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description=(
+            "Atomically assign the highest-priority pending unassigned report of the emergency types handled "
+            "by the caller's agencies to the caller and set it to Responding. Concurrent callers each get a "
+            "different report: reports being dispatched to someone else are skipped, not waited for. "
+            "data is null when no report is waiting."
+        ),
+        tags=['Emergency Reports'],
+        responses={
+            200: "The assigned report with its priority_score, or null",
+            401: "Authentication required",
+            403: "The caller is not a responder of any agency"
+        }
+    )
+    def post(self, request):
+        emergency_type_ids = responder_emergency_types(request.user)
+        if not emergency_type_ids:
+            return Response({
+                'status': 'error',
+                'message': 'You are not a responder of an agency handling any emergency type.'
+            }, status=status.HTTP_403_FORBIDDEN)
+
+        report = dispatch_next(request.user, emergency_type_ids)
+        if report is None:
+            return Response({
+                'status': 'success',
+                'message': 'No reports are waiting for your agencies.',
+                'data': None
+            }, status=status.HTTP_200_OK)
+
+        data = EmergencyReportSerializer(report).data
+        data['priority_score'] = round(priority_score(report.priority), 2)
+        return Response({
+            'status': 'success',
+            'message': 'You have been assigned to this emergency report.',
+            'data': data
+        }, status=status.HTTP_200_OK)
+
+class EmergencyReportCreateAsync(AsyncAPIView):
+    """
+    Async variant of report creation for the ASGI deployment profile. The image upload is
+    awaited instead of blocking a worker, so one process can hold many slow uploads at once.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Create a new emergency report (async variant of POST /api/emergencies/reports/, same payload and response)",
+        tags=['Emergency Reports'],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['emergency_type', 'longitude', 'latitude'],
+            properties={
+                'emergency_type': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_UUID, description='ID of the emergency type'),
+                'longitude': openapi.Schema(type=openapi.TYPE_NUMBER, description='Longitude of the emergency location'),
+                'latitude': openapi.Schema(type=openapi.TYPE_NUMBER, description='Latitude of the emergency location'),
+                'details': openapi.Schema(type=openapi.TYPE_STRING, description='Additional details about the emergency'),
+                'image_base64': openapi.Schema(type=openapi.TYPE_STRING, description='Base64 encoded image string (with or without data URL prefix) or an image URL')
+            }
+        ),
+        responses={
+            201: EmergencyReportSerializer(),
+            400: "Validation failed",
+            401: "Authentication required"
+        }
+    )
+    async def post(self, request):
+        data = request.data.copy()
+        image = data.pop('image_base64', None)
+        if data.get('details'):
+            import bleach
+            data['details'] = bleach.clean(data['details'], tags=['b', 'i', 'u'], strip=True)
+
+        # Validate everything but the image (the serializer would upload it synchronously)
+        serializer = EmergencyReportSerializer(data=data)
+        errors = {} if await sync_to_async(serializer.is_valid)() else dict(serializer.errors)
+        image_url = None
+        if not errors:
+            success, image_url = await FileService.process_image_field_async(image, folder='emergency_reports')
+            if not success:
+                errors['image_base64'] = [image_url]
+        if errors:
+            return Response({
+                'status': 'error',
+                'message': 'Validation failed',
+                'errors': errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        report = await EmergencyReport.objects.acreate(user=request.user, image_url=image_url, **serializer.validated_data)
+        return Response({
+            'status': 'success',
+            'message': 'Emergency report created successfully',
+            'data': EmergencyReportSerializer(report).data
+        }, status=status.HTTP_201_CREATED)
+
+class EmergencyVerificationCreateAsync(AsyncAPIView):
+    """
+    Async variant of verification creation for the ASGI deployment profile.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Create a new emergency verification (async variant of POST /api/emergencies/verifications/, same payload and response)",
+        tags=['Emergency Verifications'],
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            required=['report', 'vote'],
+            properties={
+                'report': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_UUID, description='ID of the emergency report to verify'),
+                'vote': openapi.Schema(type=openapi.TYPE_BOOLEAN, description='True if verifying the emergency, False if denying'),
+                'details': openapi.Schema(type=openapi.TYPE_STRING, description='Additional details about the verification. Required when vote is False, must be at least 5 characters.'),
+                'image_base64': openapi.Schema(type=openapi.TYPE_STRING, description='Base64 encoded image string (with or without data URL prefix) or an image URL')
+            }
+        ),
+        responses={
+            201: EmergencyVerificationSerializer(),
+            400: "Validation error - details required for denial or too short",
+            401: "Authentication required"
+        }
+    )
+    async def post(self, request):
+        data = request.data.copy()
+        image = data.pop('image_base64', None)
+
+        serializer = EmergencyVerificationSerializer(data=data)
+        errors = {} if await sync_to_async(serializer.is_valid)() else dict(serializer.errors)
+        image_url = None
+        if not errors:
+            success, image_url = await FileService.process_image_field_async(image, folder='emergency_verifications')
+            if not success:
+                errors['image_base64'] = [image_url]
+        if errors:
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # EmergencyVerification.save() also refreshes the report's verification status
+        verification = await EmergencyVerification.objects.acreate(user=request.user, image_url=image_url, **serializer.validated_data)
+        return Response(EmergencyVerificationSerializer(verification).data, status=status.HTTP_201_CREATED)
+
 class TriggerCrowdsourcingBroadcast(APIView):
     """
     Endpoint for responders to trigger a crowdsourcing broadcast within a specific range.
@@ -467,7 +1132,6 @@ class TriggerCrowdsourcingBroadcast(APIView):
 
         # Check if the points are the same (distance is 0)
         if lat1 == lat2 and lon1 == lon1:
-            print(f"Points are the same: ({lat1}, {lon1})")
             return 0.0
 
         R = 6371  # Radius of the Earth in kilometers
@@ -479,10 +1143,8 @@ class TriggerCrowdsourcingBroadcast(APIView):
 
         # Treat very small distances as zero
         if distance < 0.1:  # Adjusted threshold for very small distances
-            print(f"Distance ({distance} km) is considered zero.")
             return 0.0
 
-        print(f"Calculated distance: {distance} km between ({lat1}, {lon1}) and ({lat2}, {lon2})")
         return distance
 
     @swagger_auto_schema(
@@ -508,10 +1170,16 @@ class TriggerCrowdsourcingBroadcast(APIView):
 
         # Validate the emergency report
         report = get_object_or_404(EmergencyReport, id=report_id)
+        # A duplicate report broadcasts its incident's canonical report, so one incident
+        # reported many times is only broadcast once, unless that report was closed
+        if report.canonical_report_id is not None:
+            report = EmergencyReport.objects.filter(
+                id=report.canonical_report_id
+            ).exclude(status__in=CLOSED_STATUSES).first() or report
         report_lat, report_lon = report.latitude, report.longitude
 
         # Filter all user profiles within the specified range
-        user_profiles = UserProfile.objects.filter(status='approved')
+        user_profiles = UserProfile.objects.filter(status='approved').select_related('user')
         users_within_range = []
         # Exclude users when the range is explicitly set to 0 km
         if broadcast_range == 0:
@@ -525,7 +1193,7 @@ class TriggerCrowdsourcingBroadcast(APIView):
 
         # Filter relevant agencies by emergency type and proximity
         relevant_agencies = Agency.objects.filter(
-            agencyemergencytype__emergency_type=report.emergency_type
+            agencyemergencytype__emergency_type_id=report.emergency_type_id
         )
         agencies_within_range = []
         for agency in relevant_agencies:
@@ -551,6 +1219,7 @@ class TriggerCrowdsourcingBroadcast(APIView):
 
         return Response({
             "message": "Broadcast triggered successfully.",
+            "report_id": str(report.id),
             "users": user_ids,
             "notified_agencies": agency_notifications
         }, status=status.HTTP_200_OK)
@@ -581,7 +1250,7 @@ class MarkReportAsVerified(APIView):
         report_id = request.data.get('report_id')
         report = get_object_or_404(EmergencyReport, id=report_id)
         report.verification_status = 'Verified'
-        report.save()
+        report.save(update_fields=['verification_status'])
         return Response({"message": "Report marked as verified."}, status=status.HTTP_200_OK)
 
 class EmergencyReportResponderActions(APIView):
@@ -591,17 +1260,19 @@ class EmergencyReportResponderActions(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, report_id):
-        report = get_object_or_404(EmergencyReport, id=report_id)
+        with transaction.atomic():
+            # Locked so that two responders claiming at once cannot both succeed
+            report = get_object_or_404(EmergencyReport.objects.select_for_update(), id=report_id)
 
-        if report.responder is not None:
-            return Response({
-                'status': 'error',
-                'message': 'This report has already been assigned to another responder.'
-            }, status=status.HTTP_400_BAD_REQUEST)
+            if report.responder is not None:
+                return Response({
+                    'status': 'error',
+                    'message': 'This report has already been assigned to another responder.'
+                }, status=status.HTTP_400_BAD_REQUEST)
 
-        report.responder = request.user
-        report.status = 'Responding'
-        report.save()
+            report.responder = request.user
+            report.status = 'Responding'
+            report.save(update_fields=['responder', 'status'])
 
         return Response({
             'status': 'success',
@@ -614,7 +1285,7 @@ class EmergencyReportResponderActions(APIView):
 
         report.responder = None
         report.status = 'Pending'
-        report.save()
+        report.save(update_fields=['responder', 'status'])
 
         return Response({
             'status': 'success',
@@ -639,7 +1310,7 @@ class EmergencyReportStatusUpdate(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         report.status = new_status
-        report.save()
+        report.save(update_fields=['status'])
 
         return Response({
             'status': 'success',
@@ -663,21 +1334,17 @@ class TriggerCrowdsourcing(APIView):
                 'message': 'Only responders can trigger crowdsourcing.'
             }, status=status.HTTP_403_FORBIDDEN)
 
-        # Identify nearby users (example logic, replace with actual distance calculation)
-        nearby_users = UserProfile.objects.filter(
-            status='approved',
-            latitude__range=(report.latitude - 0.1, report.latitude + 0.1),
-            longitude__range=(report.longitude - 0.1, report.longitude + 0.1)
-        ).exclude(user=request.user)
+        # Identify nearby users, by their last ping when it is recent, else their profile location
+        nearby_users = approved_users_near(report.latitude, report.longitude, 0.1, exclude_user=request.user)
 
         # Send verification prompts (mocked for now)
         for user in nearby_users:
-            print(f"Sending verification request to {user.user.email}")
+            print(f"Sending verification request to {user.email}")
 
         return Response({
             'status': 'success',
             'message': 'Crowdsourcing verification triggered.',
-            'notified_users': [user.user.email for user in nearby_users]
+            'notified_users': [user.email for user in nearby_users]
         }, status=status.HTTP_200_OK)
 
 class RespondToEmergency(APIView):
@@ -712,7 +1379,7 @@ class RespondToEmergency(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         report.status = 'Responded'
-        report.save()
+        report.save(update_fields=['status'])
 
         # Notify the reporter
         send_mail(
@@ -2,6 +2,7 @@
 
 echo "Running migrations..."
 python manage.py migrate
+python manage.py createcachetable
 
 echo "Starting server..."
 python manage.py runserver 0.0.0.0:8000
\ No newline at end of file
@@ -0,0 +1,60 @@
+"""
+Database router sending read-only request traffic to read replicas.
+
+Replicas are only used inside a replica_reads() block, which ReplicaRoutingMiddleware opens
+for safe requests on settings.REPLICA_READ_PATH_PREFIXES. Everything else, including all
+writes and reads done while handling a write, stays on the primary ('default').
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Let reads inside the block go to a replica"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_aliases():
+    """Database aliases configured as read replicas"""
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+class ReplicaRouter:
+    """
+    Route reads to a random replica while replica_reads() is active, writes to the primary.
+    Apps listed in settings.REPLICA_EXCLUDED_APPS (auth tokens, users) are always read from
+    the primary so a token issued a moment ago is never missing on a lagging replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if not replicas or not _replica_reads.get():
+            return 'default'
+        if model._meta.app_label in getattr(settings, 'REPLICA_EXCLUDED_APPS', ()):
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        databases = {'default', *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema through replication
+        return db not in replica_aliases()
@@ -1,12 +1,36 @@
 """
 Custom middleware to separate session-based authentication (for Django admin)
-from token-based authentication (for API endpoints).
+from token-based authentication (for API endpoints), to instrument requests and
+to route read-only traffic to read replicas.
 """
+import hashlib
+import logging
 
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
 from django.contrib.sessions.middleware import SessionMiddleware
 from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
 from django.middleware.csrf import CsrfViewMiddleware
 from django.contrib.messages.middleware import MessageMiddleware
+from django.utils.decorators import sync_and_async_middleware
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from core.services.metrics import RequestMetrics, endpoint_stats, exceeded_budgets
+from nstw_backend.db_routers import replica_aliases, replica_reads
+
+
+metrics_logger = logging.getLogger('nstw_backend.metrics')
+
+
+def uses_session(request):
+    """
+    Return True when the request targets a session-based path (Django admin by default).
+    The prefixes come from settings.SESSION_PATH_PREFIXES.
+    """
+    return request.path.startswith(getattr(settings, 'SESSION_PATH_PREFIXES', ('/admin/',)))
 
 
 class ConditionalSessionMiddleware(SessionMiddleware):
@@ -16,14 +40,14 @@ class ConditionalSessionMiddleware(SessionMiddleware):
     """
     def process_request(self, request):
         # Only enable sessions for admin paths
-        if request.path.startswith('/admin/'):
+        if uses_session(request):
             return super().process_request(request)
         # Skip session processing for API endpoints
         return None
 
     def process_response(self, request, response):
         # Only process session response for admin paths
-        if request.path.startswith('/admin/'):
+        if uses_session(request):
             return super().process_response(request, response)
         return response
 
@@ -35,13 +59,13 @@ class ConditionalCsrfMiddleware(CsrfViewMiddleware):
     """
     def process_request(self, request):
         # Only enable CSRF for admin paths
-        if request.path.startswith('/admin/'):
+        if uses_session(request):
             return super().process_request(request)
         return None
 
     def process_view(self, request, callback, callback_args, callback_kwargs):
         # Only apply CSRF checks for admin paths
-        if request.path.startswith('/admin/'):
+        if uses_session(request):
             return super().process_view(request, callback, callback_args, callback_kwargs)
         return None
 
@@ -53,11 +77,10 @@ class ConditionalAuthMiddleware(AuthenticationMiddleware):
     """
     def process_request(self, request):
         # Only enable session-based auth for admin paths
-        if request.path.startswith('/admin/'):
+        if uses_session(request):
             return super().process_request(request)
         # For API paths, set user to AnonymousUser initially
         # DRF will handle authentication via TokenAuthentication
-        from django.contrib.auth.models import AnonymousUser
         request.user = AnonymousUser()
         return None
 
@@ -69,12 +92,171 @@ class ConditionalMessageMiddleware(MessageMiddleware):
     """
     def process_request(self, request):
         # Only enable messages for admin paths
-        if request.path.startswith('/admin/'):
+        if uses_session(request):
             return super().process_request(request)
         return None
 
     def process_response(self, request, response):
         # Only process message response for admin paths
-        if request.path.startswith('/admin/'):
+        if uses_session(request):
             return super().process_response(request, response)
         return response
+
+
+class AsyncCapableMiddleware:
+    """
+    Base for middleware that runs in the request's own mode: under ASGI, __acall__ awaits
+    the async handler instead of Django running the middleware in a thread.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        raise NotImplementedError
+
+    async def __acall__(self, request):
+        raise NotImplementedError
+
+
+@sync_and_async_middleware
+class AsyncWhiteNoiseMiddleware(AsyncCapableMiddleware, WhiteNoiseMiddleware):
+    """
+    WhiteNoise, which is sync-only, without its thread under ASGI. A sync-only middleware
+    makes Django run it, and every request passing through it, in a thread. Here only
+    the requests for static files go to a thread, to open the file.
+    """
+    def __init__(self, get_response):
+        WhiteNoiseMiddleware.__init__(self, get_response)
+        AsyncCapableMiddleware.__init__(self, get_response)
+
+    def handle(self, request):
+        return WhiteNoiseMiddleware.__call__(self, request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
+
+
+@sync_and_async_middleware
+class RequestMetricsMiddleware(AsyncCapableMiddleware):
+    """
+    Record query count, DB time and timed sections (serialization, uploads) per request.
+    Totals are kept per endpoint, exposed in a Server-Timing header, and requests that
+    exceed settings.REQUEST_BUDGETS are logged as warnings.
+    """
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    def handle(self, request):
+        metrics = RequestMetrics()
+        with metrics.activate():
+            response = self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        with metrics.activate():
+            response = await self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        metrics.endpoint = self.get_endpoint(request)
+        endpoint_stats.record(metrics)
+        response['Server-Timing'] = metrics.server_timing()
+
+        budgets = dict(getattr(settings, 'REQUEST_BUDGETS', {}))
+        budgets.update(getattr(settings, 'REQUEST_BUDGET_OVERRIDES', {}).get(metrics.endpoint, {}))
+        violations = exceeded_budgets(metrics, budgets)
+        if violations:
+            metrics_logger.warning(
+                'Request over budget: %s (%s) %s', metrics.endpoint, ', '.join(violations), metrics.as_dict()
+            )
+        return response
+
+    @staticmethod
+    def get_endpoint(request):
+        """Group requests by method and URL pattern rather than by concrete path"""
+        match = getattr(request, 'resolver_match', None)
+        route = f'/{match.route}' if match is not None and match.route else request.path
+        return f'{request.method} {route}'
+
+
+@sync_and_async_middleware
+class ReplicaRoutingMiddleware(AsyncCapableMiddleware):
+    """
+    Serve safe requests on settings.REPLICA_READ_PATH_PREFIXES from the read replicas.
+    A client that sent a write is pinned to the primary for REPLICA_PIN_SECONDS so it
+    reads its own writes despite replication lag. Clients are told apart by their
+    Authorization header; pins live in the REPLICA_PIN_CACHE cache, which must be shared
+    by all workers (not the per-process local memory cache) for pins to hold across them.
+    """
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    def handle(self, request):
+        pin_key = self.get_pin_key(request)
+        cache = self.get_pin_cache()
+
+        if request.method not in self.SAFE_METHODS:
+            response = self.get_response(request)
+            if pin_key:
+                cache.set(pin_key, True, timeout=getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+            return response
+
+        if self.reads_from_replica(request):
+            if not (pin_key and cache.get(pin_key)):
+                with replica_reads():
+                    return self.get_response(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        pin_key = self.get_pin_key(request)
+        cache = self.get_pin_cache()
+
+        if request.method not in self.SAFE_METHODS:
+            response = await self.get_response(request)
+            if pin_key:
+                await cache.aset(pin_key, True, timeout=getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+            return response
+
+        if self.reads_from_replica(request):
+            if not (pin_key and await cache.aget(pin_key)):
+                # The router reads a context variable, which sync_to_async carries into the
+                # threads that run the queries
+                with replica_reads():
+                    return await self.get_response(request)
+        return await self.get_response(request)
+
+    @staticmethod
+    def reads_from_replica(request):
+        return request.path.startswith(tuple(getattr(settings, 'REPLICA_READ_PATH_PREFIXES', ())))
+
+    @staticmethod
+    def get_pin_cache():
+        return caches[getattr(settings, 'REPLICA_PIN_CACHE', 'default')]
+
+    @staticmethod
+    def get_pin_key(request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        return 'replica-pin:' + hashlib.sha256(authorization.encode()).hexdigest()
@@ -0,0 +1,41 @@
+"""
+Warming the application in gunicorn's master before it forks the workers.
+
+The heavy dependencies are imported on first use (DEFERRED_IMPORTS), so a worker boots
+without them. With GUNICORN_PRELOAD=True, start_production.sh runs gunicorn with --preload:
+the master imports the application once, warm() loads the URLconf with every view, the
+deferred modules and the OpenAPI schema, and the forked workers share those pages
+copy-on-write instead of each loading its own copy on its first requests. gc.freeze() keeps
+the collector in the workers from writing to (and so copying) the shared objects.
+
+Nothing here may open a database connection or start a thread: neither survives the fork.
+"""
+import gc
+import importlib
+
+from django.db import connections
+from django.urls import get_resolver
+
+
+# Imported on first use rather than at boot; see core.services.file_service and emergencies
+DEFERRED_IMPORTS = (
+    'PIL.Image',
+    'cloudinary.uploader',
+    'cloudinary.utils',
+    'httpx',
+    'bleach',
+)
+
+
+def warm():
+    """Load everything a worker would load on its first requests"""
+    from nstw_backend.schema import SCHEMA_FILES, cached_schema
+
+    for name in DEFERRED_IMPORTS:
+        importlib.import_module(name)
+    get_resolver().url_patterns
+    for format in SCHEMA_FILES:
+        cached_schema(format)
+    # A connection opened by mistake must not be shared by the workers
+    connections.close_all()
+    gc.freeze()
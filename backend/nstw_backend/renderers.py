@@ -0,0 +1,17 @@
+"""
+Renderers used by the REST API.
+"""
+from rest_framework.renderers import JSONRenderer
+
+from core.services.metrics import timed
+
+
+class InstrumentedJSONRenderer(JSONRenderer):
+    """
+    JSON renderer that adds its time to the request's 'serialization' section, where
+    core.serializers.TimedSerializerMixin records the time to build serializer.data
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('serialization'):
+            return super().render(data, accepted_media_type, renderer_context)
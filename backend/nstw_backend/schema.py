@@ -0,0 +1,119 @@
+"""
+The OpenAPI schema, generated once and served from memory.
+
+drf_yasg builds the schema by introspecting every view and serializer, which takes a good
+part of a second of CPU per request. `manage.py generate_schema` writes it to
+OPENAPI_SCHEMA_DIR at deploy (see start_production.sh). Each process reads the files on the
+first request and then serves them from memory with an ETag, answering If-None-Match with
+304. Without the files, each process generates the schema once on its first request. The
+Swagger UI and ReDoc pages load the spec from /swagger.json (SPEC_URL).
+"""
+import hashlib
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from drf_yasg import openapi
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.generators import OpenAPISchemaGenerator
+from drf_yasg.views import get_schema_view
+from rest_framework import permissions
+
+
+logger = logging.getLogger(__name__)
+
+API_INFO = openapi.Info(
+   title="Alisto API",
+   default_version='v1',
+   description="API documentation for the Alisto emergency response system",
+   terms_of_service="",
+   contact=openapi.Contact(email="contact@alisto.example.com"),
+   license=openapi.License(name="MIT License"),
+)
+
+# File name and content type per format; drf_yasg's renderers name JSON both '.json' and 'openapi'
+SCHEMA_FILES = {
+    '.json': ('openapi.json', 'application/json'),
+    '.yaml': ('openapi.yaml', 'application/yaml'),
+}
+RENDERER_FORMATS = {'openapi': '.json', '.json': '.json', '.yaml': '.yaml'}
+
+_lock = threading.Lock()
+_schemas = {}  # (directory, format) -> (content, etag)
+
+
+def generate_schema():
+    """The encoded schema of every public endpoint, by format"""
+    schema = OpenAPISchemaGenerator(API_INFO).get_schema(request=None, public=True)
+    return {
+        '.json': OpenAPICodecJson(validators=[]).encode(schema),
+        '.yaml': OpenAPICodecYaml(validators=[]).encode(schema),
+    }
+
+
+def write_schema(directory, schemas=None):
+    """Write the schema files to directory; returns their paths"""
+    schemas = schemas or generate_schema()
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for format, content in schemas.items():
+        path = os.path.join(directory, SCHEMA_FILES[format][0])
+        # Replace atomically: running workers may be reading the previous file
+        with open(f'{path}.tmp', 'wb') as file:
+            file.write(content)
+        os.replace(f'{path}.tmp', path)
+        paths.append(path)
+    return paths
+
+
+def _etag(content):
+    return '"%s"' % hashlib.sha256(content).hexdigest()[:32]
+
+
+def cached_schema(format):
+    """(content, etag) of the schema in format, from OPENAPI_SCHEMA_DIR or generated once"""
+    directory = str(settings.OPENAPI_SCHEMA_DIR)
+    key = (directory, format)
+    if key in _schemas:
+        return _schemas[key]
+    with _lock:
+        if key not in _schemas:
+            try:
+                with open(os.path.join(directory, SCHEMA_FILES[format][0]), 'rb') as file:
+                    content = file.read()
+            except FileNotFoundError:
+                logger.warning('No OpenAPI schema in %s; generating it (run manage.py generate_schema at deploy)', directory)
+                for generated_format, generated in generate_schema().items():
+                    _schemas.setdefault((directory, generated_format), (generated, _etag(generated)))
+            else:
+                _schemas[key] = (content, _etag(content))
+        return _schemas[key]
+
+
+BaseSchemaView = get_schema_view(
+   API_INFO,
+   public=True,
+   permission_classes=(permissions.AllowAny,),
+   authentication_classes=[],  # Disable authentication for the schema view itself
+)
+
+
+class SchemaView(BaseSchemaView):
+    """drf_yasg's schema view, serving the spec formats from cached_schema()"""
+
+    def get(self, request, version='', format=None):
+        schema_format = RENDERER_FORMATS.get(request.accepted_renderer.format)
+        if schema_format is None:
+            # The UI pages render without introspecting the views
+            return super().get(request, version, format)
+        content, etag = cached_schema(schema_format)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type=SCHEMA_FILES[schema_format][1])
+        response['ETag'] = etag
+        response['Cache-Control'] = 'public, no-cache'
+        return response
+
@@ -53,6 +53,7 @@ INSTALLED_APPS = [
     'knox',
 
     # Apps
+    'core',
     'accounts',         
     'responders',
     'emergencies',
@@ -73,23 +74,38 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'nstw_backend.renderers.InstrumentedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.ScopedRateThrottle',
+        'nstw_backend.throttling.AnonRateThrottle',
+        'nstw_backend.throttling.UserRateThrottle',
+        'nstw_backend.throttling.ScopedRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'anon': '20/minute',
-        'user': '100/minute',
+        'anon': os.getenv('THROTTLE_ANON_RATE', '20/minute'),
+        'user': os.getenv('THROTTLE_USER_RATE', '100/minute'),
         'login': '5/minute',
         'register': '3/minute',
         'password_reset_request': '3/minute',
         'password_reset_confirm': '3/minute',
         'email_verification_request': '3/minute',
         'email_verification_confirm': '3/minute',
+        'location': os.getenv('THROTTLE_LOCATION_RATE', '120/minute'),
     },
 }
 
+# Throttle counts shared by the workers (see core/services/throttling.py): 'file' shares them
+# between the workers of one server through THROTTLE_FILE_PATH (default: a file in the temp
+# directory per process group), 'database' between all servers through the database, 'redis'
+# through the Redis-compatible server at THROTTLE_REDIS_URL (needs `pip install redis`)
+THROTTLE_BACKEND = os.getenv('THROTTLE_BACKEND', 'file')
+THROTTLE_FILE_PATH = os.getenv('THROTTLE_FILE_PATH', '')
+THROTTLE_FILE_SLOTS = int(os.getenv('THROTTLE_FILE_SLOTS', '65536'))
+THROTTLE_PRUNE_SECONDS = float(os.getenv('THROTTLE_PRUNE_SECONDS', '300'))
+THROTTLE_REDIS_URL = os.getenv('THROTTLE_REDIS_URL', 'redis://localhost:6379/0')
+
 # Swagger/OpenAPI settings
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
@@ -109,7 +125,14 @@ SWAGGER_SETTINGS = {
         'delete',
         'patch'
     ],
+    # The UIs load the cached schema rather than their own ?format=openapi
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
 }
+REDOC_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+# Schema files written by `manage.py generate_schema` and served from memory (nstw_backend/schema.py)
+OPENAPI_SCHEMA_DIR = Path(os.getenv('OPENAPI_SCHEMA_DIR', BASE_DIR / 'openapi'))
 
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
@@ -118,9 +141,15 @@ STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
-MIDDLEWARE = [
+# Middleware profiles
+# 'standard' runs the stock session, CSRF, auth and messages middleware on every request.
+# 'stateless' (production) only runs them for SESSION_PATH_PREFIXES (Django admin);
+# token-authenticated API requests skip session, CSRF and message handling entirely.
+STANDARD_MIDDLEWARE = [
+    'nstw_backend.middleware.RequestMetricsMiddleware',
+    'nstw_backend.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'nstw_backend.middleware.AsyncWhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -130,6 +159,134 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+STATELESS_MIDDLEWARE = [
+    'nstw_backend.middleware.RequestMetricsMiddleware',
+    'nstw_backend.middleware.ReplicaRoutingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'nstw_backend.middleware.AsyncWhiteNoiseMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'nstw_backend.middleware.ConditionalSessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'nstw_backend.middleware.ConditionalCsrfMiddleware',
+    'nstw_backend.middleware.ConditionalAuthMiddleware',
+    'nstw_backend.middleware.ConditionalMessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+MIDDLEWARE_PROFILES = {
+    'standard': STANDARD_MIDDLEWARE,
+    'stateless': STATELESS_MIDDLEWARE,
+}
+
+MIDDLEWARE_PROFILE = os.getenv('MIDDLEWARE_PROFILE', 'standard')
+if MIDDLEWARE_PROFILE not in MIDDLEWARE_PROFILES:
+    raise RuntimeError(f"Unknown MIDDLEWARE_PROFILE '{MIDDLEWARE_PROFILE}'. Choose one of: {', '.join(MIDDLEWARE_PROFILES)}.")
+MIDDLEWARE = list(MIDDLEWARE_PROFILES[MIDDLEWARE_PROFILE])
+
+# Paths that keep session, CSRF and message handling under the stateless profile
+SESSION_PATH_PREFIXES = ('/admin/',)
+
+# Warm the application in gunicorn's master so the forked workers share it (nstw_backend/preload.py);
+# start_production.sh then runs gunicorn with --preload
+GUNICORN_PRELOAD = os.getenv('GUNICORN_PRELOAD', 'False') == 'True'
+
+# Request instrumentation (query count, DB time, serialization and upload time per endpoint)
+REQUEST_METRICS_ENABLED = os.getenv('REQUEST_METRICS_ENABLED', 'True') == 'True'
+# Requests exceeding any of these budgets are logged by the 'nstw_backend.metrics' logger
+REQUEST_BUDGETS = {
+    'queries': int(os.getenv('REQUEST_BUDGET_QUERIES', '25')),
+    'db_ms': float(os.getenv('REQUEST_BUDGET_DB_MS', '200')),
+    'total_ms': float(os.getenv('REQUEST_BUDGET_TOTAL_MS', '1000')),
+}
+# Per-endpoint budget overrides, keyed like 'POST /api/emergencies/reports/'
+REQUEST_BUDGET_OVERRIDES = {
+    'POST /api/emergencies/reports/': {'total_ms': 5000},
+    'POST /api/emergencies/verifications/': {'total_ms': 5000},
+    'POST /api/emergencies/sync/': {'total_ms': 5000},
+}
+
+# Maximum number of reports plus verifications accepted in one offline sync batch
+SYNC_MAX_BATCH_SIZE = int(os.getenv('SYNC_MAX_BATCH_SIZE', '200'))
+# Maximum change-log entries read per delta sync page
+SYNC_CHANGES_PAGE_SIZE = int(os.getenv('SYNC_CHANGES_PAGE_SIZE', '500'))
+# Change-log entries younger than this are returned again on the next delta sync, since a
+# transaction still open may commit an entry below them; keep it above the longest transaction
+SYNC_VISIBILITY_LAG_SECONDS = float(os.getenv('SYNC_VISIBILITY_LAG_SECONDS', '5'))
+
+# Cold storage for closed reports moved out of the hot tables by `manage.py archive_reports`.
+# Point ARCHIVE_ROOT at a persistent volume; the archive files are the only copy of those reports.
+ARCHIVE_ROOT = Path(os.getenv('ARCHIVE_ROOT', BASE_DIR / 'archive'))
+# Resolved or dismissed reports older than this many days are archived
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+
+# Dashboard analytics: default and maximum number of days per request
+ANALYTICS_DEFAULT_DAYS = int(os.getenv('ANALYTICS_DEFAULT_DAYS', '30'))
+ANALYTICS_MAX_DAYS = int(os.getenv('ANALYTICS_MAX_DAYS', '366'))
+# Geohash precisions with precomputed heatmap counts (3 is ~156 km cells, 6 is ~1 km);
+# run `manage.py reconcile_rollups --all` after changing them
+HEATMAP_PRECISIONS = tuple(int(value) for value in os.getenv('HEATMAP_PRECISIONS', '3,4,5,6').split(','))
+# Maximum cells per heatmap response; larger viewports fall back to a coarser precision
+HEATMAP_MAX_CELLS = int(os.getenv('HEATMAP_MAX_CELLS', '1024'))
+# Map clustering: maximum clusters per viewport, zoom from which individual reports are
+# returned, and maximum reports returned at that zoom
+MAP_CLUSTER_MAX_CELLS = int(os.getenv('MAP_CLUSTER_MAX_CELLS', '256'))
+MAP_CLUSTER_MAX_ZOOM = int(os.getenv('MAP_CLUSTER_MAX_ZOOM', '16'))
+MAP_MAX_REPORTS = int(os.getenv('MAP_MAX_REPORTS', '500'))
+
+# Duplicate detection at ingest: a new report of the same emergency type within
+# DUPLICATE_RADIUS_METERS of an open report from the last DUPLICATE_WINDOW_MINUTES is
+# linked to that report's incident
+DUPLICATE_DETECTION_ENABLED = os.getenv('DUPLICATE_DETECTION_ENABLED', 'True') == 'True'
+DUPLICATE_RADIUS_METERS = float(os.getenv('DUPLICATE_RADIUS_METERS', '150'))
+DUPLICATE_WINDOW_MINUTES = int(os.getenv('DUPLICATE_WINDOW_MINUTES', '30'))
+# How often each process pulls reports created by the other processes into its index
+DUPLICATE_INDEX_REFRESH_SECONDS = float(os.getenv('DUPLICATE_INDEX_REFRESH_SECONDS', '2'))
+
+# Triage queue score: severity (1-5) of the emergency type, net verification votes, linked
+# duplicates and hours waited, each times its weight. Run `manage.py rescore_reports` after
+# changing a weight
+TRIAGE_SEVERITY_WEIGHT = float(os.getenv('TRIAGE_SEVERITY_WEIGHT', '10'))
+TRIAGE_VOTE_WEIGHT = float(os.getenv('TRIAGE_VOTE_WEIGHT', '2'))
+TRIAGE_DUPLICATE_WEIGHT = float(os.getenv('TRIAGE_DUPLICATE_WEIGHT', '3'))
+TRIAGE_AGE_WEIGHT = float(os.getenv('TRIAGE_AGE_WEIGHT', '1'))
+TRIAGE_MAX_LIMIT = int(os.getenv('TRIAGE_MAX_LIMIT', '50'))
+
+# Report search (emergencies/search.py): most results per request, and the days searched by
+# default and at most (ranking reads every match, so the window keeps broad searches fast)
+SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', '50'))
+SEARCH_DEFAULT_DAYS = int(os.getenv('SEARCH_DEFAULT_DAYS', '30'))
+SEARCH_MAX_DAYS = int(os.getenv('SEARCH_MAX_DAYS', '366'))
+
+# Location pings are coalesced per user in memory and upserted into LastKnownPosition every
+# LOCATION_FLUSH_SECONDS (by a background thread unless LOCATION_FLUSH_THREAD=False), or
+# once LOCATION_BUFFER_MAX_USERS users are waiting
+LOCATION_FLUSH_SECONDS = float(os.getenv('LOCATION_FLUSH_SECONDS', '5'))
+LOCATION_BUFFER_MAX_USERS = int(os.getenv('LOCATION_BUFFER_MAX_USERS', '1000'))
+LOCATION_FLUSH_THREAD = os.getenv('LOCATION_FLUSH_THREAD', 'True') == 'True'
+# Positions older than this fall back to the profile location
+LOCATION_STALE_MINUTES = int(os.getenv('LOCATION_STALE_MINUTES', '15'))
+
+# Nearest-responder recommendations: responders within DISPATCH_MAX_RADIUS_KM with fewer than
+# DISPATCH_MAX_ACTIVE_REPORTS reports in Responding count as available. Each process refreshes
+# its responder index every DISPATCH_INDEX_REFRESH_SECONDS and reloads it entirely every
+# DISPATCH_INDEX_FULL_REFRESH_SECONDS
+DISPATCH_MAX_RADIUS_KM = float(os.getenv('DISPATCH_MAX_RADIUS_KM', '50'))
+DISPATCH_MAX_ACTIVE_REPORTS = int(os.getenv('DISPATCH_MAX_ACTIVE_REPORTS', '1'))
+DISPATCH_MAX_CANDIDATES = int(os.getenv('DISPATCH_MAX_CANDIDATES', '20'))
+DISPATCH_INDEX_REFRESH_SECONDS = float(os.getenv('DISPATCH_INDEX_REFRESH_SECONDS', '2'))
+DISPATCH_INDEX_FULL_REFRESH_SECONDS = float(os.getenv('DISPATCH_INDEX_FULL_REFRESH_SECONDS', '60'))
+
+# Road ETAs for dispatch: the graph written by `manage.py build_road_graph` (empty disables
+# road routing). ROUTING_CANDIDATE_FACTOR times the requested responders are re-ranked by ETA;
+# points farther than ROUTING_SNAP_MAX_METERS from a road are unreachable, nearer ones cover
+# the gap at ROUTING_OFFROAD_SPEED_KMH. Road blocks are re-read every ROAD_BLOCK_REFRESH_SECONDS
+ROAD_GRAPH_PATH = os.getenv('ROAD_GRAPH_PATH', '')
+ROUTING_CANDIDATE_FACTOR = int(os.getenv('ROUTING_CANDIDATE_FACTOR', '3'))
+ROUTING_SNAP_MAX_METERS = float(os.getenv('ROUTING_SNAP_MAX_METERS', '500'))
+ROUTING_OFFROAD_SPEED_KMH = float(os.getenv('ROUTING_OFFROAD_SPEED_KMH', '15'))
+ROAD_BLOCK_REFRESH_SECONDS = float(os.getenv('ROAD_BLOCK_REFRESH_SECONDS', '10'))
+
 # Session configuration
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SAMESITE = 'Lax'
@@ -188,9 +345,81 @@ else:
             'OPTIONS': {
                 'sslmode': os.getenv('sslmode', 'disable'),  # Use 'disable' for local development without SSL
             },
+            # Verify reused connections before handing them to a request
+            'CONN_HEALTH_CHECKS': True,
         }
     }
 
+    # Connection pooling (psycopg3 pool, one per worker process). Sizes are per worker, so the
+    # server can receive up to GUNICORN_WORKERS * DB_POOL_MAX_SIZE connections.
+    # With the pool disabled, connections persist for DB_CONN_MAX_AGE seconds instead.
+    DB_POOL_ENABLED = os.getenv('DB_POOL_ENABLED', 'True') == 'True'
+    if DB_POOL_ENABLED:
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+            # Seconds a request waits for a free connection before failing
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+            'max_idle': float(os.getenv('DB_POOL_MAX_IDLE', '300')),
+            'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', '3600')),
+        }
+    else:
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+
+# Read replicas, each added as a 'replica_<n>' alias with the primary's other settings:
+# DB_REPLICA_HOSTS lists Postgres hosts (host or host:port); SQLITE_REPLICAS lists SQLite
+# files, e.g. a copy of db.sqlite3 to try the routing locally
+if USE_SQLITE:
+    replica_overrides = [{'NAME': path} for path in os.getenv('SQLITE_REPLICAS', '').split(',') if path]
+else:
+    replica_overrides = []
+    for replica_host in filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(',')):
+        replica_host, _, replica_port = replica_host.partition(':')
+        replica_overrides.append({'HOST': replica_host, 'PORT': replica_port or DATABASES['default']['PORT']})
+
+DATABASE_REPLICAS = []
+for index, overrides in enumerate(replica_overrides, start=1):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'OPTIONS': dict(DATABASES['default'].get('OPTIONS', {})),
+        **overrides,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
+DATABASE_ROUTERS = ['nstw_backend.db_routers.ReplicaRouter']
+
+# Safe requests under these paths read from the replicas (see ReplicaRoutingMiddleware)
+REPLICA_READ_PATH_PREFIXES = (
+    '/api/emergencies/reports/',
+    '/api/emergencies/changes/',
+    '/api/emergencies/analytics/',
+    '/api/agencies/',
+    '/api/public-info/',
+)
+# Always read from the primary: tokens and users must be visible right after login
+# (and the database cache, which holds the replica pins)
+REPLICA_EXCLUDED_APPS = ('knox', 'accounts', 'auth', 'sessions', 'contenttypes', 'admin', 'django_cache')
+# Seconds a client stays on the primary after a write (read-your-writes)
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '10'))
+# The pins must be seen by every worker, so they are not kept in the per-process default
+# cache: REPLICA_PIN_CACHE_BACKEND 'database' keeps them in the replica_pin_cache table
+# (created by `manage.py createcachetable`), 'redis' on the server at THROTTLE_REDIS_URL
+# (needs `pip install redis`)
+REPLICA_PIN_CACHE_BACKEND = os.getenv('REPLICA_PIN_CACHE_BACKEND', 'database')
+REPLICA_PIN_CACHE = 'replica_pins'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    REPLICA_PIN_CACHE: (
+        {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': THROTTLE_REDIS_URL}
+        if REPLICA_PIN_CACHE_BACKEND == 'redis' else
+        {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'replica_pin_cache'}
+    ),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -240,6 +469,15 @@ AUTH_USER_MODEL = 'accounts.User'
 
 AUTH_USER_MODEL = 'accounts.User'
 
+# Image storage backend: 'cloudinary', or 'stub' for benchmarks and load tests
+# (images are validated but never uploaded; a placeholder URL is returned)
+IMAGE_STORAGE_BACKEND = os.getenv('IMAGE_STORAGE_BACKEND', 'cloudinary')
+# Simulated upload latency of the stub backend, to mimic Cloudinary round trips under load
+IMAGE_STORAGE_STUB_LATENCY_MS = float(os.getenv('IMAGE_STORAGE_STUB_LATENCY_MS', '0'))
+
+# Socket timeout for the async image uploads (FileService.upload_to_cloudinary_async)
+IMAGE_UPLOAD_TIMEOUT_SECONDS = float(os.getenv('IMAGE_UPLOAD_TIMEOUT_SECONDS', '30'))
+
 # Cloudinary Configuration
 CLOUDINARY_CONFIG = {
     'CLOUD_NAME': os.getenv('CLOUDINARY_CLOUD_NAME', ''),
@@ -0,0 +1,43 @@
+"""
+DRF's throttles on the shared sliding-window counters of core.services.throttling: every
+worker sees the same counts, in fixed memory per client. Rates, scopes and cache keys are
+DRF's own.
+"""
+from rest_framework import throttling
+
+from core.services.throttling import get_throttle_store
+
+
+class SlidingWindowRateThrottle(throttling.SimpleRateThrottle):
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.hit = get_throttle_store().hit(self.key, self.duration, self.num_requests, self.timer())
+        return self.hit.allowed
+
+    def wait(self):
+        """Seconds until the estimated requests drop below the limit again"""
+        hit, limit = self.hit, self.num_requests
+        if limit <= 0:
+            return None
+        if hit.current >= limit:
+            # Not in this window; in the next one, once its count weighs little enough
+            seconds = self.duration - hit.elapsed + self.duration * (1 - limit / hit.current)
+        else:
+            seconds = self.duration * (1 - (limit - hit.current) / hit.previous) - hit.elapsed
+        return max(seconds, 0.0)
+
+
+class AnonRateThrottle(throttling.AnonRateThrottle, SlidingWindowRateThrottle):
+    """Limits anonymous clients by IP address, at the 'anon' rate"""
+
+
+class UserRateThrottle(throttling.UserRateThrottle, SlidingWindowRateThrottle):
+    """Limits authenticated users by id and anonymous ones by IP address, at the 'user' rate"""
+
+
+class ScopedRateThrottle(throttling.ScopedRateThrottle, SlidingWindowRateThrottle):
+    """Limits views with a throttle_scope at that scope's rate"""
@@ -17,13 +17,14 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
-from rest_framework import permissions
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
-from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
+from core.services.db_pool import pool_stats
+from core.services.metrics import endpoint_stats
+from nstw_backend.schema import SchemaView
 from emergencies.views import EmergencyReportResponderActions, EmergencyReportStatusUpdate, TriggerCrowdsourcing, RespondToEmergency
 
 @api_view(['GET'])
@@ -105,24 +106,25 @@ def authenticated_health_check(request):
         'profile': profile_data,
     }, status=200)
 
-schema_view = get_schema_view(
-   openapi.Info(
-      title="Alisto API",
-      default_version='v1',
-      description="API documentation for the Alisto emergency response system",
-      terms_of_service="",
-      contact=openapi.Contact(email="contact@alisto.example.com"),
-      license=openapi.License(name="MIT License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-   authentication_classes=[],  # Disable authentication for the schema view itself
+@swagger_auto_schema(
+    method='get',
+    operation_description="Per-endpoint request metrics (query count, DB, serialization and upload time) and database connection pool statistics collected by this worker process",
+    tags=['Health Check'],
+    security=[{'Token': []}]
 )
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def request_metrics(request):
+    """
+    Staff-only endpoint returning the request metrics and connection pool statistics of this worker process
+    """
+    return Response({'endpoints': endpoint_stats.snapshot(), 'db_pools': pool_stats()}, status=200)
 
 urlpatterns = [
     # Health check endpoints
     path('health/', health_check, name='health_check'),
     path('health/authenticated/', authenticated_health_check, name='authenticated_health_check'),
+    path('health/metrics/', request_metrics, name='request_metrics'),
     
     path('admin/', admin.site.urls),
     # API routes
@@ -132,10 +134,10 @@ urlpatterns = [
     path('api/public-info/', include('public_info.urls')),
     path('api/responders/', include('responders.urls')),
     
-    # Swagger documentation
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    # Swagger documentation; the schema itself is generated once (see nstw_backend/schema.py)
+    path('swagger<format>/', SchemaView.without_ui(cache_timeout=0), name='schema-json'),
+    path('swagger/', SchemaView.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('redoc/', SchemaView.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
     path('api/emergencies/<uuid:report_id>/responder-actions/', EmergencyReportResponderActions.as_view(), name='emergency_report_responder_actions'),
     path('api/emergencies/<uuid:report_id>/status-update/', EmergencyReportStatusUpdate.as_view(), name='emergency_report_status_update'),
     path('api/emergencies/<uuid:report_id>/trigger-crowdsourcing/', TriggerCrowdsourcing.as_view(), name='trigger_crowdsourcing'),
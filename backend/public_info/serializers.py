@@ -1,13 +1,14 @@
 from rest_framework import serializers
+from core.serializers import TimedSerializerMixin
 from .models import EmergencyContact, ContactRedirection
 from emergencies.serializers import EmergencyTypeSerializer
 
-class EmergencyContactSerializer(serializers.ModelSerializer):
+class EmergencyContactSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = EmergencyContact
         fields = ['id', 'name', 'contact_number', 'description', 'type']
 
-class ContactRedirectionSerializer(serializers.ModelSerializer):
+class ContactRedirectionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     contact = EmergencyContactSerializer(read_only=True)
     emergency_type = EmergencyTypeSerializer(read_only=True)
 
@@ -15,7 +16,7 @@ class ContactRedirectionSerializer(serializers.ModelSerializer):
         model = ContactRedirection
         fields = ['id', 'contact', 'emergency_type']
 
-class EmergencyContactDetailSerializer(serializers.ModelSerializer):
+class EmergencyContactDetailSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     emergency_types = EmergencyTypeSerializer(many=True, read_only=True, source='contactredirection_set.emergency_type')
 
     class Meta:
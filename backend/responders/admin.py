@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Responder
+from .models import Responder, RoadBlock
 
 class ResponderAdmin(admin.ModelAdmin):
     list_display = ('user', 'agency')
@@ -7,3 +7,10 @@ class ResponderAdmin(admin.ModelAdmin):
     search_fields = ('user__email', 'agency__name')
 
 admin.site.register(Responder, ResponderAdmin)
+
+
+class RoadBlockAdmin(admin.ModelAdmin):
+    list_display = ('latitude', 'longitude', 'radius_meters', 'reason', 'created_by', 'created_at', 'expires_at')
+    search_fields = ('reason',)
+
+admin.site.register(RoadBlock, RoadBlockAdmin)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RespondersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'responders'
+
+    def ready(self):
+        # Registers the responder index invalidation receivers
+        from . import dispatch  # noqa: F401
@@ -0,0 +1,355 @@
+"""
+Nearest available responders for a report.
+
+Each process keeps an in-memory index of the responders: a grid of CELL_DEGREES cells per
+emergency type, holding the responders whose agencies handle the type at their last known
+position, and how many reports each one is currently Responding to. A recommendation walks
+the report type's grid in rings around the report, so it only looks at nearby responders
+able to take it.
+
+The index is refreshed at most every DISPATCH_INDEX_REFRESH_SECONDS with two indexed
+queries: positions recorded since the last refresh, and the reports in the change log
+since the last refresh. Everything, agencies and emergency types included, is reloaded
+every DISPATCH_INDEX_FULL_REFRESH_SECONDS, and right away when this process changes a
+Responder or AgencyEmergencyType.
+
+With a road graph configured (see responders.routing), recommend_responders takes
+ROUTING_CANDIDATE_FACTOR times as many candidates from the index and ranks them by road ETA
+instead, so a responder across a river or behind a flooded street drops behind one with a
+clear road.
+"""
+import math
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts.models import LastKnownPosition
+from agencies.models import AgencyEmergencyType
+from emergencies.models import EmergencyChange, EmergencyReport
+from . import routing
+from .models import Responder
+
+
+EARTH_RADIUS_METERS = 6_371_000
+# About 2.2 km; a recommendation usually settles within a few rings
+CELL_DEGREES = 0.02
+# A report counts against its responder's load while in this status
+BUSY_STATUS = 'Responding'
+# Pings reach the database some time after they were recorded: up to LOCATION_FLUSH_SECONDS
+# in the buffer, plus this margin for slow requests; refreshes re-read that far back
+REFRESH_OVERLAP = timedelta(seconds=10)
+
+Candidate = namedtuple(
+    'Candidate', 'user_id distance_meters active_reports available recorded_at latitude longitude eta_seconds',
+    defaults=(None,)
+)
+
+
+def _cell(latitude, longitude):
+    return math.floor(latitude / CELL_DEGREES), math.floor(longitude / CELL_DEGREES)
+
+
+def _ring(row, column, radius):
+    """Cells at Chebyshev distance `radius` from (row, column)"""
+    if radius == 0:
+        yield row, column
+        return
+    for offset in range(-radius, radius + 1):
+        yield row - radius, column + offset
+        yield row + radius, column + offset
+    for offset in range(-radius + 1, radius):
+        yield row + offset, column - radius
+        yield row + offset, column + radius
+
+
+class ResponderIndex:
+    """Grid of responder positions with their capabilities and current load"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Bumped by clear() and invalidate(), so a refresh read before either is not applied
+        self._generation = 0
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._refreshing = False
+            self._generation += 1
+
+    def _reset(self):
+        self._capabilities = {}  # user_id -> frozenset of emergency type ids
+        self._positions = {}  # user_id -> (latitude, longitude, recorded_at, cell)
+        self._cells = {}  # (emergency type id, row, column) -> set of user_ids
+        self._assignments = {}  # busy report id -> responder user_id
+        self._load = Counter()  # responder user_id -> busy reports
+        self._positions_until = None
+        self._change_cursor = 0
+        self._refreshed_at = 0.0
+        self._loaded_at = None
+
+    def invalidate(self):
+        """Reload everything on the next lookup"""
+        with self._lock:
+            self._loaded_at = None
+            self._generation += 1
+
+    def set_capabilities(self, user_id, emergency_type_ids):
+        with self._lock:
+            position = self._positions.get(user_id)
+            if position is not None:
+                self._unplace(user_id, position[3])
+            self._capabilities[user_id] = frozenset(emergency_type_ids)
+            if position is not None:
+                self._place(user_id, position[3])
+
+    def move(self, user_id, latitude, longitude, recorded_at):
+        with self._lock:
+            self._move(user_id, latitude, longitude, recorded_at)
+
+    def _place(self, user_id, cell):
+        for emergency_type_id in self._capabilities.get(user_id, ()):
+            self._cells.setdefault((emergency_type_id, *cell), set()).add(user_id)
+
+    def _unplace(self, user_id, cell):
+        for emergency_type_id in self._capabilities.get(user_id, ()):
+            key = (emergency_type_id, *cell)
+            self._cells[key].discard(user_id)
+            if not self._cells[key]:
+                del self._cells[key]
+
+    def _move(self, user_id, latitude, longitude, recorded_at):
+        current = self._positions.get(user_id)
+        if current is not None:
+            if current[2] > recorded_at:
+                return
+            self._unplace(user_id, current[3])
+        cell = _cell(latitude, longitude)
+        self._positions[user_id] = (latitude, longitude, recorded_at, cell)
+        self._place(user_id, cell)
+        if self._positions_until is None or recorded_at > self._positions_until:
+            self._positions_until = recorded_at
+
+    def _assign(self, report_id, responder_id):
+        previous = self._assignments.pop(report_id, None)
+        if previous is not None:
+            self._load[previous] -= 1
+            if not self._load[previous]:
+                del self._load[previous]
+        if responder_id is not None:
+            self._assignments[report_id] = responder_id
+            self._load[responder_id] += 1
+
+    def _start_refresh(self, now):
+        """
+        What this thread should read to refresh the index: ('full', None), ('changes',
+        (positions since, change cursor)), or None when the index is fresh or another thread
+        is already reading. Until a full load is in place, each thread reads one rather than
+        answer from an empty or invalidated index. Called with the lock held.
+        """
+        if self._refreshing and self._loaded_at is not None:
+            return None
+        if (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at >= settings.DISPATCH_INDEX_FULL_REFRESH_SECONDS
+        ):
+            kind, since = 'full', None
+        elif time.monotonic() - self._refreshed_at >= settings.DISPATCH_INDEX_REFRESH_SECONDS:
+            stale_cutoff = now - timedelta(minutes=settings.LOCATION_STALE_MINUTES)
+            overlap = REFRESH_OVERLAP + timedelta(seconds=settings.LOCATION_FLUSH_SECONDS)
+            since = max(self._positions_until - overlap, stale_cutoff) if self._positions_until else stale_cutoff
+            kind, since = 'changes', (since, self._change_cursor)
+        else:
+            return None
+        self._refreshing = True
+        return kind, since, self._generation
+
+    @staticmethod
+    def _read_full(now):
+        capabilities = {}
+        for user_id, emergency_type_id in AgencyEmergencyType.objects.filter(
+            agency__responder__isnull=False
+        ).values_list('agency__responder__user_id', 'emergency_type_id'):
+            capabilities.setdefault(user_id, set()).add(emergency_type_id)
+        # Read the cursor first: changes logged while loading are replayed, not lost, and so
+        # are the recent ones an older transaction may still commit entries below
+        cursor = EmergencyChange.objects.filter(
+            date_created__lte=EmergencyChange.settled_before()
+        ).aggregate(cursor=Max('id'))['cursor'] or 0
+        positions = ResponderIndex._read_positions(now - timedelta(minutes=settings.LOCATION_STALE_MINUTES))
+        assignments = list(EmergencyReport.objects.filter(
+            status=BUSY_STATUS, responder__isnull=False
+        ).values_list('id', 'responder_id'))
+        return capabilities, cursor, positions, assignments
+
+    @staticmethod
+    def _read_positions(since):
+        return list(LastKnownPosition.objects.filter(
+            recorded_at__gte=since, user_id__in=Responder.objects.values('user_id')
+        ).values_list('user_id', 'latitude', 'longitude', 'recorded_at'))
+
+    @staticmethod
+    def _read_changes(cursor):
+        """(next cursor, {report id: busy responder id or None}) of the reports changed after cursor"""
+        entries = list(
+            EmergencyChange.objects.filter(id__gt=cursor, kind=EmergencyChange.REPORT)
+            .order_by('id').values_list('id', 'object_id', 'date_created')
+        )
+        if not entries:
+            return cursor, {}
+        # Recent entries are applied now and again on the next refresh, in case an older
+        # transaction commits an entry below them in the meantime
+        cursor = EmergencyChange.settled_cursor(
+            [(entry_id, date_created) for entry_id, _, date_created in entries], cursor
+        )
+        report_ids = {object_id for _, object_id, _ in entries}
+        current = {
+            report_id: responder_id if status == BUSY_STATUS else None
+            for report_id, responder_id, status in EmergencyReport.objects.filter(
+                id__in=report_ids
+            ).values_list('id', 'responder_id', 'status')
+        }
+        # Deleted reports are missing and free their responder
+        return cursor, {report_id: current.get(report_id) for report_id in report_ids}
+
+    def _refresh(self, now):
+        """
+        Bring the index up to date. The queries run without the lock, so recommendations in
+        this process go on with the index as it was, and the result is swapped in after.
+        """
+        with self._lock:
+            refresh = self._start_refresh(now)
+        if refresh is None:
+            return
+        kind, since, generation = refresh
+        try:
+            if kind == 'full':
+                loaded = self._read_full(now)
+            else:
+                positions_since, cursor = since
+                loaded = self._read_positions(positions_since), self._read_changes(cursor)
+        except Exception:
+            with self._lock:
+                self._refreshing = False
+            raise
+        with self._lock:
+            self._refreshing = False
+            if kind == 'full':
+                if generation != self._generation:
+                    # Invalidated or cleared while reading: read again on the next lookup
+                    return
+                capabilities, cursor, positions, assignments = loaded
+                self._reset()
+                self._capabilities = {user_id: frozenset(types) for user_id, types in capabilities.items()}
+                self._change_cursor = cursor
+                for position in positions:
+                    self._move(*position)
+                for report_id, responder_id in assignments:
+                    self._assign(report_id, responder_id)
+                self._loaded_at = time.monotonic()
+            else:
+                if generation != self._generation:
+                    return
+                positions, (cursor, assignments) = loaded
+                for position in positions:
+                    self._move(*position)
+                self._change_cursor = cursor
+                for report_id, responder_id in assignments.items():
+                    self._assign(report_id, responder_id)
+            self._refreshed_at = time.monotonic()
+
+    def recommend(self, emergency_type_id, latitude, longitude, limit, now=None):
+        """
+        Up to `limit` responders able to handle the emergency type: the available ones
+        (fewer than DISPATCH_MAX_ACTIVE_REPORTS busy reports) nearest first, then the busy
+        ones, least loaded first. Only responders with a fresh position within
+        DISPATCH_MAX_RADIUS_KM count.
+        """
+        now = now or timezone.now()
+        self._refresh(now)
+        with self._lock:
+            stale_cutoff = now - timedelta(minutes=settings.LOCATION_STALE_MINUTES)
+            max_distance = settings.DISPATCH_MAX_RADIUS_KM * 1000
+            max_load = settings.DISPATCH_MAX_ACTIVE_REPORTS
+            # Equirectangular distance at the report's latitude, as in emergencies.duplicates
+            meters_y = EARTH_RADIUS_METERS * math.pi / 180
+            meters_x = meters_y * math.cos(math.radians(latitude))
+            row, column = _cell(latitude, longitude)
+            available, busy = [], []  # (distance, user_id)
+            radius = 0
+            while True:
+                for cell_row, cell_column in _ring(row, column, radius):
+                    for user_id in self._cells.get((emergency_type_id, cell_row, cell_column), ()):
+                        other_lat, other_lon, recorded_at, _ = self._positions[user_id]
+                        if recorded_at < stale_cutoff:
+                            continue
+                        distance = math.hypot((other_lon - longitude) * meters_x, (other_lat - latitude) * meters_y)
+                        if distance <= max_distance:
+                            (available if self._load.get(user_id, 0) < max_load else busy).append((distance, user_id))
+                # Responders outside the rings walked so far are at least this far away
+                edge = min(abs(latitude) + (radius + 1) * CELL_DEGREES, 89.9)
+                reached = radius * CELL_DEGREES * meters_y * math.cos(math.radians(edge))
+                if reached >= max_distance or sum(distance <= reached for distance, _ in available) >= limit:
+                    break
+                radius += 1
+            available.sort()
+            busy.sort(key=lambda item: (self._load[item[1]], item[0]))
+            ranked = [(distance, user_id, True) for distance, user_id in available]
+            ranked += [(distance, user_id, False) for distance, user_id in busy]
+            candidates = []
+            for distance, user_id, is_available in ranked[:limit]:
+                other_lat, other_lon, recorded_at, _ = self._positions[user_id]
+                candidates.append(Candidate(
+                    user_id, distance, self._load.get(user_id, 0), is_available, recorded_at, other_lat, other_lon
+                ))
+            return candidates
+
+
+responder_index = ResponderIndex()
+
+
+def _eta_key(candidate):
+    # Unreachable by road last, then by straight-line distance
+    return (candidate.eta_seconds is None, candidate.eta_seconds or 0, candidate.distance_meters)
+
+
+def recommend_responders(report, limit):
+    """
+    Ranked Candidates for a report (see ResponderIndex.recommend), re-ranked by road ETA
+    when a road graph is configured: available ones fastest first, then busy ones least
+    loaded first, each with eta_seconds set (None when the road network cannot reach them).
+    """
+    if routing.road_graph() is None:
+        return responder_index.recommend(report.emergency_type_id, report.latitude, report.longitude, limit)
+    candidates = responder_index.recommend(
+        report.emergency_type_id, report.latitude, report.longitude, limit * settings.ROUTING_CANDIDATE_FACTOR
+    )
+    etas = routing.eta_seconds(
+        [(candidate.latitude, candidate.longitude) for candidate in candidates], (report.latitude, report.longitude)
+    )
+    if etas is None:
+        return candidates[:limit]
+    candidates = [candidate._replace(eta_seconds=eta) for candidate, eta in zip(candidates, etas)]
+    available = sorted((candidate for candidate in candidates if candidate.available), key=_eta_key)
+    busy = sorted(
+        (candidate for candidate in candidates if not candidate.available),
+        key=lambda candidate: (candidate.active_reports, *_eta_key(candidate))
+    )
+    return (available + busy)[:limit]
+
+
+@receiver(post_save, sender=Responder)
+@receiver(post_delete, sender=Responder)
+@receiver(post_save, sender=AgencyEmergencyType)
+@receiver(post_delete, sender=AgencyEmergencyType)
+def invalidate_responder_index(sender, raw=False, **kwargs):
+    if raw:
+        return
+    responder_index.invalidate()
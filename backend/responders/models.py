@@ -1,5 +1,6 @@
-from django.db import models
 from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models
 
 class Responder(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -9,4 +10,22 @@ class Responder(models.Model):
         unique_together = ('user', 'agency')
 
     def __str__(self):
-        return f"{self.user.email} - {self.agency.name}"
\ No newline at end of file
+        return f"{self.user.email} - {self.agency.name}"
+
+
+class RoadBlock(models.Model):
+    """
+    Impassable area, e.g. a flooded street: road ETAs route around the roads passing within
+    radius_meters of the point until expires_at (or until the block is deleted).
+    """
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    radius_meters = models.FloatField(default=50, validators=[MinValueValidator(1), MaxValueValidator(5000)])
+    reason = models.CharField(max_length=255, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(null=True, blank=True, help_text="Leave empty to keep the block until it is deleted.")
+
+    def __str__(self):
+        return f"Road block at {self.latitude}, {self.longitude} ({self.radius_meters:g} m)"
+
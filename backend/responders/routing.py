@@ -0,0 +1,82 @@
+"""
+Road-network ETAs for dispatch.
+
+Each process loads the graph built by `manage.py build_road_graph` from ROAD_GRAPH_PATH on
+first use and keeps it in memory. The active RoadBlocks are re-read at most every
+ROAD_BLOCK_REFRESH_SECONDS, and right away when this process changes one; the graph is
+only re-blocked when they changed. Without ROAD_GRAPH_PATH, or when the file cannot be
+read, road_graph() returns None and dispatch ranks by straight-line distance.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.services.routing import RoadGraph
+from .models import RoadBlock
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_state = {'path': None, 'graph': None, 'blocks': (), 'blocks_read_at': 0.0}
+
+
+def active_road_blocks():
+    now = timezone.now()
+    return RoadBlock.objects.filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+
+
+def _graph():
+    """The graph for ROAD_GRAPH_PATH with the current blocks applied; call with _lock held"""
+    path = settings.ROAD_GRAPH_PATH
+    if path != _state['path']:
+        _state.update(path=path, graph=None, blocks=(), blocks_read_at=0.0)
+        if path:
+            try:
+                _state['graph'] = RoadGraph.load(path)
+            except (OSError, ValueError):
+                logger.exception('Road graph %s could not be loaded; dispatch falls back to straight-line distance', path)
+    graph = _state['graph']
+    if graph is not None and time.monotonic() - _state['blocks_read_at'] >= settings.ROAD_BLOCK_REFRESH_SECONDS:
+        blocks = tuple(sorted(active_road_blocks().values_list('latitude', 'longitude', 'radius_meters')))
+        if blocks != _state['blocks']:
+            graph.block_areas(blocks)
+            _state['blocks'] = blocks
+        _state['blocks_read_at'] = time.monotonic()
+    return graph
+
+
+def road_graph():
+    """The loaded road graph, or None when road routing is not configured"""
+    with _lock:
+        return _graph()
+
+
+@receiver(post_save, sender=RoadBlock)
+@receiver(post_delete, sender=RoadBlock)
+def invalidate_road_blocks(sender=None, raw=False, **kwargs):
+    """Re-read the road blocks on the next ETA"""
+    if raw:
+        return
+    with _lock:
+        _state['blocks_read_at'] = 0.0
+
+
+def eta_seconds(origins, destination):
+    """
+    Road ETA in seconds from each (latitude, longitude) origin to the destination, with None
+    for unreachable points; None instead of the list when road routing is not configured.
+    """
+    with _lock:
+        graph = _graph()
+        if graph is None:
+            return None
+        return graph.eta_seconds(
+            origins, destination, settings.ROUTING_SNAP_MAX_METERS, settings.ROUTING_OFFROAD_SPEED_KMH / 3.6
+        )
@@ -1,9 +1,10 @@
 from rest_framework import serializers
-from .models import Responder
+from core.serializers import TimedSerializerMixin
+from .models import Responder, RoadBlock
 from accounts.serializers import UserSerializer
 from agencies.serializers import AgencySerializer
 
-class ResponderSerializer(serializers.ModelSerializer):
+class ResponderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     agency = AgencySerializer(read_only=True)
 
@@ -11,7 +12,13 @@ class ResponderSerializer(serializers.ModelSerializer):
         model = Responder
         fields = ['id', 'user', 'agency']
 
-class ResponderCreateSerializer(serializers.ModelSerializer):
+class ResponderCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Responder
-        fields = ['user', 'agency']
\ No newline at end of file
+        fields = ['user', 'agency']
+
+class RoadBlockSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = RoadBlock
+        fields = ['id', 'latitude', 'longitude', 'radius_meters', 'reason', 'created_by', 'created_at', 'expires_at']
+        read_only_fields = ['created_by', 'created_at']
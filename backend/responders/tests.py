@@ -1,3 +1,221 @@
-from django.test import TestCase
+import os
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from accounts.models import LastKnownPosition, User, UserProfile
+from agencies.models import Agency, AgencyEmergencyType
+from core.services.routing import RoadGraph
+from core.testing import road_feature, write_geojson
+from emergencies.models import EmergencyChange, EmergencyReport, EmergencyType
+from .dispatch import responder_index
+from .models import Responder, RoadBlock
+
+
+@override_settings(
+    DISPATCH_INDEX_REFRESH_SECONDS=0, DISPATCH_INDEX_FULL_REFRESH_SECONDS=3600,
+    DISPATCH_MAX_ACTIVE_REPORTS=1, DISPATCH_MAX_RADIUS_KM=50, DUPLICATE_DETECTION_ENABLED=False,
+)
+class NearestResponderTests(TestCase):
+    """Ranking responders for a report by position, capability and load."""
+
+    def setUp(self):
+        responder_index.clear()
+        self.client = APIClient()
+        self.reporter = User.objects.create_user(email='reporter@example.com', password='pass')
+        self.client.force_authenticate(user=self.reporter)
+        self.fire = EmergencyType.objects.create(name='Fire', icon_type='fire-icon')
+        self.flood = EmergencyType.objects.create(name='Flood', icon_type='flood-icon')
+        self.bfp = Agency.objects.create(name='BFP', hotline_number='911', latitude=14.6, longitude=121.0)
+        self.mmda = Agency.objects.create(name='MMDA', hotline_number='136', latitude=14.6, longitude=121.0)
+        AgencyEmergencyType.objects.create(agency=self.bfp, emergency_type=self.fire)
+        AgencyEmergencyType.objects.create(agency=self.mmda, emergency_type=self.flood)
+        self.report = EmergencyReport.objects.create(
+            emergency_type=self.fire, user=self.reporter, latitude=14.6, longitude=121.0
+        )
+        # About 1 km, 3 km and 0.5 km north of the report
+        self.near = self.create_responder('near@example.com', self.bfp, 14.609)
+        self.far = self.create_responder('far@example.com', self.bfp, 14.627)
+        self.busy = self.create_responder('busy@example.com', self.bfp, 14.6045)
+        EmergencyReport.objects.create(
+            emergency_type=self.fire, user=self.reporter, latitude=14.7, longitude=121.0,
+            responder=self.busy, status='Responding'
+        )
+        # Close by, but for floods only, or with an old position
+        self.create_responder('flood@example.com', self.mmda, 14.601)
+        self.create_responder('stale@example.com', self.bfp, 14.601, age=timedelta(hours=1))
+
+    def create_responder(self, email, agency, latitude, age=timedelta(0)):
+        user = User.objects.create_user(email=email, password='pass')
+        Responder.objects.create(user=user, agency=agency)
+        LastKnownPosition.objects.create(
+            user=user, latitude=latitude, longitude=121.0, recorded_at=timezone.now() - age
+        )
+        return user
+
+    def ranked_emails(self, **params):
+        response = self.client.get(reverse('responder-nearest', kwargs={'report_id': self.report.id}), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [responder['email'] for responder in response.data['data']['responders']]
+
+    def test_available_responders_come_first_by_distance(self):
+        response = self.client.get(reverse('responder-nearest', kwargs={'report_id': self.report.id}))
+        responders = response.data['data']['responders']
+        self.assertEqual(
+            [responder['email'] for responder in responders],
+            ['near@example.com', 'far@example.com', 'busy@example.com']
+        )
+        self.assertAlmostEqual(responders[0]['distance_km'], 1.0, delta=0.05)
+        self.assertEqual(responders[0]['agencies'], [{'id': str(self.bfp.id), 'name': 'BFP'}])
+        self.assertEqual((responders[2]['active_reports'], responders[2]['available']), (1, False))
+        self.assertEqual(self.ranked_emails(limit=1), ['near@example.com'])
+
+    @override_settings(DISPATCH_MAX_RADIUS_KM=2)
+    def test_responders_beyond_the_radius_are_left_out(self):
+        self.assertEqual(self.ranked_emails(), ['near@example.com', 'busy@example.com'])
+
+    def test_index_picks_up_positions_and_assignments_incrementally(self):
+        self.ranked_emails()
+        LastKnownPosition.objects.filter(user=self.far).update(latitude=14.6, recorded_at=timezone.now())
+        self.report.responder = self.near
+        self.report.status = 'Responding'
+        self.report.save()
+
+        # New positions, the change log, and the changed reports
+        with self.assertNumQueries(3):
+            candidates = responder_index.recommend(self.fire.id, 14.6, 121.0, 5)
+        self.assertEqual(
+            [(candidate.user_id, candidate.available) for candidate in candidates],
+            [(self.far.id, True), (self.busy.id, False), (self.near.id, False)]
+        )
+
+        self.report.status = 'Resolved'
+        self.report.save()
+        self.assertEqual(responder_index.recommend(self.fire.id, 14.6, 121.0, 1)[0].user_id, self.far.id)
+        self.assertTrue(responder_index.recommend(self.fire.id, 14.6, 121.0, 5)[1].available)
+
+    def test_refresh_queries_without_holding_the_index_lock(self):
+        filter_changes, held = EmergencyChange.objects.filter, []
+
+        def filter_and_check(*args, **kwargs):
+            held.append(responder_index._lock.locked())
+            return filter_changes(*args, **kwargs)
+
+        with patch.object(EmergencyChange.objects, 'filter', side_effect=filter_and_check):
+            # A full load, then an incremental refresh
+            self.ranked_emails()
+            self.ranked_emails()
+        self.assertEqual(held, [False, False])
+
+    def test_new_responders_are_picked_up(self):
+        self.ranked_emails()
+        AgencyEmergencyType.objects.create(agency=self.mmda, emergency_type=self.fire)
+        self.assertEqual(self.ranked_emails(limit=1), ['flood@example.com'])
+
+    def test_invalid_requests(self):
+        url = reverse('responder-nearest', kwargs={'report_id': self.report.id})
+        self.assertEqual(self.client.get(url, {'limit': 0}).status_code, status.HTTP_400_BAD_REQUEST)
+        missing = reverse('responder-nearest', kwargs={'report_id': '00000000-0000-0000-0000-000000000000'})
+        self.assertEqual(self.client.get(missing).status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(
+    DISPATCH_INDEX_REFRESH_SECONDS=0, DISPATCH_INDEX_FULL_REFRESH_SECONDS=3600,
+    DISPATCH_MAX_ACTIVE_REPORTS=1, DISPATCH_MAX_RADIUS_KM=50, DUPLICATE_DETECTION_ENABLED=False,
+    ROAD_BLOCK_REFRESH_SECONDS=3600, ROUTING_SNAP_MAX_METERS=500, ROUTING_OFFROAD_SPEED_KMH=15,
+)
+class RoadEtaTests(TestCase):
+    """Re-ranking responders by road ETA, around the road blocks."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        directory = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(directory.cleanup)
+        # A road 2 km east from the report, and a river 0.5 km north of it, crossed by a
+        # bridge 4.4 km west
+        graph = RoadGraph.from_geojson(write_geojson(os.path.join(directory.name, 'roads.geojson'), [
+            road_feature([(14.6, 121.0), (14.6, 121.0185)]),
+            road_feature([(14.6, 121.0), (14.6, 120.96)]),
+            road_feature([(14.6, 120.96), (14.609, 120.96)]),
+            road_feature([(14.609, 120.96), (14.609, 121.0)]),
+        ]))
+        graph.contract()
+        cls.graph_path = os.path.join(directory.name, 'roads.graph')
+        graph.save(cls.graph_path)
+
+    def setUp(self):
+        responder_index.clear()
+        self.client = APIClient()
+        self.responder = User.objects.create_user(email='dispatcher@example.com', password='pass')
+        UserProfile.objects.create(
+            user=self.responder, full_name='Dispatcher', authority_level='Responder', contact_number='123',
+            date_of_birth='1990-01-01', address='Test', status='approved', email_verified=True
+        )
+        self.client.force_authenticate(user=self.responder)
+        fire = EmergencyType.objects.create(name='Fire', icon_type='fire-icon')
+        bfp = Agency.objects.create(name='BFP', hotline_number='911', latitude=14.6, longitude=121.0)
+        AgencyEmergencyType.objects.create(agency=bfp, emergency_type=fire)
+        self.report = EmergencyReport.objects.create(
+            emergency_type=fire, user=self.responder, latitude=14.6, longitude=121.0
+        )
+        for email, latitude, longitude in (('across@example.com', 14.609, 121.0), ('down@example.com', 14.6, 121.0185)):
+            user = User.objects.create_user(email=email, password='pass')
+            Responder.objects.create(user=user, agency=bfp)
+            LastKnownPosition.objects.create(user=user, latitude=latitude, longitude=longitude, recorded_at=timezone.now())
+
+    def nearest(self):
+        response = self.client.get(reverse('responder-nearest', kwargs={'report_id': self.report.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['data']
+
+    def test_without_a_graph_responders_are_ranked_by_distance(self):
+        with override_settings(ROAD_GRAPH_PATH=''):
+            data = self.nearest()
+        self.assertFalse(data['routing'])
+        self.assertEqual([responder['email'] for responder in data['responders']], ['across@example.com', 'down@example.com'])
+        self.assertIsNone(data['responders'][0]['eta_seconds'])
+
+    def test_road_etas_rank_the_responder_with_a_clear_road_first(self):
+        with override_settings(ROAD_GRAPH_PATH=self.graph_path):
+            data = self.nearest()
+        self.assertTrue(data['routing'])
+        responders = data['responders']
+        self.assertEqual([responder['email'] for responder in responders], ['down@example.com', 'across@example.com'])
+        # 2 km at 20 km/h, against 9.6 km round the bridge
+        self.assertAlmostEqual(responders[0]['eta_seconds'], 358, delta=5)
+        self.assertAlmostEqual(responders[1]['eta_seconds'], 1730, delta=5)
+
+    def test_road_blocks_reroute_dispatch(self):
+        url = reverse('road-block-list')
+        with override_settings(ROAD_GRAPH_PATH=self.graph_path):
+            self.nearest()
+            response = self.client.post(url, {'latitude': 14.6, 'longitude': 121.009, 'radius_meters': 50, 'reason': 'Flooded'})
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.data['created_by'], self.responder.id)
+            responders = self.nearest()['responders']
+            self.assertEqual([responder['email'] for responder in responders], ['across@example.com', 'down@example.com'])
+            self.assertIsNone(responders[1]['eta_seconds'])
+
+            response = self.client.delete(reverse('road-block-detail', kwargs={'pk': response.data['id']}))
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+            self.assertEqual(self.nearest()['responders'][0]['email'], 'down@example.com')
+
+    def test_road_block_permissions_and_expiry(self):
+        RoadBlock.objects.create(latitude=14.6, longitude=121.0, expires_at=timezone.now() - timedelta(minutes=1))
+        current = RoadBlock.objects.create(latitude=14.6, longitude=121.01)
+        response = self.client.get(reverse('road-block-list'))
+        self.assertEqual([block['id'] for block in response.data], [current.id])
+
+        self.responder.profile.authority_level = 'User'
+        self.responder.profile.save()
+        response = self.client.post(reverse('road-block-list'), {'latitude': 14.6, 'longitude': 121.0})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.delete(reverse('road-block-detail', kwargs={'pk': current.id}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -1,7 +1,10 @@
 from django.urls import path
-from .views import ResponderList, ResponderDetail
+from .views import NearestResponders, ResponderList, ResponderDetail, RoadBlockDetail, RoadBlockList
 
 urlpatterns = [
     path('', ResponderList.as_view(), name='responder-list'),
     path('<int:pk>/', ResponderDetail.as_view(), name='responder-detail'),
+    path('nearest/<uuid:report_id>/', NearestResponders.as_view(), name='responder-nearest'),
+    path('road-blocks/', RoadBlockList.as_view(), name='road-block-list'),
+    path('road-blocks/<int:pk>/', RoadBlockDetail.as_view(), name='road-block-detail'),
 ]
\ No newline at end of file
@@ -1,7 +1,19 @@
-from rest_framework import generics, permissions
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
-from .models import Responder
-from .serializers import ResponderSerializer, ResponderCreateSerializer
+from accounts.models import User
+from emergencies.models import EmergencyReport
+from .dispatch import recommend_responders
+from .models import Responder, RoadBlock
+from .routing import active_road_blocks, road_graph
+from .serializers import ResponderSerializer, ResponderCreateSerializer, RoadBlockSerializer
+
+# Authority levels allowed to mark and clear road blocks
+ROAD_BLOCK_EDITORS = ('Responder', 'LGU Administrator')
 
 class ResponderList(generics.ListCreateAPIView):
     """
@@ -109,3 +121,158 @@ class ResponderDetail(generics.RetrieveUpdateDestroyAPIView):
     )
     def delete(self, request, *args, **kwargs):
         return super().delete(request, *args, **kwargs)
+
+
+class NearestResponders(APIView):
+    """
+    Responders to send to a report: the closest free ones whose agencies handle its emergency type.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="Recommend responders for a report",
+        operation_description=(
+            "Rank the responders able to handle the report's emergency type by their last known position. "
+            "Available responders (fewer than DISPATCH_MAX_ACTIVE_REPORTS reports in Responding) come first, "
+            "nearest first, then busy ones. Responders without a position in the last LOCATION_STALE_MINUTES "
+            "or farther than DISPATCH_MAX_RADIUS_KM are left out. When a road graph is configured (routing is "
+            "true), they are ranked by road ETA around the active road blocks instead; eta_seconds is null for "
+            "responders the roads cannot bring there."
+        ),
+        tags=['Responders'],
+        manual_parameters=[
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, description='Number of responders (default 5, at most DISPATCH_MAX_CANDIDATES)')
+        ],
+        responses={
+            200: "Ranked responders with distance_km, eta_seconds, active_reports and available",
+            400: "Invalid limit",
+            401: "Authentication required",
+            404: "Emergency report not found"
+        }
+    )
+    def get(self, request, report_id):
+        try:
+            limit = int(request.query_params.get('limit', 5))
+            if not 1 <= limit <= settings.DISPATCH_MAX_CANDIDATES:
+                raise ValueError
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': f'limit must be an integer between 1 and {settings.DISPATCH_MAX_CANDIDATES}.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        report = get_object_or_404(
+            EmergencyReport.objects.only('id', 'emergency_type_id', 'latitude', 'longitude'), id=report_id
+        )
+        candidates = recommend_responders(report, limit)
+        user_ids = [candidate.user_id for candidate in candidates]
+        users = User.objects.in_bulk(user_ids)
+        agencies = {}
+        for user_id, agency_id, agency_name in Responder.objects.filter(
+            user_id__in=user_ids, agency__agencyemergencytype__emergency_type_id=report.emergency_type_id
+        ).values_list('user_id', 'agency_id', 'agency__name'):
+            agencies.setdefault(user_id, []).append({'id': str(agency_id), 'name': agency_name})
+
+        return Response({
+            'status': 'success',
+            'message': 'Responders ranked.',
+            'data': {
+                'report_id': str(report.id),
+                'routing': road_graph() is not None,
+                'responders': [
+                    {
+                        'user_id': candidate.user_id,
+                        'email': users[candidate.user_id].email if candidate.user_id in users else None,
+                        'name': users[candidate.user_id].get_full_name() if candidate.user_id in users else None,
+                        'agencies': agencies.get(candidate.user_id, []),
+                        'distance_km': round(candidate.distance_meters / 1000, 3),
+                        'eta_seconds': None if candidate.eta_seconds is None else round(candidate.eta_seconds),
+                        'active_reports': candidate.active_reports,
+                        'available': candidate.available,
+                        'position_recorded_at': candidate.recorded_at,
+                    }
+                    for candidate in candidates
+                ],
+            }
+        }, status=status.HTTP_200_OK)
+
+
+def _can_edit_road_blocks(user):
+    return getattr(getattr(user, 'profile', None), 'authority_level', None) in ROAD_BLOCK_EDITORS
+
+
+class RoadBlockList(generics.ListCreateAPIView):
+    """
+    list:
+    Get the road blocks currently in effect.
+
+    create:
+    Mark an impassable area; road ETAs route around it.
+    """
+    serializer_class = RoadBlockSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return active_road_blocks().order_by('-created_at')
+
+    @swagger_auto_schema(
+        operation_summary="List road blocks",
+        operation_description="Get the road blocks currently in effect (not expired).",
+        tags=['Responders'],
+        responses={
+            200: RoadBlockSerializer(many=True)
+        }
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    @swagger_auto_schema(
+        operation_summary="Create road block",
+        operation_description=(
+            "Mark the roads within radius_meters of a point as impassable, e.g. a flooded street, until "
+            "expires_at. Responder and LGU Administrator accounts only."
+        ),
+        tags=['Responders'],
+        request_body=RoadBlockSerializer,
+        responses={
+            201: RoadBlockSerializer,
+            403: "Only responders and LGU administrators can mark road blocks"
+        }
+    )
+    def post(self, request, *args, **kwargs):
+        if not _can_edit_road_blocks(request.user):
+            return Response({
+                'status': 'error',
+                'message': 'Only responders and LGU administrators can mark road blocks.'
+            }, status=status.HTTP_403_FORBIDDEN)
+        return super().post(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+
+class RoadBlockDetail(generics.DestroyAPIView):
+    """
+    destroy:
+    Clear a road block.
+    """
+    queryset = RoadBlock.objects.all()
+    serializer_class = RoadBlockSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_summary="Delete road block",
+        operation_description="Clear a road block, e.g. once the water has receded. Responder and LGU Administrator accounts only.",
+        tags=['Responders'],
+        responses={
+            204: "No Content",
+            403: "Only responders and LGU administrators can clear road blocks"
+        }
+    )
+    def delete(self, request, *args, **kwargs):
+        if not _can_edit_road_blocks(request.user):
+            return Response({
+                'status': 'error',
+                'message': 'Only responders and LGU administrators can clear road blocks.'
+            }, status=status.HTTP_403_FORBIDDEN)
+        return super().delete(request, *args, **kwargs)
@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# Production uses the stateless middleware profile (sessions/CSRF/messages only for admin)
+export MIDDLEWARE_PROFILE=${MIDDLEWARE_PROFILE:-stateless}
+
 # Collect static files
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
@@ -8,6 +11,31 @@ python manage.py collectstatic --noinput
 echo "Applying database migrations..."
 python manage.py migrate
 
+# The table of the database cache that shares replica pins between workers
+echo "Creating cache tables..."
+python manage.py createcachetable
+
+# Generate the OpenAPI schema once; the workers serve it from memory
+echo "Generating the OpenAPI schema..."
+python manage.py generate_schema
+
+# Make sure the upcoming monthly partitions exist (no-op on SQLite)
+echo "Creating upcoming table partitions..."
+python manage.py create_partitions
+
 # Start Gunicorn server
-echo "Starting Gunicorn server..."
-gunicorn nstw_backend.wsgi:application --bind 0.0.0.0:${PORT:-8000} --workers 3
\ No newline at end of file
+# GUNICORN_PRELOAD=True loads and warms the application once in the master, and the forked
+# workers share it (see nstw_backend/preload.py)
+PRELOAD=""
+if [ "${GUNICORN_PRELOAD:-False}" = "True" ]; then
+    PRELOAD="--preload"
+fi
+# SERVER_PROFILE=asgi runs uvicorn workers, so the async creation endpoints
+# (/api/emergencies/async/...) keep many slow image uploads in flight per process
+if [ "${SERVER_PROFILE:-wsgi}" = "asgi" ]; then
+    echo "Starting Gunicorn server (ASGI, uvicorn workers)..."
+    gunicorn nstw_backend.asgi:application -k uvicorn_worker.UvicornWorker --bind 0.0.0.0:${PORT:-8000} --workers ${GUNICORN_WORKERS:-3} $PRELOAD
+else
+    echo "Starting Gunicorn server..."
+    gunicorn nstw_backend.wsgi:application --bind 0.0.0.0:${PORT:-8000} --workers ${GUNICORN_WORKERS:-3} $PRELOAD
+fi
\ No newline at end of file